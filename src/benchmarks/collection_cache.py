@@ -0,0 +1,72 @@
+"""
+Benchmark for opening a collection again, like starting the editor or reloading the collection does. Compares
+reading every file of the collection with restoring the trees from the cache of the collection, when no file
+changed and when some files changed, eagerly and lazily. The collections are copies of the trees of a collection
+on disk, written to a temporary directory, the cache is written to a temporary directory as well. The verification
+cache is cleared before every run.
+Run from the src directory: python -m benchmarks.collection_cache
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import timeit
+from pathlib import Path
+
+from benchmarks.collection_loading import build_directory
+from model.collection_loader import CollectionLoader
+from model.tree import Verification
+
+
+def touch_files(path: Path, changed: int):
+    """
+    Changes the modification time of some files of a collection, so they are read again
+    :param path: the collection
+    :param changed: the number of files
+    """
+    files = [file_path for _, file, file_path in CollectionLoader.list_files(path)[1] if file.endswith('.json')]
+    for file_path in files[:changed]:
+        stat = os.stat(file_path)
+        os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Opening a collection with a cache')
+    parser.add_argument('--path', default='jsons', help='the collection to copy the files from')
+    parser.add_argument('--files', type=int, nargs='+', default=[500, 2000, 5000],
+                        help='the numbers of files in the collection')
+    parser.add_argument('--changed', type=int, default=10, help='the number of files that change between opens')
+    parser.add_argument('--repeat', type=int, default=3, help='how many times every open is timed')
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    uncached = CollectionLoader(max_workers=1, use_cache=False)
+    cache_folder = tempfile.mkdtemp()
+    print('{:>8} {:>6} {:>12} {:>12} {:>14} {:>8}'.format('files', 'lazy', 'uncached', 'cached',
+                                                          '{} changed'.format(args.changed), 'speedup'))
+    try:
+        for size in args.files:
+            directory = tempfile.mkdtemp()
+            try:
+                build_directory(Path(args.path), Path(directory), size)
+                for lazy in (False, True):
+                    cached = CollectionLoader(max_workers=1, cache_folder=Path(cache_folder))
+                    cached.load(Path(directory), lazy=lazy)
+                    times = [min(timeit.repeat(lambda: loader.load(Path(directory), lazy=lazy),
+                                               setup=Verification.cache.clear, number=1, repeat=args.repeat))
+                             for loader in (uncached, cached)]
+                    times.append(min(timeit.repeat(lambda: cached.load(Path(directory), lazy=lazy),
+                                                   setup=lambda: touch_files(Path(directory), args.changed)
+                                                   or Verification.cache.clear(), number=1, repeat=args.repeat)))
+                    print('{:>8} {:>6} {:>9.1f} ms {:>9.1f} ms {:>11.1f} ms {:>7.2f}x'
+                          .format(size, str(lazy), times[0] * 1000, times[1] * 1000, times[2] * 1000,
+                                  times[0] / times[1]))
+            finally:
+                shutil.rmtree(directory)
+    finally:
+        shutil.rmtree(cache_folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark for loading a collection from disk, like opening the editor does. Compares reading, converting and
+verifying the json files one after another in this process with doing so on a pool of processes, for collections
+of growing size, to find from how many files the pool pays off. The collections are copies of the trees of a
+collection on disk, written to a temporary directory. The verification cache is cleared before every run and the
+cache of the collection is not used.
+Run from the src directory: python -m benchmarks.collection_loading
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import timeit
+from pathlib import Path
+
+from model.collection_loader import CollectionLoader
+from model.tree import Verification
+
+
+def build_directory(source: Path, target: Path, size: int):
+    """
+    Writes a collection with copies of the json files of a collection on disk
+    :param source: the collection to copy the files from
+    :param target: the directory to write the collection to
+    :param size: the number of files
+    """
+    files = [(category, file_path) for category, file, file_path in CollectionLoader.list_files(source)[1]
+             if file.endswith('.json')]
+    for index in range(size):
+        category, file_path = files[index % len(files)]
+        os.makedirs(str(target / category), exist_ok=True)
+        shutil.copyfile(file_path, str(target / category / '{}_{}'.format(index, os.path.basename(file_path))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Loading a collection from disk')
+    parser.add_argument('--path', default='jsons', help='the collection to copy the files from')
+    parser.add_argument('--files', type=int, nargs='+', default=[50, 500, 2000, 5000],
+                        help='the numbers of files in the collection')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='the number of processes of the pool')
+    parser.add_argument('--repeat', type=int, default=3, help='how many times every load is timed')
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    serial = CollectionLoader(max_workers=1, use_cache=False)
+    parallel = CollectionLoader(max_workers=args.workers, min_parallel_files=0, use_cache=False)
+    print('{} processes, by default collections from {} files are loaded in parallel'
+          .format(args.workers, CollectionLoader.MIN_PARALLEL_FILES))
+    print('{:>8} {:>12} {:>12} {:>8}'.format('files', 'serial', 'pool', 'speedup'))
+    for size in args.files:
+        directory = tempfile.mkdtemp()
+        try:
+            build_directory(Path(args.path), Path(directory), size)
+            # the verification cache is cleared, so every tree is verified
+            times = [min(timeit.repeat(lambda: loader.load(Path(directory)), setup=Verification.cache.clear,
+                                       number=1, repeat=args.repeat)) for loader in (serial, parallel)]
+        finally:
+            shutil.rmtree(directory)
+        print('{:>8} {:>9.1f} ms {:>9.1f} ms {:>7.2f}x'.format(size, times[0] * 1000, times[1] * 1000,
+                                                             times[0] / times[1]))
+
+
+if __name__ == '__main__':
+    main()
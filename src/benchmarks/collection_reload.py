@@ -0,0 +1,72 @@
+"""
+Benchmark for reloading a collection after some of its files changed on disk, like the Reload menu item and the
+watcher of the collection do. Compares reading the whole collection again with reading only the added and changed
+files and merging them into the saved collection, and shows the cost of checking a collection without changes.
+The collections are copies of the trees of a collection on disk, written to a temporary directory, the cache of the
+collection is not used. The verification cache is cleared before every run.
+Run from the src directory: python -m benchmarks.collection_reload
+"""
+import argparse
+import logging
+import shutil
+import tempfile
+import timeit
+from pathlib import Path
+
+from benchmarks.collection_cache import touch_files
+from benchmarks.collection_loading import build_directory
+from model.collection_loader import CollectionLoader
+from model.tree import Collection, Verification
+
+
+def read_collection(path: Path) -> Collection:
+    """
+    Reads a collection like Collection.from_path, without the cache of the collection
+    """
+    collection = Collection(None, path)
+    loader = CollectionLoader(use_cache=False)
+    collection.collection = loader.load(path, True, collection)
+    collection.file_stamps = loader.stamps
+    return collection
+
+
+def reload_collection(saved: Collection) -> Collection:
+    """
+    Reloads a saved collection like the editor does, by merging the changed files into it
+    """
+    saved.merge_changes(saved.read_changes(CollectionLoader(use_cache=False)))
+    return saved.writable_copy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reloading a collection')
+    parser.add_argument('--path', default='jsons', help='the collection to copy the files from')
+    parser.add_argument('--files', type=int, nargs='+', default=[500, 2000, 5000],
+                        help='the numbers of files in the collection')
+    parser.add_argument('--changed', type=int, default=10, help='the number of files that change between reloads')
+    parser.add_argument('--repeat', type=int, default=3, help='how many times every reload is timed')
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    print('{:>8} {:>12} {:>14} {:>8} {:>12}'.format('files', 'full', 'incremental', 'speedup', 'no changes'))
+    for size in args.files:
+        directory = tempfile.mkdtemp()
+        try:
+            build_directory(Path(args.path), Path(directory), size)
+            saved = read_collection(Path(directory)).snapshot()
+            full = min(timeit.repeat(lambda: read_collection(Path(directory)),
+                                     setup=lambda: touch_files(Path(directory), args.changed)
+                                     or Verification.cache.clear(), number=1, repeat=args.repeat))
+            incremental = min(timeit.repeat(lambda: reload_collection(saved),
+                                            setup=lambda: touch_files(Path(directory), args.changed)
+                                            or Verification.cache.clear(), number=1, repeat=args.repeat))
+            unchanged = min(timeit.repeat(lambda: saved.read_changes(CollectionLoader(use_cache=False)), number=1,
+                                          repeat=args.repeat))
+        finally:
+            shutil.rmtree(directory)
+        print('{:>8} {:>9.1f} ms {:>11.1f} ms {:>7.2f}x {:>9.1f} ms'.format(size, full * 1000, incremental * 1000,
+                                                                          full / incremental, unchanged * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark for verifying every tree of a collection, like saving the collection or closing the editor does.
+Compares verifying the trees one after another in this process with verifying them on a pool of processes,
+for collections of growing size, to find from how many nodes the pool pays off. The verification cache is
+cleared before every run, so every tree is verified.
+Run from the src directory: python -m benchmarks.collection_verification
+"""
+import argparse
+import logging
+import os
+import timeit
+from pathlib import Path
+
+from model.collection_verifier import CollectionVerifier
+from model.tree import Collection, Verification
+
+
+class PoolVerifier(CollectionVerifier):
+    """
+    Verifies every collection on a pool of processes, also the ones the CollectionVerifier verifies in one process
+    """
+
+    def use_pool(self, pending, only_check_mathematical_properties):
+        return True
+
+
+def build_collection(path: Path, size: int) -> Collection:
+    """
+    Builds a collection with renamed copies of the trees of a collection on disk, so every copy is verified
+    :param path: the collection to copy the trees from
+    :param size: the number of trees
+    :return: the collection
+    """
+    source = Collection.from_path(path)
+    trees = [(category, filename, tree) for category, files in source.collection.items()
+             for filename, tree in files.items()]
+    collection = Collection(path=path)
+    for index in range(size):
+        category, filename, tree = trees[index % len(trees)]
+        # the first copy of every tree keeps its name, so the trees referred to by name can still be found
+        copy = tree.clone()
+        if index >= len(trees):
+            copy.name = '{}_{}'.format(index, tree.name)
+        collection.add_tree(category, '{}_{}'.format(index, filename), copy)
+    return collection
+
+
+def timed(collection: Collection, verifier: CollectionVerifier, only_math: bool, repeat: int) -> float:
+    """
+    The fastest of a few verifications of the collection without cached results
+    """
+    return min(timeit.repeat(lambda: verifier.verify(collection, only_math), setup=Verification.cache.clear,
+                             number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verifying all trees of a collection')
+    parser.add_argument('--path', default='jsons', help='the collection to copy the trees from')
+    parser.add_argument('--trees', type=int, nargs='+', default=[10, 100, 1000, 5000],
+                        help='the numbers of trees in the collection')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='the number of processes of the pool')
+    parser.add_argument('--repeat', type=int, default=3, help='how many times every verification is timed')
+    args = parser.parse_args()
+    # the trees in the collection do not all follow the structure of their category
+    logging.disable(logging.ERROR)
+
+    serial = CollectionVerifier(max_workers=1)
+    parallel = PoolVerifier(max_workers=args.workers)
+    print('{} processes, by default full checks from {} nodes on {} processes are verified in parallel'
+          .format(args.workers, CollectionVerifier.MIN_PARALLEL_NODES, CollectionVerifier.MIN_PARALLEL_WORKERS))
+    print('{:>8} {:>8} {:>12} {:>12} {:>12} {:>12}'.format('trees', 'nodes', 'math serial', 'math pool',
+                                                          'full serial', 'full pool'))
+    for size in args.trees:
+        collection = build_collection(Path(args.path), size)
+        nodes = sum(len(tree.nodes) for trees in collection.collection.values() for tree in trees.values())
+        times = [timed(collection, verifier, only_math, args.repeat)
+                 for only_math in (True, False) for verifier in (serial, parallel)]
+        print('{:>8} {:>8} {:>9.1f} ms {:>9.1f} ms {:>9.1f} ms {:>9.1f} ms'.format(size, nodes,
+                                                                               *[time * 1000 for time in times]))
+
+
+if __name__ == '__main__':
+    main()
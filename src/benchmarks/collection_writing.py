@@ -0,0 +1,97 @@
+"""
+Benchmark for saving a collection, like the Save and Save as menu items do. Compares writing every tree with
+write_json, one after another, with writing only the changed trees to the folder of the collection, and writing all
+trees to another folder with different numbers of threads. The collections are copies of the trees of a collection
+on disk, written to a temporary directory.
+Run from the src directory: python -m benchmarks.collection_writing
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import timeit
+from pathlib import Path
+
+from benchmarks.collection_loading import build_directory
+from controller.utils import write_json
+from model.collection_loader import CollectionLoader
+from model.tree import Collection, Tree
+
+
+def read_collection(path: Path) -> Collection:
+    """
+    Reads a collection like Collection.from_path, without the cache of the collection
+    """
+    collection = Collection(None, path)
+    loader = CollectionLoader(use_cache=False)
+    collection.collection = loader.load(path, True, collection)
+    collection.file_stamps = loader.stamps
+    collection.file_fingerprints = {(category, filename): tree.fingerprint
+                                    for category, trees in collection.collection.items()
+                                    for filename, tree in dict.items(trees)}
+    return collection
+
+
+def write_every_tree(collection: Collection, path: Path):
+    """
+    Writes every tree of a collection like the collection did before only changed trees were written
+    """
+    for category, trees in collection.collection.items():
+        for filename, tree in trees.items():
+            if len(collection.verify_tree(tree, only_check_mathematical_properties=True)) == 0:
+                write_json(path / category / filename, Tree.create_json(tree))
+
+
+def change_trees(collection: Collection, changed: int):
+    """
+    Changes the title of the root node of some trees of a collection
+    """
+    trees = [tree for trees in collection.collection.values() for tree in trees.values()]
+    for tree in trees[:changed]:
+        node = tree.nodes[tree.root]
+        node.title = node.title + '_' if not node.title.endswith('_') else node.title[:-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Saving a collection')
+    parser.add_argument('--path', default='jsons', help='the collection to copy the files from')
+    parser.add_argument('--files', type=int, nargs='+', default=[500, 2000],
+                        help='the numbers of files in the collection')
+    parser.add_argument('--changed', type=int, default=10, help='the number of trees that change between saves')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4],
+                        help='the numbers of threads that write to another folder')
+    parser.add_argument('--repeat', type=int, default=3, help='how many times every save is timed')
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    print('{:>8} {:>14} {:>14} {:>8}'.format('files', 'every tree', 'changed only', 'speedup') +
+          ''.join(' {:>14}'.format('save as, {}'.format(workers)) for workers in args.workers))
+    workers = Collection.WRITE_WORKERS
+    for size in args.files:
+        directory = tempfile.mkdtemp()
+        try:
+            build_directory(Path(args.path), Path(directory), size)
+            collection = read_collection(Path(directory))
+            every = min(timeit.repeat(lambda: write_every_tree(collection, Path(directory)),
+                                      setup=lambda: change_trees(collection, args.changed), number=1,
+                                      repeat=args.repeat))
+            changed = min(timeit.repeat(collection.write_collection,
+                                        setup=lambda: change_trees(collection, args.changed), number=1,
+                                        repeat=args.repeat))
+            copies = []
+            for count in args.workers:
+                Collection.WRITE_WORKERS = count
+                copy = os.path.join(directory, 'copy')
+                copies.append(min(timeit.repeat(lambda: collection.write_collection(Path(copy)),
+                                                setup=lambda: shutil.rmtree(copy, ignore_errors=True), number=1,
+                                                repeat=args.repeat)))
+            Collection.WRITE_WORKERS = workers
+        finally:
+            shutil.rmtree(directory)
+        print('{:>8} {:>11.1f} ms {:>11.1f} ms {:>7.2f}x'.format(size, every * 1000, changed * 1000, every / changed) +
+              ''.join(' {:>11.1f} ms'.format(time * 1000) for time in copies))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark for verifying a large tree again after a small edit, like the editor does after every change.
+Compares verifying the whole tree with the TreeVerifier against the IncrementalVerifier that only checks
+the nodes the edit affected.
+Run from the src directory: python -m benchmarks.incremental_verification
+"""
+import argparse
+import timeit
+
+from model.tree import Collection, Node, Tree
+from model.tree_verifier import IncrementalVerifier, TreeVerifier
+
+
+def build_tree(size: int, branching: int=4) -> Tree:
+    """
+    Builds a valid role tree of sequences with skills as leaves
+    :param size: the number of nodes
+    :param branching: the number of children per node
+    :return: the tree
+    """
+    nodes = {}
+    for index in range(size):
+        children = [str(child) for child in range(index * branching + 1, min(size, (index + 1) * branching + 1))]
+        title = 'Role' if index == 0 else 'Sequence' if children else 'Kick'
+        nodes[str(index)] = Node(title, str(index), {'properties': {'ROLE': 'benchmark'}}, children)
+    return Tree('benchmark', '0', nodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verifying a tree after an edit')
+    parser.add_argument('--size', type=int, default=5000, help='the number of nodes of the tree')
+    parser.add_argument('--repeat', type=int, default=5, help='how many times every verification is timed')
+    args = parser.parse_args()
+
+    tree = build_tree(args.size)
+    collection = Collection({'roles': {'benchmark.json': tree}})
+    verifier = IncrementalVerifier(collection, tree, 'roles')
+    assert [] == verifier.verify()
+    leaf = tree.nodes[str(args.size - 1)]
+    edits = iter(range(10 ** 9))
+
+    def edit():
+        leaf.add_attribute('edit', next(edits))
+
+    full = min(timeit.repeat(lambda: TreeVerifier(collection, 'roles').verify(tree), number=1, repeat=args.repeat))
+    incremental = min(timeit.repeat(verifier.verify, setup=edit, number=1, repeat=args.repeat))
+    print('tree of {} nodes, {} checked after an edit'.format(args.size, verifier.checked_nodes))
+    print('whole tree:   {:8.1f} ms'.format(full * 1000))
+    print('incremental:  {:8.1f} ms'.format(incremental * 1000))
+    print('speedup:      {:8.1f}x'.format(full / incremental))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark for opening a collection and using a few of its trees, like opening the editor and a tree does.
+Compares reading every tree when the collection is opened with reading only the headers of the trees and the
+trees themselves when they are looked up, and shows how many nodes are kept in memory with a budget for the
+lazily loaded collection. The collections are copies of the trees of a collection on disk, written to a temporary
+directory. The verification cache is cleared before every run and the cache of the collection is not used.
+Run from the src directory: python -m benchmarks.lazy_loading
+"""
+import argparse
+import logging
+import shutil
+import tempfile
+import timeit
+from pathlib import Path
+
+from benchmarks.collection_loading import build_directory
+from model.collection_loader import CollectionLoader
+from model.tree import Collection, Verification
+
+
+def open_collection(path: Path, lazy: bool, max_loaded_nodes: int, lookups: int) -> Collection:
+    """
+    Opens a collection and looks up the trees of the first files of every category
+    """
+    # like Collection.from_path, without the cache of the collection
+    collection = Collection(None, path, max_loaded_nodes if lazy else None)
+    collection.collection = CollectionLoader(use_cache=False).load(path, True, collection, lazy)
+    for trees in collection.collection.values():
+        for filename in list(trees.keys())[:lookups]:
+            trees.get(filename)
+    return collection
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Opening a collection lazily')
+    parser.add_argument('--path', default='jsons', help='the collection to copy the files from')
+    parser.add_argument('--files', type=int, nargs='+', default=[500, 2000, 5000],
+                        help='the numbers of files in the collection')
+    parser.add_argument('--lookups', type=int, default=5, help='the number of trees looked up in every category')
+    parser.add_argument('--max-loaded-nodes', type=int, default=1000,
+                        help='the number of nodes kept in memory by the lazily loaded collection')
+    parser.add_argument('--repeat', type=int, default=3, help='how many times every open is timed')
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    print('{:>8} {:>12} {:>12} {:>8} {:>14} {:>14}'.format('files', 'eager', 'lazy', 'speedup', 'eager nodes',
+                                                            'lazy nodes'))
+    for size in args.files:
+        directory = tempfile.mkdtemp()
+        try:
+            build_directory(Path(args.path), Path(directory), size)
+            times = [min(timeit.repeat(lambda: open_collection(Path(directory), lazy, args.max_loaded_nodes,
+                                                               args.lookups),
+                                       setup=Verification.cache.clear, number=1, repeat=args.repeat))
+                     for lazy in (False, True)]
+            eager = open_collection(Path(directory), False, args.max_loaded_nodes, args.lookups)
+            lazy = open_collection(Path(directory), True, args.max_loaded_nodes, args.lookups)
+        finally:
+            shutil.rmtree(directory)
+        eager_nodes = sum(len(tree.nodes) for trees in eager.collection.values() for tree in trees.values())
+        print('{:>8} {:>9.1f} ms {:>9.1f} ms {:>7.2f}x {:>14} {:>14}'.format(size, times[0] * 1000, times[1] * 1000,
+                                                                         times[0] / times[1], eager_nodes,
+                                                                         lazy.loaded_nodes))
+
+
+if __name__ == '__main__':
+    main()
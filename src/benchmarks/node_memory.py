@@ -0,0 +1,92 @@
+"""
+Benchmark for the memory used per node when loading the bundled jsons collection multiple times.
+Compares the slots based Node with a plain node storing its values in a __dict__ like the editor used to.
+Run from the src directory: python -m benchmarks.node_memory
+"""
+import argparse
+import json
+import os
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List
+
+from model.exceptions import InvalidTreeJsonFormatException
+from model.tree import Node, Tree
+
+
+class DictNode:
+    """
+    Node as it was before the slots, every instance has a __dict__ and nothing is interned
+    """
+
+    def __init__(self, title: str, node_id: str, attributes: Dict[str, Any] = None, children: List[str] = None):
+        self.title = title
+        self.id = node_id
+        self.attributes = dict(attributes) if attributes else {}
+        self.children = list(children) if children else []
+
+    @classmethod
+    def from_json(cls, node: Dict[str, Any]):
+        attributes = node.copy()
+        attributes.pop('children', None)
+        attributes.pop('id')
+        attributes.pop('title')
+        return cls(node.get('title'), node.get('id'), attributes, node.get('children'))
+
+
+def read_collection(path: Path) -> List[str]:
+    """
+    Reads the text of every valid json tree file in the collection
+    :param path: the path of the collection
+    :return: a list with the contents of the files
+    """
+    texts = []
+    for root, _, files in os.walk(str(path)):
+        for file in sorted(files):
+            if file.endswith('.json') and not file.startswith('.'):
+                with open(os.path.join(root, file), 'r') as f:
+                    text = f.read()
+                try:
+                    Tree.from_json(json.loads(text))
+                except InvalidTreeJsonFormatException:
+                    continue
+                texts.append(text)
+    return texts
+
+
+def measure(node_class, texts: List[str], scale: int):
+    """
+    Measures the memory kept alive by the nodes created from the files
+    :param node_class: the node class to create the nodes with
+    :param texts: the contents of the json files
+    :param scale: how many times the collection is loaded
+    :return: the number of nodes and the number of bytes allocated for them
+    """
+    tracemalloc.start()
+    nodes = []
+    for _ in range(scale):
+        for text in texts:
+            # parse again for every copy, like separate files with their own strings
+            for node in json.loads(text)['data']['trees'][0]['nodes'].values():
+                nodes.append(node_class.from_json(node))
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(nodes), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory per node for the jsons collection')
+    parser.add_argument('--path', default='jsons', help='the collection to load')
+    parser.add_argument('--scale', type=int, default=100, help='how many times the collection is loaded')
+    args = parser.parse_args()
+    texts = read_collection(Path(args.path))
+    dict_count, dict_size = measure(DictNode, texts, args.scale)
+    slots_count, slots_size = measure(Node, texts, args.scale)
+    print('nodes: {}'.format(slots_count))
+    print('dict nodes:  {:8.1f} bytes per node'.format(dict_size / dict_count))
+    print('slots nodes: {:8.1f} bytes per node'.format(slots_size / slots_count))
+    print('reduction:   {:8.1f}%'.format(100 * (1 - slots_size / dict_size)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark for checking the Strategy -> Tactic -> Role structure of all strategies of a collection, where the
+strategies share their tactics and the tactics share their roles by name. Compares walking every referred tree
+again for every leaf that refers to it, like the structure check used to, with the summaries of the reference
+graph. Also times checking the strategies again after one role changed, when only the summaries of the
+trees depending on that role are dropped.
+Run from the src directory: python -m benchmarks.reference_graph
+"""
+import argparse
+import logging
+import random
+import timeit
+from typing import List
+
+from model.tree import Collection, Node, Tree
+from model.tree_verifier import CategoryStructureRule, TreeVerifier
+
+
+class WalkingCategoryStructureRule(CategoryStructureRule):
+    """
+    Walks every tree a leaf node refers to, without the summaries of the reference graph
+    """
+
+    def reference_graph(self):
+        return None
+
+
+def build_tree(name: str, root_title: str, references: List[str], size: int) -> Tree:
+    """
+    Builds a tree with a sequence of skills and leaves that refer to other trees
+    :param name: the name of the tree
+    :param root_title: the title of the root
+    :param references: the names of the trees the leaves refer to
+    :param size: the number of skills
+    :return: the tree
+    """
+    sequence = Node('Sequence', name + '_sequence')
+    nodes = {sequence.id: sequence}
+    for index in range(size):
+        skill = Node('Kick', '{}_skill_{}'.format(name, index))
+        nodes[skill.id] = skill
+        sequence.children.append(skill.id)
+    for reference in references:
+        leaf = Node(reference, '{}_{}'.format(name, reference), {'name': reference})
+        nodes[leaf.id] = leaf
+        sequence.children.append(leaf.id)
+    root = Node(root_title, name + '_root', {}, [sequence.id])
+    nodes[root.id] = root
+    return Tree(name, root.id, nodes)
+
+
+def build_collection(strategies: int, tactics: int, roles: int, references: int, size: int) -> Collection:
+    """
+    Builds a collection where every strategy refers to a few tactics and every tactic to a few roles
+    """
+    generator = random.Random(1)
+    role_names = ['Role{}'.format(index) for index in range(roles)]
+    tactic_names = ['Tactic{}'.format(index) for index in range(tactics)]
+    return Collection({
+        'strategies': {'Strategy{}.json'.format(index):
+                       build_tree('Strategy{}'.format(index), 'Sequence', generator.sample(tactic_names, references),
+                                  size)
+                       for index in range(strategies)},
+        'tactics': {name + '.json': build_tree(name, 'Tactic', generator.sample(role_names, references), size)
+                    for name in tactic_names},
+        'roles': {name + '.json': build_tree(name, 'Role', [], size) for name in role_names}})
+
+
+def verify_strategies(collection: Collection, verifier: TreeVerifier):
+    """
+    Checks the structure of all strategies
+    """
+    for tree in collection.collection['strategies'].values():
+        verifier.verify(tree)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Checking the structure of strategies that share tactics and roles')
+    parser.add_argument('--strategies', type=int, default=200, help='the number of strategies')
+    parser.add_argument('--tactics', type=int, default=40, help='the number of tactics')
+    parser.add_argument('--roles', type=int, default=20, help='the number of roles')
+    parser.add_argument('--references', type=int, default=4, help='the number of trees every tree refers to')
+    parser.add_argument('--size', type=int, default=30, help='the number of skills in every tree')
+    parser.add_argument('--repeat', type=int, default=3, help='how many times every check is timed')
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    collection = build_collection(args.strategies, args.tactics, args.roles, args.references, args.size)
+    graph = collection.reference_graph
+    walking = TreeVerifier(collection, 'strategies', rules=[WalkingCategoryStructureRule])
+    summarized = TreeVerifier(collection, 'strategies', rules=[CategoryStructureRule])
+    print('{} strategies, {} tactics, {} roles, {} cycles'.format(args.strategies, args.tactics, args.roles,
+                                                                 len(graph.cycles())))
+
+    def clear():
+        graph.summaries = {}
+
+    role = collection.collection['roles']['Role0.json']
+
+    def change_role():
+        # keeps the summaries of the trees that do not depend on the role
+        role.nodes[role.root].title = 'Role' if role.nodes[role.root].title == 'Tactic' else 'Tactic'
+
+    walked = min(timeit.repeat(lambda: verify_strategies(collection, walking), number=1, repeat=args.repeat))
+    cold = min(timeit.repeat(lambda: verify_strategies(collection, summarized), setup=clear, number=1,
+                             repeat=args.repeat))
+    changed = min(timeit.repeat(lambda: verify_strategies(collection, summarized), setup=change_role, number=1,
+                                repeat=args.repeat))
+    print('walk every reference:    {:8.1f} ms'.format(walked * 1000))
+    print('summaries, none kept:    {:8.1f} ms'.format(cold * 1000))
+    print('summaries, role changed: {:8.1f} ms ({} trees depend on the role)'
+          .format(changed * 1000, len(graph.dependents([role.name]))))
+    print('speedup:                 {:8.1f}x / {:.1f}x'.format(walked / cold, walked / changed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark for updating the role subtrees in a collection after a role changed, like the editor does on every
+change when roles are updated automatically. Compares visiting every tree and changing it right away, like
+Collection.update_subtrees_in_collection used to, with planning the update once and applying it.
+Run from the src directory: python -m benchmarks.role_update
+"""
+import argparse
+import timeit
+from pathlib import Path
+from typing import List
+
+from model.tree import Collection, Tree
+
+
+def legacy_role_nodes(tree: Tree, role: str) -> List:
+    """
+    Finds the Role nodes with a role by sorting and scanning all nodes of the tree
+    """
+    return [node for _, node in sorted(tree.nodes.items())
+            if node.title == 'Role' and 'role' in node.attributes and node.attributes.get('role') == role]
+
+
+def legacy_update(collection: Collection, tree: Tree, role_name: str, start_node_id: str):
+    """
+    Visits every tree of the collection and updates the Role nodes right away, the role nodes below the
+    changed subtree are searched again for every candidate
+    """
+    for category, trees in collection.collection.items():
+        for loop_tree in trees.values():
+            if category == 'roles' and loop_tree.name == role_name and tree != loop_tree and \
+                    len(tree.find_role_subtree_nodes_below_node(tree.nodes.get(start_node_id))) == 0:
+                old_root = loop_tree.root
+                loop_tree.update_subtree(tree, old_root, start_node_id)
+                loop_tree.root = loop_tree.nodes.get(old_root).children[0]
+                loop_tree.nodes.pop(old_root)
+                continue
+            for node in legacy_role_nodes(loop_tree, role_name):
+                if not loop_tree.find_role_subtree_node_above_node(node) and \
+                        len(tree.find_role_subtree_nodes_below_node(tree.nodes.get(start_node_id))) == 0:
+                    loop_tree.update_subtree(tree, node.id, start_node_id)
+
+
+def build_collection(path: Path, size: int) -> Collection:
+    """
+    Builds a collection with copies of the trees of a collection on disk
+    :param path: the collection to copy the trees from
+    :param size: the number of trees
+    :return: the collection
+    """
+    source = Collection.from_path(path)
+    trees = [(category, filename, tree) for category, files in source.collection.items()
+             for filename, tree in files.items()]
+    collection = Collection(path=path)
+    for index in range(size):
+        category, filename, tree = trees[index % len(trees)]
+        # the first copy of every tree keeps its filename, so role trees can still be found by name
+        name = filename if index < len(trees) else '{}_{}'.format(index, filename)
+        collection.add_tree(category, name, tree.clone())
+    return collection
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Updating role subtrees in a collection')
+    parser.add_argument('--path', default='jsons', help='the collection to copy the trees from')
+    parser.add_argument('--role', default='EnterFormationRole', help='the role that changes')
+    parser.add_argument('--trees', type=int, default=200, help='the number of trees in the collection')
+    parser.add_argument('--repeat', type=int, default=5, help='how many times every update is timed')
+    args = parser.parse_args()
+
+    collection = build_collection(Path(args.path), args.trees)
+    role_tree = collection.get_tree_by_name(args.role)
+    print('collection of {} trees, {} uses of {}'.format(args.trees, len(collection.find_role_usages(args.role)),
+                                                        args.role))
+    legacy = min(timeit.repeat(lambda: legacy_update(collection, role_tree, args.role, role_tree.root),
+                               number=1, repeat=args.repeat))
+    planned = min(timeit.repeat(lambda: collection.update_subtrees_in_collection(role_tree),
+                                number=1, repeat=args.repeat))
+    print('visit every tree: {:8.1f} ms'.format(legacy * 1000))
+    print('plan and apply:   {:8.1f} ms'.format(planned * 1000))
+    print('speedup:          {:8.1f}x'.format(legacy / planned))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark for copying subtrees and collections.
+Compares adding a subtree node by node with deepcopy and a settings read for every new id, like
+Tree.add_subtree used to, with the bulk Tree.clone_subtree, and the generic deepcopy of a collection
+with Collection.clone.
+Run from the src directory: python -m benchmarks.subtree_clone
+"""
+import argparse
+import json
+import timeit
+from copy import deepcopy
+from pathlib import Path
+from typing import Dict
+
+from benchmarks.node_memory import read_collection
+from model.tree import Collection, Node, Tree
+
+
+def legacy_deepcopy_node(node: Node) -> Node:
+    """
+    Copies a node through the generic deepcopy of its state, like deepcopy did before Node.clone
+    """
+    copy = Node.__new__(Node)
+    copy.__setstate__(deepcopy(node.__getstate__()))
+    return copy
+
+
+def legacy_add_subtree(target: Tree, tree: Tree, node_id: str, start_node_id: str):
+    """
+    Adds a subtree node by node, every node is deep copied and gets an id with the size read from the settings
+    """
+    subtree_node = tree.nodes.get(start_node_id)
+    copy = legacy_deepcopy_node(subtree_node)
+    copy.id = Node.generate_id()
+    copy.children = list()
+    target.add_node(copy)
+    target.nodes.get(node_id).add_child(copy.id)
+    for child_id in subtree_node.children:
+        legacy_add_subtree(target, tree, copy.id, child_id)
+
+
+def legacy_deepcopy_collection(collection: Collection) -> Collection:
+    """
+    Copies a collection through the generic deepcopy of the states of the trees and nodes
+    """
+    copies: Dict[str, Dict[str, Tree]] = {}
+    for category, trees in collection.collection.items():
+        copies[category] = {}
+        for filename, tree in trees.items():
+            copy = Tree.__new__(Tree)
+            copy.__setstate__({'name': tree.name, 'root': tree.root,
+                               'nodes': {node_id: legacy_deepcopy_node(node) for node_id, node in tree.nodes.items()}})
+            copies[category][filename] = copy
+    return Collection(copies, collection.path)
+
+
+def build_tree(size: int, branching: int) -> Tree:
+    """
+    Builds a tree with role properties and a fixed number of children per node
+    :param size: the number of nodes
+    :param branching: the number of children per node
+    :return: the tree
+    """
+    nodes = {}
+    for index in range(size):
+        children = [str(child) for child in range(index * branching + 1, min(size, (index + 1) * branching + 1))]
+        nodes[str(index)] = Node('Sequence' if children else 'Skill', str(index),
+                                 {'name': 'node{}'.format(index), 'properties': {'ROLE': 'Keeper', 'speed': '1'}},
+                                 children)
+    return Tree('benchmark', '0', nodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Copying subtrees and collections')
+    parser.add_argument('--path', default='jsons', help='the collection to copy')
+    parser.add_argument('--size', type=int, default=2000, help='the number of nodes of the subtree')
+    parser.add_argument('--repeat', type=int, default=5, help='how many times every copy is timed')
+    args = parser.parse_args()
+
+    subtree = build_tree(args.size, 4)
+
+    def target() -> Tree:
+        return Tree('target', 'root', {'root': Node('Role', 'root')})
+
+    legacy = min(timeit.repeat(lambda: legacy_add_subtree(target(), subtree, 'root', subtree.root),
+                               number=1, repeat=args.repeat))
+    bulk = min(timeit.repeat(lambda: target().add_subtree(subtree, 'root'), number=1, repeat=args.repeat))
+    print('subtree of {} nodes'.format(args.size))
+    print('node by node add_subtree: {:8.1f} ms'.format(legacy * 1000))
+    print('bulk add_subtree:         {:8.1f} ms'.format(bulk * 1000))
+    print('speedup:                  {:8.1f}x'.format(legacy / bulk))
+
+    collection = Collection(path=Path(args.path))
+    for index, text in enumerate(read_collection(Path(args.path))):
+        collection.add_tree('trees', '{}.json'.format(index), Tree.from_json(json.loads(text)))
+    legacy = min(timeit.repeat(lambda: legacy_deepcopy_collection(collection), number=1, repeat=args.repeat))
+    clone = min(timeit.repeat(lambda: collection.clone(), number=1, repeat=args.repeat))
+    print('collection of {} nodes'.format(sum(len(tree.nodes) for tree in collection.collection['trees'].values())))
+    print('generic deepcopy:         {:8.1f} ms'.format(legacy * 1000))
+    print('clone:                    {:8.1f} ms'.format(clone * 1000))
+    print('speedup:                  {:8.1f}x'.format(legacy / clone))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark for finding unconnected nodes in a large tree with a few disconnected branches.
+Compares walking the tree into a list and comparing every node against every visited node, like
+Verification.has_unconnected_nodes used to, with the single walk over id sets.
+Run from the src directory: python -m benchmarks.unconnected_nodes
+"""
+import argparse
+import logging
+import timeit
+from typing import List
+
+from model.tree import Node, Tree, Verification
+
+
+def legacy_unconnected_nodes(tree: Tree) -> List[str]:
+    """
+    Walks the tree into a list of nodes and looks up every node of the tree in it with the node equality
+    """
+    visited_nodes = []
+    to_visit = [tree.root]
+    while to_visit:
+        node = tree.nodes.get(to_visit.pop())
+        if node is None or node in visited_nodes:
+            continue
+        visited_nodes.append(node)
+        to_visit.extend(node.children)
+    errors = []
+    for tree_node in tree.nodes.values():
+        present = False
+        for visited_node in visited_nodes:
+            if tree_node == visited_node:
+                present = True
+                break
+        if not present:
+            errors.append("The node {} is unconnected in tree {}".format(tree_node, tree.name))
+    return errors
+
+
+def build_tree(size: int, branches: int, branching: int=4) -> Tree:
+    """
+    Builds a tree where a few branches are cut off from the root and some children do not exist
+    :param size: the number of nodes
+    :param branches: the number of disconnected branches
+    :param branching: the number of children per node
+    :return: the tree
+    """
+    nodes = {}
+    for index in range(size):
+        children = [str(child) for child in range(index * branching + 1, min(size, (index + 1) * branching + 1))]
+        nodes[str(index)] = Node('Sequence' if children else 'Skill', str(index), {'name': str(index)}, children)
+    # cut a few small branches deep in the tree, and point their parents to nodes that do not exist
+    for branch in range(branches):
+        parent = nodes[str(size // branching ** 3 + branch * 5)]
+        parent.children = [child + '_missing' for child in parent.children]
+    return Tree('benchmark', '0', nodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Finding unconnected nodes')
+    parser.add_argument('--size', type=int, default=20000, help='the number of nodes of the tree')
+    parser.add_argument('--branches', type=int, default=3, help='the number of disconnected branches')
+    parser.add_argument('--legacy-size', type=int, default=2000,
+                        help='the number of nodes for the old quadratic approach, it is too slow for large trees')
+    parser.add_argument('--repeat', type=int, default=3, help='how many times every check is timed')
+    args = parser.parse_args()
+    # the dangling children are logged for every call
+    logging.disable(logging.ERROR)
+
+    for size in sorted({args.legacy_size, args.size}):
+        tree = build_tree(size, args.branches)
+        unconnected, dangling = Verification.find_unconnected_nodes(tree)
+        print('tree of {} nodes, {} unconnected, {} dangling children'.format(size, len(unconnected), len(dangling)))
+        sets = min(timeit.repeat(lambda: Verification.has_unconnected_nodes(tree), number=1, repeat=args.repeat))
+        print('  id sets:       {:10.1f} ms'.format(sets * 1000))
+        if size <= args.legacy_size:
+            legacy = min(timeit.repeat(lambda: legacy_unconnected_nodes(tree), number=1, repeat=args.repeat))
+            print('  list compare:  {:10.1f} ms'.format(legacy * 1000))
+            print('  speedup:       {:10.1f}x'.format(legacy / sets))
+
+
+if __name__ == '__main__':
+    main()
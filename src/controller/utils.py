@@ -1,8 +1,12 @@
 import json
 import csv
+import os
 from pathlib import Path
 from typing import Any, Dict, List
 
+# the number of random names tried for the temporary file of an atomic write
+TEMPORARY_FILE_ATTEMPTS = 100
+
 
 def read_json(src: Path) -> Dict[str, Any]:
     """
@@ -25,6 +29,43 @@ def write_json(dest: Path, content: Dict[str, Any]):
         json.dump(content, data_file, indent=2, sort_keys=True)
 
 
+def write_file_atomic(dest: Path, content: bytes):
+    """
+    Writes a file at once, the content is written to a hidden temporary file next to it that replaces the file
+    when it is complete, so the file is never left half written. The file keeps its permissions, a new file gets the
+    permissions open would give it
+    :param dest: the location of the file
+    :param content: the content of the file
+    """
+    directory, name = os.path.split(os.path.abspath(str(dest)))
+    try:
+        mode = os.stat(str(dest)).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = None
+    # open applies the umask to the permissions of the new temporary file, like it would for the file itself
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+    for _ in range(TEMPORARY_FILE_ATTEMPTS):
+        temporary = os.path.join(directory, '.{}.{}.tmp'.format(name, os.urandom(6).hex()))
+        try:
+            descriptor = os.open(temporary, flags, 0o666)
+            break
+        except FileExistsError:
+            continue
+    else:
+        raise FileExistsError('No free name for a temporary file next to {}'.format(dest))
+    try:
+        with os.fdopen(descriptor, 'wb') as data_file:
+            if mode is not None:
+                os.chmod(temporary, mode)
+            data_file.write(content)
+            data_file.flush()
+            os.fsync(data_file.fileno())
+        os.replace(temporary, str(dest))
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
 def read_csv(src: Path) -> List[List[str]]:
     """
     Reads a csv file, removes blank lines and adds the result to a list
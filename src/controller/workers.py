@@ -1,8 +1,12 @@
+import logging
 from pathlib import Path
 
 from PyQt5.QtCore import pyqtSignal, QObject, pyqtSlot
 
+from model.collection_loader import CollectionLoader
+from model.exceptions import VerificationCancelledException
 from model.tree import NodeTypes, Tree, Collection
+from model.verification_mirror import MirrorUpdate, VerificationMirror
 
 from controller.tree_data import *
 
@@ -12,27 +16,34 @@ class MainWorker(QObject):
     Thread that handles the main interaction with the model
     Uses signalling to communicate results with the ui thread
     """
+    logger = logging.getLogger('main_worker')
 
     # signals
     # signal when opening a collection is finished:
     # return a Dictionary of categories with a lost of filenames
     open_collection_finished_signal = pyqtSignal(Collection)
+    # signal when checking the files of the collection for changes is finished
+    # returns the changes, which can be empty
+    poll_collection_finished_signal = pyqtSignal(object)
     # signal when opening tree from collection is finished
     # returns category filename and the tree object
     open_tree_from_collection_finished_signal = pyqtSignal(str, str, Tree)
     # signal when writing collection is finished
-    # return a list of errors
-    write_collection_finished_signal = pyqtSignal(list)
+    # return the path of the json files of the collection, the written files and a list of errors
+    write_collection_finished_signal = pyqtSignal(Path, object, list)
     # write tree finished
-    # return tree and a list with possible errors
-    write_tree_finished_signal = pyqtSignal(str, str, Tree, list)
-    write_tree_custom_path_finished_signal = pyqtSignal(Path, Tree, list)
+    # return the path of the json files of the collection, the tree, the written files and a list with possible errors
+    write_tree_finished_signal = pyqtSignal(Path, str, str, Tree, object, list)
+    write_tree_custom_path_finished_signal = pyqtSignal(Path, Path, Tree, object, list)
     # signal when opening node_types is finished
     # returns the node types dictionary with list of lists for each type
     open_node_types_finished_signal = pyqtSignal(NodeTypes)
     # signal when DB query is finished
     # sends a dictionary with node ids as keys and heatmap values as vals to the view
     db_query_finished_signal = pyqtSignal(dict, str)
+    # signal when verifying a tree is finished
+    # returns the revision of the tree that was verified and a list with errors
+    verify_tree_finished_signal = pyqtSignal(int, list)
 
     def __init__(self):
         super().__init__()
@@ -40,6 +51,11 @@ class MainWorker(QObject):
         self.collection = Collection.from_path()
         # create node types variable and initialize from settings
         self.node_types = NodeTypes.from_csv()
+        # the latest revision of the tree in the editor, set by the listener on every edit
+        # verifications of older revisions are cancelled
+        self.verification_revision = 0
+        # the copy of the collection and the tree in the editor that is verified, only used by this thread
+        self.verification_mirror = VerificationMirror()
 
     # noinspection PyArgumentList
     @pyqtSlot()
@@ -55,6 +71,21 @@ class MainWorker(QObject):
         self.collection = Collection.from_path(path)
         self.open_collection_finished_signal.emit(self.collection)
 
+    # noinspection PyArgumentList
+    @pyqtSlot(Path, object, bool, bool)
+    def poll_collection(self, path: Path, stamps: dict, only_verify_mathematical_properties: bool, lazy: bool):
+        """
+        PyqtSlot for checking the files of a collection for changes made outside of the editor
+        Sends a poll_collection_finished_signal with the changes when finished,
+            the collection takes them over on the ui thread
+        :param path: the path of the json files of the collection
+        :param stamps: a copy of the size and modification time of the files the collection was read from
+        :param only_verify_mathematical_properties: if only the mathematical properties of the trees are verified
+        :param lazy: if only the headers of the trees are read
+        """
+        self.poll_collection_finished_signal.emit(
+            CollectionLoader().changes(path, stamps, only_verify_mathematical_properties, None, lazy))
+
     # noinspection PyArgumentList
     @pyqtSlot(Collection)
     @pyqtSlot(Collection, Path)
@@ -62,40 +93,47 @@ class MainWorker(QObject):
         """
         pyqtSlot for writing a collection
         Emits a write_collection_finished signal
-            with a boolean if writing succeeded or not
-        :param collection: the collection to write
+            with the written files, which the collection takes over on the ui thread, and the errors
+        :param collection: a copy of the collection to write, only used by this thread
         :param path: the path to write to, None if writing to path in collection or Settings
         """
         self.collection = collection
+        stamps = dict(collection.file_stamps)
         errors = self.collection.write_collection(path)
-        self.write_collection_finished_signal.emit(errors)
+        self.write_collection_finished_signal.emit(collection.jsons_path(), collection.files_saved(stamps), errors)
 
     # noinspection PyArgumentList
-    @pyqtSlot(str, str, Tree)
-    def write_tree(self, category: str, filename: str, tree: Tree):
+    @pyqtSlot(Path, str, str, Tree)
+    def write_tree(self, collection_path: Path, category: str, filename: str, tree: Tree):
         """
         Writes a tree to the current collection
-        Emits a write_tree_finished_signal with a boolean
-            if writing succeeded or not
+        Emits a write_tree_finished_signal with the written files,
+            which the collection takes over on the ui thread, and the errors
+        :param collection_path: the path of the json files of the collection
         :param category: the category of the tree
         :param filename: the filename of the tree
-        :param tree: the Tree to write
+        :param tree: a copy of the Tree to write, only used by this thread
         """
-        errors = self.collection.write_tree(tree, self.collection.jsons_path() / category / filename)
-        self.write_tree_finished_signal.emit(category, filename, tree, errors)
+        collection = Collection(None, collection_path)
+        errors = collection.write_tree(tree, collection_path / category / filename)
+        self.write_tree_finished_signal.emit(collection_path, category, filename, tree, collection.files_saved({}),
+                                             errors)
 
     # noinspection PyArgumentList
-    @pyqtSlot(Path, Tree)
-    def write_tree_custom_path(self, path: Path, tree: Tree):
+    @pyqtSlot(Path, Path, Tree)
+    def write_tree_custom_path(self, collection_path: Path, path: Path, tree: Tree):
         """
         Writes a tree to a custom path
-        Emits a write_tree_finished_signal with a boolean
-            if writing succeeded or not
+        Emits a write_tree_custom_path_finished_signal with the written files,
+            which the collection takes over on the ui thread, and the errors
+        :param collection_path: the path of the json files of the collection
         :param path: the path to write the tree to
-        :param tree: the Tree to write
+        :param tree: a copy of the Tree to write, only used by this thread
         """
-        errors = self.collection.write_tree(tree, path)
-        self.write_tree_custom_path_finished_signal.emit(path, tree, errors)
+        collection = Collection(None, collection_path)
+        errors = collection.write_tree(tree, path)
+        self.write_tree_custom_path_finished_signal.emit(collection_path, path, tree, collection.files_saved({}),
+                                                         errors)
 
     # noinspection PyArgumentList
     @pyqtSlot()
@@ -104,8 +142,34 @@ class MainWorker(QObject):
         Reloads the node types and returns it to the listener as NodeTypes object
         """
         self.node_types = NodeTypes.from_csv()
+        # the verifier uses the cached node types, those are read again as well
+        NodeTypes.invalidate_classifiers()
         self.open_node_types_finished_signal.emit(self.node_types)
 
+    # noinspection PyArgumentList
+    @pyqtSlot(int, MirrorUpdate)
+    def verify_tree(self, revision: int, update: MirrorUpdate):
+        """
+        Verifies the tree in the editor on the copy of this thread
+        Emits a verify_tree_finished_signal with the revision and the errors,
+            nothing is emitted if the tree was edited again in the meantime
+        :param revision: the revision of the tree
+        :param update: the changes to the tree and collection since the previous verification,
+                       applied also when the revision is outdated
+        """
+        def cancelled() -> bool:
+            return revision != self.verification_revision
+
+        self.verification_mirror.apply(update)
+        if cancelled():
+            return
+        try:
+            errors = self.verification_mirror.verify(cancelled)
+        except VerificationCancelledException:
+            return
+        if not cancelled():
+            self.verify_tree_finished_signal.emit(revision, errors)
+
     # noinspection PyArgumentList
     @pyqtSlot(str, str)
     def create_heatmap(self, tid: str, status_type: str):
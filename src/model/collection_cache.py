@@ -0,0 +1,156 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Tuple, Union
+
+from controller.utils import write_file_atomic
+from model.config import Settings
+from model.tree import TreeHeader, content_hash
+
+
+class CollectionCache:
+    """
+    Cache file with the parsed trees of a collection, their headers and if they could be verified, so opening the
+    collection again only reads the files that changed. An entry is kept by the category and filename of a file and
+    used while the file has the same size and modification time.
+    The cache file is versioned, a cache file of another version or that cannot be read is ignored and written again
+    after the collection was read, an entry that cannot be used is read from its file again.
+    """
+    logger = logging.getLogger('collection_cache')
+    # changes whenever the contents of the cache file change, cache files of other versions are ignored
+    VERSION = 3
+
+    def __init__(self, path: Path, folder: Path):
+        """
+        Constructor of the CollectionCache
+        :param path: the main json folder of the collection
+        :param folder: the folder with the cache files
+        """
+        self.path = os.path.abspath(str(path))
+        # one cache file per collection, named after the path of the collection
+        self.file = os.path.join(str(folder), '{:032x}.json'.format(content_hash(self.path)))
+        # (category, filename) -> the cached information about the file
+        self.entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # the entries that were looked up or stored, the others are dropped when the cache is written
+        self.used = set()
+        self.changed = False
+
+    @staticmethod
+    def for_collection(path: Path, folder: Path=None) -> Union['CollectionCache', None]:
+        """
+        Reads the cache of a collection
+        :param path: the main json folder of the collection
+        :param folder: the folder with the cache files, defaults to the one in the settings
+        :return: the cache, None if no cache folder is set
+        """
+        if folder is None:
+            folder = Settings.collection_cache_folder()
+        if folder is None:
+            return None
+        cache = CollectionCache(path, folder)
+        cache.read()
+        return cache
+
+    @staticmethod
+    def stamp(file_path: str) -> Tuple[int, int]:
+        """
+        The size and modification time of a file, a cached entry is used while they stay the same
+        """
+        stat = os.stat(file_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def read(self):
+        """
+        Reads the cache file, a missing, outdated or corrupt cache file leaves the cache empty
+        """
+        self.entries = {}
+        if not os.path.exists(self.file):
+            return
+        try:
+            with open(self.file, 'r') as cache_file:
+                content = json.load(cache_file)
+            if content.get('version') != CollectionCache.VERSION or content.get('path') != self.path:
+                CollectionCache.logger.info("The cache file {} is outdated, the collection is read again"
+                                            .format(self.file))
+                return
+            self.entries = {tuple(key.split('/', 1)): entry for key, entry in content['files'].items()}
+        except (OSError, ValueError, AttributeError, KeyError, TypeError) as error:
+            CollectionCache.logger.warning("The cache file {} could not be read, the collection is read again: {}"
+                                           .format(self.file, error))
+            self.entries = {}
+
+    def lookup(self, category: str, filename: str, stamp: Tuple[int, int]) -> Union[Dict[str, Any], None]:
+        """
+        Looks up the cached information about a file
+        :param category: the category of the file
+        :param filename: the name of the file
+        :param stamp: the size and modification time of the file
+        :return: the entry, None if the file changed since it was cached
+        """
+        self.used.add((category, filename))
+        entry = self.entries.get((category, filename))
+        if type(entry) is not dict or entry.get('stamp') != list(stamp):
+            return None
+        return entry
+
+    def keep(self, category: str, filename: str):
+        """
+        Keeps the entry of a file that was not looked up, because it did not change, when the cache is written
+        :param category: the category of the file
+        :param filename: the name of the file
+        """
+        self.used.add((category, filename))
+
+    def store(self, category: str, filename: str, stamp: Tuple[int, int], **information):
+        """
+        Stores information about a file, added to the information that is kept for the same version of the file
+        :param category: the category of the file
+        :param filename: the name of the file
+        :param stamp: the size and modification time of the file
+        :param information: the information, like the packed tree, the header or if the tree could be verified
+        """
+        self.used.add((category, filename))
+        entry = self.lookup(category, filename, stamp)
+        if entry is None:
+            entry = self.entries[(category, filename)] = {'stamp': list(stamp)}
+        for key, value in information.items():
+            if key == 'verified':
+                entry.setdefault('verified', {}).update(value)
+            else:
+                entry[key] = value
+        self.changed = True
+
+    def write(self):
+        """
+        Writes the cache file when it changed, without the entries of files that no longer exist
+        """
+        if not self.changed and self.used == set(self.entries.keys()):
+            return
+        files = {'/'.join(key): entry for key, entry in self.entries.items() if key in self.used}
+        content = json.dumps({'version': CollectionCache.VERSION, 'path': self.path, 'files': files},
+                             separators=(',', ':'))
+        try:
+            os.makedirs(os.path.dirname(self.file), exist_ok=True)
+            # replaced at once, a collection read at the same time sees the old or the new cache file
+            write_file_atomic(Path(self.file), content.encode())
+            self.changed = False
+        except OSError as error:
+            CollectionCache.logger.warning("Could not write the cache file {}: {}".format(self.file, error))
+
+    @staticmethod
+    def pack_header(header: TreeHeader) -> list:
+        """
+        The information of a header that is cached, the path and stamp of the file are cached with the entry
+        """
+        return [header.name, header.root, header.nodes, str(header.fingerprint), sorted(header.references),
+                sorted(header.roles)]
+
+    @staticmethod
+    def unpack_header(packed: list, file_path: str, stamp: Tuple[int, int]) -> TreeHeader:
+        """
+        Restores a header cached by pack_header
+        """
+        name, root, nodes, fingerprint, references, roles = packed
+        return TreeHeader(name, root, file_path, stamp[0], stamp[1], nodes, int(fingerprint), frozenset(references),
+                          frozenset(roles))
@@ -0,0 +1,464 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
+
+from controller.utils import read_json
+from model.collection_cache import CollectionCache
+from model.compact_tree import CompactTree
+from model.config import Settings
+from model.exceptions import InvalidTreeJsonFormatException
+from model.tree import Collection, Tree, TreeHeader, Verification
+from model.tree_verifier import TreeVerifier
+
+# what happened to a file of the collection
+INVALID, UNVERIFIED, LOADED = 'invalid', 'unverified', 'loaded'
+
+
+def load_tree(path: str, collection: Collection,
+              only_verify_mathematical_properties: bool) -> Tuple[str, Union[Tree, None]]:
+    """
+    Reads a json file, converts it to a tree and verifies the tree
+    :param path: the path of the file
+    :param collection: the collection to verify the tree in
+    :param only_verify_mathematical_properties: if only the mathematical properties are verified
+    :return: LOADED and the tree, UNVERIFIED and the tree or INVALID and None
+    """
+    try:
+        tree = Tree.from_json(read_json(Path(path)))
+    except InvalidTreeJsonFormatException:
+        return INVALID, None
+    if len(Verification.verify_tree(collection, tree, None, only_verify_mathematical_properties)) > 0:
+        return UNVERIFIED, tree
+    return LOADED, tree
+
+
+def load_header(path: str) -> Tuple[str, Union[TreeHeader, None]]:
+    """
+    Reads the header of the tree in a json file, for a lazily loaded collection
+    :param path: the path of the file
+    :return: LOADED and the header or INVALID and None
+    """
+    try:
+        return LOADED, TreeHeader.from_file(path)
+    except InvalidTreeJsonFormatException:
+        return INVALID, None
+
+
+def load_packed_tree(path: str) -> Tuple[str, Union[str, None]]:
+    """
+    Loads a tree in a worker process and serializes it compactly to send it back, with the digests of the nodes
+    so they do not have to be calculated again. The worker reads the tree as a CompactTree, without creating the
+    nodes, and does not have the collection, so only the mathematical properties are verified here, the other
+    properties are verified against the collection when the tree is restored
+    :param path: the path of the file
+    :return: what happened to the file and the serialized tree, only the name of the tree when it is not verified
+    """
+    try:
+        compact = CompactTree.from_json(read_json(Path(path)))
+    except InvalidTreeJsonFormatException:
+        return INVALID, None
+    if len(TreeVerifier.verify_compact(compact)) > 0:
+        return UNVERIFIED, compact.name
+    return LOADED, compact.pack()
+
+
+def pack_loaded_tree(tree: Tree) -> str:
+    """
+    Serializes a tree compactly, with the digests of the nodes so they do not have to be calculated again
+    :param tree: the tree
+    :return: the serialized tree
+    """
+    return CompactTree.from_tree(tree).pack()
+
+
+def unpack_loaded_tree(packed: str) -> Tree:
+    """
+    Restores a tree serialized by pack_loaded_tree or load_packed_tree
+    :param packed: the serialized tree
+    :return: the tree
+    """
+    return CompactTree.unpack(packed).to_tree()
+
+
+class CollectionChanges:
+    """
+    The changes to the files of a collection since it was read, with the trees read from the added and changed files
+    """
+
+    def __init__(self, categories: List[str], stamps: Dict[Tuple[str, str], Tuple[int, int]],
+                 compared: Dict[Tuple[str, str], Tuple[int, int]]):
+        """
+        Constructor of the CollectionChanges
+        :param categories: the categories on disk
+        :param stamps: the size and modification time of all json files on disk by category and filename
+        :param compared: the size and modification time of the files the collection was read from, that the files
+                         on disk were compared with
+        """
+        self.categories = categories
+        self.stamps = stamps
+        self.compared = compared
+        # (category, filename) -> the tree or header read from an added or changed file
+        self.trees: Dict[Tuple[str, str], Union[Tree, TreeHeader]] = {}
+        # the (category, filename) entries whose files were removed or no longer hold a valid tree
+        self.removed: List[Tuple[str, str]] = []
+
+    def locations(self) -> List[Tuple[str, str]]:
+        """
+        The (category, filename) entries that changed
+        """
+        return list(self.trees.keys()) + self.removed
+
+    def __bool__(self):
+        return len(self.trees) > 0 or len(self.removed) > 0
+
+    def __repr__(self):
+        """
+        Internal representation of the object
+        """
+        return 'CollectionChanges({} read, {} removed)'.format(len(self.trees), len(self.removed))
+
+
+class CollectionLoader:
+    """
+    Reads the json files of a collection. The files of large collections are read, converted and verified
+    by a pool of processes while the trees that are done are restored here, in the order of the files.
+    The processes only verify the mathematical properties, the other properties are verified here against the
+    collection, like the trees that are read in this process.
+    Small collections are read in this process, as starting the processes costs more than it saves.
+    For a lazily loaded collection only the headers of the trees are read, in this process, the trees are verified
+    when they are read.
+    With a cache folder in the settings, the files that did not change since the collection was read before are
+    restored from the cache file of the collection, see CollectionCache. The cache only keeps if the mathematical
+    properties of a tree could be verified, the other properties depend on the collection and the node types,
+    they are verified again.
+    """
+    logger = logging.getLogger('collection_loader')
+    # below this number of json files the collection is read in this process,
+    # see benchmarks/collection_loading.py
+    MIN_PARALLEL_FILES = 500
+    # the files are handed to the processes in groups of this size
+    CHUNK_SIZE = 16
+    # the key under which the cache keeps if the mathematical properties of a tree could be verified
+    VERIFIED = 'math'
+
+    def __init__(self, max_workers: int=None, min_parallel_files: int=MIN_PARALLEL_FILES, mp_context=None,
+                 use_cache: bool=True, cache_folder: Path=None):
+        """
+        Constructor of the CollectionLoader
+        :param max_workers: the number of processes, defaults to the number of cores, 1 reads in this process
+        :param min_parallel_files: the number of json files from which they are read on a pool of processes
+        :param mp_context: the multiprocessing context to start the processes with, defaults to the platform default
+        :param use_cache: if the cache file of the collection is used
+        :param cache_folder: the folder with the cache files, defaults to the one in the settings, when no folder
+                             is set there the cache is not used
+        """
+        self.max_workers = max_workers if max_workers else (os.cpu_count() or 1)
+        self.min_parallel_files = min_parallel_files
+        self.mp_context = mp_context
+        self.use_cache = use_cache
+        self.cache_folder = cache_folder
+        # the size and modification time of the json files of the last collection that was read
+        self.stamps: Dict[Tuple[str, str], Tuple[int, int]] = {}
+
+    @staticmethod
+    def list_files(path: Path) -> Tuple[List[str], List[Tuple[str, str, str]]]:
+        """
+        Finds the categories and files of a collection, the directories in the main json folder
+        :param path: the main json folder
+        :return: the categories and the category, filename and path of every file, in the order they are read
+        """
+        categories = []
+        files = []
+        # skip branch checking in coverage as the loop will only be executed once
+        for root, dirs, _ in os.walk(str(path)):     # pragma: no branch
+            for directory in dirs:
+                # skip hidden directories
+                if directory[0] == '_' or directory[0] == ".":
+                    continue
+                categories.append(directory)
+                # skip branch checking in coverage as the loop will only be executed once
+                for sub_root, _, directory_files in os.walk(os.path.join(root, directory)):    # pragma: no branch
+                    files.extend((directory, file, os.path.join(sub_root, file)) for file in directory_files)
+                    break
+            break
+        return categories, files
+
+    def load(self, path: Path=None, only_verify_mathematical_properties: bool=True, collection: Collection=None,
+             lazy: bool=False) -> Dict[str, Dict[str, Union[Tree, TreeHeader]]]:
+        """
+        Reads all the json files in the first subdirectories and creates Tree objects from them,
+        the trees that are not valid are left out. The size and modification time of the files are kept in stamps
+        :param path: the path of the main JSON folder, defaults to the one in the settings
+        :param only_verify_mathematical_properties: if only the mathematical properties are verified
+        :param collection: the collection to verify the trees in this process in
+        :param lazy: if only the headers of the trees are read
+        :return: the trees or their headers by category and filename, with the default categories
+        """
+        # set the path to the path specified in settings if None
+        if not path:
+            path = Settings.default_json_folder()
+        trees = {category: {} for category in Settings.default_collection_categories()}
+        categories, files = CollectionLoader.list_files(path)
+        for category in categories:
+            trees[category] = {}
+        json_files = [(category, file, file_path) for category, file, file_path in files
+                      if file[0] != '.' and file.endswith('.json')]
+        # the size and modification time of the files are read before the files, a file that changes
+        # while it is read is read again the next time
+        self.stamps = CollectionLoader.stamps(json_files)
+        results = iter(self.read_files(path, json_files, self.stamps, only_verify_mathematical_properties,
+                                       collection, lazy))
+        for category, file, file_path in files:
+            # skip hidden files
+            if file[0] == '.':
+                logging.info("File at {} is a hidden file, this file will be skipped.".format(file_path))
+                continue
+            elif not file.endswith('.json'):
+                # If the file is not a .json log it
+                logging.info("File at {} is not a .json file, this file will be skipped.".format(file_path))
+                continue
+            status, tree = next(results)
+            if CollectionLoader.accepted(status, tree, file_path):
+                trees[category][file] = tree
+        return trees
+
+    def changes(self, path: Path, stamps: Dict[Tuple[str, str], Tuple[int, int]],
+                only_verify_mathematical_properties: bool=True, collection: Collection=None,
+                lazy: bool=False) -> 'CollectionChanges':
+        """
+        Compares the json files in the first subdirectories with the files a collection was read from and reads the
+        files that were added or changed since
+        :param path: the path of the main JSON folder, defaults to the one in the settings
+        :param stamps: the size and modification time of the files the collection was read from,
+                       by category and filename
+        :param only_verify_mathematical_properties: if only the mathematical properties are verified
+        :param collection: the collection to verify the trees in this process in
+        :param lazy: if only the headers of the trees are read
+        :return: the changes
+        """
+        if not path:
+            path = Settings.default_json_folder()
+        categories, files = CollectionLoader.list_files(path)
+        json_files = [(category, file, file_path) for category, file, file_path in files
+                      if file[0] != '.' and file.endswith('.json')]
+        current = CollectionLoader.stamps(json_files)
+        # a file that cannot be read now is compared again the next time
+        changed = [(category, file, file_path) for category, file, file_path in json_files
+                   if (category, file) in current and stamps.get((category, file)) != current[(category, file)]]
+        changes = CollectionChanges(categories, current, dict(stamps))
+        changes.removed = [location for location in stamps.keys() if location not in current]
+        results = self.read_files(path, changed, current, only_verify_mathematical_properties, collection, lazy,
+                                  current.keys())
+        for (category, file, file_path), (status, tree) in zip(changed, results):
+            if CollectionLoader.accepted(status, tree, file_path):
+                changes.trees[(category, file)] = tree
+            else:
+                # the file no longer holds a tree, like a collection read again would not have it
+                changes.removed.append((category, file))
+        return changes
+
+    def read_files(self, path: Path, json_files: List[Tuple[str, str, str]],
+                   stamps: Dict[Tuple[str, str], Tuple[int, int]], only_verify_mathematical_properties: bool,
+                   collection: Union[Collection, None], lazy: bool,
+                   listed: Iterable[Tuple[str, str]]=()) -> List[Tuple[str, Any]]:
+        """
+        Reads json files of a collection, the files that did not change since they were cached are restored from
+        the cache of the collection
+        :param path: the path of the main JSON folder
+        :param json_files: the category, filename and path of the files
+        :param stamps: the size and modification time of the files by category and filename
+        :param only_verify_mathematical_properties: if only the mathematical properties are verified
+        :param collection: the collection to verify the trees in this process in
+        :param lazy: if only the headers of the trees are read
+        :param listed: the other files of the collection, their cached entries are kept
+        :return: for every file in order what happened to it and the tree or header, or the name of the tree
+                 when it is not verified
+        """
+        # a poll that found no changed files does not read the cache, it holds a packed copy of every tree
+        cache = CollectionCache.for_collection(path, self.cache_folder) if self.use_cache and json_files else None
+        cached = {}
+        if cache is not None:
+            for category, file, file_path in json_files:
+                result = CollectionLoader.cached_result(cache, category, file, file_path,
+                                                        stamps.get((category, file)), lazy)
+                if result is not None:
+                    cached[file_path] = result
+            for category, file in listed:
+                cache.keep(category, file)
+        if collection is None:
+            collection = Collection()
+        unread = [file_path for _, _, file_path in json_files if file_path not in cached]
+        if lazy:
+            results = (load_header(file_path) for file_path in unread)
+        else:
+            results = self.results(unread)
+        read = []
+        for category, file, file_path in json_files:
+            if file_path in cached:
+                status, tree = cached[file_path]
+            else:
+                status, tree = next(results)
+                stamp = stamps.get((category, file))
+                if cache is not None and stamp is not None:
+                    CollectionLoader.cache_result(cache, category, file, stamp, status, tree)
+            if status == LOADED and not lazy:
+                status, tree = CollectionLoader.verified(tree, collection, only_verify_mathematical_properties)
+            read.append((status, tree))
+        if cache is not None:
+            cache.write()
+        return read
+
+    @staticmethod
+    def accepted(status: str, result: Union[Tree, TreeHeader, str, None], file_path: str) -> bool:
+        """
+        Reports a file that was read and is left out of the collection
+        :param status: what happened to the file
+        :param result: the tree or header, or the name of the tree when it is not verified
+        :param file_path: the path of the file
+        :return: if the tree or header is added to the collection
+        """
+        if status == LOADED:
+            return True
+        if status == UNVERIFIED:
+            # say that tree x in folder y wasn't added
+            logging.warning("Unable to verify tree {} in {}, this tree will not be added to the"
+                            " collection".format(result, file_path))
+        else:
+            # skip incorrect json files
+            logging.error("The tree at {} is not a valid tree, this tree will not be loaded".format(file_path))
+        return False
+
+    @staticmethod
+    def stamps(json_files: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str], Tuple[int, int]]:
+        """
+        The size and modification time of json files by category and filename, without the files that cannot be
+        read
+        :param json_files: the category, filename and path of the files
+        :return: the stamps
+        """
+        stamps = {}
+        for category, file, file_path in json_files:
+            stamp = CollectionLoader.stamp(file_path)
+            if stamp is not None:
+                stamps[(category, file)] = stamp
+        return stamps
+
+    @staticmethod
+    def stamp(file_path: str) -> Union[Tuple[int, int], None]:
+        """
+        The size and modification time of a file
+        :return: the stamp, None if the file cannot be read, then it is not cached
+        """
+        try:
+            return CollectionCache.stamp(file_path)
+        except OSError:
+            return None
+
+    @staticmethod
+    def cached_result(cache: CollectionCache, category: str, file: str, file_path: str,
+                      stamp: Union[Tuple[int, int], None], lazy: bool) -> Union[Tuple[str, Any], None]:
+        """
+        Restores what happened to a file when it was read before from the cache
+        :param cache: the cache of the collection
+        :param category: the category of the file
+        :param file: the name of the file
+        :param file_path: the path of the file
+        :param stamp: the size and modification time of the file
+        :param lazy: if only the header of the tree is needed
+        :return: the status and tree, header or name like the results of reading the file with only the mathematical
+        properties verified, None if the file has to be read
+        """
+        if stamp is None:
+            return None
+        entry = cache.lookup(category, file, stamp)
+        if entry is None:
+            return None
+        try:
+            if entry.get('invalid'):
+                return INVALID, None
+            if lazy:
+                if 'header' not in entry:
+                    return None
+                return LOADED, CollectionCache.unpack_header(entry['header'], file_path, stamp)
+            verified = entry.get('verified', {}).get(CollectionLoader.VERIFIED)
+            if verified is None:
+                return None
+            if not verified:
+                return UNVERIFIED, str(entry['name'])
+            if 'tree' not in entry:
+                return None
+            return LOADED, unpack_loaded_tree(entry['tree'])
+        except (ValueError, KeyError, TypeError, IndexError, AttributeError) as error:
+            # a broken entry is read from the file again and replaced
+            CollectionLoader.logger.warning("The cached tree {} in {} could not be used, it is read again: {}"
+                                            .format(file, category, error))
+            return None
+
+    @staticmethod
+    def cache_result(cache: CollectionCache, category: str, file: str, stamp: Tuple[int, int], status: str,
+                     result: Union[Tree, TreeHeader, str, None]):
+        """
+        Stores what happened to a file that was read in the cache
+        :param cache: the cache of the collection
+        :param category: the category of the file
+        :param file: the name of the file
+        :param stamp: the size and modification time of the file before it was read
+        :param status: what happened to the file, with only the mathematical properties verified
+        :param result: the tree, header or name of the tree
+        """
+        if status == INVALID:
+            cache.store(category, file, stamp, invalid=True)
+        elif status == UNVERIFIED:
+            cache.store(category, file, stamp, name=result, verified={CollectionLoader.VERIFIED: False})
+        elif isinstance(result, TreeHeader):
+            cache.store(category, file, stamp, name=result.name, header=CollectionCache.pack_header(result))
+        else:
+            # the header is kept as well, so a lazily loaded collection does not read the file again
+            cache.store(category, file, stamp, name=result.name, tree=pack_loaded_tree(result),
+                        header=CollectionCache.pack_header(TreeHeader.from_tree(result, '', stamp)),
+                        verified={CollectionLoader.VERIFIED: True})
+
+    @staticmethod
+    def verified(tree: Tree, collection: Collection,
+                 only_verify_mathematical_properties: bool) -> Tuple[str, Union[Tree, str]]:
+        """
+        Verifies the other properties of a tree whose mathematical properties were verified
+        :param tree: the tree
+        :param collection: the collection to verify the tree in
+        :param only_verify_mathematical_properties: if only the mathematical properties are verified
+        :return: LOADED and the tree or UNVERIFIED and the name of the tree
+        """
+        if not only_verify_mathematical_properties and len(Verification.verify_tree(collection, tree)) > 0:
+            return UNVERIFIED, tree.name
+        return LOADED, tree
+
+    def results(self, paths: List[str]) -> Iterator[Tuple[str, Any]]:
+        """
+        Loads the json files and verifies the mathematical properties of the trees, in parallel for many files
+        :param paths: the paths of the json files
+        :return: for every file in order what happened to it and the tree, or the name of the tree when it is
+                 not verified
+        """
+        # the number of files whose results were yielded
+        done = 0
+        if self.max_workers > 1 and len(paths) >= self.min_parallel_files:
+            try:
+                with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self.mp_context) as executor:
+                    # the results come in the order of the files, while the processes continue with the next ones
+                    for status, packed in executor.map(load_packed_tree, paths, chunksize=CollectionLoader.CHUNK_SIZE):
+                        yield status, unpack_loaded_tree(packed) if status == LOADED else packed
+                        done += 1
+                return
+            except (OSError, BrokenProcessPool) as exception:
+                # the processes could not be started, stopped or could not read a file, the files from the one
+                # that failed on are read in this process
+                CollectionLoader.logger.warning("Could not read the collection in parallel, reading the remaining {} "
+                                                "files in one process: {}".format(len(paths) - done, exception))
+        # only the mathematical properties are verified, they do not depend on the collection
+        collection = Collection()
+        for path in paths[done:]:
+            status, tree = load_tree(path, collection, True)
+            yield status, tree.name if status == UNVERIFIED else tree
@@ -0,0 +1,238 @@
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Tuple, Union
+
+from model.tree import Collection, Node, NodeTypeClassifier, NodeTypes, Tree, Verification
+from model.tree_verifier import TreeVerifier
+from model.verification_cache import DependencyRecorder, LogRecorder
+
+# the trees and node types a worker process verifies with, set once when the process starts
+worker_collection: 'WorkerCollection' = None
+worker_classifier: NodeTypeClassifier = None
+
+
+def pack_tree(tree: Tree) -> str:
+    """
+    Serializes a tree compactly to send it to a worker process, also trees that are not valid
+    :param tree: the tree
+    :return: json text with the name, the root and the key, id, title, attributes and children of every node
+    """
+    nodes = [[key, node.id, node.title, node.attributes, node.children] for key, node in tree.nodes.items()]
+    return json.dumps([tree.name, tree.root, nodes], separators=(',', ':'))
+
+
+def unpack_tree(packed: str) -> Tree:
+    """
+    Restores a tree serialized by pack_tree
+    :param packed: the serialized tree
+    :return: the tree
+    """
+    name, root, nodes = json.loads(packed)
+    return Tree(name, root, {key: Node(title, node_id, attributes, children)
+                             for key, node_id, title, attributes, children in nodes})
+
+
+class WorkerCollection:
+    """
+    The collection of a worker process, answers the questions of the verifier like the collection it is a copy of.
+    The trees are only restored when they are verified or followed into, most trees are never needed by a process.
+    """
+
+    def __init__(self, entries: List[Tuple[str, str, str, str, str]]):
+        """
+        Constructor of the WorkerCollection
+        :param entries: the category, filename, name, root and serialized tree of all trees, in collection order
+        """
+        self.packed = {(category, filename): packed for category, filename, _, _, packed in entries}
+        self.trees: Dict[Tuple[str, str], Tree] = {}
+        # the first tree with a name and the categories with a tree with a root, in collection order
+        self.names: Dict[str, Tuple[str, str]] = {}
+        self.roots: Dict[str, List[str]] = {}
+        for category, filename, name, root, _ in entries:
+            self.names.setdefault(name, (category, filename))
+            categories = self.roots.setdefault(root, [])
+            if category not in categories:
+                categories.append(category)
+
+    def get_tree(self, category: str, filename: str) -> Tree:
+        """
+        Returns a tree of the collection, restored the first time it is needed
+        """
+        tree = self.trees.get((category, filename))
+        if tree is None:
+            tree = self.trees[(category, filename)] = unpack_tree(self.packed[(category, filename)])
+        return tree
+
+    def get_tree_by_name(self, name: str) -> Union[Tree, None]:
+        entry = self.names.get(name)
+        if entry is None:
+            Collection.logger.warning('The requested tree {} does not exist'.format(name))
+            return None
+        return self.get_tree(*entry)
+
+    def get_category_from_node(self, node: str) -> str:
+        categories = self.roots.get(node)
+        return categories[0] if categories else None
+
+    def is_root_in_category(self, node: str, category: str) -> bool:
+        return category in self.roots.get(node, ())
+
+
+def init_worker(entries: List[Tuple[str, str, str, str, str]], classifier: NodeTypeClassifier):
+    """
+    Sets up a worker process, called once when the process starts
+    :param entries: the category, filename, name, root and serialized tree of the trees the structure checks can
+                    follow into, empty if the structure is not checked
+    :param classifier: the node types to verify with, None if only the mathematical properties are checked
+    """
+    global worker_collection, worker_classifier
+    worker_collection = WorkerCollection(entries)
+    worker_classifier = classifier
+
+
+def verify_entries(entries: List[Tuple[str, str, Union[str, None]]], category_checks: bool,
+                   only_check_mathematical_properties: bool) \
+        -> List[Tuple[List[str], Dict[Tuple[str, Any], Any], List[Tuple[str, int, str]]]]:
+    """
+    Verifies trees in a worker process
+    :param entries: the category, filename and serialized tree of the trees, without the serialized tree
+                    the tree is taken from the collection of the worker process
+    :param category_checks: if the structure of the trees is checked against their category
+    :param only_check_mathematical_properties: if only the mathematical properties are checked
+    :return: the errors of every tree, the answers of the collection they depend on and the logged messages
+    """
+    results = []
+    for category, filename, packed in entries:
+        tree = unpack_tree(packed) if packed is not None else worker_collection.get_tree(category, filename)
+        recorder = DependencyRecorder(worker_collection)
+        verifier = TreeVerifier(recorder, category if category_checks else None, worker_classifier)
+        with LogRecorder() as log:
+            errors = verifier.verify(tree, only_check_mathematical_properties)
+        results.append((errors, recorder.dependencies, log.records))
+    return results
+
+
+class CollectionVerifier:
+    """
+    Verifies all trees of a collection. Large collections are verified on a pool of processes, every process
+    gets the node types when it starts and verifies a share of the trees, which are sent as compact json text.
+    The structure checks follow into other trees, for them every process gets all trees when it starts and
+    restores the ones it needs.
+    Restoring a tree in another process costs about as much as checking all its properties and several times more
+    than checking only its mathematical properties, so only large collections that are fully checked are verified
+    on a pool, with enough processes to make up for it. The others are verified in this process.
+    The errors are stored in the verification cache and returned in the order of the collection.
+    """
+    logger = logging.getLogger('collection_verifier')
+    # below this number of nodes to verify, or with fewer processes, the trees are verified in this process,
+    # see benchmarks/collection_verification.py
+    MIN_PARALLEL_NODES = 20000
+    MIN_PARALLEL_WORKERS = 3
+    # every process gets a few shares of the trees, so a process with large trees does not keep the others waiting
+    CHUNKS_PER_WORKER = 4
+
+    def __init__(self, max_workers: int=None, min_parallel_nodes: int=MIN_PARALLEL_NODES, mp_context=None):
+        """
+        Constructor of the CollectionVerifier
+        :param max_workers: the number of processes, defaults to the number of cores
+        :param min_parallel_nodes: the number of nodes to verify from which the trees are verified in parallel
+        :param mp_context: the multiprocessing context to start the processes with, defaults to the platform default
+        """
+        self.max_workers = max_workers if max_workers else (os.cpu_count() or 1)
+        self.min_parallel_nodes = min_parallel_nodes
+        self.mp_context = mp_context
+
+    def verify(self, collection: Collection, only_check_mathematical_properties: bool=False,
+               category_checks: bool=True, classifier: NodeTypeClassifier=None) -> Dict[Tuple[str, str], List[str]]:
+        """
+        Verifies all trees of a collection
+        :param collection: the collection
+        :param only_check_mathematical_properties: if only the mathematical properties are checked
+        :param category_checks: if the structure of the trees is checked against the category they are in
+        :param classifier: the node types to verify with, defaults to the cached node types from the settings
+        :return: the errors by category and filename, in the order of the collection
+        """
+        if not only_check_mathematical_properties and not classifier:
+            classifier = NodeTypes.default_classifier()
+        results = {}
+        # category, filename, tree and cache key of the trees whose result is not known yet
+        pending = []
+        for category, trees in collection.collection.items():
+            for filename, tree in trees.items():
+                key = Verification.cache_key(tree, category if category_checks else None,
+                                             only_check_mathematical_properties, classifier)
+                errors = Verification.cache.lookup(collection, key)
+                if errors is not None:
+                    results[(category, filename)] = errors
+                else:
+                    pending.append((category, filename, tree, key))
+        if pending and self.use_pool(pending, only_check_mathematical_properties):
+            try:
+                results.update(self.verify_parallel(collection, pending, only_check_mathematical_properties,
+                                                    category_checks, classifier))
+                pending = []
+            except (OSError, BrokenProcessPool) as exception:
+                CollectionVerifier.logger.warning("Could not verify the collection in parallel, verifying it "
+                                                  "in one process: {}".format(exception))
+        for category, filename, tree, key in pending:
+            recorder = DependencyRecorder(collection)
+            verifier = TreeVerifier(recorder, category if category_checks else None, classifier)
+            with LogRecorder() as log:
+                errors = verifier.verify(tree, only_check_mathematical_properties)
+            Verification.cache.store(collection, key, errors, recorder.dependencies, log.records)
+            results[(category, filename)] = errors
+        return {(category, filename): results[(category, filename)]
+                for category, trees in collection.collection.items() for filename in trees}
+
+    def use_pool(self, pending: List[Tuple[str, str, Tree, Tuple]], only_check_mathematical_properties: bool) -> bool:
+        """
+        If trees are verified on a pool of processes
+        :param pending: the category, filename, tree and cache key of the trees to verify
+        :param only_check_mathematical_properties: if only the mathematical properties are checked
+        :return: True for enough nodes to fully check and enough processes
+        """
+        return (not only_check_mathematical_properties and len(pending) > 1
+                and self.max_workers >= CollectionVerifier.MIN_PARALLEL_WORKERS
+                and sum(len(tree.nodes) for _, _, tree, _ in pending) >= self.min_parallel_nodes)
+
+    def verify_parallel(self, collection: Collection, pending: List[Tuple[str, str, Tree, Tuple]],
+                        only_check_mathematical_properties: bool, category_checks: bool,
+                        classifier: NodeTypeClassifier) -> Dict[Tuple[str, str], List[str]]:
+        """
+        Verifies trees on a pool of processes
+        :param collection: the collection the trees are in
+        :param pending: the category, filename, tree and cache key of the trees to verify
+        :param only_check_mathematical_properties: if only the mathematical properties are checked
+        :param category_checks: if the structure of the trees is checked against their category
+        :param classifier: the node types to verify with
+        :return: the errors by category and filename
+        """
+        # the structure checks follow into other trees of the collection, so every process needs all of them,
+        # otherwise a tree is only sent to the process that verifies it
+        shared = category_checks and not only_check_mathematical_properties
+        entries = [(category, filename, tree.name, tree.root, pack_tree(tree))
+                   for category, trees in collection.collection.items()
+                   for filename, tree in trees.items()] if shared else []
+        workers = min(self.max_workers, len(pending))
+        # the largest trees are handed out first, over the chunks in turn
+        chunks = [[] for _ in range(min(len(pending), workers * CollectionVerifier.CHUNKS_PER_WORKER))]
+        ordered = sorted(pending, key=lambda entry: len(entry[2].nodes), reverse=True)
+        for index, (category, filename, tree, _) in enumerate(ordered):
+            chunks[index % len(chunks)].append((category, filename, None if shared else pack_tree(tree)))
+        CollectionVerifier.logger.info("Verifying {} trees on {} processes".format(len(pending), workers))
+        results = {}
+        keys = {(category, filename): key for category, filename, _, key in pending}
+        initargs = (entries, None if only_check_mathematical_properties else classifier)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=self.mp_context, initializer=init_worker,
+                                 initargs=initargs) as executor:
+            futures = [executor.submit(verify_entries, chunk, category_checks, only_check_mathematical_properties)
+                       for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                for (category, filename, _), (errors, dependencies, records) in zip(chunk, future.result()):
+                    entry = (category, filename)
+                    Verification.cache.store(collection, keys[entry], errors, dependencies, records)
+                    results[entry] = errors
+        return results
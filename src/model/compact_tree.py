@@ -0,0 +1,433 @@
+import json
+from array import array
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+from model.tree import Node, Tree, content_hash, copy_value
+
+
+class CompactTree:
+    """
+    Struct-of-arrays representation of a tree, used for fast walks over large trees and to send trees to another
+    process. Every node gets an integer slot, the structure of the tree is stored in integer arrays
+    indexed by slot instead of in node objects.
+    """
+    # slot value used when a node has no parent, child or sibling
+    NO_NODE = -1
+
+    def __init__(self, name: str, root: str):
+        """
+        Constructor of an empty CompactTree, use from_tree or from_json to fill it
+        :param name: the name of the tree
+        :param root: the id of the root node
+        """
+        self.name: str = name
+        self.root: str = root
+        # slot -> key of the node in the tree and key -> slot
+        self.ids: List[str] = []
+        self.slots: Dict[str, int] = {}
+        # slot -> id stored in the node, only for the nodes where it is not the same as the key
+        self.node_ids: Dict[int, str] = {}
+        # slot -> code of the title of the node, and the table with the titles for each code
+        self.type_codes = array('i')
+        self.titles: List[str] = []
+        self.title_codes: Dict[str, int] = {}
+        # slot -> attributes of the node
+        self.attributes: List[Dict[str, Any]] = []
+        # slot -> digest of the node, None until it is calculated
+        self.digests: List[Union[int, None]] = []
+        # children lists of all nodes after each other, the children of slot s
+        # are in child_slots[child_offsets[s]:child_offsets[s + 1]]
+        self.child_offsets = array('i', [0])
+        self.child_slots = array('i')
+        # position in child_slots -> id of a child that does not exist in the tree
+        self.dangling: Dict[int, str] = {}
+        # the first parent of each node and the first child / next sibling links for that parent, only made when
+        # they are used
+        self._links: Union[Tuple[array, array, array], None] = None
+
+    @classmethod
+    def from_parts(cls, name: str, root: str,
+                   nodes: Iterable[Tuple[str, str, str, Dict[str, Any], List[str], Union[int, None]]]):
+        """
+        Alternative constructor from the parts of the nodes
+        :param name: the name of the tree
+        :param root: the id of the root node
+        :param nodes: the key, title, id, attributes, children and digest of every node, the attributes are kept
+        :return: the CompactTree with the nodes
+        """
+        compact = cls(name, root)
+        children_lists = []
+        for slot, (key, title, node_id, attributes, children, digest) in enumerate(nodes):
+            compact.ids.append(key)
+            compact.slots[key] = slot
+            if node_id != key:
+                compact.node_ids[slot] = node_id
+            code = compact.title_codes.get(title)
+            if code is None:
+                code = compact.title_codes[title] = len(compact.titles)
+                compact.titles.append(title)
+            compact.type_codes.append(code)
+            compact.attributes.append(attributes)
+            compact.digests.append(digest)
+            children_lists.append(children)
+        slots = compact.slots
+        for children in children_lists:
+            for child_id in children:
+                child = slots.get(child_id)
+                if child is None:
+                    compact.dangling[len(compact.child_slots)] = child_id
+                    child = cls.NO_NODE
+                compact.child_slots.append(child)
+            compact.child_offsets.append(len(compact.child_slots))
+        return compact
+
+    @classmethod
+    def from_tree(cls, tree: Tree):
+        """
+        Alternative constructor that converts a Tree, the digests the nodes already have are kept
+        :param tree: the tree to convert
+        :return: the CompactTree with the same nodes
+        """
+        return cls.from_parts(tree.name, tree.root,
+                              ((key, node.title, node.id, copy_value(node.attributes), node.children, node._digest)
+                               for key, node in tree.nodes.items()))
+
+    @classmethod
+    def from_json(cls, file: Dict[str, Any]):
+        """
+        Alternative constructor from a tree in json representation, checks the json like Tree.from_json
+        without creating nodes
+        :param file: a python dictionary containing a tree file
+        :raises InvalidTreeJsonFormatException: when the json is not a valid tree
+        :return: the CompactTree
+        """
+        name, tree = Tree.check_json(file)
+
+        def parts(key: str, node: Dict[str, Any]) -> Tuple[str, str, str, Dict[str, Any], List[str], None]:
+            title, node_id, attributes, children = Node.json_parts(node)
+            return key, title, node_id, attributes, children if children else [], None
+        return cls.from_parts(name, tree.get('root'), [parts(key, node) for key, node in tree.get('nodes').items()])
+
+    def pack(self) -> str:
+        """
+        Serializes the tree compactly to send it to another process, with the digests of the nodes so they do not
+        have to be calculated again. The children are sent as slots, so every id is only sent once
+        :return: json text of the tree
+        """
+        digests = [str(self.digest(slot)) for slot in range(len(self.ids))]
+        return json.dumps([self.name, self.root, self.ids, list(self.node_ids.items()), self.titles,
+                           self.type_codes.tolist(), self.attributes, digests, self.child_offsets.tolist(),
+                           self.child_slots.tolist(), list(self.dangling.items())], separators=(',', ':'))
+
+    @classmethod
+    def unpack(cls, packed: str):
+        """
+        Restores a tree serialized by pack
+        :param packed: the serialized tree
+        :return: the CompactTree
+        """
+        name, root, ids, node_ids, titles, type_codes, attributes, digests, child_offsets, child_slots, dangling = \
+            json.loads(packed)
+        compact = cls(name, root)
+        compact.ids = ids
+        compact.slots = {key: slot for slot, key in enumerate(ids)}
+        compact.node_ids = dict(node_ids)
+        compact.titles = titles
+        compact.title_codes = {title: code for code, title in enumerate(titles)}
+        compact.type_codes = array('i', type_codes)
+        compact.attributes = attributes
+        compact.digests = [int(digest) for digest in digests]
+        compact.child_offsets = array('i', child_offsets)
+        compact.child_slots = array('i', child_slots)
+        compact.dangling = dict(dangling)
+        return compact
+
+    def to_tree(self) -> Tree:
+        """
+        Converts the CompactTree back into a Tree, the nodes get the digests that are already calculated
+        :return: the Tree with the same nodes
+        """
+        nodes = {}
+        ids, titles, node_ids, dangling = self.ids, self.titles, self.node_ids, self.dangling
+        offsets, child_slots = self.child_offsets.tolist(), self.child_slots.tolist()
+        for slot, (key, code, attributes, digest) in enumerate(zip(ids, self.type_codes, self.attributes,
+                                                                  self.digests)):
+            if dangling:
+                children = self.children_ids(slot)
+            else:
+                children = [ids[child] for child in child_slots[offsets[slot]:offsets[slot + 1]]]
+            node = Node.__new__(Node)
+            node.__setstate__({'title': titles[code], 'id': node_ids.get(slot, key), 'attributes': attributes,
+                               'children': children, 'digest': digest})
+            nodes[key] = node
+        return Tree(self.name, self.root, nodes)
+
+    def create_json(self) -> Dict[str, Any]:
+        """
+        Creates the same JSON representation as Tree.create_json
+        :return: a JSON representation of the tree stored in a dict
+        """
+        nodes: Dict[str, Dict[str, Any]] = {}
+        for slot, key in enumerate(self.ids):
+            node = copy_value(self.attributes[slot])
+            node['id'] = self.node_id(slot)
+            node['title'] = self.titles[self.type_codes[slot]]
+            children = self.children_ids(slot)
+            if len(children) > 0:
+                node['children'] = children
+            nodes[key] = node
+        tree = {'title': self.name, 'root': self.root, 'nodes': nodes}
+        return {"name": self.name, "data": {"trees": [tree]}}
+
+    def children_ids(self, slot: int) -> List[str]:
+        """
+        Returns the ids of the children of a node in their original order, including children that do not exist
+        :param slot: the slot of the node
+        :return: a list with the child ids
+        """
+        result = []
+        for position in range(self.child_offsets[slot], self.child_offsets[slot + 1]):
+            child = self.child_slots[position]
+            result.append(self.dangling[position] if child == self.NO_NODE else self.ids[child])
+        return result
+
+    @property
+    def parent(self) -> array:
+        """
+        The slot of the first parent of each slot, NO_NODE for nodes without a parent
+        """
+        return self.links()[0]
+
+    @property
+    def first_child(self) -> array:
+        """
+        The slot of the first child each slot is the first parent of, NO_NODE if there is none
+        """
+        return self.links()[1]
+
+    @property
+    def next_sibling(self) -> array:
+        """
+        The slot of the next child of the first parent of each slot, NO_NODE if there is none
+        """
+        return self.links()[2]
+
+    def links(self) -> Tuple[array, array, array]:
+        """
+        Links every node to its first parent, the children of a parent are linked through their first child and
+        next sibling. Made the first time they are used
+        :return: the parent, first child and next sibling arrays
+        """
+        if self._links is not None:
+            return self._links
+        size = len(self.ids)
+        parent = array('i', [self.NO_NODE]) * size
+        first_child = array('i', [self.NO_NODE]) * size
+        next_sibling = array('i', [self.NO_NODE]) * size
+        # last child linked to each slot, used to append siblings
+        last_child = array('i', [self.NO_NODE]) * size
+        offsets, child_slots = self.child_offsets, self.child_slots
+        for slot in range(size):
+            for position in range(offsets[slot], offsets[slot + 1]):
+                child = child_slots[position]
+                # the first parent wins, like the parent index of Tree
+                if child == self.NO_NODE or parent[child] != self.NO_NODE or child == slot:
+                    continue
+                parent[child] = slot
+                if last_child[slot] == self.NO_NODE:
+                    first_child[slot] = child
+                else:
+                    next_sibling[last_child[slot]] = child
+                last_child[slot] = child
+        self._links = (parent, first_child, next_sibling)
+        return self._links
+
+    def slot(self, node_id: str) -> int:
+        """
+        Returns the slot of a node
+        :param node_id: the id of the node
+        :return: the slot, or NO_NODE if the node does not exist
+        """
+        return self.slots.get(node_id, self.NO_NODE)
+
+    def root_slot(self) -> int:
+        """
+        Returns the slot of the root node, NO_NODE if the root does not exist
+        """
+        return self.slot(self.root)
+
+    def node_id(self, slot: int) -> str:
+        """
+        Returns the id stored in the node in a slot, which is its key unless the tree file says otherwise
+        :param slot: the slot of the node
+        """
+        return self.node_ids.get(slot, self.ids[slot])
+
+    def title(self, slot: int) -> str:
+        """
+        Returns the title of the node in a slot
+        :param slot: the slot of the node
+        """
+        return self.titles[self.type_codes[slot]]
+
+    def digest(self, slot: int) -> int:
+        """
+        Returns the digest of the node in a slot, the same as the digest of the node in the Tree
+        :param slot: the slot of the node
+        """
+        digest = self.digests[slot]
+        if digest is None:
+            digest = self.digests[slot] = content_hash(self.title(slot), self.node_id(slot), self.attributes[slot],
+                                                       self.children_ids(slot))
+        return digest
+
+    def first_revisit(self) -> int:
+        """
+        Walks from the root like Verification.contains_cycles does, with the last child first, and finds the first
+        node that is reached again. Such a node is in a cycle or is the child of multiple nodes
+        :return: the slot of the node, NO_NODE if every node is reached once or the root does not exist
+        """
+        start = self.root_slot()
+        if start == self.NO_NODE:
+            return self.NO_NODE
+        seen = bytearray(len(self.ids))
+        stack = [start]
+        offsets, child_slots = self.child_offsets, self.child_slots
+        while stack:
+            slot = stack.pop()
+            if seen[slot]:
+                return slot
+            seen[slot] = 1
+            for position in range(offsets[slot], offsets[slot + 1]):
+                child = child_slots[position]
+                if child != self.NO_NODE:
+                    stack.append(child)
+        return self.NO_NODE
+
+    def reachable(self, start: int = None) -> bytearray:
+        """
+        Marks all nodes that can be reached from a node by following the children
+        :param start: the slot to start from, defaults to the root
+        :return: a bytearray with a 1 for each reachable slot
+        """
+        if start is None:
+            start = self.root_slot()
+        seen = bytearray(len(self.ids))
+        if start == self.NO_NODE:
+            return seen
+        seen[start] = 1
+        stack = [start]
+        offsets, child_slots = self.child_offsets, self.child_slots
+        while stack:
+            slot = stack.pop()
+            for position in range(offsets[slot], offsets[slot + 1]):
+                child = child_slots[position]
+                if child != self.NO_NODE and not seen[child]:
+                    seen[child] = 1
+                    stack.append(child)
+        return seen
+
+    def unreachable_ids(self) -> List[str]:
+        """
+        Returns the ids of all nodes that can not be reached from the root
+        """
+        seen = self.reachable()
+        return [node_id for slot, node_id in enumerate(self.ids) if not seen[slot]]
+
+    def breadth_first_order(self, start: int = None):
+        """
+        Lists the nodes below a node in breadth first order. A node that is the child of multiple
+        nodes is only visited from the first of them that is reached
+        :param start: the slot to start from, defaults to the root
+        :return: an array with the slots and an array with the parent each slot was reached from
+        """
+        if start is None:
+            start = self.root_slot()
+        order = array('i')
+        reached_from = array('i', [self.NO_NODE]) * len(self.ids)
+        if start == self.NO_NODE:
+            return order, reached_from
+        seen = bytearray(len(self.ids))
+        seen[start] = 1
+        order.append(start)
+        offsets, child_slots = self.child_offsets, self.child_slots
+        index = 0
+        while index < len(order):
+            slot = order[index]
+            for position in range(offsets[slot], offsets[slot + 1]):
+                child = child_slots[position]
+                if child != self.NO_NODE and not seen[child]:
+                    seen[child] = 1
+                    reached_from[child] = slot
+                    order.append(child)
+            index += 1
+        return order, reached_from
+
+    def depths(self) -> array:
+        """
+        Calculates the depth of each node below the root
+        :return: an array with the depth of each slot, NO_NODE for nodes that are not below the root
+        """
+        depth = array('i', [self.NO_NODE]) * len(self.ids)
+        order, reached_from = self.breadth_first_order()
+        if len(order) > 0:
+            depth[order[0]] = 0
+        for slot in order[1:]:
+            depth[slot] = depth[reached_from[slot]] + 1
+        return depth
+
+    def subtree_sizes(self) -> array:
+        """
+        Calculates the number of nodes in the subtree of each node below the root, including the node itself
+        :return: an array with the size for each slot, 0 for nodes that are not below the root
+        """
+        size = array('i', [0]) * len(self.ids)
+        order, reached_from = self.breadth_first_order()
+        # children come after their parents in breadth first order, so add the sizes in reverse
+        for slot in reversed(order):
+            size[slot] += 1
+            if reached_from[slot] != self.NO_NODE:
+                size[reached_from[slot]] += size[slot]
+        return size
+
+    def properties(self, slot: int) -> Union[Dict[str, Any], None]:
+        """
+        Returns the properties of the node in a slot if it exists
+        :param slot: the slot of the node
+        """
+        return self.attributes[slot].get('properties')
+
+    def inherited_roles(self) -> List[Union[str, None]]:
+        """
+        Determines the ROLE property each node below the root should have. The first node on the path
+        from the root with a ROLE property decides the role of all nodes below it
+        :return: a list with the role for each slot, None if no role is inherited or set
+        """
+        roles: List[Union[str, None]] = [None] * len(self.ids)
+        order, reached_from = self.breadth_first_order()
+        for slot in order:
+            role = roles[reached_from[slot]] if reached_from[slot] != self.NO_NODE else None
+            if role is None:
+                properties = self.properties(slot)
+                if properties and "ROLE" in properties:
+                    role = properties["ROLE"]
+            roles[slot] = role
+        return roles
+
+    def __len__(self):
+        """
+        The number of nodes in the tree
+        """
+        return len(self.ids)
+
+    def __eq__(self, other):
+        """
+        Equality operator, compares the JSON representation
+        """
+        return isinstance(other, self.__class__) and self.create_json() == other.create_json()
+
+    def __repr__(self):
+        """
+        internal representation
+        """
+        return str(self.create_json())
@@ -1,11 +1,124 @@
+import atexit
+import json
 import logging
+import os
+import threading
+from copy import deepcopy
 from pathlib import Path, PurePosixPath
-from typing import Any, Dict
+from typing import Any, Dict, Tuple, Union
 
-from controller.utils import read_json, write_json
+from controller.utils import read_json, write_file_atomic
 from model.exceptions import SettingNotFoundException
 
 
+class SettingsStore:
+    """
+    Process wide cache of settings files. A file is only read again when its modification time or size
+    changed, changes are visible in the cache immediately and written to the file in the background,
+    multiple changes shortly after each other are written at once.
+    """
+    logger = logging.getLogger("settings_store")
+    # seconds to wait for more changes before a file is written
+    WRITE_DELAY = 0.2
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # serializes the writes, so an older version of a file never overwrites a newer one
+        self.write_lock = threading.Lock()
+        # path -> ((size, modification time) of the file when read, the settings)
+        self.cache: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+        # path -> the settings that still have to be written to the file
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.timers: Dict[str, threading.Timer] = {}
+
+    @staticmethod
+    def key(path: Path) -> str:
+        """
+        The absolute path of a settings file, so relative and absolute paths share the cache
+        """
+        return os.path.abspath(str(path))
+
+    @staticmethod
+    def version(path: str) -> Tuple[int, int]:
+        """
+        The size and modification time of a file, like the stamps of the files of a collection,
+        when either changes the file is read again
+        """
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def read(self, path: Path) -> Dict[str, Any]:
+        """
+        Returns the settings of a file, the file is only read when it changed since the last read
+        :param path: the path of the settings file
+        :return: the settings, should not be changed by the caller
+        """
+        key = SettingsStore.key(path)
+        with self.lock:
+            if key in self.pending:
+                # the cache is newer than the file
+                return self.cache[key][1]
+            version = SettingsStore.version(key)
+            cached = self.cache.get(key)
+            if cached is None or cached[0] != version:
+                cached = (version, read_json(Path(key)))
+                self.cache[key] = cached
+            return cached[1]
+
+    def write(self, path: Path, setting: str, value: Any):
+        """
+        Changes a setting in the cache and schedules writing the file
+        :param path: the path of the settings file
+        :param setting: the name of the setting
+        :param value: the new value
+        """
+        key = SettingsStore.key(path)
+        with self.lock:
+            settings = dict(self.read(path))
+            settings[setting] = value
+            self.cache[key] = (self.cache[key][0], settings)
+            self.pending[key] = settings
+            if key not in self.timers:
+                timer = threading.Timer(SettingsStore.WRITE_DELAY, self.flush_path, (key,))
+                timer.daemon = True
+                self.timers[key] = timer
+                timer.start()
+
+    def flush_path(self, key: str):
+        """
+        Writes the pending settings of one file
+        :param key: the absolute path of the settings file
+        """
+        with self.write_lock:
+            with self.lock:
+                self.timers.pop(key, None)
+                settings = self.pending.get(key)
+            if settings is None:
+                return
+            try:
+                write_file_atomic(Path(key), json.dumps(settings, indent=2, sort_keys=True).encode())
+            except OSError as error:
+                SettingsStore.logger.error("Could not write settings file {}: {}".format(key, error))
+            with self.lock:
+                # the settings could have changed again while writing, those are written by the next timer
+                if self.pending.get(key) is settings:
+                    del self.pending[key]
+                    if os.path.exists(key):
+                        self.cache[key] = (SettingsStore.version(key), settings)
+
+    def flush(self):
+        """
+        Writes all pending settings now
+        """
+        with self.lock:
+            keys = list(self.pending.keys())
+            timers = [self.timers.pop(key) for key in keys if key in self.timers]
+        for timer in timers:
+            timer.cancel()
+        for key in keys:
+            self.flush_path(key)
+
+
 class Settings:
     """
     Global class for storing the path of the settings file.
@@ -13,6 +126,7 @@ class Settings:
     """
     SETTINGS_PATH: Path = Path('config/settings.json')
     logger = logging.getLogger("settings")
+    store = SettingsStore()
 
     @staticmethod
     def query_setting(setting: str, caller: str, path: Path = None) -> Any:
@@ -27,12 +141,14 @@ class Settings:
         # set path default value when not initialized
         if not path:
             path = Settings.SETTINGS_PATH
-        settings: Dict[str, Any] = read_json(path)
+        settings: Dict[str, Any] = Settings.store.read(path)
         if setting not in settings.keys():
             # If the setting doesn't exist, log the error and return None
             Settings.logger.error("Invalid setting " + "\'" + setting + "\'" + " queried by " + caller + ".")
             raise SettingNotFoundException
-        return settings[setting]
+        value = settings[setting]
+        # lists and dictionaries are copied, so changes by the caller do not end up in the cache
+        return deepcopy(value) if isinstance(value, (list, dict)) else value
 
     @staticmethod
     def alter_setting(setting: str, val: Any, caller: str, path: Path = None):
@@ -47,14 +163,20 @@ class Settings:
         # set path default value when not initialized
         if not path:
             path = Settings.SETTINGS_PATH
-        settings: Dict[str, Any] = read_json(path)
+        settings: Dict[str, Any] = Settings.store.read(path)
         if setting not in settings.keys():
             # If the setting doesn't exist, log the error and change nothing
             Settings.logger.error("Invalid setting " + "\'" + setting + "\'" + " accessed by " + caller + ".")
             raise SettingNotFoundException
-        # Update the corresponding setting in the settings dict and also the settings JSON
-        settings[setting] = val
-        write_json(path, settings)
+        # Update the corresponding setting in the cache, the settings JSON is written in the background
+        Settings.store.write(path, setting, deepcopy(val))
+
+    @staticmethod
+    def flush():
+        """
+        Writes the settings that were altered but not written to the settings file yet
+        """
+        Settings.store.flush()
 
     @staticmethod
     def default_node_types_folder() -> Path:
@@ -122,6 +244,69 @@ class Settings:
         """
         Settings.alter_setting("default_id_size", int_size, "settings")
 
+    @staticmethod
+    def lazy_collection_loading() -> bool:
+        """
+        Queries if only the headers of the trees of a collection are read when it is opened
+        """
+        return Settings.query_setting("lazy_collection_loading", "settings")
+
+    @staticmethod
+    def alter_lazy_collection_loading(enable: bool):
+        """
+        Updates if only the headers of the trees of a collection are read when it is opened
+        :param enable: enable or disable the setting
+        """
+        Settings.alter_setting("lazy_collection_loading", enable, "settings")
+
+    @staticmethod
+    def max_loaded_nodes() -> int:
+        """
+        Queries the number of nodes of a lazily loaded collection that are kept in memory
+        """
+        return Settings.query_setting("max_loaded_nodes", "settings")
+
+    @staticmethod
+    def alter_max_loaded_nodes(nodes: int):
+        """
+        Updates the number of nodes of a lazily loaded collection that are kept in memory
+        :param nodes: the number of nodes
+        """
+        Settings.alter_setting("max_loaded_nodes", nodes, "settings")
+
+    @staticmethod
+    def collection_cache_folder() -> Union[Path, None]:
+        """
+        Queries the folder with the cache files of the collections, a leading ~ is the home directory of the user
+        :return: the folder, None if the collections are not cached
+        """
+        folder = Settings.query_setting("collection_cache_folder", "settings")
+        return Path(folder).expanduser() if folder else None
+
+    @staticmethod
+    def alter_collection_cache_folder(path: Union[Path, None]):
+        """
+        Updates the folder with the cache files of the collections
+        :param path: the folder, None to not cache the collections
+        """
+        Settings.alter_setting("collection_cache_folder", PurePosixPath(path).as_posix() if path else '', "settings")
+
+    @staticmethod
+    def collection_watch_interval() -> int:
+        """
+        Queries the milliseconds between two checks for changes to the files of the open collection
+        :return: the interval, 0 if the files are not watched
+        """
+        return Settings.query_setting("collection_watch_interval", "settings")
+
+    @staticmethod
+    def alter_collection_watch_interval(interval: int):
+        """
+        Updates the milliseconds between two checks for changes to the files of the open collection
+        :param interval: the interval, 0 to not watch the files
+        """
+        Settings.alter_setting("collection_watch_interval", interval, "settings")
+
     @staticmethod
     def default_logfile_name():
         """
@@ -153,3 +338,7 @@ class Settings:
                             datefmt='%m-%d %H:%M',
                             filename=Settings.default_logfile_name(),
                             filemode='a')
+
+
+# the settings altered just before the program exits are written as well
+atexit.register(Settings.flush)
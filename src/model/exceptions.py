@@ -24,3 +24,17 @@ class SettingNotFoundException(Exception):
     Exception when a non-existent setting is queried or altered
     """
     pass
+
+
+class VerificationCancelledException(Exception):
+    """
+    Is raised when a verification is cancelled because a newer version of the tree has to be verified
+    """
+    pass
+
+
+class IdSpaceExhaustedException(Exception):
+    """
+    Is raised when no more unused ids of the configured size can be generated
+    """
+    pass
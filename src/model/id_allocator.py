@@ -0,0 +1,147 @@
+import logging
+import os
+import secrets
+import string
+from collections import Counter
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+from model.config import Settings
+from model.exceptions import IdSpaceExhaustedException
+
+ID_CHARS = string.ascii_lowercase + string.digits
+
+
+@lru_cache(maxsize=8)
+def translation(chars: str) -> Tuple[bytes, bytes]:
+    """
+    Translation table that maps random bytes to the characters of an id
+    :param chars: the characters an id can contain, at most 256 ascii characters
+    :return: the table and the bytes to delete, the bytes above the last full round of the characters are
+             deleted so every character is equally likely
+    """
+    limit = 256 - 256 % len(chars)
+    table = bytes(ord(chars[byte % len(chars)]) for byte in range(256))
+    return table, bytes(range(limit, 256))
+
+
+def random_ids(count: int, size: int, chars: str = ID_CHARS) -> List[str]:
+    """
+    Generates random ids with the randomness of all ids read from the operating system at once
+    :param count: the number of ids
+    :param size: the size of every id
+    :param chars: the characters an id can contain
+    :return: a list with the ids, they are not checked for duplicates
+    """
+    if len(chars) > 256 or not chars.isascii():
+        return [''.join(secrets.choice(chars) for _ in range(size)) for _ in range(count)]
+    table, delete = translation(chars)
+    needed = count * size
+    text = b''
+    while len(text) < needed:
+        missing = needed - len(text)
+        # read some bytes extra for the deleted ones, so another round is rarely necessary
+        text += os.urandom(missing + missing // 4 + 16).translate(table, delete)
+    text = text[:needed].decode('ascii')
+    return [text[index:index + size] for index in range(0, needed, size)]
+
+
+class IdAllocator:
+    """
+    Keeps track of the node ids used in a collection and hands out new ids that are not used yet.
+    Ids are generated in batches, an id that was handed out is reserved until a node with it is added
+    or until it is released.
+    """
+    logger = logging.getLogger("id_allocator")
+    # number of ids generated at once when fewer ids are requested
+    BATCH_SIZE = 64
+    # number of generated ids in a row that are already in use before the ids are considered used up
+    MAX_COLLISIONS = 1000
+
+    def __init__(self, size: int = None, chars: str = ID_CHARS):
+        """
+        Constructor of the IdAllocator
+        :param size: the size of the ids, default from settings
+        :param chars: the characters of the ids
+        """
+        self._size = size
+        self.chars = chars
+        # number of trees containing each id, the same id can be in multiple trees
+        self.counts = Counter()
+        # ids that were handed out but are not in a tree yet
+        self.reserved = set()
+        # generated ids that were not handed out yet
+        self.pool: List[str] = []
+
+    @property
+    def size(self) -> int:
+        """
+        The size of the ids, read from the settings once
+        """
+        if not self._size:
+            self._size = Settings.query_setting("default_id_size", "IdAllocator")
+        return self._size
+
+    def register(self, node_ids: Iterable[str]):
+        """
+        Marks ids as used by the nodes of a tree
+        :param node_ids: the ids of the nodes
+        """
+        for node_id in node_ids:
+            self.counts[node_id] += 1
+            self.reserved.discard(node_id)
+
+    def release(self, node_ids: Iterable[str]):
+        """
+        Marks ids as no longer used by the nodes of a tree, ids that were handed out but never used are free again
+        :param node_ids: the ids of the nodes
+        """
+        for node_id in node_ids:
+            self.reserved.discard(node_id)
+            count = self.counts.get(node_id, 0)
+            if count > 1:
+                self.counts[node_id] = count - 1
+            else:
+                self.counts.pop(node_id, None)
+
+    def allocate(self, count: int = 1) -> List[str]:
+        """
+        Hands out ids that are not used in the collection and were not handed out before
+        :param count: the number of ids
+        :return: a list with the ids
+        :raises IdSpaceExhaustedException: if not enough unused ids of the size are left
+        """
+        if len(self.counts) + len(self.reserved) + count > len(self.chars) ** self.size:
+            raise IdSpaceExhaustedException("Not enough unused ids of size {} left for {} ids"
+                                            .format(self.size, count))
+        result = []
+        collisions = 0
+        while len(result) < count:
+            if not self.pool:
+                self.pool = random_ids(max(count - len(result), IdAllocator.BATCH_SIZE), self.size, self.chars)
+            node_id = self.pool.pop()
+            if node_id in self:
+                IdAllocator.logger.debug("Generated id {} is already in use".format(node_id))
+                collisions += 1
+                if collisions >= IdAllocator.MAX_COLLISIONS:
+                    # the ids handed out so far are not used
+                    self.reserved.difference_update(result)
+                    raise IdSpaceExhaustedException("Almost all ids of size {} are in use".format(self.size))
+                continue
+            collisions = 0
+            self.reserved.add(node_id)
+            result.append(node_id)
+        return result
+
+    def allocate_one(self) -> str:
+        """
+        Hands out a single id that is not used in the collection
+        :return: the id
+        """
+        return self.allocate(1)[0]
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self.counts or node_id in self.reserved
+
+    def __len__(self) -> int:
+        return len(self.counts)
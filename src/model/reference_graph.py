@@ -0,0 +1,190 @@
+import logging
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+from model.traversal import strongly_connected_components
+from model.tree import Tree, TreeHeader
+
+
+class StructureSummary:
+    """
+    The result of the Strategy -> Tactic -> Role structure check of a tree that a leaf node refers to,
+    for the node types passed before the tree was entered. Everything a verification needs to use the
+    result instead of walking the tree again.
+    """
+    __slots__ = ('errors', 'queries', 'followed_trees')
+
+    def __init__(self, errors: List[str], queries: List[Tuple[str, Any]], followed_trees: List[Tree]):
+        """
+        Constructor of the StructureSummary
+        :param errors: the errors of the check
+        :param queries: the (name of the method, argument) questions the check asked the collection
+        :param followed_trees: the trees the check walked, once for every node it checked in them
+        """
+        self.errors = tuple(errors)
+        self.queries = tuple(queries)
+        # every tree once, in the order they were walked
+        self.followed_trees = tuple({id(tree): tree for tree in followed_trees}.values())
+
+
+class ReferenceGraph:
+    """
+    The references between the trees of a collection. A leaf node with a name refers to the tree with that
+    name, like a strategy to its tactics and a tactic to its roles, the structure check follows them.
+    Keeps summaries of the structure checks of referred trees, so a tactic used by many strategies is only
+    walked once. A summary is dropped when a tree it can reach changes, the references of a tree are only
+    found again after it changed.
+    """
+    logger = logging.getLogger("reference_graph")
+
+    def __init__(self, collection):
+        """
+        Constructor of the ReferenceGraph
+        :param collection: the collection with the trees
+        """
+        self.collection = collection
+        # the version of the indexes of the collection the graph is up to date with
+        self.index_version = collection.index_version
+        # name -> the names the tree with that name refers to
+        self.references: Dict[str, frozenset] = {}
+        # names of the trees that changed since the graph was last used
+        self.changed_names = set()
+        # the strongly connected components of the graph and the names reachable from every name, built when needed
+        self._components: List[List[str]] = None
+        self.reachable_names: Dict[str, frozenset] = {}
+        # name -> key -> the summary of the tree entered in the state of the key
+        self.summaries: Dict[str, Dict[Tuple, StructureSummary]] = {}
+
+    @staticmethod
+    def tree_references(tree: Tree) -> frozenset:
+        """
+        The names of the trees a tree refers to, like the structure check follows them
+        :param tree: the tree
+        :return: the names of the leaf nodes with a name, except the ones titled like the tree itself
+        """
+        return frozenset(node.attributes['name'] for node in tree.nodes.values()
+                         if len(node.children) == 0 and type(node.attributes.get('name')) == str
+                         and node.title != tree.name)
+
+    def tree_changed(self, name: str):
+        """
+        Called by the collection when a tree changed, the graph is updated when it is used next
+        :param name: the name of the tree
+        """
+        self.changed_names.add(name)
+
+    def update(self):
+        """
+        Brings the graph up to date with the collection, drops the summaries that depend on changed trees
+        """
+        if self.index_version != self.collection.index_version:
+            # trees were added, removed, renamed or got another root, so names and roots can mean other trees
+            self.index_version = self.collection.index_version
+            self.references = {}
+            self.summaries = {}
+            self.changed_names = set()
+        elif self.changed_names:
+            changed, self.changed_names = self.changed_names, set()
+            # the summaries were made with the references from before the change
+            for name in self.dependents(changed):
+                self.summaries.pop(name, None)
+            for name in changed:
+                self.references.pop(name, None)
+        else:
+            return
+        self._components = None
+        self.reachable_names = {}
+
+    def refers_to(self, name: str) -> frozenset:
+        """
+        The names the tree with a name refers to
+        :param name: the name of the tree
+        :return: the names, empty if there is no tree with the name
+        """
+        references = self.references.get(name)
+        if references is None:
+            # the header of a tree that is not read yet knows its references
+            entry = self.collection.find_entry_by_name(name)
+            if entry is None:
+                references = frozenset()
+            elif type(entry[1]) is TreeHeader:
+                references = entry[1].references
+            else:
+                references = ReferenceGraph.tree_references(entry[1])
+            self.references[name] = references
+        return references
+
+    def components(self) -> List[List[str]]:
+        """
+        The strongly connected components of the graph, a component comes after the ones it refers to
+        """
+        self.update()
+        if self._components is None:
+            self._components = strongly_connected_components(list(self.collection.names.keys()), self.refers_to)
+        return self._components
+
+    def cycles(self) -> List[List[str]]:
+        """
+        The groups of trees that refer to each other, the structure check stops following a reference
+        into a tree that it already followed into on the path
+        :return: the sorted names of every group
+        """
+        return [sorted(component) for component in self.components()
+                if len(component) > 1 or component[0] in self.refers_to(component[0])]
+
+    def reachable(self, name: str) -> frozenset:
+        """
+        The names of the trees that can be reached from a tree by following the references
+        :param name: the name of the tree
+        :return: the names, including the name itself
+        """
+        self.update()
+        if not self.reachable_names:
+            for component in self.components():
+                # the components the component refers to come first, so they are done already
+                reachable = set(component)
+                for member in component:
+                    for reference in self.refers_to(member):
+                        reachable.update(self.reachable_names.get(reference, (reference,)))
+                reachable = frozenset(reachable)
+                for member in component:
+                    self.reachable_names[member] = reachable
+        return self.reachable_names.get(name, frozenset((name,)))
+
+    def dependents(self, names: Iterable[str]) -> set:
+        """
+        The trees that refer to any of the trees with the names, directly or through other trees
+        :param names: the names of the trees
+        :return: the names of the trees that depend on them, including the names themselves
+        """
+        referred_by = {}
+        for name in list(self.collection.names.keys()):
+            for reference in self.refers_to(name):
+                referred_by.setdefault(reference, []).append(name)
+        dependents = set(names)
+        to_visit = list(dependents)
+        while to_visit:
+            for dependent in referred_by.get(to_visit.pop(), ()):
+                if dependent not in dependents:
+                    dependents.add(dependent)
+                    to_visit.append(dependent)
+        return dependents
+
+    def summary(self, name: str, key: Tuple) -> Union[StructureSummary, None]:
+        """
+        Looks up the summary of the structure check of a tree
+        :param name: the name of the tree
+        :param key: the state the tree is entered in
+        :return: the summary, None if it is not known
+        """
+        self.update()
+        return self.summaries.get(name, {}).get(key)
+
+    def store_summary(self, name: str, key: Tuple, summary: StructureSummary):
+        """
+        Stores the summary of the structure check of a tree
+        :param name: the name of the tree
+        :param key: the state the tree was entered in
+        :param summary: the summary
+        """
+        self.update()
+        self.summaries.setdefault(name, {})[key] = summary
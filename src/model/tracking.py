@@ -0,0 +1,572 @@
+import sys
+from typing import Any, Dict, List, Union
+
+
+class ChildList(list):
+    """
+    List with the children ids of a node that reports every change to the node owning it.
+    Makes sure the indexes of the tree stay correct, also when the list is changed in place.
+    """
+
+    __slots__ = ('node',)
+
+    def __init__(self, node, children=()):
+        """
+        Constructor of the ChildList
+        :param node: the node owning the list
+        :param children: the initial child ids
+        """
+        super().__init__(children)
+        self.node = node
+
+    def prepare(self) -> List[str]:
+        """
+        Tells the owning node the list is about to change
+        :return: the children before the change
+        """
+        if self.node is not None:
+            self.node.will_change()
+        return list(self)
+
+    def notify(self, old: List[str]):
+        """
+        Reports a change of the list to the owning node
+        :param old: the children before the change
+        """
+        if self.node is not None:
+            self.node.children_changed(old)
+
+    def append(self, child_id):
+        old = self.prepare()
+        super().append(child_id)
+        self.notify(old)
+
+    def extend(self, child_ids):
+        old = self.prepare()
+        super().extend(child_ids)
+        self.notify(old)
+
+    def insert(self, index, child_id):
+        old = self.prepare()
+        super().insert(index, child_id)
+        self.notify(old)
+
+    def remove(self, child_id):
+        old = self.prepare()
+        super().remove(child_id)
+        self.notify(old)
+
+    def pop(self, index=-1):
+        old = self.prepare()
+        child_id = super().pop(index)
+        self.notify(old)
+        return child_id
+
+    def clear(self):
+        old = self.prepare()
+        super().clear()
+        self.notify(old)
+
+    def sort(self, *args, **kwargs):
+        old = self.prepare()
+        super().sort(*args, **kwargs)
+        self.notify(old)
+
+    def reverse(self):
+        old = self.prepare()
+        super().reverse()
+        self.notify(old)
+
+    def __setitem__(self, index, value):
+        old = self.prepare()
+        super().__setitem__(index, value)
+        self.notify(old)
+
+    def __delitem__(self, index):
+        old = self.prepare()
+        super().__delitem__(index)
+        self.notify(old)
+
+    def __iadd__(self, child_ids):
+        old = self.prepare()
+        super().__iadd__(child_ids)
+        self.notify(old)
+        return self
+
+    def __reduce_ex__(self, protocol):
+        """
+        Copies and pickles of the list are plain lists, the owner is not copied along
+        """
+        return list, (list(self),)
+
+
+class AttributeMap(dict):
+    """
+    Dictionary with the attributes of a node that reports every change to the node owning it.
+    Keys are interned and a properties dictionary is stored as a PropertyMap, so changes
+    to the properties are reported as well.
+    """
+
+    __slots__ = ('node',)
+
+    def __init__(self, node, attributes: Dict[str, Any] = None):
+        """
+        Constructor of the AttributeMap, the attributes are copied
+        :param node: the node owning the attributes
+        :param attributes: the initial attributes
+        """
+        super().__init__()
+        self.node = node
+        for key, value in (attributes.items() if attributes else ()):
+            super().__setitem__(self.intern(key), self.wrap(key, value))
+
+    @staticmethod
+    def intern(key):
+        """
+        Interns string keys, so equal keys of different nodes share the same string object
+        """
+        return sys.intern(key) if type(key) == str else key
+
+    def wrap(self, key, value):
+        """
+        Converts the properties dictionary to a PropertyMap and other dictionaries and lists to copies that report
+        their changes, owned by the same node
+        """
+        if key == 'properties' and isinstance(value, dict):
+            return PropertyMap(self.node, value)
+        return wrap_value(self.node, value)
+
+    def prepare(self):
+        """
+        Tells the owning node the dictionary is about to change
+        """
+        if self.node is not None:
+            self.node.will_change()
+
+    def notify(self):
+        """
+        Reports a change to the owning node
+        """
+        if self.node is not None:
+            self.node.content_changed()
+
+    def __setitem__(self, key, value):
+        self.prepare()
+        super().__setitem__(self.intern(key), self.wrap(key, value))
+        self.notify()
+
+    def __delitem__(self, key):
+        self.prepare()
+        super().__delitem__(key)
+        self.notify()
+
+    def pop(self, key, *default):
+        if key not in self:
+            return super().pop(key, *default)
+        self.prepare()
+        value = super().pop(key)
+        self.notify()
+        return value
+
+    def popitem(self):
+        self.prepare()
+        item = super().popitem()
+        self.notify()
+        return item
+
+    def setdefault(self, key, value=None):
+        if key not in self:
+            self[key] = value
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        self.prepare()
+        for key, value in dict(*args, **kwargs).items():
+            super().__setitem__(self.intern(key), self.wrap(key, value))
+        self.notify()
+
+    def clear(self):
+        self.prepare()
+        super().clear()
+        self.notify()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __reduce_ex__(self, protocol):
+        """
+        Copies and pickles of the dictionary are plain dictionaries, the owner is not copied along
+        """
+        return dict, (dict(self),)
+
+
+class ValueMap(AttributeMap):
+    """
+    Dictionary nested in the attributes of a node that reports every change to the node owning it, so a value
+    changed in place changes the digest of the node as well
+    """
+
+    __slots__ = ()
+
+    def wrap(self, key, value):
+        return wrap_value(self.node, value)
+
+
+class PropertyMap(ValueMap):
+    """
+    Dictionary with the properties of a node that reports every change to the node owning it
+    """
+
+    __slots__ = ()
+
+
+class ValueList(list):
+    """
+    List nested in the attributes of a node that reports every change to the node owning it
+    """
+
+    __slots__ = ('node',)
+
+    def __init__(self, node, values=()):
+        """
+        Constructor of the ValueList, the values are copied
+        :param node: the node owning the list
+        :param values: the initial values
+        """
+        super().__init__(wrap_value(node, value) for value in values)
+        self.node = node
+
+    def prepare(self):
+        """
+        Tells the owning node the list is about to change
+        """
+        if self.node is not None:
+            self.node.will_change()
+
+    def notify(self):
+        """
+        Reports a change to the owning node
+        """
+        if self.node is not None:
+            self.node.content_changed()
+
+    def append(self, value):
+        self.prepare()
+        super().append(wrap_value(self.node, value))
+        self.notify()
+
+    def extend(self, values):
+        self.prepare()
+        super().extend([wrap_value(self.node, value) for value in values])
+        self.notify()
+
+    def insert(self, index, value):
+        self.prepare()
+        super().insert(index, wrap_value(self.node, value))
+        self.notify()
+
+    def remove(self, value):
+        self.prepare()
+        super().remove(value)
+        self.notify()
+
+    def pop(self, index=-1):
+        self.prepare()
+        value = super().pop(index)
+        self.notify()
+        return value
+
+    def clear(self):
+        self.prepare()
+        super().clear()
+        self.notify()
+
+    def sort(self, *args, **kwargs):
+        self.prepare()
+        super().sort(*args, **kwargs)
+        self.notify()
+
+    def reverse(self):
+        self.prepare()
+        super().reverse()
+        self.notify()
+
+    def __setitem__(self, index, value):
+        self.prepare()
+        if isinstance(index, slice):
+            super().__setitem__(index, [wrap_value(self.node, item) for item in value])
+        else:
+            super().__setitem__(index, wrap_value(self.node, value))
+        self.notify()
+
+    def __delitem__(self, index):
+        self.prepare()
+        super().__delitem__(index)
+        self.notify()
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def __imul__(self, count):
+        self.prepare()
+        super().__imul__(count)
+        self.notify()
+        return self
+
+    def __reduce_ex__(self, protocol):
+        """
+        Copies and pickles of the list are plain lists, the owner is not copied along
+        """
+        return list, (list(self),)
+
+
+def wrap_value(node, value):
+    """
+    Copies the dictionaries and lists of a value nested in the attributes of a node to ones that report their
+    changes to the node, other values are immutable
+    :param node: the node owning the value
+    :param value: the value
+    :return: the value that is stored
+    """
+    if isinstance(value, dict):
+        return ValueMap(node, value)
+    if isinstance(value, list):
+        return ValueList(node, value)
+    return value
+
+
+class NodeMap(dict):
+    """
+    Dictionary with the nodes of a tree by id that reports every added or removed node to the tree.
+    Makes sure the indexes of the tree stay correct, also when the dictionary is changed directly.
+    """
+
+    __slots__ = ('tree',)
+
+    def __init__(self, tree, nodes: Dict[str, 'Node'] = None):
+        """
+        Constructor of the NodeMap
+        :param tree: the tree owning the nodes
+        :param nodes: the initial nodes
+        """
+        super().__init__(nodes if nodes else {})
+        self.tree = tree
+
+    def __setitem__(self, node_id: str, node: 'Node'):
+        self.tree.will_change()
+        old = self.get(node_id)
+        super().__setitem__(node_id, node)
+        if old is not None and old is not node:
+            self.tree.node_removed(old)
+        self.tree.node_added(node)
+
+    def __delitem__(self, node_id: str):
+        node = self[node_id]
+        self.tree.will_change()
+        super().__delitem__(node_id)
+        self.tree.node_removed(node)
+
+    def pop(self, node_id: str, *default):
+        if node_id not in self:
+            return super().pop(node_id, *default)
+        self.tree.will_change()
+        node = super().pop(node_id)
+        self.tree.node_removed(node)
+        return node
+
+    def popitem(self):
+        self.tree.will_change()
+        node_id, node = super().popitem()
+        self.tree.node_removed(node)
+        return node_id, node
+
+    def setdefault(self, node_id: str, node: 'Node' = None):
+        if node_id not in self:
+            self[node_id] = node
+        return self[node_id]
+
+    def update(self, *args, **kwargs):
+        for node_id, node in dict(*args, **kwargs).items():
+            self[node_id] = node
+
+    def clear(self):
+        self.tree.will_change()
+        nodes = list(self.values())
+        super().clear()
+        for node in nodes:
+            self.tree.node_removed(node)
+
+    def __reduce_ex__(self, protocol):
+        """
+        Copies and pickles of the dictionary are plain dictionaries, the owner is not copied along
+        """
+        return dict, (dict(self),)
+
+
+class TreeMap(dict):
+    """
+    Dictionary with the trees of one category of a collection by filename that reports every
+    added or removed tree to the collection. Keeps the fingerprint of the collection correct,
+    also when the dictionary is changed directly.
+    """
+
+    __slots__ = ('collection', 'category')
+
+    def __init__(self, collection, category: str, trees: Dict[str, 'Tree'] = None):
+        """
+        Constructor of the TreeMap
+        :param collection: the collection owning the trees
+        :param category: the category of the trees
+        :param trees: the initial trees
+        """
+        super().__init__(trees if trees else {})
+        self.collection = collection
+        self.category = category
+
+    def __setitem__(self, filename: str, tree: 'Tree'):
+        # the values are looked up directly, a lazily loaded collection would read the tree first
+        old = dict.get(self, filename)
+        super().__setitem__(filename, tree)
+        if old is not None:
+            self.collection.tree_removed(self.category, filename, old)
+        self.collection.tree_added(self.category, filename, tree)
+
+    def __delitem__(self, filename: str):
+        tree = dict.__getitem__(self, filename)
+        super().__delitem__(filename)
+        self.collection.tree_removed(self.category, filename, tree)
+
+    def pop(self, filename: str, *default):
+        if filename not in self:
+            return super().pop(filename, *default)
+        tree = super().pop(filename)
+        self.collection.tree_removed(self.category, filename, tree)
+        return tree
+
+    def popitem(self):
+        filename, tree = super().popitem()
+        self.collection.tree_removed(self.category, filename, tree)
+        return filename, tree
+
+    def setdefault(self, filename: str, tree: 'Tree' = None):
+        if filename not in self:
+            self[filename] = tree
+        return self[filename]
+
+    def update(self, *args, **kwargs):
+        for filename, tree in dict(*args, **kwargs).items():
+            self[filename] = tree
+
+    def clear(self):
+        trees = list(dict.items(self))
+        super().clear()
+        for filename, tree in trees:
+            self.collection.tree_removed(self.category, filename, tree)
+
+    def __reduce_ex__(self, protocol):
+        """
+        Copies and pickles of the dictionary are plain dictionaries, the owner is not copied along
+        """
+        return dict, (dict(self),)
+
+
+class LazyTreeMap(TreeMap):
+    """
+    TreeMap of a lazily loaded collection, holds the header of a tree until the tree is looked up and reads the
+    tree from its file then. The filenames can be used without reading any tree, iterating over the trees reads
+    them one at a time. A tree that can no longer be read or verified is removed when it is looked up.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, filename: str) -> 'Tree':
+        # imported here, the tree module imports this module
+        from model.tree import TreeHeader
+        tree = dict.__getitem__(self, filename)
+        if type(tree) is TreeHeader:
+            tree = self.collection.load_entry(self.category, filename, tree)
+            if tree is None:
+                raise KeyError(filename)
+        else:
+            self.collection.entry_used(self.category, filename)
+        return tree
+
+    def get(self, filename: str, default: 'Tree' = None) -> Union['Tree', None]:
+        if filename not in self:
+            return default
+        try:
+            return self[filename]
+        except KeyError:
+            return default
+
+    def items(self):
+        for filename in list(self.keys()):
+            tree = self.get(filename)
+            if tree is not None:
+                yield filename, tree
+
+    def values(self):
+        return (tree for _, tree in self.items())
+
+
+class CategoryMap(dict):
+    """
+    Dictionary with the categories of a collection, the trees of each category are stored in a TreeMap
+    """
+
+    __slots__ = ('collection',)
+
+    def __init__(self, collection, categories: Dict[str, Dict[str, 'Tree']] = None):
+        """
+        Constructor of the CategoryMap
+        :param collection: the collection owning the categories
+        :param categories: the initial categories with their trees
+        """
+        super().__init__()
+        self.collection = collection
+        self.update(categories if categories else {})
+
+    def __setitem__(self, category: str, trees: Dict[str, 'Tree']):
+        # copy first, the trees could be the TreeMap that is replaced
+        trees = dict(trees)
+        if category in self:
+            self.pop(category)
+        super().__setitem__(category, (LazyTreeMap if self.collection.lazy else TreeMap)(self.collection, category))
+        self.collection.category_changed(category)
+        self[category].update(trees)
+
+    def __delitem__(self, category: str):
+        self.pop(category)
+
+    def pop(self, category: str, *default):
+        if category not in self:
+            return super().pop(category, *default)
+        self[category].clear()
+        trees = super().pop(category)
+        self.collection.category_changed(category)
+        return trees
+
+    def popitem(self):
+        category = next(reversed(list(self.keys())))
+        return category, self.pop(category)
+
+    def setdefault(self, category: str, trees: Dict[str, 'Tree'] = None):
+        if category not in self:
+            self[category] = trees if trees else {}
+        return self[category]
+
+    def update(self, *args, **kwargs):
+        for category, trees in dict(*args, **kwargs).items():
+            self[category] = trees
+
+    def clear(self):
+        for category in list(self.keys()):
+            self.pop(category)
+
+    def __reduce_ex__(self, protocol):
+        """
+        Copies and pickles of the dictionary are plain dictionaries, the owner is not copied along
+        """
+        return dict, ({category: dict(trees) for category, trees in self.items()},)
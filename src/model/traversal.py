@@ -0,0 +1,83 @@
+from typing import Any, Callable, Iterable, List
+
+
+def walk(start: Any, children: Callable[[Any], Iterable[Any]], pre: Callable[[Any], Any] = None,
+         post: Callable[[Any], Any] = None, prune: Callable[[Any], bool] = None):
+    """
+    Walks a tree depth first without recursion, so deep trees do not hit the recursion limit.
+    The items can be node ids or any other object that describes a step of the walk, for example
+    a tuple with a node id and the state that is passed down from the parent.
+    For every item pre is called first, then prune decides if the children are walked and post is
+    called after all children have been walked. Children are walked in the order they are returned.
+    :param start: the item to start walking from
+    :param children: function returning the child items of an item
+    :param pre: optional function called for each item before its children (pre-order)
+    :param post: optional function called for each item after its children (post-order)
+    :param prune: optional function, if it returns True for an item its children are skipped
+    """
+    # each entry is the item and whether its children have already been pushed
+    stack = [(start, False)]
+    while stack:
+        item, expanded = stack.pop()
+        if expanded:
+            post(item)
+            continue
+        if pre:
+            pre(item)
+        if post:
+            stack.append((item, True))
+        if prune and prune(item):
+            continue
+        # push in reverse, so the first child is walked first
+        stack.extend((child, False) for child in reversed(list(children(item))))
+
+
+def strongly_connected_components(vertices: Iterable[Any],
+                                  successors: Callable[[Any], Iterable[Any]]) -> List[List[Any]]:
+    """
+    Finds the strongly connected components of a directed graph with Tarjan's algorithm, without recursion.
+    Every vertex of a component can reach all others, so a component with more than one vertex or with a
+    vertex that is its own successor is a cycle.
+    :param vertices: the vertices to start from, successors that are not in it are part of the graph as well
+    :param successors: function returning the successors of a vertex
+    :return: the components, a component comes after all components reachable from it
+    """
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    components = []
+    for start in vertices:
+        if start in index:
+            continue
+        # each entry is a vertex and the iterator over its successors that are still to be walked
+        work = [(start, None)]
+        while work:
+            vertex, remaining = work.pop()
+            if remaining is None:
+                index[vertex] = lowlink[vertex] = len(index)
+                stack.append(vertex)
+                on_stack.add(vertex)
+                remaining = iter(successors(vertex))
+            for successor in remaining:
+                if successor not in index:
+                    # continue with this vertex after the successor is done
+                    work.append((vertex, remaining))
+                    work.append((successor, None))
+                    break
+                if successor in on_stack:
+                    lowlink[vertex] = min(lowlink[vertex], index[successor])
+            else:
+                if lowlink[vertex] == index[vertex]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == vertex:
+                            break
+                    components.append(component)
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[vertex])
+    return components
@@ -1,18 +1,78 @@
+import hashlib
+import json
 import logging
 import os
-import random
 import string
-from copy import deepcopy
+import sys
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List, Tuple, Union
+from typing import Dict, Any, Iterable, List, Tuple, Union
 
-from controller.utils import read_json, write_json, read_csv, write_csv
+from controller.utils import read_json, read_csv, write_csv, write_file_atomic
 from model.config import Settings
 from model.exceptions import *
+from model.id_allocator import IdAllocator, random_ids
+from model.tracking import AttributeMap, CategoryMap, ChildList, NodeMap
+from model.traversal import walk
+from model.verification_cache import DependencyRecorder, LogRecorder, VerificationCache
+
+
+def copy_value(value):
+    """
+    Copies a json like value, faster than deepcopy because only dictionaries and lists are copied
+    :param value: the value to copy
+    :return: the copy
+    """
+    if isinstance(value, dict):
+        return {key: copy_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_value(item) for item in value]
+    return value
+
+
+def canonical_value(value):
+    """
+    Converts the numbers in a json like value that compare equal to the same number, so values that are equal
+    are hashed the same. True, 1 and 1.0 all become 1
+    :param value: the value
+    :return: the converted value
+    """
+    kind = type(value)
+    if kind is str:
+        return value
+    if kind is bool:
+        return int(value)
+    if kind is float:
+        return int(value) if value.is_integer() else value
+    if isinstance(value, dict):
+        return {canonical_value(key) if type(key) in (bool, float) else key: canonical_value(item)
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonical_value(item) for item in value]
+    return value
+
+
+def content_hash(*parts) -> int:
+    """
+    Calculates a 128 bit hash of json serializable content, dictionaries are hashed independent of their order
+    and numbers that compare equal are hashed the same
+    :param parts: the content to hash
+    :return: the hash as integer
+    """
+    data = json.dumps(canonical_value(parts), sort_keys=True, separators=(',', ':'), default=repr).encode()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=16).digest(), 'big')
+
+
+# hashes of unordered parts like the nodes of a tree are added up modulo this number
+HASH_MODULUS = 1 << 128
 
 
 class Node:
     logger = logging.getLogger("node")
+    # nodes are created for every node of every tree in the collection, slots keep them small
+    __slots__ = ('tree', '_title', '_id', '_attributes', '_children', '_digest')
 
     def __init__(self, title: str, node_id: str = None, attributes: Dict[str, Any] = None, children: List[str] = None):
         """
@@ -22,13 +82,112 @@ class Node:
         :param attributes: other attributes with values the nodes has in a dict
         :param children: The id's of the node as children
         """
+        # the tree this node is part of, set by the tree when the node is added
+        self.tree = None
+        self._digest = None
         self.title: str = title
         # generate ID if not provided
         self.id: str = node_id if node_id else Node.generate_id()
         # if statements and list/dict copies because because of mutability
         # A node will always have a title but not always a name, if it has a name it will be saved in attributes
-        self.attributes: Dict[str, Any] = dict(attributes) if attributes else {}
-        self.children: List[str] = list(children) if children else []
+        self.attributes: Dict[str, Any] = attributes if attributes else {}
+        self.children: List[str] = children if children else []
+
+    @property
+    def title(self) -> str:
+        """
+        The title of the node, interned because only a few different titles exist
+        """
+        return self._title
+
+    @title.setter
+    def title(self, title: str):
+        self.will_change()
+        self._title = sys.intern(title) if type(title) == str else title
+        self.content_changed()
+
+    @property
+    def id(self) -> str:
+        """
+        The id of the node, interned so it is shared with the children lists referring to it
+        """
+        return self._id
+
+    @id.setter
+    def id(self, node_id: str):
+        self.will_change()
+        self._id = sys.intern(node_id) if type(node_id) == str else node_id
+        self.content_changed()
+
+    @property
+    def attributes(self) -> Dict[str, Any]:
+        """
+        The other attributes of the node, including the properties
+        """
+        return self._attributes
+
+    @attributes.setter
+    def attributes(self, attributes: Dict[str, Any]):
+        """
+        Replaces the attributes by a copy with interned keys, including the keys of the properties
+        :param attributes: the new attributes
+        """
+        self.will_change()
+        self._attributes = AttributeMap(self, attributes)
+        self.content_changed()
+
+    @property
+    def children(self) -> List[str]:
+        """
+        The ids of the children of this node
+        """
+        return self._children
+
+    @children.setter
+    def children(self, children: List[str]):
+        """
+        Replaces the children of this node and updates the tree indexes
+        :param children: the new child ids
+        """
+        self.will_change()
+        old = getattr(self, '_children', [])
+        self._children = ChildList(self, [sys.intern(c) if type(c) == str else c for c in children])
+        self.children_changed(old)
+
+    def children_changed(self, old: List[str]):
+        """
+        Called when the list of children changed, updates the indexes of the tree the node is in
+        :param old: the children before the change
+        """
+        self.content_changed()
+        if self.tree is not None:
+            self.tree.children_changed(self, old)
+
+    def will_change(self):
+        """
+        Called before the title, id, attributes or children change, so trees that share this node
+        with the tree the node is in can keep a copy of the current content
+        """
+        if self.tree is not None:
+            self.tree.node_will_change(self)
+
+    def content_changed(self):
+        """
+        Called when the title, id, attributes or children changed, invalidates the digest
+        of the node and reports the change to the tree the node is in
+        """
+        self._digest = None
+        if self.tree is not None:
+            self.tree.node_changed(self)
+
+    @property
+    def digest(self) -> int:
+        """
+        Hash of the title, id, attributes and children of the node, calculated again after a change
+        """
+        if self._digest is None:
+            self._digest = content_hash(self.title, self.id, self.attributes, self.children)
+        return self._digest
 
     @classmethod
     def from_json(cls, node: Dict[str, Any]):
@@ -39,6 +198,17 @@ class Node:
         :raises InvalidTreeException: If the node misses required attributes or the
                     required attributes have the incorrect type
         """
+        return cls(*Node.json_parts(node))
+
+    @staticmethod
+    def json_parts(node: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any], List[str]]:
+        """
+        Checks a node in JSON representation and splits it in the parts of a node object
+        :param node: a node in JSON representation
+        :return: the title, id, other attributes and children of the node
+        :raises InvalidTreeException: If the node misses required attributes or the
+                    required attributes have the incorrect type
+        """
         attributes = node.copy()
         attributes.pop('children', None)
         if not ('id' in attributes and type(attributes.get('id')) == str
@@ -48,7 +218,7 @@ class Node:
             raise InvalidTreeJsonFormatException
         attributes.pop('id')
         attributes.pop('title')
-        return cls(node.get('title'), node.get('id'), attributes, node.get('children'))
+        return node.get('title'), node.get('id'), attributes, node.get('children')
 
     @staticmethod
     def generate_id(size: int = None, chars=string.ascii_lowercase + string.digits) -> str:
@@ -61,7 +231,7 @@ class Node:
         # set size default value when not initialized
         if not size:
             size = Settings.query_setting("default_id_size", "Controller")
-        return ''.join(random.choice(chars) for _ in range(size))
+        return random_ids(1, size, chars)[0]
 
     def add_child(self, node_id: str):
         """
@@ -148,24 +318,70 @@ class Node:
 
     def create_json(self) -> Dict[str, Any]:
         """
-        Returns a json representation of this node
+        Returns a json representation of this node, a plain copy that can be changed without changing the node
         :return: A JSON object of this node
         """
-        node = self.attributes.copy()
+        node = copy_value(self.attributes)
         node['id'] = self.id
         node['title'] = self.title
         if len(self.children) > 0:
-            node['children'] = self.children
+            node['children'] = list(self.children)
         return node
 
     def __eq__(self, other):
         """
-        Equality operator that compares all attributes
+        Equality operator that compares the title, id, attributes and children, nodes with different
+        digests are not compared any further
         :param other: object to compare against
         :return: if they are equal
         """
         return (isinstance(other, self.__class__)
-                and self.__dict__ == other.__dict__)
+                and self.digest == other.digest
+                and self.title == other.title
+                and self.id == other.id
+                and self.attributes == other.attributes
+                and self.children == other.children)
+
+    def clone(self):
+        """
+        Copies the node without the tree it is in, skips the generic deepcopy machinery
+        :return: the copy
+        """
+        clone = self.__class__.__new__(self.__class__)
+        clone.tree = None
+        clone._title = self._title
+        clone._id = self._id
+        clone._attributes = AttributeMap(clone, copy_value(self._attributes))
+        clone._children = ChildList(clone, self._children)
+        # the copy has the same content, so the digest does not have to be calculated again
+        clone._digest = self._digest
+        return clone
+
+    def __deepcopy__(self, memo: Dict[int, Any]):
+        clone = self.clone()
+        memo[id(self)] = clone
+        return clone
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        State used for copying and pickling, the tree the node is in is not copied along
+        """
+        return {'title': self.title, 'id': self.id, 'attributes': self.attributes, 'children': list(self.children),
+                'digest': self._digest}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        """
+        Restores a copied or unpickled node
+        :param state: the state from __getstate__
+        """
+        self.tree = None
+        self._digest = None
+        self.title = state['title']
+        self.id = state['id']
+        self.attributes = state['attributes']
+        self.children = state['children']
+        # the copy has the same content, so the digest does not have to be calculated again
+        self._digest = state.get('digest')
 
     def __repr__(self):
         """
@@ -175,6 +391,7 @@ class Node:
 
 
 class DisconnectedNode(Node):
+    __slots__ = ()
 
     def __init__(self, node: Node = None):
         """
@@ -197,10 +414,472 @@ class Tree:
         :param root: The root node of the tree
         :param nodes: a dictionary containing the id of the node as key as the node object as value
         """
+        self.init_tracking()
         self.name: str = name
         self.root: str = root
         # if statement and dict copy because of mutability
-        self.nodes: Dict[str, Node] = dict(nodes) if nodes else {}
+        self.nodes: Dict[str, Node] = nodes if nodes else {}
+
+    def init_tracking(self):
+        """
+        Initializes the bookkeeping of the fingerprint and the snapshots of the tree
+        """
+        # weak references to read only collections that contain this tree object, they get a snapshot
+        # of the tree before it changes, and to snapshots of this tree that share nodes with it
+        self.holders: List[weakref.ref] = []
+        self.snapshots: List[weakref.ref] = []
+        # a snapshot shares the nodes of another tree, the nodes report their changes to that tree
+        self.owns_nodes = True
+        # weak references to the collections the tree is in, they are told about every change
+        self.observers: List[weakref.ref] = []
+        # weak references to objects that are told which nodes changed, like an incremental verifier
+        self.watchers: List[weakref.ref] = []
+        # digests of the nodes that are counted in digest_sum and nodes that changed since, by object id
+        self.node_digests: Dict[int, int] = {}
+        self.changed_nodes: Dict[int, Node] = {}
+        self.digest_sum = 0
+        self._fingerprint = None
+        # the json file of the tree and the fingerprint it was created for, see serialized
+        self._serialized: Union[Tuple[int, bytes], None] = None
+        # role name -> ids of the Role nodes with that role, and node id -> role
+        self.role_nodes: Dict[str, set] = {}
+        self.node_roles: Dict[str, str] = {}
+
+    @property
+    def name(self) -> str:
+        """
+        The name of the tree
+        """
+        return self._name
+
+    @name.setter
+    def name(self, name: str):
+        self.will_change()
+        self._name = name
+        self.dirty()
+        self.changed()
+
+    @property
+    def root(self) -> str:
+        """
+        The id of the root node of the tree
+        """
+        return self._root
+
+    @root.setter
+    def root(self, root: str):
+        self.will_change()
+        self._root = root
+        self.dirty()
+        self.changed()
+
+    @property
+    def nodes(self) -> Dict[str, Node]:
+        """
+        The nodes of the tree with their id as key
+        """
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, nodes: Dict[str, Node]):
+        """
+        Replaces the nodes of the tree and rebuilds the indexes
+        :param nodes: a dictionary containing the id of the node as key as the node object as value
+        """
+        self.will_change()
+        old = getattr(self, '_nodes', {})
+        for node in old.values():
+            if node.tree is self:
+                node.tree = None
+        self._nodes = NodeMap(self, nodes)
+        for collection in self.observing_collections():
+            collection.node_ids_removed(old.keys())
+            collection.node_ids_added(self._nodes.keys())
+        self.node_digests = {}
+        self.changed_nodes = {}
+        self.digest_sum = 0
+        old_roles = set(self.role_nodes.keys())
+        self.role_nodes = {}
+        self.node_roles = {}
+        for node in self._nodes.values():
+            node.tree = self
+            self.changed_nodes[id(node)] = node
+            role = Tree.role_of(node)
+            if role is not None:
+                self.node_roles[node.id] = role
+                self.role_nodes.setdefault(role, set()).add(node.id)
+        for collection in self.observing_collections():
+            for role in old_roles - self.role_nodes.keys():
+                collection.role_unused(self, role)
+            for role in self.role_nodes.keys() - old_roles:
+                collection.role_used(self, role)
+        self.rebuild_index()
+        self.dirty()
+        self.changed()
+
+    def rebuild_index(self):
+        """
+        Rebuilds the parent and child position index of the tree from the nodes.
+        If a node is the child of multiple nodes the first parent found is used
+        """
+        # id of the child -> id of the parent
+        self.parents: Dict[str, str] = {}
+        # id of the child -> position in the children of the parent
+        self.child_positions: Dict[str, int] = {}
+        # ids of children that have multiple parents, removing those requires a rebuild
+        self.conflicting_children = set()
+        self.index_outdated = False
+        for node_id, node in self._nodes.items():
+            for position, child_id in enumerate(node.children):
+                parent_id = self.parents.get(child_id)
+                if parent_id is None or parent_id == node_id:
+                    self.parents[child_id] = node_id
+                    self.child_positions[child_id] = position
+                else:
+                    self.conflicting_children.add(child_id)
+
+    def link_children(self, node_id: str, children: List[str]):
+        """
+        Adds the children of a node to the index
+        :param node_id: the id of the parent
+        :param children: the children of the parent
+        """
+        for position, child_id in enumerate(children):
+            parent_id = self.parents.get(child_id)
+            if parent_id is None or parent_id == node_id:
+                self.parents[child_id] = node_id
+                self.child_positions[child_id] = position
+            else:
+                # the first parent in the nodes should win, let the next lookup decide
+                self.conflicting_children.add(child_id)
+                self.index_outdated = True
+
+    def unlink_children(self, node_id: str, children: List[str]):
+        """
+        Removes the children of a node from the index
+        :param node_id: the id of the parent
+        :param children: the children of the parent
+        """
+        for child_id in children:
+            if child_id in self.conflicting_children:
+                self.index_outdated = True
+            if self.parents.get(child_id) == node_id:
+                del self.parents[child_id]
+                del self.child_positions[child_id]
+
+    def node_added(self, node: Node):
+        """
+        Called by the nodes dictionary when a node is added to the tree
+        :param node: the added node
+        """
+        node.tree = self
+        self.link_children(node.id, node.children)
+        for collection in self.observing_collections():
+            collection.node_ids_added([node.id])
+        self.dirty(node.id, True)
+        self.node_changed(node)
+
+    def node_removed(self, node: Node):
+        """
+        Called by the nodes dictionary when a node is removed from the tree
+        :param node: the removed node
+        """
+        if node.tree is self:
+            node.tree = None
+        self.unlink_children(node.id, node.children)
+        self.digest_sum = (self.digest_sum - self.node_digests.pop(id(node), 0)) % HASH_MODULUS
+        self.changed_nodes.pop(id(node), None)
+        self.unindex_role(node.id)
+        for collection in self.observing_collections():
+            collection.node_ids_removed([node.id])
+        self.dirty(node.id, True)
+        self.changed()
+
+    @staticmethod
+    def role_of(node: Node) -> Union[str, None]:
+        """
+        The role of a Role node
+        :param node: the node
+        :return: the role or None if the node is not a Role node with a role
+        """
+        if node.title == 'Role' and 'role' in node.attributes:
+            role = node.attributes.get('role')
+            if isinstance(role, str):
+                return role
+        return None
+
+    def index_role(self, node: Node):
+        """
+        Updates the role index for a node that was added or changed
+        :param node: the node
+        """
+        role = Tree.role_of(node)
+        if role == self.node_roles.get(node.id):
+            return
+        self.unindex_role(node.id)
+        if role is None:
+            return
+        self.node_roles[node.id] = role
+        node_ids = self.role_nodes.setdefault(role, set())
+        node_ids.add(node.id)
+        if len(node_ids) == 1:
+            for collection in self.observing_collections():
+                collection.role_used(self, role)
+
+    def unindex_role(self, node_id: str):
+        """
+        Removes a node from the role index
+        :param node_id: the id of the node
+        """
+        role = self.node_roles.pop(node_id, None)
+        if role is None:
+            return
+        node_ids = self.role_nodes.get(role, set())
+        node_ids.discard(node_id)
+        if len(node_ids) == 0:
+            self.role_nodes.pop(role, None)
+            for collection in self.observing_collections():
+                collection.role_unused(self, role)
+
+    def will_change(self):
+        """
+        Called before the tree changes, read only collections containing this tree get a snapshot
+        of the current tree instead and collections that dropped the tree from memory store it again
+        """
+        holders, self.holders = self.holders, []
+        for holder in holders:
+            collection = holder()
+            if collection is not None:
+                collection.replace_tree(self, self.snapshot())
+        for collection in self.observing_collections():
+            collection.tree_will_change(self)
+
+    def node_will_change(self, node: Node):
+        """
+        Called by a node of the tree before it changes, snapshots sharing the node get a copy of it
+        :param node: the node that will change
+        """
+        self.will_change()
+        copy = None
+        for reference in list(self.snapshots):
+            snapshot = reference()
+            if snapshot is None:
+                self.snapshots.remove(reference)
+            elif dict.get(snapshot.nodes, node.id) is node:
+                if copy is None:
+                    copy = node.clone()
+                    copy.tree = snapshot
+                snapshot.replace_shared_node(node, copy)
+
+    def replace_shared_node(self, node: Node, copy: Node):
+        """
+        Replaces a node shared with another tree by a copy with the same content, without
+        reporting a change
+        :param node: the shared node
+        :param copy: the copy of the node
+        """
+        dict.__setitem__(self.nodes, node.id, copy)
+        if id(node) in self.node_digests:
+            self.node_digests[id(copy)] = self.node_digests.pop(id(node))
+        if id(node) in self.changed_nodes:
+            self.changed_nodes[id(copy)] = copy
+            del self.changed_nodes[id(node)]
+
+    def snapshot(self):
+        """
+        Creates a read only copy of the tree that shares the nodes with this tree. When a node
+        changes in this tree the snapshot gets a copy of the node first, so the snapshot keeps
+        the current content and only changed nodes are copied
+        :return: the snapshot
+        """
+        snapshot = Tree.__new__(Tree)
+        snapshot.init_tracking()
+        snapshot.owns_nodes = False
+        snapshot._name = self.name
+        snapshot._root = self.root
+        snapshot._nodes = NodeMap(snapshot, self.nodes)
+        snapshot.parents = self.parents.copy()
+        snapshot.child_positions = self.child_positions.copy()
+        snapshot.conflicting_children = self.conflicting_children.copy()
+        snapshot.index_outdated = self.index_outdated
+        snapshot.node_digests = self.node_digests.copy()
+        snapshot.changed_nodes = self.changed_nodes.copy()
+        snapshot.digest_sum = self.digest_sum
+        snapshot._fingerprint = self._fingerprint
+        snapshot._serialized = self._serialized
+        snapshot.role_nodes = {role: node_ids.copy() for role, node_ids in self.role_nodes.items()}
+        snapshot.node_roles = self.node_roles.copy()
+        self.snapshots.append(weakref.ref(snapshot))
+        return snapshot
+
+    def clone(self):
+        """
+        Copies the tree and all of its nodes, skips the generic deepcopy machinery and copies
+        the indexes and digests instead of rebuilding them
+        :return: the copy
+        """
+        clone = Tree.__new__(Tree)
+        clone.init_tracking()
+        clone._name = self.name
+        clone._root = self.root
+        nodes = {}
+        for node_id, node in self.nodes.items():
+            copy = node.clone()
+            copy.tree = clone
+            nodes[node_id] = copy
+            if id(node) in self.node_digests:
+                clone.node_digests[id(copy)] = self.node_digests[id(node)]
+            if id(node) in self.changed_nodes:
+                clone.changed_nodes[id(copy)] = copy
+        clone._nodes = NodeMap(clone, nodes)
+        clone.parents = self.parents.copy()
+        clone.child_positions = self.child_positions.copy()
+        clone.conflicting_children = self.conflicting_children.copy()
+        clone.index_outdated = self.index_outdated
+        clone.digest_sum = self.digest_sum
+        clone._fingerprint = self._fingerprint
+        clone._serialized = self._serialized
+        clone.role_nodes = {role: node_ids.copy() for role, node_ids in self.role_nodes.items()}
+        clone.node_roles = self.node_roles.copy()
+        return clone
+
+    def __deepcopy__(self, memo: Dict[int, Any]):
+        clone = self.clone()
+        memo[id(self)] = clone
+        return clone
+
+    def make_writable(self):
+        """
+        Makes a snapshot writable by taking over its nodes, the tree the nodes came from
+        should not be changed anymore afterwards
+        """
+        if self.owns_nodes:
+            return
+        for node in self.nodes.values():
+            node.tree = self
+        self.owns_nodes = True
+
+    def hold(self, collection):
+        """
+        Adds a read only collection that gets a snapshot of this tree before it changes
+        :param collection: the read only collection containing the tree
+        """
+        if not any(holder() is collection for holder in self.holders):
+            self.holders.append(weakref.ref(collection))
+
+    def release(self, collection):
+        """
+        Removes a read only collection that no longer contains the tree
+        :param collection: the read only collection
+        """
+        self.holders = [holder for holder in self.holders if holder() is not collection and holder() is not None]
+
+    def node_changed(self, node: Node):
+        """
+        Called by a node of the tree when its content changed, its digest is counted again on the next fingerprint
+        :param node: the changed node
+        """
+        self.changed_nodes[id(node)] = node
+        self.index_role(node)
+        if self._nodes.get(node.id) is node:
+            self.dirty(node.id, False)
+        else:
+            # the id of the node changed, it is stored under another id
+            self.dirty()
+        self.changed()
+
+    def changed(self):
+        """
+        Invalidates the fingerprint and reports the change to the collections the tree is in
+        """
+        self._fingerprint = None
+        for collection in self.observing_collections():
+            collection.tree_changed(self)
+
+    def observing_collections(self) -> List:
+        """
+        The collections the tree is in that still exist
+        :return: a list with the collections
+        """
+        collections = []
+        for observer in list(self.observers):
+            collection = observer()
+            if collection is None:
+                self.observers.remove(observer)
+            else:
+                collections.append(collection)
+        return collections
+
+    def observe(self, collection):
+        """
+        Adds a collection that is told about every change of the tree
+        :param collection: the collection containing the tree
+        """
+        if not any(observer() is collection for observer in self.observers):
+            self.observers.append(weakref.ref(collection))
+
+    def unobserve(self, collection):
+        """
+        Removes a collection that was told about every change of the tree
+        :param collection: the collection that no longer contains the tree
+        """
+        self.observers = [observer for observer in self.observers
+                          if observer() is not collection and observer() is not None]
+
+    def watch(self, watcher):
+        """
+        Adds an object that is told which nodes changed by calling watcher.tree_dirty(tree, node_id, structure)
+        :param watcher: the object
+        """
+        if not any(reference() is watcher for reference in self.watchers):
+            self.watchers.append(weakref.ref(watcher))
+
+    def unwatch(self, watcher):
+        """
+        Removes an object that was told which nodes changed
+        :param watcher: the object
+        """
+        self.watchers = [reference for reference in self.watchers
+                         if reference() is not watcher and reference() is not None]
+
+    def dirty(self, node_id: str=None, structure: bool=True):
+        """
+        Tells the watchers that a node changed
+        :param node_id: the id of the node, None if the name, root or all nodes of the tree changed
+        :param structure: if the node was added, removed or its children changed
+        """
+        for reference in list(self.watchers):
+            watcher = reference()
+            if watcher is None:
+                self.watchers.remove(reference)
+            else:
+                watcher.tree_dirty(self, node_id, structure)
+
+    @property
+    def fingerprint(self) -> int:
+        """
+        Hash of the name, root and nodes of the tree, only the nodes that changed since the last call are hashed again
+        """
+        if self._fingerprint is None:
+            for key, node in self.changed_nodes.items():
+                digest = node.digest
+                self.digest_sum = (self.digest_sum - self.node_digests.get(key, 0) + digest) % HASH_MODULUS
+                self.node_digests[key] = digest
+            self.changed_nodes = {}
+            self._fingerprint = content_hash(self.name, self.root, self.digest_sum)
+        return self._fingerprint
+
+    def children_changed(self, node: Node, old: List[str]):
+        """
+        Called by a node of the tree when its children changed
+        :param node: the node with changed children
+        :param old: the children before the change
+        """
+        if self._nodes.get(node.id) is not node:
+            return
+        self.unlink_children(node.id, old)
+        self.link_children(node.id, node.children)
+        self.dirty(node.id, True)
 
     @staticmethod
     def check_presence(tree_name: str, attribute_name: str, dictionary: Dict[str, Any]):
@@ -246,6 +925,22 @@ class Tree:
         :raises InvalidTreeException; if required attributes are missing
                     or when required attributes have the wrong type
         """
+        tree_name, tree = Tree.check_json(file)
+        nodes: Dict[str, Any] = {}
+        for key, value in tree.get('nodes').items():
+            nodes[key] = Node.from_json(value)
+        # create the new tree object
+        return cls(tree_name, tree.get('root'), nodes)
+
+    @staticmethod
+    def check_json(file: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Checks the attributes of a file in json representation, except for the nodes themselves
+        :param file: a python dictionary containing a tree file
+        :return: the name of the tree and the tree in the file, with the root, title and nodes
+        :raises InvalidTreeException; if required attributes are missing
+                    or when required attributes have the wrong type
+        """
         # Manually check name first, since we don't know the tree name yet.
         if 'name' not in file:
             Tree.logger.error("The \"name\" attribute in tree is missing")
@@ -294,12 +989,7 @@ class Tree:
                 "The size of the \"nodes\" array in tree {} is of length 0 while its length "
                 "should be at least 1".format(tree_name))
             raise InvalidTreeJsonFormatException
-
-        nodes: Dict[str, Any] = {}
-        for key, value in tree.get('nodes').items():
-            nodes[key] = Node.from_json(value)
-        # create the new tree object
-        return cls(file.get('name'), tree.get('root'), nodes)
+        return tree_name, tree
 
     def add_node(self, node: Node):
         """
@@ -314,7 +1004,8 @@ class Tree:
         :param node: the node object to remove
         :returns True if success, False if node could not be found
         """
-        if node not in self.nodes.values():
+        existing = self.nodes.get(node.id)
+        if existing is None or (existing is not node and existing != node):
             Tree.logger.warning("Attempted to remove non-existent node {} from tree {}".format(node.id, self.name))
             return False
         # remove root node if trying to remove root
@@ -338,12 +1029,13 @@ class Tree:
         self.nodes.pop(node_id)
         return True
 
-    def add_subtree(self, tree, node_id: str, start_node_id: str=None):
+    def add_subtree(self, tree, node_id: str, start_node_id: str=None, id_allocator: IdAllocator=None):
         """
-        Adds a subtree recursively to the tree below a specified node
+        Adds a copy of a subtree to the tree below a specified node
         :param tree: the subtree to add
         :param node_id: the id of the node to add the subtree below
         :param start_node_id: optional specify the starting root node of the tree to add
+        :param id_allocator: optional allocator of the collection that hands out the ids of the copies
         """
         if node_id not in self.nodes.keys():
             return Tree.logger.error("Node {} from subtree {} to does not exist".format(node_id, tree.name))
@@ -351,22 +1043,99 @@ class Tree:
             return Tree.logger.error("Node {} from subtree {} does not exist".format(start_node_id, tree.name))
         if not start_node_id:
             start_node_id = tree.root
-        node = self.nodes.get(node_id)
-        subtree_node: Node = tree.nodes.get(start_node_id)
-        copy_subtree_node: Node = deepcopy(subtree_node)
-        copy_subtree_node.id = Node.generate_id()
-        copy_subtree_node.children = list()
-        self.add_node(copy_subtree_node)
-        node.add_child(copy_subtree_node.id)
-        for child_id in subtree_node.children:
-            self.add_subtree(tree, copy_subtree_node.id, child_id)
-
-    def update_subtree(self, tree, node_id: str, start_node_id: str=None):
+        if start_node_id not in tree.nodes.keys():
+            return Tree.logger.error("Node {} from subtree {} does not exist".format(start_node_id, tree.name))
+        id_map = self.clone_subtree(tree, start_node_id, id_allocator=id_allocator)
+        self.nodes.get(node_id).add_child(id_map[start_node_id])
+
+    def clone_subtree(self, tree, start_node_id: str, id_map: Dict[str, str] = None,
+                      id_allocator: IdAllocator = None) -> Dict[str, str]:
+        """
+        Copies the nodes of a subtree into this tree in one pass, every copy gets a new id.
+        The copies are not added below a node. Like the subtree was always copied, a node that is the child of
+        multiple nodes in the subtree is copied below each of them, children that do not exist or that would
+        repeat a node above them are left out
+        :param tree: the tree containing the subtree
+        :param start_node_id: the id of the first node of the subtree
+        :param id_map: optional new ids by the ids in the subtree for their first copy, missing ids are generated
+        :param id_allocator: optional allocator of the collection that hands out the missing ids
+        :return: the new id of the first copy of every copied node by its id in the subtree
+        """
+        occurrences = tree.subtree_occurrences(start_node_id)
+        id_map = dict(id_map) if id_map else {}
+        # the first copy of a node gets the id from the map, the other copies of nodes below multiple nodes get new ids
+        mapped = set()
+        new_ids: List[Union[str, None]] = []
+        for current_id, _ in occurrences:
+            if current_id in id_map and current_id not in mapped:
+                mapped.add(current_id)
+                new_ids.append(id_map[current_id])
+            else:
+                new_ids.append(None)
+        missing = new_ids.count(None)
+        # all missing ids are generated at once
+        if missing and id_allocator:
+            generated = iter(id_allocator.allocate(missing))
+        elif missing:
+            generated = iter(random_ids(missing, Settings.query_setting("default_id_size", "Controller")))
+        new_ids = [sys.intern(new_id if new_id is not None else next(generated)) for new_id in new_ids]
+
+        children: List[List[str]] = [[] for _ in occurrences]
+        for index, (_, parent) in enumerate(occurrences):
+            if parent is not None:
+                children[parent].append(new_ids[index])
+        copies = {}
+        first_copies = {}
+        for index, (current_id, _) in enumerate(occurrences):
+            copy = tree.nodes[current_id].clone()
+            # the ids are interned above, like the id setter does
+            copy._id = new_ids[index]
+            copy._children = ChildList(copy, children[index])
+            copy._digest = None
+            copies[copy.id] = copy
+            first_copies.setdefault(current_id, copy.id)
+        self.nodes.update(copies)
+        return first_copies
+
+    def subtree_occurrences(self, start_node_id: str) -> List[Tuple[str, Union[int, None]]]:
+        """
+        Lists the nodes of a subtree in depth first order the way a copy of the subtree has them, a node that is the
+        child of multiple nodes is listed below each of them. Children that do not exist or that are above
+        themselves, which would never end, are left out
+        :param start_node_id: the id of the first node of the subtree
+        :return: a list with the node id and the position of its parent in the list, None for the first node
+        """
+        occurrences: List[Tuple[str, Union[int, None]]] = []
+        # the ids of the nodes from the first node to the current one
+        path = set()
+
+        # every item is a list with the node id, the position of its parent and its own position once it is listed
+        def visit(item: list):
+            current_id = item[0]
+            if current_id not in self.nodes.keys():
+                Tree.logger.error("Node {} from subtree {} does not exist".format(current_id, self.name))
+            elif current_id in path:
+                Tree.logger.error("Node {} from subtree {} is below itself".format(current_id, self.name))
+            else:
+                item.append(len(occurrences))
+                occurrences.append((current_id, item[1]))
+                path.add(current_id)
+
+        def leave(item: list):
+            if len(item) == 3:
+                path.discard(item[0])
+
+        walk([start_node_id, None], lambda item: [[child_id, item[2]] for child_id in self.nodes[item[0]].children],
+             pre=visit, post=leave, prune=lambda item: len(item) < 3)
+        return occurrences
+
+    def update_subtree(self, tree, node_id: str, start_node_id: str=None, id_allocator: IdAllocator=None):
         """
         Method that updates the subtree below a specified node to a given subtree
         :param tree: the tree containing the subtree
         :param node_id: the node to replace the subtree below of
         :param start_node_id: the id of the first node of the subtree
+        :param id_allocator: optional allocator of the collection that hands out the ids of the copies
         """
         if node_id not in self.nodes.keys():
             return Tree.logger.error("Node {} from subtree {} to does not exist".format(node_id, tree.name))
@@ -375,23 +1144,39 @@ class Tree:
         if not start_node_id:
             start_node_id = tree.root
         self.remove_subtree(node_id)
-        self.add_subtree(tree, node_id, start_node_id)
+        self.add_subtree(tree, node_id, start_node_id, id_allocator)
 
     def remove_subtree(self, node_id: str, first_run=True):
         """
-        Removes all nodes recursively below a specified node
+        Removes all nodes below a specified node
         :param node_id: the nodes to remove below this node
-        :param first_run: If this is the first step or the recursive step
+        :param first_run: if the node itself should be kept, when False the node is removed as well
         """
         if node_id not in self.nodes.keys():
             return Tree.logger.error("Node {} to delete subtree from does not exist".format(node_id))
-        node = self.nodes.get(node_id)
-        if len(node.children) > 0:
-            for child_id in node.children:
-                self.remove_subtree(child_id, first_run=False)
-            node.children = list()
-        if not first_run:
-            self.nodes.pop(node_id, None)
+        # the ids of the nodes on the current path, a node that is reached again from below is a cycle
+        path = set()
+
+        def skip(current_id: str) -> bool:
+            if current_id not in self.nodes.keys():
+                Tree.logger.error("Node {} to delete subtree from does not exist".format(current_id))
+                return True
+            path.add(current_id)
+            return False
+
+        def remove(current_id: str):
+            node = self.nodes.get(current_id)
+            if node is None:
+                return
+            path.discard(current_id)
+            if len(node.children) > 0:
+                node.children = list()
+            if not first_run or current_id != node_id:
+                self.nodes.pop(current_id, None)
+
+        walk(node_id, lambda current_id: [child_id for child_id in self.nodes.get(current_id).children
+                                          if child_id not in path],
+             post=remove, prune=skip)
 
     def find_role_subtree_node_above_node(self, node: Node) -> Union[Node, None]:
         """
@@ -411,14 +1196,27 @@ class Tree:
         :return: the subtree node if it exists else None.
         """
         role_nodes = []
-        for child_id in node.children:
-            if child_id in self.nodes.keys():
-                child_node = self.nodes.get(child_id)
-                if child_node.title == 'Role' and 'role' in child_node.attributes:
-                    role_nodes.append(child_node)
-                role_nodes.extend(self.find_role_subtree_nodes_below_node(child_node))
-            else:
-                self.logger.error('Child node {} does not exist.'.format(child_id))
+        # the ids of the nodes on the current path, so a cycle is not walked forever
+        path = set()
+
+        def visit(current_id: str) -> bool:
+            if current_id == node.id:
+                path.add(current_id)
+                return False
+            if current_id not in self.nodes.keys():
+                self.logger.error('Child node {} does not exist.'.format(current_id))
+                return True
+            child_node = self.nodes.get(current_id)
+            if child_node.title == 'Role' and 'role' in child_node.attributes:
+                role_nodes.append(child_node)
+            path.add(current_id)
+            return False
+
+        def children(current_id: str) -> List[str]:
+            current_node = node if current_id == node.id else self.nodes.get(current_id)
+            return [child_id for child_id in current_node.children if child_id not in path]
+
+        walk(node.id, children, post=path.discard, prune=visit)
         return role_nodes
 
     def find_parent_node_if_exists(self, node: Node) -> Union[Node, None]:
@@ -427,12 +1225,22 @@ class Tree:
         :param node: the node to find the parent of
         :return: The parent node or None
         """
-        id_to_look_for = node.id
-        for node_id, tree_node in self.nodes.items():
-            for child in tree_node.children:
-                if child == id_to_look_for:
-                    return tree_node
-        return None
+        if self.index_outdated:
+            self.rebuild_index()
+        parent_id = self.parents.get(node.id)
+        if parent_id is None:
+            return None
+        return self.nodes.get(parent_id)
+
+    def find_child_position(self, node: Node) -> Union[int, None]:
+        """
+        Finds the position of a node in the children of its parent
+        :param node: the node to find the position of
+        :return: the index in the children of the parent or None if the node has no parent
+        """
+        if self.index_outdated:
+            self.rebuild_index()
+        return self.child_positions.get(node.id)
 
     def find_role_subtree_nodes_if_exist(self, role: str) -> List[Node]:
         """
@@ -441,43 +1249,56 @@ class Tree:
         :return: a list with the nodes
         """
         result = []
-        for node_id, node in sorted(self.nodes.items()):
-            if node.title == 'Role' and 'role' in node.attributes and \
-                    node.attributes.get('role') == role:
+        for node_id in sorted(self.role_nodes.get(role, ())):
+            node = self.nodes.get(node_id)
+            # a node that changed its id is still indexed with the old id
+            if node is not None and Tree.role_of(node) == role:
                 result.append(node)
         return result
 
     def remove_node_and_children_by_id(self, node_id: str) -> bool:
         """
-        Removes a node and all of its children recursively
+        Removes a node and all nodes below it
         :param node_id: the id of the node to remove
         :return success: if the node and the children were removed successfully
         """
-        if node_id not in self.nodes.keys():
-            Tree.logger.warning("Attempted to remove non-existent node {} from tree {}".format(node_id, self.name))
-            return False
-        # remove root node if trying to remove root
-        if self.root == node_id:
-            self.root = ''
-        children = self.nodes.get(node_id).children
         success = True
-        for child_id in children:
-            success &= self.remove_node_and_children_by_id(child_id)
-        self.nodes.pop(node_id, None)
+        # the ids of the nodes on the current path, so a cycle is not walked forever
+        path = set()
+
+        def skip(current_id: str) -> bool:
+            nonlocal success
+            if current_id not in self.nodes.keys():
+                Tree.logger.warning("Attempted to remove non-existent node {} from tree {}"
+                                    .format(current_id, self.name))
+                success = False
+                return True
+            # remove root node if trying to remove root
+            if self.root == current_id:
+                self.root = ''
+            path.add(current_id)
+            return False
+
+        def remove(current_id: str):
+            if current_id in path:
+                path.discard(current_id)
+                self.nodes.pop(current_id, None)
+
+        walk(node_id, lambda current_id: [child_id for child_id in self.nodes.get(current_id).children
+                                          if child_id not in path],
+             post=remove, prune=skip)
         return success
 
     def propagate_role(self, current_node_id: str, to_propagate: str):
         """
-        Function to recursively go through children to propagate ROLE property.
+        Function to go through all nodes below a node to propagate ROLE property.
         :param current_node_id: id of the current node.
         :param to_propagate: the value of the ROLE property to propagate
         """
         if current_node_id not in self.nodes:
             return Tree.logger.error("Node with id {} does not exist in tree {}.".format(current_node_id, self.name))
-        for child_id in self.nodes[current_node_id].children:
-            current_child = self.nodes[child_id]
-            current_child.add_property("ROLE", to_propagate)
-            self.propagate_role(child_id, to_propagate)
+        for child_id in self.descendant_ids(current_node_id):
+            self.nodes[child_id].add_property("ROLE", to_propagate)
 
     def remove_propagation(self, current_node_id):
         """
@@ -486,11 +1307,32 @@ class Tree:
         """
         if current_node_id not in self.nodes:
             return Tree.logger.error("Node with id {} does not exist in tree {}.".format(current_node_id, self.name))
-        for child_id in self.nodes[current_node_id].children:
+        for child_id in self.descendant_ids(current_node_id):
             current_child = self.nodes[child_id]
             if 'properties' in current_child.attributes and 'ROLE' in current_child.attributes['properties']:
                 current_child.remove_property("ROLE")
-            self.remove_propagation(child_id)
+
+    def descendant_ids(self, node_id: str) -> List[str]:
+        """
+        Lists the ids of all nodes below a node in depth first order, a node that is the child
+        of multiple nodes is listed for each of them
+        :param node_id: the id of the node to start from, it is not included itself
+        :raises KeyError: when a node below the node does not exist
+        :return: a list with the node ids
+        """
+        result = []
+        # the ids of the nodes on the current path, so a cycle is not walked forever
+        path = set()
+
+        def visit(current_id: str):
+            if current_id != node_id:
+                result.append(current_id)
+            path.add(current_id)
+
+        walk(node_id, lambda current_id: [child_id for child_id in self.nodes[current_id].children
+                                          if child_id not in path],
+             pre=visit, post=path.discard)
+        return result
 
     def create_json(self) -> Dict[str, Any]:
         """
@@ -505,6 +1347,16 @@ class Tree:
         file = {"name": self.name, "data": {"trees": [tree]}}
         return file
 
+    def serialized(self) -> bytes:
+        """
+        The json file of the tree, like write_json writes it, created again only after the tree changed
+        :return: the content of the file
+        """
+        fingerprint = self.fingerprint
+        if self._serialized is None or self._serialized[0] != fingerprint:
+            self._serialized = (fingerprint, json.dumps(self.create_json(), indent=2, sort_keys=True).encode())
+        return self._serialized[1]
+
     def __repr__(self):
         """
         internal representation
@@ -513,94 +1365,945 @@ class Tree:
 
     def __eq__(self, other):
         """
-        Equality operator for tree, compares all attributes
+        Equality operator for tree, compares the name, root and nodes, trees with different fingerprints
+        are not compared any further. Nodes shared by the trees are not compared
         """
         return (isinstance(other, self.__class__)
-                and self.__dict__ == other.__dict__)
+                and self.fingerprint == other.fingerprint
+                and self.name == other.name
+                and self.root == other.root
+                and dict.__eq__(self.nodes, other.nodes))
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        State used for copying and pickling, the indexes are rebuilt instead of copied
+        """
+        return {'name': self.name, 'root': self.root, 'nodes': dict(self.nodes)}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        """
+        Restores a copied or unpickled tree
+        :param state: the state from __getstate__
+        """
+        self.init_tracking()
+        self.name = state['name']
+        self.root = state['root']
+        self.nodes = state['nodes']
+
+
+class TreeHeader:
+    """
+    What a lazily loaded collection knows about a tree before the tree is read: the name and root of the tree,
+    the names of the trees it refers to, the roles it uses, its number of nodes and the fingerprint of its content,
+    and the path, size and modification time of its file
+    """
+    # a header is kept for every file of the collection, slots keep them small
+    __slots__ = ('name', 'root', 'path', 'size', 'modified', 'nodes', 'fingerprint', 'references', 'roles')
+
+    def __init__(self, name: str, root: str, path: str, size: int, modified: int, nodes: int, fingerprint: int,
+                 references: frozenset, roles: frozenset):
+        """
+        Constructor of the TreeHeader
+        :param name: the name of the tree
+        :param root: the id of the root of the tree
+        :param path: the path of the file
+        :param size: the size of the file in bytes
+        :param modified: the modification time of the file in nanoseconds
+        :param nodes: the number of nodes of the tree
+        :param fingerprint: the fingerprint the tree has once it is read
+        :param references: the names of the trees the tree refers to
+        :param roles: the roles of the Role nodes in the tree
+        """
+        self.name = name
+        self.root = root
+        self.path = path
+        self.size = size
+        self.modified = modified
+        self.nodes = nodes
+        self.fingerprint = fingerprint
+        self.references = references
+        self.roles = roles
+
+    @classmethod
+    def from_file(cls, path: str):
+        """
+        Reads the header of the tree in a json file, the nodes are checked and hashed like a tree hashes them,
+        without creating node objects
+        :param path: the path of the file
+        :return: the header
+        :raises InvalidTreeJsonFormatException: if the file does not contain a valid tree
+        """
+        stat = os.stat(path)
+        name, tree = Tree.check_json(read_json(Path(path)))
+        digest_sum = 0
+        references = set()
+        roles = set()
+        for node in tree['nodes'].values():
+            title, node_id, attributes, children = Node.json_parts(node)
+            children = children if children else []
+            digest_sum += content_hash(title, node_id, attributes, children)
+            # the same references and roles as ReferenceGraph.tree_references and Tree.role_of find
+            if len(children) == 0 and type(attributes.get('name')) == str and title != name:
+                references.add(attributes['name'])
+            if title == 'Role' and isinstance(attributes.get('role'), str):
+                roles.add(attributes['role'])
+        fingerprint = content_hash(name, tree['root'], digest_sum % HASH_MODULUS)
+        return cls(name, tree['root'], path, stat.st_size, stat.st_mtime_ns, len(tree['nodes']), fingerprint,
+                   frozenset(references), frozenset(roles))
+
+    @classmethod
+    def from_tree(cls, tree: Tree, path: str, stamp: Tuple[int, int]=None):
+        """
+        Creates the header of a tree that was just written to or read from a file
+        :param tree: the tree
+        :param path: the path of the file
+        :param stamp: the size and modification time of the file, read from the file if not given
+        :return: the header
+        """
+        # imported here, the reference graph imports this module
+        from model.reference_graph import ReferenceGraph
+        if stamp is None:
+            stat = os.stat(path)
+            stamp = stat.st_size, stat.st_mtime_ns
+        return cls(tree.name, tree.root, path, stamp[0], stamp[1], len(tree.nodes), tree.fingerprint,
+                   ReferenceGraph.tree_references(tree), frozenset(tree.role_nodes.keys()))
+
+    def __repr__(self):
+        """
+        Internal representation of the object
+        """
+        return 'TreeHeader({}, {})'.format(self.name, self.path)
+
+
+class RoleUpdate:
+    """
+    A Role node in a tree of the collection whose subtree is replaced by the changed role subtree
+    """
+
+    def __init__(self, category: str, filename: str, tree: Tree, node_id: str, replaces_root: bool=False):
+        """
+        Constructor of the RoleUpdate
+        :param category: the category of the tree
+        :param filename: the filename of the tree
+        :param tree: the tree to update
+        :param node_id: the id of the Role node, or of the root when the whole role tree is replaced
+        :param replaces_root: if the tree is the role tree itself and its root is replaced
+        """
+        self.category = category
+        self.filename = filename
+        self.tree = tree
+        self.node_id = node_id
+        self.replaces_root = replaces_root
+
+    def __repr__(self):
+        """
+        Internal representation of the object
+        """
+        return 'RoleUpdate({}/{}, {}{})'.format(self.category, self.filename, self.node_id,
+                                                ', root' if self.replaces_root else '')
+
+
+class RoleUpdatePlan:
+    """
+    The changes needed in a collection after a role subtree changed. The plan is computed once before
+    any tree changes, then all subtrees are replaced in one pass by apply. Afterwards the plan tells
+    which Role nodes were updated.
+    """
+    logger = logging.getLogger("role_update_plan")
+
+    def __init__(self, collection, tree: Tree, role: str, start_node_id: str):
+        """
+        Constructor of the RoleUpdatePlan
+        :param collection: the collection to update
+        :param tree: the tree containing the changed subtree
+        :param role: the role that changed
+        :param start_node_id: the id of the first node of the changed subtree
+        """
+        self.collection = collection
+        self.tree = tree
+        self.role = role
+        self.start_node_id = start_node_id
+        # the Role nodes whose subtree is replaced
+        self.updates: List[RoleUpdate] = []
+        # the Role nodes that are not updated because that would create a cycle
+        self.prevented: List[RoleUpdate] = []
+        self.applied = False
+
+    def apply(self):
+        """
+        Replaces the subtrees of all planned updates, the ids of all copies are allocated at once
+        :return: the plan itself, as the set of changes that were made
+        """
+        if self.applied:
+            return self
+        self.applied = True
+        if len(self.updates) == 0:
+            return self
+        tree = self.tree
+        subtree_ids = list(dict.fromkeys(node_id for node_id, _ in tree.subtree_occurrences(self.start_node_id)))
+        new_ids = iter(self.collection.id_allocator.allocate(len(subtree_ids) * len(self.updates)))
+        for update in self.updates:
+            loop_tree = update.tree
+            id_map = {subtree_id: next(new_ids) for subtree_id in subtree_ids}
+            loop_tree.remove_subtree(update.node_id)
+            # the further copies of nodes below multiple nodes get their ids from the allocator
+            copy_ids = loop_tree.clone_subtree(tree, self.start_node_id, id_map, self.collection.id_allocator)
+            loop_tree.nodes.get(update.node_id).add_child(copy_ids[self.start_node_id])
+            if update.replaces_root:
+                # remove the old root and change root to new subtree
+                old_root = loop_tree.root
+                loop_tree.root = copy_ids[self.start_node_id]
+                loop_tree.nodes.pop(old_root)
+                loop_tree.remove_propagation(tree.root)
+                continue
+            # propagate ROLE attribute again
+            node = loop_tree.nodes.get(update.node_id)
+            if 'properties' in node.attributes and 'ROLE' in node.attributes.get('properties'):
+                loop_tree.propagate_role(node.id, node.attributes['properties']['ROLE'])
+            else:
+                loop_tree.remove_propagation(node.id)
+        return self
+
+    def updated_node_ids(self, tree: Tree=None) -> List[str]:
+        """
+        The ids of the Role nodes whose subtree was replaced, the replaced roots of role trees are not included
+        :param tree: optional only the Role nodes in this tree
+        :return: a list with the node ids
+        """
+        return [update.node_id for update in self.updates
+                if not update.replaces_root and (tree is None or update.tree is tree)]
+
+    def __repr__(self):
+        """
+        Internal representation of the object
+        """
+        return 'RoleUpdatePlan({}, updates={}, prevented={})'.format(self.role, self.updates, self.prevented)
 
 
 class Collection:
     logger = logging.getLogger("collection")
+    # the number of threads that write the files of a collection, see benchmarks/collection_writing.py
+    WRITE_WORKERS = 4
 
-    def __init__(self, collection: Dict[str, Dict[str, Tree]]=None, path: Path=None):
+    def __init__(self, collection: Dict[str, Dict[str, Tree]]=None, path: Path=None, max_loaded_nodes: int=None):
         """
         Initializes a collection with a given dict
         :param collection: the collection of files
         :param path: the path of the collection None if using custom path
+        :param max_loaded_nodes: for a lazily loaded collection, the number of nodes of the trees read from their
+                                 files that are kept in memory. None if the collection is not lazily loaded
         """
         self.path = path
-        self.collection: Dict[str, Dict[str, Tree]] = dict(collection) if collection else {}
+        # a snapshot is read only, its trees are replaced by snapshots of them before they change
+        self.is_snapshot = False
+        # set before the trees, the categories of a lazily loaded collection hold headers until a tree is needed
+        self.max_loaded_nodes = max_loaded_nodes
+        # what is verified when a tree of a lazily loaded collection is read
+        self.only_verify_mathematical_properties = True
+        # (category, filename) -> the size and modification time of the file when the collection read or wrote it,
+        # and the fingerprint of the tree in the file. Shared with the snapshots and writable copies of the
+        # collection, they are of the same files
+        self.file_stamps: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self.file_fingerprints: Dict[Tuple[str, str], int] = {}
+        self.collection: Dict[str, Dict[str, Tree]] = collection if collection else {}
+
+    @property
+    def lazy(self) -> bool:
+        """
+        If the trees are only read from their files when they are needed
+        """
+        return self.max_loaded_nodes is not None
+
+    @property
+    def collection(self) -> Dict[str, Dict[str, Tree]]:
+        """
+        The trees of the collection by category and filename
+        """
+        return self._collection
+
+    @collection.setter
+    def collection(self, collection: Dict[str, Dict[str, Tree]]):
+        """
+        Replaces the trees of the collection, the dictionaries are copied
+        :param collection: the trees by category and filename
+        """
+        for category, trees in getattr(self, '_collection', {}).items():
+            for tree in dict.values(trees):
+                if type(tree) is not TreeHeader:
+                    tree.unobserve(self)
+                    tree.release(self)
+        for _, reference in getattr(self, 'evicted', {}).values():
+            tree = reference()
+            if tree is not None:
+                tree.unobserve(self)
+        # (category, filename) -> hash counted in hash_sum, and the entries that changed since
+        self.entry_hashes: Dict[Tuple[str, str], int] = {}
+        self.changed_entries = set()
+        # object id of a tree -> the (category, filename) entries it is stored at
+        self.locations: Dict[int, set] = {}
+        self.hash_sum = 0
+        self._fingerprint = None
+        # built on first use and kept up to date with the trees afterwards
+        self._id_allocator = None
+        # object id of a tree -> the (name, root) it is indexed with
+        self.indexed: Dict[int, Tuple[str, str]] = {}
+        # name -> the (category, filename) entries with a tree with that name and the tree
+        self.names: Dict[str, Dict[Tuple[str, str], Tree]] = {}
+        # root id -> the number of trees with that root per category
+        self.roots: Dict[str, Dict[str, int]] = {}
+        # category -> filename -> (root id, name), in the order of the trees in the category
+        self.category_roots: Dict[str, Dict[str, Tuple[str, str]]] = {}
+        # role name -> the trees with Role nodes with that role by object id
+        self.role_users: Dict[str, Dict[int, Tree]] = {}
+        # built on first use and told about every changed tree afterwards
+        self._reference_graph = None
+        # the (category, filename) entries of a lazily loaded collection that hold a tree read from its file,
+        # with the header of the file, the least recently used entry first
+        self.loaded: OrderedDict = OrderedDict()
+        self.loaded_nodes = 0
+        # (category, filename) -> the header and a weak reference to a tree that was dropped from memory, it is used
+        # again while someone else still holds it. The tree is observed until then, when it is about to change it is
+        # stored at the entry again, so the change is not missed
+        self.evicted: Dict[Tuple[str, str], Tuple[TreeHeader, weakref.ref]] = {}
+        # changes whenever the name and root indexes change, never goes back to an earlier value
+        self.index_version = getattr(self, 'index_version', 0) + 1
+        # the categories are added after the dictionary is set, so the changes can look it up
+        self._collection = CategoryMap(self)
+        self._collection.update(collection if collection else {})
+
+    def category_changed(self, category: str):
+        """
+        Called by the categories dictionary when a category is added or removed
+        :param category: the category
+        """
+        if category not in self.collection:
+            self.category_roots.pop(category, None)
+        self.changed_entries.add((category, None))
+        self._fingerprint = None
+
+    def tree_added(self, category: str, filename: str, tree: Union[Tree, TreeHeader]):
+        """
+        Called by the trees dictionary of a category when a tree is added
+        :param category: the category of the tree
+        :param filename: the filename of the tree
+        :param tree: the added tree, or the header of a tree that is not read yet
+        """
+        if type(tree) is not TreeHeader:
+            self.track_tree(category, filename, tree)
+        self.index_entry(category, filename, tree)
+        self.changed_entries.add((category, filename))
+        self._fingerprint = None
+
+    def tree_removed(self, category: str, filename: str, tree: Union[Tree, TreeHeader]):
+        """
+        Called by the trees dictionary of a category when a tree is removed
+        :param category: the category of the tree
+        :param filename: the filename of the tree
+        :param tree: the removed tree, or the header of a tree that was not read yet
+        """
+        header = self.loaded.pop((category, filename), None)
+        if header is not None:
+            self.loaded_nodes -= header.nodes
+        self.drop_evicted((category, filename))
+        if type(tree) is TreeHeader:
+            self.unindex_entry(category, filename, tree.name, tree.root)
+        else:
+            self.unindex_entry(category, filename, *self.indexed.get(id(tree), (tree.name, tree.root)))
+            self.untrack_tree(category, filename, tree)
+        self.changed_entries.add((category, filename))
+        self._fingerprint = None
+
+    def track_tree(self, category: str, filename: str, tree: Tree):
+        """
+        Starts following the changes of a tree stored at an entry, without indexing the entry
+        :param category: the category of the entry
+        :param filename: the filename of the entry
+        :param tree: the tree
+        """
+        locations = self.locations.setdefault(id(tree), set())
+        if len(locations) == 0 and self._id_allocator is not None:
+            self._id_allocator.register(tree.nodes.keys())
+        if len(locations) == 0:
+            for role in tree.role_nodes.keys():
+                self.role_users.setdefault(role, {})[id(tree)] = tree
+        locations.add((category, filename))
+        self.indexed[id(tree)] = (tree.name, tree.root)
+        tree.observe(self)
+        if self.is_snapshot:
+            tree.hold(self)
+
+    def untrack_tree(self, category: str, filename: str, tree: Tree):
+        """
+        Stops following the changes of a tree that is no longer stored at an entry, once it is stored at none
+        :param category: the category of the entry
+        :param filename: the filename of the entry
+        :param tree: the tree
+        """
+        locations = self.locations.get(id(tree), set())
+        locations.discard((category, filename))
+        if len(locations) == 0:
+            self.locations.pop(id(tree), None)
+            self.indexed.pop(id(tree), None)
+            for role in tree.role_nodes.keys():
+                self.role_unused(tree, role)
+            tree.unobserve(self)
+            tree.release(self)
+            if self._id_allocator is not None:
+                self._id_allocator.release(tree.nodes.keys())
+
+    def load_entry(self, category: str, filename: str, header: TreeHeader, evict: bool=True) -> Union[Tree, None]:
+        """
+        Reads and verifies the tree of an entry of a lazily loaded collection that only has its header yet,
+        a tree that can no longer be read or verified is removed from the collection
+        :param category: the category of the entry
+        :param filename: the filename of the entry
+        :param header: the header stored at the entry
+        :param evict: if the least recently used trees are dropped from memory afterwards
+        :return: the tree, None if it was removed
+        """
+        location = (category, filename)
+        evicted = self.drop_evicted(location)
+        tree = evicted[1]() if evicted is not None and evicted[0] is header else None
+        if tree is not None and tree.fingerprint != header.fingerprint:
+            # a read only collection does not follow the trees it dropped, one that changed since is read again
+            tree = None
+        if tree is None:
+            # imported here, the collection loader imports this module
+            from model.collection_loader import LOADED, UNVERIFIED, load_tree
+            try:
+                status, tree = load_tree(header.path, self, self.only_verify_mathematical_properties)
+            except OSError:
+                status, tree = None, None
+            if status == UNVERIFIED:
+                logging.warning("Unable to verify tree {} in {}, this tree will not be added to the"
+                                " collection".format(tree.name, header.path))
+            elif status != LOADED:
+                logging.error("The tree at {} is not a valid tree, this tree will not be loaded".format(header.path))
+            if status != LOADED:
+                self.collection[category].pop(filename)
+                return None
+        dict.__setitem__(self.collection[category], filename, tree)
+        self.track_tree(category, filename, tree)
+        if (tree.name, tree.root) == (header.name, header.root):
+            # the indexes stay the same, they refer to the tree instead of the header
+            self.names[header.name][location] = tree
+        else:
+            # the file changed since its header was read
+            self.unindex_entry(category, filename, header.name, header.root)
+            self.index_entry(category, filename, tree)
+        self.loaded[location] = header
+        self.loaded_nodes += header.nodes
+        self.changed_entries.add(location)
+        self._fingerprint = None
+        if evict:
+            self.evict(location)
+        return tree
+
+    def entry_used(self, category: str, filename: str):
+        """
+        Marks the tree read from the file of an entry as the most recently used one
+        :param category: the category of the entry
+        :param filename: the filename of the entry
+        """
+        if (category, filename) in self.loaded:
+            self.loaded.move_to_end((category, filename))
+
+    def evict(self, keep: Tuple[str, str]=None):
+        """
+        Drops the least recently used trees without unsaved changes from memory until the trees read from their
+        files fit in the number of nodes of the collection, a dropped tree is read again when it is needed
+        :param keep: the entry whose tree is kept in any case
+        """
+        if self.loaded_nodes <= self.max_loaded_nodes:
+            return
+        for location, header in list(self.loaded.items()):
+            if self.loaded_nodes <= self.max_loaded_nodes:
+                return
+            category, filename = location
+            tree = dict.__getitem__(self.collection[category], filename)
+            # a tree is unchanged when it has the fingerprint of its file
+            if location == keep or tree.fingerprint != header.fingerprint:
+                continue
+            del self.loaded[location]
+            self.loaded_nodes -= header.nodes
+            dict.__setitem__(self.collection[category], filename, header)
+            self.untrack_tree(category, filename, tree)
+            self.names[header.name][location] = header
+            self.evicted[location] = (header, weakref.ref(tree))
+            if not self.is_snapshot:
+                tree.observe(self)
+
+    def drop_evicted(self, location: Tuple[str, str]) -> Union[Tuple[TreeHeader, weakref.ref], None]:
+        """
+        Forgets the tree that was dropped from memory at an entry, it is no longer observed unless it is stored or
+        dropped elsewhere in the collection
+        :param location: the (category, filename) of the entry
+        :return: the header and the weak reference to the tree, None if no tree was dropped at the entry
+        """
+        evicted = self.evicted.pop(location, None)
+        tree = evicted[1]() if evicted is not None else None
+        if tree is not None and id(tree) not in self.locations and \
+                not any(reference() is tree for _, reference in self.evicted.values()):
+            tree.unobserve(self)
+        return evicted
+
+    def tree_will_change(self, tree: Tree):
+        """
+        Called by a tree of the collection before it changes, a tree that was dropped from memory while someone
+        else still holds it is stored at its entries again, so the change counts as unsaved
+        :param tree: the tree that will change
+        """
+        if id(tree) in self.locations:
+            return
+        for (category, filename), (header, reference) in list(self.evicted.items()):
+            if reference() is tree and dict.get(self.collection.get(category, {}), filename) is header:
+                self.load_entry(category, filename, header, evict=False)
+
+    def load_role_users(self, role: str):
+        """
+        Reads the trees of a lazily loaded collection that use a role and were not read yet, without dropping
+        trees from memory, so the trees using the role can be found
+        :param role: the role
+        """
+        for category, trees in self.collection.items():
+            for filename, header in list(dict.items(trees)):
+                if type(header) is TreeHeader and role in header.roles:
+                    self.load_entry(category, filename, header, evict=False)
+
+    def tree_saved(self, tree: Tree, path: Path):
+        """
+        Called when a tree was written, a file of the collection gets the size and modification time it has now,
+        so it does not count as changed on disk, and a tree of a lazily loaded collection written to its own file
+        gets the header of the file, so it counts as unchanged again
+        :param tree: the written tree
+        :param path: the path the tree was written to
+        """
+        try:
+            stat = os.stat(str(path))
+        except OSError:
+            return
+        stamp = stat.st_size, stat.st_mtime_ns
+        file_path = os.path.abspath(str(path))
+        directory = os.path.dirname(file_path)
+        if os.path.dirname(directory) == os.path.abspath(str(self.jsons_path())):
+            location = (os.path.basename(directory), os.path.basename(file_path))
+            self.file_stamps[location] = stamp
+            self.file_fingerprints[location] = tree.fingerprint
+        for location in self.locations.get(id(tree), ()):
+            header = self.loaded.get(location)
+            if header is not None and os.path.abspath(header.path) == file_path:
+                self.loaded[location] = TreeHeader.from_tree(tree, header.path, stamp)
+                self.loaded_nodes += self.loaded[location].nodes - header.nodes
+
+    def files_saved(self, stamps: Dict[Tuple[str, str], Tuple[int, int]]) \
+            -> Dict[Tuple[str, str], Tuple[Tuple[int, int], int]]:
+        """
+        The files of the collection that were written since it had some stamps, for a copy of a collection that
+        writes its trees on another thread, see merge_saved
+        :param stamps: the size and modification time of the files before the trees were written
+        :return: the size and modification time of the written files and the fingerprint of the tree in them,
+                 by category and filename
+        """
+        return {location: (stamp, self.file_fingerprints[location]) for location, stamp in self.file_stamps.items()
+                if stamps.get(location) != stamp}
+
+    def merge_saved(self, path: Path, saved: Dict[Tuple[str, str], Tuple[Tuple[int, int], int]]):
+        """
+        Takes over the files that a copy of the collection wrote on another thread, like tree_saved does for
+        the files the collection writes itself
+        :param path: the path of the json files of the copy, nothing is taken over for another folder
+        :param saved: the written files, see files_saved
+        """
+        if os.path.abspath(str(path)) != os.path.abspath(str(self.jsons_path())):
+            return
+        for location, (stamp, fingerprint) in saved.items():
+            self.file_stamps[location] = stamp
+            self.file_fingerprints[location] = fingerprint
+            header = self.loaded.get(location)
+            if header is None:
+                continue
+            category, filename = location
+            tree = dict.get(self.collection.get(category, {}), filename)
+            # a tree of a lazily loaded collection that was written as it is gets the header of its file
+            if type(tree) is not TreeHeader and tree is not None and tree.fingerprint == fingerprint:
+                self.loaded[location] = TreeHeader.from_tree(tree, header.path, stamp)
+                self.loaded_nodes += self.loaded[location].nodes - header.nodes
+
+    def same_entry(self, other: 'Collection', category: str, filename: str) -> bool:
+        """
+        Compares an entry with the same entry of another collection by fingerprint, without reading trees
+        that were not read yet
+        :param other: the other collection
+        :param category: the category of the entry
+        :param filename: the filename of the entry
+        :return: True if both collections have the entry with the same tree
+        """
+        trees = self.collection.get(category)
+        other_trees = other.collection.get(category)
+        if trees is None or other_trees is None or filename not in trees or filename not in other_trees:
+            return False
+        return dict.__getitem__(trees, filename).fingerprint == dict.__getitem__(other_trees, filename).fingerprint
+
+    def unsaved_entry(self, saved: 'Collection', category: str, filename: str) -> bool:
+        """
+        Checks if an entry has changes that are not in the saved collection, also when the entry was added or
+        removed, without reading trees that were not read yet
+        :param saved: the saved collection
+        :param category: the category of the entry
+        :param filename: the filename of the entry
+        :return: True if the entry differs from the saved collection
+        """
+        present = filename in self.collection.get(category, {})
+        if present != (filename in saved.collection.get(category, {})):
+            return True
+        return present and not self.same_entry(saved, category, filename)
+
+    def replace_tree(self, tree: Tree, snapshot: Tree):
+        """
+        Replaces a tree by a snapshot with the same content, without reporting a change
+        :param tree: the tree that will change
+        :param snapshot: the snapshot of the tree
+        """
+        locations = self.locations.pop(id(tree), set())
+        for category, filename in locations:
+            dict.__setitem__(self.collection[category], filename, snapshot)
+            self.names[tree.name][(category, filename)] = snapshot
+        self.locations[id(snapshot)] = locations
+        self.indexed[id(snapshot)] = self.indexed.pop(id(tree))
+        for role in tree.role_nodes.keys():
+            self.role_users[role].pop(id(tree), None)
+            self.role_users[role][id(snapshot)] = snapshot
+        tree.unobserve(self)
+        tree.release(self)
+        snapshot.observe(self)
+        if self.is_snapshot:
+            snapshot.hold(self)
+
+    def snapshot(self):
+        """
+        Creates a read only collection that shares the trees with this collection. A tree that changes
+        is replaced by a snapshot of the tree in the read only collection first, so only changed trees
+        and nodes are copied
+        :return: the read only collection
+        """
+        snapshot = Collection(None, self.path, self.max_loaded_nodes)
+        snapshot.is_snapshot = True
+        snapshot.collection = self.collection
+        snapshot.share_loaded(self)
+        snapshot.file_stamps = self.file_stamps
+        snapshot.file_fingerprints = self.file_fingerprints
+        return snapshot
+
+    def clone(self):
+        """
+        Copies the collection and all of its trees, skips the generic deepcopy machinery.
+        A tree that is stored at multiple entries is copied once
+        :return: the copy
+        """
+        clones = {}
+        collection = {}
+        for category, trees in self.collection.items():
+            collection[category] = {}
+            # the headers of trees that are not read yet are shared, they do not change
+            for filename, tree in dict.items(trees):
+                if type(tree) is not TreeHeader and id(tree) not in clones:
+                    clones[id(tree)] = tree.clone()
+                collection[category][filename] = clones[id(tree)] if type(tree) is not TreeHeader else tree
+        clone = Collection(collection, self.path, self.max_loaded_nodes)
+        clone.only_verify_mathematical_properties = self.only_verify_mathematical_properties
+        clone.file_stamps = dict(self.file_stamps)
+        clone.file_fingerprints = dict(self.file_fingerprints)
+        return clone
+
+    def __deepcopy__(self, memo: Dict[int, Any]):
+        clone = self.clone()
+        memo[id(self)] = clone
+        return clone
+
+    def writable_copy(self):
+        """
+        Creates a collection that shares the trees with this read only collection and can be changed
+        :return: the writable collection
+        """
+        copy = Collection(self.collection, self.path, self.max_loaded_nodes)
+        for trees in copy.collection.values():
+            for tree in dict.values(trees):
+                if type(tree) is not TreeHeader:
+                    tree.make_writable()
+        copy.share_loaded(self)
+        copy.file_stamps = self.file_stamps
+        copy.file_fingerprints = self.file_fingerprints
+        return copy
+
+    def share_loaded(self, other: 'Collection'):
+        """
+        Takes over which trees of a lazily loaded collection that shares its trees were read from their files,
+        so they can be dropped from memory in this collection as well
+        :param other: the collection the trees are shared with
+        """
+        self.only_verify_mathematical_properties = other.only_verify_mathematical_properties
+        for (category, filename), header in other.loaded.items():
+            trees = self.collection.get(category)
+            if trees is not None and dict.get(trees, filename) is dict.get(other.collection[category], filename):
+                self.loaded[(category, filename)] = header
+                self.loaded_nodes += header.nodes
+
+    @property
+    def id_allocator(self) -> IdAllocator:
+        """
+        Allocator that knows the node ids of all trees in the collection and hands out unused ids
+        """
+        if self._id_allocator is None:
+            self._id_allocator = IdAllocator()
+            # a tree stored at multiple entries is counted once, like when it is added
+            trees = {id(tree): tree for trees in self.collection.values() for tree in dict.values(trees)
+                     if type(tree) is not TreeHeader}
+            for tree in trees.values():
+                self._id_allocator.register(tree.nodes.keys())
+        return self._id_allocator
+
+    @property
+    def reference_graph(self) -> 'ReferenceGraph':
+        """
+        The references between the trees of the collection by name, with the summaries of their structure checks
+        """
+        if self._reference_graph is None:
+            # imported here, the reference graph imports this module
+            from model.reference_graph import ReferenceGraph
+            self._reference_graph = ReferenceGraph(self)
+        return self._reference_graph
+
+    def node_ids_added(self, node_ids: Iterable[str]):
+        """
+        Called by a tree of the collection when nodes are added to it
+        :param node_ids: the ids of the added nodes
+        """
+        if self._id_allocator is not None:
+            self._id_allocator.register(node_ids)
+
+    def node_ids_removed(self, node_ids: Iterable[str]):
+        """
+        Called by a tree of the collection when nodes are removed from it
+        :param node_ids: the ids of the removed nodes
+        """
+        if self._id_allocator is not None:
+            self._id_allocator.release(node_ids)
+
+    def index_entry(self, category: str, filename: str, tree: Tree):
+        """
+        Adds an entry of the collection to the name, root and category indexes
+        :param category: the category of the entry
+        :param filename: the filename of the entry
+        :param tree: the tree stored at the entry
+        """
+        self.index_version += 1
+        self.names.setdefault(tree.name, {})[(category, filename)] = tree
+        counts = self.roots.setdefault(tree.root, {})
+        counts[category] = counts.get(category, 0) + 1
+        self.category_roots.setdefault(category, {})[filename] = (tree.root, tree.name)
+
+    def unindex_entry(self, category: str, filename: str, name: str, root: str):
+        """
+        Removes an entry of the collection from the name, root and category indexes
+        :param category: the category of the entry
+        :param filename: the filename of the entry
+        :param name: the name the tree of the entry is indexed with
+        :param root: the root the tree of the entry is indexed with
+        """
+        self.index_version += 1
+        entries = self.names.get(name, {})
+        entries.pop((category, filename), None)
+        if len(entries) == 0:
+            self.names.pop(name, None)
+        counts = self.roots.get(root, {})
+        if counts.get(category, 0) > 1:
+            counts[category] -= 1
+        else:
+            counts.pop(category, None)
+            if len(counts) == 0:
+                self.roots.pop(root, None)
+        self.category_roots.get(category, {}).pop(filename, None)
+
+    def role_used(self, tree: Tree, role: str):
+        """
+        Called by a tree of the collection when it got its first Role node with a role
+        :param tree: the tree
+        :param role: the role
+        """
+        if id(tree) in self.locations:
+            self.role_users.setdefault(role, {})[id(tree)] = tree
+
+    def role_unused(self, tree: Tree, role: str):
+        """
+        Called by a tree of the collection when its last Role node with a role was removed or changed
+        :param tree: the tree
+        :param role: the role
+        """
+        trees = self.role_users.get(role, {})
+        trees.pop(id(tree), None)
+        if len(trees) == 0:
+            self.role_users.pop(role, None)
+
+    def find_role_usages(self, role: str) -> List[Tuple[Tree, str]]:
+        """
+        Finds the Role nodes with a role in all trees of the collection
+        :param role: the role to look for
+        :return: a list with the trees and the ids of the Role nodes in them
+        """
+        if self.lazy:
+            self.load_role_users(role)
+        return [(tree, node.id) for tree in self.role_users.get(role, {}).values()
+                for node in tree.find_role_subtree_nodes_if_exist(role)]
+
+    def tree_changed(self, tree: Tree):
+        """
+        Called by a tree of the collection when it changed
+        :param tree: the changed tree
+        """
+        locations = self.locations.get(id(tree), ())
+        self.changed_entries.update(locations)
+        self._fingerprint = None
+        if self._reference_graph is not None:
+            self._reference_graph.tree_changed(tree.name)
+        # the indexes only change when the name or the root of the tree changed
+        indexed = self.indexed.get(id(tree))
+        if indexed is not None and indexed != (tree.name, tree.root):
+            self.indexed[id(tree)] = (tree.name, tree.root)
+            for category, filename in locations:
+                self.unindex_entry(category, filename, *indexed)
+                self.index_entry(category, filename, tree)
+
+    @property
+    def fingerprint(self) -> int:
+        """
+        Hash of the categories and trees of the collection, only the trees that changed since the last
+        call are hashed again
+        """
+        if self._fingerprint is None:
+            for category, filename in self.changed_entries:
+                self.hash_sum -= self.entry_hashes.pop((category, filename), 0)
+                trees = self.collection.get(category)
+                if filename is None and trees is not None:
+                    entry_hash = content_hash(category)
+                elif filename is not None and trees is not None and filename in trees:
+                    # a header has the fingerprint of the tree in its file, the tree is not read for it
+                    entry_hash = content_hash(category, filename, dict.__getitem__(trees, filename).fingerprint)
+                else:
+                    continue
+                self.entry_hashes[(category, filename)] = entry_hash
+                self.hash_sum += entry_hash
+            self.hash_sum %= HASH_MODULUS
+            self.changed_entries = set()
+            self._fingerprint = content_hash(self.hash_sum)
+        return self._fingerprint
 
     @classmethod
-    def from_path(cls, path: Path=None, only_verify_mathematical_properties: bool=True):
+    def from_path(cls, path: Path=None, only_verify_mathematical_properties: bool=True, lazy: bool=None):
         """
         Constructor creating a collection from a given location
         :param path: the path containing the directories with jsons
         :param only_verify_mathematical_properties: boolean to tell if
                 we should verify the tree while building the collection
+        :param lazy: if only the headers of the trees are read and the trees themselves when they are needed,
+                     defaults to the setting
         :return: the generated collection object
         """
-        collection = cls(None, path)
+        if lazy is None:
+            lazy = Settings.lazy_collection_loading()
+        collection = cls(None, path, Settings.max_loaded_nodes() if lazy else None)
         collection.build_collection(path, only_verify_mathematical_properties)
         return collection
 
     def build_collection(self, path: Path=None, only_verify_mathematical_properties: bool=True):
         """
-        Reads all the json files in the first subdirectories and creates Tree objects from them
+        Reads all the json files in the first subdirectories and creates Tree objects from them,
+        a lazily loaded collection only reads their headers
         :param only_verify_mathematical_properties: boolean to tell if we should
                         verify the tree while building the collection
         :param path: the path of the main JSON folder
         """
-        # set the path to the path specified in settings if None
-        if not path:
-            path = Settings.default_json_folder()
-        # clean the current collection
-        collection = {}
-        # create default categories in collection
-        for category in Settings.default_collection_categories():
-            collection[category] = {}
-        # find the current directories in the main json folder and create dict for each
-        # skip branch checking in coverage as the loop will only be executed once
-        for root, dirs, _ in os.walk(str(path)):     # pragma: no branch
-            for directory in dirs:
-                # skip hidden directories
-                if directory[0] == '_' or directory[0] == ".":
-                    continue
-                collection[directory] = {}
-                # for each directory make a tree object of each json file inside the folder
-                # add the object to the dict of that folder
-                # skip branch checking in coverage as the loop will only be executed once
-                for sub_root, _, files in os.walk(os.path.join(root, directory)):    # pragma: no branch
-                    for file in files:
-                        # skip hidden files
-                        if file[0] == '.':
-                            logging.info("File at {} is a hidden file, this file will be "
-                                         "skipped.".format(os.path.join(sub_root, file)))
-                            continue
-                        # only parse json files
-                        elif file.endswith('.json'):
-                            try:
-                                json_file: Dict[str, Any] = read_json(Path(sub_root) / file)
-                                tree: Tree = Tree.from_json(json_file)
-                                # Verify if the tree is valid
-                                if len(self.verify_tree(tree, None, only_verify_mathematical_properties)) == 0:
-                                    collection[directory][file] = tree
-                                else:
-                                    # say that tree x in folder y wasn't added
-                                    logging.warning("Unable to verify tree {} in {}, this tree will not be added to the"
-                                                    " collection".format(tree.name, os.path.join(sub_root, file)))
-                            # skip incorrect json files
-                            except InvalidTreeJsonFormatException:
-                                logging.error("The tree at {} is not a valid tree, this tree will "
-                                              "not be loaded".format(os.path.join(sub_root, file)))
-                                continue
-                        else:
-                            # If the file is not a .json log it
-                            logging.info("File at {} is not a .json file, this file will be "
-                                         "skipped.".format(os.path.join(sub_root, file)))
-                    break
-            break
-        self.collection = collection
+        # the files are read, converted and verified on multiple processes for large collections,
+        # the files that did not change are restored from the cache of the collection
+        # imported here, the collection loader imports this module
+        from model.collection_loader import CollectionLoader
+        self.only_verify_mathematical_properties = only_verify_mathematical_properties
+        loader = CollectionLoader()
+        self.collection = loader.load(path, only_verify_mathematical_properties, self, self.lazy)
+        self.file_stamps = loader.stamps
+        # the trees were hashed when they were verified, headers have the fingerprint of their file
+        self.file_fingerprints = {(category, filename): tree.fingerprint
+                                  for category, trees in self.collection.items()
+                                  for filename, tree in dict.items(trees)}
+
+    def read_changes(self, loader: 'CollectionLoader'=None) -> 'CollectionChanges':
+        """
+        Compares the files of the collection on disk with the files the collection was read from or written to and
+        reads the files that were added or changed since, the files count as read afterwards.
+        The trees are not changed, see merge_changes
+        :param loader: the loader that reads the files, defaults to one with the settings
+        :return: the changes
+        """
+        # imported here, the collection loader imports this module
+        from model.collection_loader import CollectionLoader
+        if loader is None:
+            loader = CollectionLoader()
+        changes = loader.changes(self.jsons_path(), self.file_stamps, self.only_verify_mathematical_properties, None,
+                                 self.lazy)
+        self.changes_read(changes)
+        return changes
+
+    def changes_read(self, changes: 'CollectionChanges'):
+        """
+        Takes over the stamps of the files that were compared by CollectionLoader.changes, for changes that were
+        read on another thread. The files count as read afterwards, the trees are not changed, see merge_changes.
+        The entries the collection wrote while the files were compared keep their stamps and are left out of
+        the changes, they are compared again the next time
+        :param changes: the changes
+        """
+        written = {location for location in changes.compared.keys() | changes.stamps.keys()
+                   if self.file_stamps.get(location) != changes.compared.get(location)}
+        if written:
+            changes.trees = {location: tree for location, tree in changes.trees.items() if location not in written}
+            changes.removed = [location for location in changes.removed if location not in written]
+        # changed in place, the snapshots and writable copies share the stamps
+        for location in [location for location in self.file_stamps.keys()
+                         if location not in changes.stamps and location not in written]:
+            del self.file_stamps[location]
+        self.file_stamps.update((location, stamp) for location, stamp in changes.stamps.items()
+                                if location not in written)
+        for location in changes.removed:
+            self.file_fingerprints.pop(location, None)
+        self.file_fingerprints.update((location, tree.fingerprint) for location, tree in changes.trees.items())
+
+    def merge_changes(self, changes: 'CollectionChanges', saved: 'Collection'=None,
+                      keep: Iterable[Tuple[str, str]]=()) -> List[Tuple[str, str]]:
+        """
+        Takes over the trees read from the files that were added or changed on disk and removes the trees of
+        removed files, entries with unsaved changes keep their trees
+        :param changes: the changes read by read_changes
+        :param saved: the saved version of this collection, the entries that differ from it are kept,
+                      None to take over all changes
+        :param keep: other (category, filename) entries that are kept, like the tree in the editor
+        :return: the (category, filename) entries that were changed
+        """
+        keep = set(keep)
+        for category in changes.categories:
+            if category not in self.collection:
+                self.collection[category] = {}
+        merged = []
+        for location in changes.locations():
+            category, filename = location
+            if location in keep or (saved is not None and self.unsaved_entry(saved, category, filename)):
+                continue
+            trees = self.collection.get(category)
+            if location in changes.trees:
+                trees[filename] = changes.trees[location]
+            elif trees is not None and filename in trees:
+                del trees[filename]
+            else:
+                continue
+            merged.append(location)
+        return merged
 
     def write_collection(self, path: Path=None) -> List[str]:
         """
@@ -608,12 +2311,17 @@ class Collection:
         :param path: the location to write to
         :returns errors, a list with errors that occurred during verification
         """
-        errors = []
         # set the path to the path specified in settings if None
         if not path and not self.path:
             path = Settings.default_json_folder()
         elif not path and self.path:
             path = self.path
+        # in the folder of the collection only the trees that differ from their files are written
+        own_folder = os.path.abspath(str(path)) == os.path.abspath(str(self.jsons_path()))
+        if not own_folder:
+            # verify all trees at once, write_trees finds the results in the verification cache
+            self.verify_collection(only_check_mathematical_properties=True)
+        writes = []
         # make a copy of the current collection
         collection = dict(self.collection)
         # read each nested dictionary and write each file in that directory
@@ -622,10 +2330,34 @@ class Collection:
             write_path = path / directory
             if not os.path.isdir(write_path):
                 os.makedirs(str(write_path))
-            for filename, content in files.items():
-                # write collection
-                errors.extend(self.write_tree(content, write_path / filename))
-        return errors
+            for filename in list(files.keys()):
+                if own_folder and self.saved_entry(directory, filename, write_path / filename):
+                    continue
+                # a tree of a lazily loaded collection that was not read yet is read to write it elsewhere
+                tree = files.get(filename)
+                if tree is not None:
+                    writes.append((tree, write_path / filename))
+        return self.write_trees(writes)
+
+    def saved_entry(self, category: str, filename: str, path: Path) -> bool:
+        """
+        Checks if the file of an entry has the content of the entry, because the file did not change since the
+        collection read or wrote it and the tree did not change since either, without reading trees that were not
+        read yet
+        :param category: the category of the entry
+        :param filename: the filename of the entry
+        :param path: the path of the file
+        :return: True if the tree does not have to be written
+        """
+        location = (category, filename)
+        if location not in self.file_fingerprints:
+            return False
+        try:
+            stat = os.stat(str(path))
+        except OSError:
+            return False
+        return (stat.st_size, stat.st_mtime_ns) == self.file_stamps.get(location) and \
+            dict.__getitem__(self.collection[category], filename).fingerprint == self.file_fingerprints[location]
 
     def add_tree(self, directory: str, name: str, tree: Tree):
         """
@@ -661,8 +2393,8 @@ class Collection:
         :returns True if success, False if tree was not found
         """
         if directory in self.collection.keys():
-            for key, value in self.collection[directory].items():
-                if value.name == name:
+            for key in self.collection[directory].keys():
+                if (directory, key) in self.names.get(name, {}):
                     self.remove_tree(directory, key)
                     return True
         Collection.logger.warning("The requested tree {} to be removed could not be found".format(name))
@@ -674,18 +2406,51 @@ class Collection:
         :param name: the name of the tree to find
         :return: the tree object
         """
-        for directory in self.collection.keys():
-            for key, value in self.collection[directory].items():
-                if value.name == name:
-                    return value
-        Collection.logger.warning('The requested tree {} does not exist'.format(name))
+        tree = self.find_tree_by_name(name)
+        if tree is None:
+            Collection.logger.warning('The requested tree {} does not exist'.format(name))
+        return tree
+
+    def find_tree_by_name(self, name: str) -> Union[Tree, None]:
+        """
+        Returns the first tree with the corresponding name, without logging when there is none
+        :param name: the name of the tree to find
+        :return: the tree object, None if there is no tree with the name
+        """
+        entry = self.find_entry_by_name(name)
+        if entry is None:
+            return None
+        (category, filename), tree = entry
+        if type(tree) is TreeHeader:
+            return self.collection[category].get(filename)
+        if self.loaded:
+            self.entry_used(category, filename)
+        return tree
+
+    def find_entry_by_name(self, name: str) -> Union[Tuple[Tuple[str, str], Union[Tree, TreeHeader]], None]:
+        """
+        Finds the first entry with a tree with the corresponding name, without reading the tree
+        :param name: the name of the tree to find
+        :return: the category and filename of the entry and the tree or its header, None if there is none
+        """
+        entries = self.names.get(name)
+        if entries and len(entries) == 1:
+            return next(iter(entries.items()))
+        if entries:
+            # multiple trees have the name, the first one in the collection is returned
+            for directory in self.collection.keys():
+                for key in self.collection[directory].keys():
+                    if (directory, key) in entries:
+                        return (directory, key), entries[(directory, key)]
         return None
 
-    def update_subtrees_in_collection(self, tree: Tree, role_node: Node=None):
+    def plan_role_update(self, tree: Tree, role_node: Node=None) -> Union[RoleUpdatePlan, None]:
         """
-        Helper method to automatically update the subtrees in other trees
+        Finds the subtrees in the collection that have to be updated after a role subtree changed,
+        without changing anything yet
         :param tree: the tree containing the new subtree
         :param role_node: the role node to update from. Leave empty if tree is a role
+        :return: the plan, or None if the role node is not valid
         """
         if not role_node:
             # update from the root of the tree. Tree should be a role
@@ -699,41 +2464,54 @@ class Collection:
                                                ' children'.format(role_node.title, role_node.id))
             role_name = role_node.attributes.get('role')
             start_node_id = role_node.children[0]
-        updated_roots = []
-        for category, trees in self.collection.items():
-            for _, loop_tree in trees.items():
-                if category == 'roles' and loop_tree.name == role_name and tree != loop_tree and \
-                            len(tree.find_role_subtree_nodes_below_node(tree.nodes.get(start_node_id))) == 0:
-                        old_root = loop_tree.root
-                        loop_tree.update_subtree(tree, old_root, start_node_id)
-                        # remove the old root and change root to new subtree
-                        loop_tree.root = loop_tree.nodes.get(old_root).children[0]
-                        loop_tree.nodes.pop(old_root)
-                        loop_tree.remove_propagation(tree.root)
+        if self.lazy:
+            self.load_role_users(role_name)
+        plan = RoleUpdatePlan(self, tree, role_name, start_node_id)
+        # copying a subtree that contains role subtrees itself could create a cycle, this does not change
+        # while planning so it is checked once
+        has_role_below = len(tree.find_role_subtree_nodes_below_node(tree.nodes.get(start_node_id))) > 0
+        # only the role tree itself and the trees using the role can change
+        entries = [entry for entry in self.names.get(role_name, {}).keys() if entry[0] == 'roles']
+        for loop_tree in self.role_users.get(role_name, {}).values():
+            entries.extend(self.locations.get(id(loop_tree), ()))
+        # a tree stored at multiple entries is updated once
+        planned = set()
+        for category, filename in sorted(set(entries)):
+            loop_tree = self.collection[category][filename]
+            if category == 'roles' and loop_tree.name == role_name and tree != loop_tree and not has_role_below:
+                if (id(loop_tree), loop_tree.root) not in planned:
+                    planned.add((id(loop_tree), loop_tree.root))
+                    plan.updates.append(RoleUpdate(category, filename, loop_tree, loop_tree.root, True))
+                continue
+            # update all subtrees below the given role node
+            for node in loop_tree.find_role_subtree_nodes_if_exist(role_name):
+                if (id(loop_tree), node.id) in planned:
+                    continue
+                update = RoleUpdate(category, filename, loop_tree, node.id)
+                if not loop_tree.find_role_subtree_node_above_node(node) and not has_role_below:
+                    if tree.name == loop_tree.name and role_node and node.id == role_node.id:
+                        # skip the node we're currently at
+                        continue
+                    planned.add((id(loop_tree), node.id))
+                    plan.updates.append(update)
                 else:
-                    # update all subtrees below the given role node
-                    role_nodes = loop_tree.find_role_subtree_nodes_if_exist(role_name)
-                    for node in role_nodes:
-                        if not loop_tree.find_role_subtree_node_above_node(node) and \
-                                len(tree.find_role_subtree_nodes_below_node(tree.nodes.get(start_node_id))) == 0:
-                            if tree.name == loop_tree.name and role_node and node.id == role_node.id:
-                                # skip the node we're currently at
-                                continue
-                            elif node in loop_tree.nodes.values():
-                                loop_tree.update_subtree(tree, node.id, start_node_id)
-                                updated_roots.append(node.id)
-                                # propagate ROLE attribute again
-                                if 'properties' in node.attributes and 'ROLE' in \
-                                        node.attributes.get('properties'):
-                                    loop_tree.propagate_role(node.id, node.attributes['properties']['ROLE'])
-                                else:
-                                    loop_tree.remove_propagation(node.id)
-                                continue
-                        else:
-                            # do not update subtrees with a role node above it if
-                            # the tree updating from has a role node below it.
-                            Collection.logger.warning('Prevented a cycle. Found a subtree above or below a subtree.')
-        return updated_roots
+                    # do not update subtrees with a role node above it if
+                    # the tree updating from has a role node below it.
+                    Collection.logger.warning('Prevented a cycle. Found a subtree above or below a subtree.')
+                    plan.prevented.append(update)
+        return plan
+
+    def update_subtrees_in_collection(self, tree: Tree, role_node: Node=None) -> Union[RoleUpdatePlan, None]:
+        """
+        Helper method to automatically update the subtrees in other trees
+        :param tree: the tree containing the new subtree
+        :param role_node: the role node to update from. Leave empty if tree is a role
+        :return: the applied plan with the updated Role nodes, or None if the role node is not valid
+        """
+        plan = self.plan_role_update(tree, role_node)
+        if plan is None:
+            return None
+        return plan.apply()
 
     def verify_tree(self, tree, category=None, only_check_mathematical_properties=False) -> List[str]:
         """
@@ -745,6 +2523,20 @@ class Collection:
         """
         return Verification.verify_tree(self, tree, category, only_check_mathematical_properties)
 
+    def verify_collection(self, only_check_mathematical_properties=False, category_checks=True,
+                          max_workers: int=None) -> List[str]:
+        """
+        Verifies all trees of the collection, large collections are verified on multiple processes
+        :param only_check_mathematical_properties: if only the mathematical properties should be checked
+        :param category_checks: if the structure of the trees is checked against the category they are in
+        :param max_workers: the number of processes, defaults to the number of cores
+        :return: the errors of all trees in the order of the collection, empty list when no errors occur
+        """
+        # imported here, the collection verifier imports this module
+        from model.collection_verifier import CollectionVerifier
+        results = CollectionVerifier(max_workers).verify(self, only_check_mathematical_properties, category_checks)
+        return [error for errors in results.values() for error in errors]
+
     def get_root_nodes_by_category(self, category: str) -> List[Tuple[str, str]]:
         """
         Gets all the root nodes from a specific category (Like 'strategies')
@@ -753,11 +2545,7 @@ class Collection:
         """
         if category not in self.collection:
             return []
-        result = []
-        trees = self.collection[category]
-        for tree in trees:
-            result.append((self.collection[category][tree].root, self.collection[category][tree].name))
-        return result
+        return list(self.category_roots.get(category, {}).values())
 
     def get_category_from_node(self, node: str) -> str:
         """
@@ -765,12 +2553,25 @@ class Collection:
         :param node: The node to check the category of
         :return: The category node if its found
         """
+        categories = self.roots.get(node)
+        if not categories:
+            return None
+        if len(categories) == 1:
+            return next(iter(categories))
+        # the node is the root of trees in multiple categories, the first category in the collection is returned
         for category in self.collection.keys():
-            for tree in self.collection[category]:
-                if self.collection[category][tree].root == node:
-                    return category
+            if category in categories:
+                return category
+
+    def is_root_in_category(self, node: str, category: str) -> bool:
+        """
+        Checks if a node is the root of a tree in a category
+        :param node: the id of the node
+        :param category: the category
+        :return: True if a tree in the category has the node as root
+        """
+        return category in self.roots.get(node, {})
 
-    # noinspection PyBroadException
     def write_tree(self, tree: Tree, path: Path, only_verify_mathematical_properties=True) -> List[str]:
         """
         Method that writes a tree to a file
@@ -779,19 +2580,71 @@ class Collection:
         :param only_verify_mathematical_properties: verify mathematical properties (False) or full verification (True)
         :return: a list with errors during writing of verification
         """
-        errors = self.verify_tree(tree, only_check_mathematical_properties=only_verify_mathematical_properties)
-        if len(errors) == 0:
+        return self.write_trees([(tree, path)], only_verify_mathematical_properties)
+
+    # noinspection PyBroadException
+    def write_trees(self, writes: List[Tuple[Tree, Path]], only_verify_mathematical_properties=True) -> List[str]:
+        """
+        Verifies trees and writes the trees without errors to their files, the files are written at the same time
+        on a pool of threads. Every file is replaced at once, a file is never left half written
+        :param writes: the trees and the paths to write them to
+        :param only_verify_mathematical_properties: verify mathematical properties (False) or full verification (True)
+        :return: a list with errors during writing of verification, in the order of the trees
+        """
+        results: List[List[str]] = []
+        contents = {}
+        # verified and serialized here, the trees and the verification cache are not shared with the threads
+        for index, (tree, path) in enumerate(writes):
+            errors = self.verify_tree(tree, only_check_mathematical_properties=only_verify_mathematical_properties)
+            results.append(errors)
+            if len(errors) > 0:
+                error = 'Tree {} could not be written as there were errors during verification'.format(tree.name)
+                Tree.logger.error(error)
+                errors.append(error)
+                continue
             try:
-                write_json(path, Tree.create_json(tree))
+                contents[index] = tree.serialized()
             except Exception:
-                error = 'An exception occurred when writing tree {}.'.format(tree.name)
-                Tree.logger.error(error)
-                errors.extend(error)
+                Collection.write_failed(tree, errors)
+        paths = [writes[index][1] for index in contents.keys()]
+        if len(contents) > 1:
+            with ThreadPoolExecutor(max_workers=min(Collection.WRITE_WORKERS, len(contents))) as executor:
+                written = list(executor.map(Collection.write_file, paths, contents.values()))
         else:
-            error = 'Tree {} could not be written as there were errors during verification'.format(tree.name)
-            Tree.logger.error(error)
-            errors.append(error)
-        return errors
+            written = [Collection.write_file(path, content) for path, content in zip(paths, contents.values())]
+        for index, success in zip(contents.keys(), written):
+            tree, path = writes[index]
+            if success:
+                self.tree_saved(tree, path)
+            else:
+                Collection.write_failed(tree, results[index])
+        return [error for errors in results for error in errors]
+
+    # noinspection PyBroadException
+    @staticmethod
+    def write_file(path: Path, content: bytes) -> bool:
+        """
+        Writes the file of a tree, on a thread of the pool of write_trees
+        :param path: the path of the file
+        :param content: the content of the file
+        :return: if the file was written
+        """
+        try:
+            write_file_atomic(path, content)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def write_failed(tree: Tree, errors: List[str]):
+        """
+        Reports a tree that could not be written
+        :param tree: the tree
+        :param errors: the errors of the tree, the error is added to
+        """
+        error = 'An exception occurred when writing tree {}.'.format(tree.name)
+        Tree.logger.error(error)
+        errors.append(error)
 
     def categories_and_filenames(self) -> Dict[str, List[str]]:
         """
@@ -814,12 +2667,58 @@ class Collection:
             return self.path
 
     def __eq__(self, other):
-        return (isinstance(other, self.__class__)
-                and self.__dict__ == other.__dict__)
+        """
+        Equality operator for collection, compares the path and the trees, collections with different
+        fingerprints are not compared any further. A tree that is not read yet is compared by the fingerprint
+        of its file
+        """
+        if not (isinstance(other, self.__class__) and self.path == other.path
+                and self.fingerprint == other.fingerprint):
+            return False
+        if self.collection.keys() != other.collection.keys():
+            return False
+        for category, trees in self.collection.items():
+            others = other.collection[category]
+            if trees.keys() != others.keys():
+                return False
+            for filename, tree in dict.items(trees):
+                other_tree = dict.__getitem__(others, filename)
+                if tree is other_tree:
+                    continue
+                if type(tree) is TreeHeader or type(other_tree) is TreeHeader:
+                    if tree.fingerprint != other_tree.fingerprint:
+                        return False
+                elif tree != other_tree:
+                    return False
+        return True
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        State used for copying and pickling, the fingerprint bookkeeping is rebuilt instead of copied
+        """
+        return {'path': self.path, 'max_loaded_nodes': self.max_loaded_nodes,
+                'only_verify_mathematical_properties': self.only_verify_mathematical_properties,
+                'file_stamps': dict(self.file_stamps), 'file_fingerprints': dict(self.file_fingerprints),
+                'collection': {category: dict(trees) for category, trees in self.collection.items()}}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        """
+        Restores a copied or unpickled collection
+        :param state: the state from __getstate__
+        """
+        self.path = state['path']
+        self.is_snapshot = False
+        self.max_loaded_nodes = state.get('max_loaded_nodes')
+        self.only_verify_mathematical_properties = state.get('only_verify_mathematical_properties', True)
+        self.file_stamps = state.get('file_stamps', {})
+        self.file_fingerprints = state.get('file_fingerprints', {})
+        self.collection = state['collection']
 
 
 class NodeTypes:
     logger = logging.getLogger("node_types")
+    # classifiers of the node types folders by absolute path, built once and kept until the node types change
+    classifiers: Dict[str, 'NodeTypeClassifier'] = {}
 
     def __init__(self, node_types: Dict[str, List[List[str]]]=None, path: Path=None):
         """
@@ -878,6 +2777,36 @@ class NodeTypes:
         # writes each category to a csv file in the path
         for category, csv_content in self.node_types.items():
             write_csv(path / (category + '.csv'), csv_content)
+        NodeTypes.invalidate_classifiers()
+
+    @classmethod
+    def default_classifier(cls, path: Path=None) -> 'NodeTypeClassifier':
+        """
+        Returns the classifier of the node types in a folder, the files are only read the first time
+        :param path: the path of the csv files, defaults to config/node_types/
+        :return: the classifier
+        """
+        read_path = path if path else Settings.default_node_types_folder()
+        key = os.path.abspath(str(read_path))
+        classifier = NodeTypes.classifiers.get(key)
+        if classifier is None:
+            classifier = NodeTypeClassifier(cls.from_csv(path))
+            NodeTypes.classifiers[key] = classifier
+        return classifier
+
+    @staticmethod
+    def invalidate_classifiers():
+        """
+        Drops the cached classifiers, called when the node types are reloaded or edited
+        """
+        NodeTypes.classifiers = {}
+
+    def classifier(self) -> 'NodeTypeClassifier':
+        """
+        Creates a classifier of these node types
+        :return: the classifier
+        """
+        return NodeTypeClassifier(self)
 
     @staticmethod
     def check_node_type_validity(node_type: List[str]) -> bool:
@@ -892,10 +2821,11 @@ class NodeTypes:
         return True
 
     @staticmethod
-    def create_node_from_node_type(node_type: List[str]) -> Node:
+    def create_node_from_node_type(node_type: List[str], id_allocator: IdAllocator=None) -> Node:
         """
         Static method to create a node object from a node with a provided node_type dictionary
         :param node_type: the dictionary containing the attributes the node requires and the name is first entry
+        :param id_allocator: hands out an id that is unique in the collection, a random id is generated without it
         :return: a node created from the node type dictionary
         """
         # check if the new node_type is valid
@@ -906,7 +2836,7 @@ class NodeTypes:
         # iterate over the node type, except the name
         for attribute in node_type[1:]:
             properties[attribute] = ""
-        return Node(node_type[0], attributes=attributes)
+        return Node(node_type[0], id_allocator.allocate_one() if id_allocator else None, attributes)
 
     def add_node_type(self, category: str, name: str, attributes: List[str]=None):
         """
@@ -924,6 +2854,7 @@ class NodeTypes:
             node_type.extend(attributes)
         # adds the node type to the requested category
         self.node_types.get(category).append(node_type)
+        NodeTypes.invalidate_classifiers()
 
     def remove_node_type(self, category: str, node_type: List[str]):
         """
@@ -934,6 +2865,7 @@ class NodeTypes:
         """
         if category in self.node_types.keys() and node_type in self.node_types.get(category):
             self.node_types.get(category).remove(node_type)
+            NodeTypes.invalidate_classifiers()
         NodeTypes.logger.warning("The requested node type {} in category {} "
                                  "could not be found and removed".format(node_type, category))
 
@@ -950,6 +2882,7 @@ class NodeTypes:
         if category in self.node_types.keys() and old in self.node_types.get(category):
             index = self.node_types.get(category).index(old)
             self.node_types.get(category)[index] = updated
+            NodeTypes.invalidate_classifiers()
 
     def add_category(self, category: str):
         """
@@ -958,6 +2891,7 @@ class NodeTypes:
         """
         if category not in self.node_types.keys():
             self.node_types[category] = []
+            NodeTypes.invalidate_classifiers()
 
     def remove_category(self, category: str):
         """
@@ -968,6 +2902,7 @@ class NodeTypes:
             NodeTypes.logger.warning("Category {} does not exist and cannot be removed "
                                      "from node types".format(category))
         self.node_types.pop(category, None)
+        NodeTypes.invalidate_classifiers()
 
     def get_node_type_by_name(self, name: str) -> List[Tuple[str, List[str]]]:
         """
@@ -1006,12 +2941,97 @@ class NodeTypes:
         return str(self.node_types)
 
 
+class NodeTypeClassifier:
+    """
+    Immutable lookup of the node types by name, built once from a NodeTypes object so the verifier
+    does not have to read the csv files or scan all node types for every node
+    """
+    __slots__ = ('table', 'types', 'categories', 'sequences', 'version')
+
+    def __init__(self, node_types: NodeTypes):
+        """
+        Constructor of the NodeTypeClassifier
+        :param node_types: the node types to classify with, later changes to them are not seen
+        """
+        # category -> node types, a copy of the node types the classifier was built from
+        object.__setattr__(self, 'table', {category: tuple(tuple(node_type) for node_type in category_node_types)
+                                           for category, category_node_types in node_types.node_types.items()})
+        types = {}
+        for category, category_node_types in node_types.node_types.items():
+            for node_type in category_node_types:
+                if len(node_type) > 0:
+                    types.setdefault(node_type[0], []).append((category, tuple(node_type)))
+        # name -> (category, node type) for every node type with the name, in the order of the node types
+        object.__setattr__(self, 'types', {name: tuple(entries) for name, entries in types.items()})
+        # name -> the categories of the node types with the name, a category is repeated for every node type
+        object.__setattr__(self, 'categories', {name: tuple(category for category, _ in entries)
+                                                for name, entries in types.items()})
+        # names of composites with Sequence in their name
+        object.__setattr__(self, 'sequences', frozenset(name for name, categories in self.categories.items()
+                                                        if 'composites' in categories and 'Sequence' in name))
+        # hash of the node types, classifiers of the same node types have the same version
+        object.__setattr__(self, 'version', content_hash(self.types))
+
+    def __setattr__(self, key, value):
+        raise AttributeError("NodeTypeClassifier is immutable")
+
+    def __reduce__(self):
+        """
+        Copies and pickles only contain the table of node types, the lookups are built again from it
+        """
+        return NodeTypeClassifier, (NodeTypes({category: [list(node_type) for node_type in category_node_types]
+                                               for category, category_node_types in self.table.items()}),)
+
+    def get_node_type_by_name(self, name: str) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+        """
+        Returns the node types with the requested name
+        :param name: the name to look for
+        :return: tuple of tuples with the category and node type
+        """
+        return self.types.get(name, ())
+
+    def categories_of(self, name: str) -> Tuple[str, ...]:
+        """
+        Returns the categories of the node types with the requested name, once for every node type
+        :param name: the name to look for
+        :return: a tuple with the categories
+        """
+        return self.categories.get(name, ())
+
+    def is_composite(self, name: str) -> bool:
+        """
+        If a node type with the name is a composite
+        """
+        return 'composites' in self.categories.get(name, ())
+
+    def is_decorator(self, name: str) -> bool:
+        """
+        If a node type with the name is a decorator
+        """
+        return 'decorators' in self.categories.get(name, ())
+
+    def is_condition(self, name: str) -> bool:
+        """
+        If the first node type with the name is a condition, the verifier only looks at the first one
+        """
+        categories = self.categories.get(name, ())
+        return len(categories) > 0 and categories[0] == 'conditions'
+
+    def is_sequence(self, name: str) -> bool:
+        """
+        If a node type with the name is a composite with Sequence in its name
+        """
+        return name in self.sequences
+
+
 class Verification:
     logger = logging.getLogger('verification')
+    # results of verify_tree, shared by all collections
+    cache = VerificationCache()
 
     @staticmethod
     def verify_tree(collection: Collection, tree: Tree, category=None,
-                    only_check_mathematical_properties=False) -> List[str]:
+                    only_check_mathematical_properties=False, classifier: NodeTypeClassifier=None) -> List[str]:
         """
         Function to verify if a tree is valid according to the definition of a tree. So being acyclic and having no
         unconnected nodes in short. But also according to the definition of a behaviour tree and
@@ -1025,17 +3045,41 @@ class Verification:
         some properties.
         :param only_check_mathematical_properties: Boolean value if we only want to check the mathematical properties
         of the tree
+        :param classifier: the node types to verify with, defaults to the cached node types from the settings
         :return: A list with errors, it the list is empty, no errors were found
         """
-        # first check mathematical properties and return them if any errors were found
-        errors = Verification.verify_mathematical_properties(tree)
-        if len(errors) is not 0:
+        if not only_check_mathematical_properties and not classifier:
+            classifier = NodeTypes.default_classifier()
+        key = Verification.cache_key(tree, category, only_check_mathematical_properties, classifier)
+        errors = Verification.cache.lookup(collection, key)
+        if errors is not None:
             return errors
-
-        if not only_check_mathematical_properties:
-            errors.extend(Verification.verify_non_mathematical_properties(collection, category, tree))
+        # the mathematical properties are checked first and returned if any errors were found, the other
+        # properties are checked while walking the tree only once
+        # imported here, the tree verifier imports this module
+        from model.tree_verifier import TreeVerifier
+        recorder = DependencyRecorder(collection)
+        with LogRecorder() as log:
+            errors = TreeVerifier(recorder, category, classifier).verify(tree, only_check_mathematical_properties)
+        Verification.cache.store(collection, key, errors, recorder.dependencies, log.records)
         return errors
 
+    @staticmethod
+    def cache_key(tree: Tree, category: str, only_check_mathematical_properties: bool,
+                  classifier: NodeTypeClassifier) -> Tuple:
+        """
+        The key of the results of a verification in the cache
+        :param tree: the tree that is verified
+        :param category: the category the tree is verified in
+        :param only_check_mathematical_properties: if only the mathematical properties are checked
+        :param classifier: the node types the tree is verified with, not used for the mathematical properties
+        :return: the key
+        """
+        # the mathematical properties only depend on the tree, the other properties on the node types as well
+        if only_check_mathematical_properties:
+            return tree.fingerprint, None, True, None
+        return tree.fingerprint, category, False, classifier.version
+
     @staticmethod
     def verify_mathematical_properties(tree: Tree):
         """
@@ -1048,7 +3092,7 @@ class Verification:
 
         # check validity of root
         errors.extend(Verification.check_root_validity(tree))
-        if len(errors) is not 0:
+        if len(errors) != 0:
             return errors
 
         # Check for cycles
@@ -1057,18 +3101,22 @@ class Verification:
         return errors
 
     @staticmethod
-    def verify_non_mathematical_properties(collection: Collection, category: str, tree: Tree) -> List[str]:
+    def verify_non_mathematical_properties(collection: Collection, category: str, tree: Tree,
+                                           classifier: NodeTypeClassifier=None) -> List[str]:
         """
         Helper method that calls the helper methods to check the non-mathematical properties of the verification
         :param collection: the collection of the tree
         :param category: the category of the tree
         :param tree: the tree to verify
+        :param classifier: the node types to verify with, defaults to the cached node types from the settings
         :return: a list with errors, empty if no errors
         """
+        if not classifier:
+            classifier = NodeTypes.default_classifier()
         errors = []
         errors.extend(Verification.has_unconnected_nodes(tree))
-        errors.extend(Verification.check_category_structure(collection, category, tree))
-        errors.extend(Verification.check_composites_and_decorators(tree, tree.root))
+        errors.extend(Verification.check_category_structure(collection, category, tree, classifier))
+        errors.extend(Verification.check_composites_and_decorators(tree, tree.root, classifier))
         errors.extend(Verification.check_role_inheritance(tree, tree.root))
         return errors
 
@@ -1079,63 +3127,120 @@ class Verification:
         :param tree: the tree to check the root of
         :return: a list with errors, empty list if valid
         """
+        return Verification.check_root(tree.name, tree.root, tree.root in tree.nodes)
+
+    @staticmethod
+    def check_root(tree_name: str, root: str, exists: bool) -> List[str]:
+        """
+        Helper method that checks the root of a tree, also used for trees that are not a Tree object
+        :param tree_name: the name of the tree
+        :param root: the id of the root
+        :param exists: if the tree has a node with the id of the root
+        :return: a list with errors, empty list if valid
+        """
         errors = []
-        root = tree.root
         # check existence of root and validity of root node
         if not root or root == '':
-            error = 'The tree {} does not have a root and cannot be validated'.format(tree.name)
+            error = 'The tree {} does not have a root and cannot be validated'.format(tree_name)
             errors.append(error)
-        elif root not in tree.nodes.keys():
-            error = 'The root node with id {} in tree {} does not exist.'.format(root, tree.name)
+        elif not exists:
+            error = 'The root node with id {} in tree {} does not exist.'.format(root, tree_name)
             errors.append(error)
         return errors
 
     @staticmethod
     def has_unconnected_nodes(tree) -> List[str]:
         """
-        Helper function to compare two lists of nodes to see if all the visited nodes are within a list of tree nodes,
-        if there are unconnected nodes then go through the list to log which ones are unconnected.
+        Helper function to find the nodes that cannot be reached from the root, children that do not
+        exist are logged as well
         :param tree: the tree object verifying
-        :return: True if there are no unconnected nodes
+        :return: a list with an error for every unconnected node, empty if there are none
         """
         errors = []
-        tree_nodes = tree.nodes.values()
-        visited_nodes = Verification.walk_tree(tree, tree.nodes.get(tree.root))
-        if len(visited_nodes) < len(tree_nodes):
-            # If there is an unconnected node find it so we can log detailed info
-            for tree_node in tree_nodes:
-                present = False
-                for visited_node in visited_nodes:
-                    if tree_node == visited_node:
-                        # If the node has been visited break from this loop
-                        present = True
-                        break
-                if not present:
-                    error = "The node {} is unconnected in tree {}".format(tree_node, tree.name)
-                    Verification.logger.error(error)
-                    errors.append(error)
+        unconnected, dangling = Verification.find_unconnected_nodes(tree)
+        for parent_id, child_id in dangling:
+            Verification.logger.error('Child {} from node {} in tree {} does not exist.'
+                                      .format(child_id, parent_id, tree.name))
+        for node_id in unconnected:
+            error = "The node {} is unconnected in tree {}".format(tree.nodes[node_id], tree.name)
+            Verification.logger.error(error)
+            errors.append(error)
         return errors
 
+    @staticmethod
+    def find_unconnected_nodes(tree: Tree) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """
+        Walks the tree once from the root to find the nodes that are not connected to it and the children
+        that do not exist
+        :param tree: the tree to check
+        :return: the ids of the unconnected nodes in the order of the nodes of the tree, and the
+                 (parent id, child id) pairs of children that do not exist
+        """
+        reachable, dangling = Verification.reachable_node_ids(tree, tree.root)
+        if len(reachable) == len(tree.nodes):
+            return [], dangling
+        return [node_id for node_id in tree.nodes.keys() if node_id not in reachable], dangling
+
+    @staticmethod
+    def reachable_node_ids(tree: Tree, start_node_id: str) -> Tuple[set, List[Tuple[str, str]]]:
+        """
+        Collects the ids of the nodes that can be reached from a node, every node is visited once
+        :param tree: the tree to walk
+        :param start_node_id: the id of the node to start from
+        :return: the set of reachable ids, and the (parent id, child id) pairs of children that do not exist
+        """
+        if start_node_id not in tree.nodes:
+            return set(), []
+        reachable = {start_node_id}
+        dangling = []
+        to_visit = [start_node_id]
+        while to_visit:
+            node_id = to_visit.pop()
+            for child_id in tree.nodes[node_id].children:
+                if child_id in reachable:
+                    continue
+                if child_id not in tree.nodes:
+                    dangling.append((node_id, child_id))
+                    continue
+                reachable.add(child_id)
+                to_visit.append(child_id)
+        return reachable, dangling
+
     @staticmethod
     def walk_tree(tree: Tree, start_node: Node) -> List[Node]:
         """
         Method to walk the tree to see which nodes are connected to the root
-        :param tree:
-        :param start_node:
-        :return:
-        """
-        visited_nodes = [start_node]
-        for child in start_node.children:
-            if child in tree.nodes:
-                child_node = tree.nodes.get(child)
-                if child_node not in visited_nodes:
-                    visited_nodes.extend(Verification.walk_tree(tree, child_node))
-                else:
-                    Verification.logger.error('Encountered a cycle in tree {}'.format(tree.name))
-            else:
+        :param tree: the tree to walk
+        :param start_node: the node to start walking from
+        :return: the visited nodes in depth first order
+        """
+        visited_nodes = []
+        # the ids of the visited nodes, so a deep tree is not compared against the whole list for each node
+        visited_ids = set()
+
+        # each step is the id of a child and the node it is a child of, None for the start node
+        def skip(step: Tuple[str, Union[Node, None]]) -> bool:
+            child, parent = step
+            if parent is None:
+                visited_nodes.append(start_node)
+                visited_ids.add(child)
+                return False
+            if child not in tree.nodes:
                 Verification.logger.error('Child {} from node {} in tree {} does not exist.'
-                                          .format(child, start_node.id, tree.name))
-                continue
+                                          .format(child, parent.id, tree.name))
+                return True
+            if child in visited_ids:
+                Verification.logger.error('Encountered a cycle in tree {}'.format(tree.name))
+                return True
+            visited_nodes.append(tree.nodes.get(child))
+            visited_ids.add(child)
+            return False
+
+        def children(step: Tuple[str, Union[Node, None]]) -> List[Tuple[str, Node]]:
+            node = start_node if step[1] is None else tree.nodes.get(step[0])
+            return [(child, node) for child in node.children]
+
+        walk((start_node.id, None), children, prune=skip)
         return visited_nodes
 
     @staticmethod
@@ -1151,9 +3256,7 @@ class Verification:
             # node_to_visit is the id represented as a string
             node_to_visit = to_visit.pop()
             if node_to_visit in visited_nodes:
-                error = "Cycle found in tree {} at node {} while verifying.".format(tree.name, node_to_visit)
-                Verification.logger.error(error)
-                return [error]
+                return Verification.cycle_found(tree.name, node_to_visit)
             visited_nodes[node_to_visit] = tree.nodes[node_to_visit]
             for node in tree.nodes[node_to_visit].children:
                 to_visit.append(node)
@@ -1161,6 +3264,18 @@ class Verification:
                 break
         return []
 
+    @staticmethod
+    def cycle_found(tree_name: str, node_id: str) -> List[str]:
+        """
+        Helper function that reports a cycle
+        :param tree_name: the name of the tree
+        :param node_id: the id of the node the cycle was found at
+        :return: a list with the error
+        """
+        error = "Cycle found in tree {} at node {} while verifying.".format(tree_name, node_id)
+        Verification.logger.error(error)
+        return [error]
+
     @staticmethod
     def check_role_inheritance(tree, current_node: str, current_role=None) -> List[str]:
         """
@@ -1171,101 +3286,154 @@ class Verification:
         :return: a list with errors
         """
         errors = []
-        children = tree.nodes[current_node].children
-        current_node_properties = tree.nodes[current_node].properties()
+        # Walk the children of the current node
+        walk([current_node, current_role],
+             lambda step: [[child, step[1]] for child in tree.nodes[step[0]].children],
+             pre=lambda step: Verification.check_role_inheritance_node(tree, step, errors))
+        return errors
+
+    @staticmethod
+    def check_role_inheritance_node(tree: Tree, step: List[Union[str, None]], errors: List[str]):
+        """
+        Checks the ROLE property of a single node against the role it should inherit
+        :param tree: the tree the node is in
+        :param step: [id of the node, role that should be inherited], the role is updated for the children
+        :param errors: the list to add the errors to
+        """
+        node_id, role = step
+        current_node_properties = tree.nodes[node_id].properties()
         if not current_node_properties:
-            if current_role:
+            if role:
                 error = "Error in structure of tree {}, node {} has no properties, but should inherit the " \
-                        "{} ROLE property from parent".format(tree.name, current_node, current_role)
+                        "{} ROLE property from parent".format(tree.name, node_id, role)
                 Verification.logger.error(error)
                 errors.append(error)
         elif "ROLE" in current_node_properties.keys():
-            if not current_role:
-                current_role = current_node_properties["ROLE"]
+            if not role:
+                step[1] = current_node_properties["ROLE"]
             else:
-                if not current_role == current_node_properties["ROLE"]:
+                if not role == current_node_properties["ROLE"]:
                     error = "Error in structure of tree {}, node {} has ROLE property {}, but should inherit" \
-                            "{} from parent".format(tree.name, current_node,
-                                                    current_node_properties["ROLE"], current_role)
+                            "{} from parent".format(tree.name, node_id,
+                                                    current_node_properties["ROLE"], role)
                     Verification.logger.error(error)
                     errors.append(error)
 
-        # Walk the children of the current node
-        for child in children:
-            errors.extend(Verification.check_role_inheritance(tree, child, current_role))
-
-        return errors
-
     @staticmethod
-    def check_category_structure(collection: Collection, category: str, tree: Tree):
+    def check_category_structure(collection: Collection, category: str, tree: Tree,
+                                 classifier: NodeTypeClassifier=None):
         """
         Helper function to check if the tree has a Strategy -> Tactic -> Role structure, which is defined as a structure
         by the RoboTeam.
         :param collection: the collection the tree is in
         :param category: the category of the tree
         :param tree: The tree to check the structure of
+        :param classifier: the node types to verify with, defaults to the cached node types from the settings
         :return: a list with errors, empty list if no errors
         """
         errors = []
-        root = tree.root
 
         # Is a category given? If so, check the tree structure
         if category:
             # First check if the root node is of the required type
-            category_root_nodes = collection.get_root_nodes_by_category(category)
-            found = False
-            for category_root_node in category_root_nodes:
-                if category_root_node[0] == root:
-                    found = True
-                    break
-            if not found:
-                error = "Error in structure of tree {}, root node was supposed to be a {} but was a {}" \
-                    .format(tree.name, category, collection.get_category_from_node(root))
-                Verification.logger.error(error)
-                errors.append(error)
+            errors.extend(Verification.check_category_root(collection, category, tree))
+            if errors:
                 return errors
 
-            # Walk the tree different ways depending on the category
-            passed_nodes = [False]*3
-            if category == "strategies":
-                passed_nodes = [False, False, False]
-            elif category == "tactics":
-                passed_nodes = [True, False, False]
-            elif category == "roles":
-                passed_nodes = [True, True, False]
-
             # Check validity by walking the tree and verifying properties defined by behaviour trees and RoboTeam
-            errors.extend(Verification.check_category_structure_recursive_step(collection, tree, root, passed_nodes))
+            errors.extend(Verification.check_category_structure_recursive_step(
+                collection, tree, tree.root, Verification.category_passed_nodes(category), classifier=classifier))
         return errors
 
+    @staticmethod
+    def check_category_root(collection: Collection, category: str, tree: Tree) -> List[str]:
+        """
+        Checks if the root node of a tree is of the type of the category
+        :param collection: the collection the tree is in
+        :param category: the category of the tree
+        :param tree: the tree to check the root of
+        :return: a list with the error, empty list if valid
+        """
+        root = tree.root
+        if collection.is_root_in_category(root, category):
+            return []
+        error = "Error in structure of tree {}, root node was supposed to be a {} but was a {}" \
+            .format(tree.name, category, collection.get_category_from_node(root))
+        Verification.logger.error(error)
+        return [error]
+
+    @staticmethod
+    def category_passed_nodes(category: str) -> List[bool]:
+        """
+        The node types of the Strategy -> Tactic -> Role structure that are passed before the root of a tree
+        :param category: the category of the tree
+        :return: a list with a boolean for strategies, tactics and roles
+        """
+        # Walk the tree different ways depending on the category
+        passed_nodes = [False]*3
+        if category == "strategies":
+            passed_nodes = [False, False, False]
+        elif category == "tactics":
+            passed_nodes = [True, False, False]
+        elif category == "roles":
+            passed_nodes = [True, True, False]
+        return passed_nodes
+
     @staticmethod
     def check_category_structure_recursive_step(collection: Collection, tree: Tree, current_node: str,
-                                                passed_nodes: [bool], first_step: bool=True) -> List[str]:
+                                                passed_nodes: [bool], first_step: bool=True,
+                                                classifier: NodeTypeClassifier=None) -> List[str]:
         """
-        Helper function for the recursive step
+        Helper function that walks the tree from a node
         to check if the tree has a Strategy -> Tactic -> Role structure, which is defined as a structure
-        by the RoboTeam.
+        by the RoboTeam. Leaf nodes with a name are followed into the tree with that name.
         :param collection: the collection the tree is in
         :param tree: The tree to check the structure of
-        :param current_node: The node currently checking
+        :param current_node: The node to start checking from
         :param passed_nodes: the nodes already checked
-        :param first_step: first time running recursive step
+        :param first_step: if current_node is the root of the walk
+        :param classifier: the node types to verify with, defaults to the cached node types from the settings
         :return: a list with errors, empty list if no errors
         """
-        node_types = NodeTypes.from_csv()
-        current_node_types = node_types.get_node_type_by_name(tree.nodes[current_node].title)
-        children = tree.nodes[current_node].children
-        current_node_type_is_sequence = False
-
+        if not classifier:
+            classifier = NodeTypes.default_classifier()
         errors = []
 
-        for current_node_type in current_node_types:
-            current_type = current_node_type[0]
-            # Composites only have one entry in their list, so we're allowed to do this
-            current_type_name = current_node_type[1][0]
-            if current_type == "composites":
-                if "Sequence" in current_type_name:
-                    current_node_type_is_sequence = True
+        # each step is [tree, id of the node, the passed nodes, first step, names of the trees followed into]
+        walk([tree, current_node, passed_nodes, first_step, (tree.name,)], lambda step: step[5],
+             pre=lambda step: Verification.check_category_structure_node(collection, step, errors, classifier))
+        return errors
+
+    @staticmethod
+    def referred_tree_name(tree: Tree, node_id: str, first_step: bool) -> Union[str, None]:
+        """
+        The name of the tree the structure check follows into from a node
+        :param tree: the tree the node is in
+        :param node_id: the id of the node
+        :param first_step: if the node is the root of the walk, which is never followed
+        :return: the name of a leaf node with a name that is not titled like its tree, otherwise None
+        """
+        node = tree.nodes[node_id]
+        if first_step or len(node.children) > 0 or "name" not in node.attributes or tree.name == node.title:
+            return None
+        return node.attributes["name"]
+
+    @staticmethod
+    def check_category_structure_node(collection: Collection, step: list, errors: List[str],
+                                      classifier: NodeTypeClassifier):
+        """
+        Checks the category structure at a single node, a leaf node with a name is followed into the tree with
+        that name. The steps for the children to walk are added to the step, so the walk stops where the check
+        returns early.
+        :param collection: the collection the tree is in
+        :param step: [tree, id of the node, the passed nodes, first step, names of the trees followed into]
+        :param errors: the list to add the errors to
+        :param classifier: the node types to verify with
+        """
+        tree, current_node, passed_nodes, first_step, followed = step
+        step.append([])
+        children = tree.nodes[current_node].children
+        current_node_type_is_sequence = classifier.is_sequence(tree.nodes[current_node].title)
 
         # If we're at a leaf node (and not the root node) check if all node types have been passed
         if len(children) == 0 and not first_step:
@@ -1276,16 +3444,18 @@ class Verification:
                             "Strategy -> Tactic -> Role pattern".format(tree.name, current_node)
                     Verification.logger.error(error)
                     errors.append(error)
-                return errors
+                return
             else:
-                current_node_name = tree.nodes[current_node].attributes["name"]
+                current_node_name = Verification.referred_tree_name(tree, current_node, first_step)
                 # If the name of the leaf does not match the current tree (to prevent cycles)
-                if tree.name != tree.nodes[current_node].title:
+                if current_node_name is not None:
                     tree = collection.get_tree_by_name(current_node_name)
-                    if tree:
+                    # a tree that was already followed into on this path would be walked forever
+                    if tree and tree.name not in followed:
                         current_node = tree.root
+                        followed = followed + (tree.name,)
                     else:
-                        return errors
+                        return
         current_node_category = collection.get_category_from_node(current_node)
         if current_node_category == "strategies":
             # We check if it's still false, because we can't pass the same node type twice.
@@ -1296,7 +3466,7 @@ class Verification:
                         "a strategy node twice".format(tree.name, current_node)
                 Verification.logger.error(error)
                 errors.append(error)
-                return errors
+                return
         elif current_node_category == "tactics" or tree.nodes[current_node].title == "Tactic":
             # We check if it's still false, because we can't pass the same node type twice.
             if passed_nodes[1] is False:
@@ -1306,7 +3476,7 @@ class Verification:
                         "encountered a tactic node twice".format(tree.name, current_node)
                 Verification.logger.error(error)
                 errors.append(error)
-                return errors
+                return
         elif current_node_category == "roles" or tree.nodes[current_node].title == "Role":
             # We check if it's still false, because we can't pass the same node type twice.
             if passed_nodes[2] is False:
@@ -1316,7 +3486,7 @@ class Verification:
                         "encountered a role node twice".format(tree.name, current_node)
                 Verification.logger.error(error)
                 errors.append(error)
-                return errors
+                return
         # Check for Keeper property here, since this kind of can replace Role apparently.
         elif tree.nodes[current_node].properties() \
                 and "ROLE" in tree.nodes[current_node].properties().keys() \
@@ -1326,39 +3496,47 @@ class Verification:
         # Walk the children of the current node
         for child in tree.nodes[current_node].children:
             # If the current node is a sequence, we must only walk nodes that are not conditions
-            if current_node_type_is_sequence:
-                child_node_type = node_types.get_node_type_by_name(tree.nodes[child].title)
-                # We are allowed to do child_node_type[0][0]
-                if len(child_node_type) > 0 and child_node_type[0][0] == "conditions":
-                    # If the child of a sequence is a condition, then we don't walk it
-                    continue
-            errors.extend(Verification.check_category_structure_recursive_step(collection, tree,
-                          child, passed_nodes.copy(), first_step=False))
-        return errors
+            if current_node_type_is_sequence and classifier.is_condition(tree.nodes[child].title):
+                # If the child of a sequence is a condition, then we don't walk it
+                continue
+            step[5].append([tree, child, passed_nodes.copy(), False, followed])
 
     @staticmethod
-    def check_composites_and_decorators(tree: Tree, current_node: str) -> List[str]:
+    def check_composites_and_decorators(tree: Tree, current_node: str,
+                                        classifier: NodeTypeClassifier=None) -> List[str]:
         """
         Checks the number of children composites and decorators can have
         :param tree: the tree to check
-        :param current_node: the node to recursively check
+        :param current_node: the node to start checking from
+        :param classifier: the node types to verify with, defaults to the cached node types from the settings
         :return: a list with errors, if none an empty list
         """
-        node_types = NodeTypes.from_csv()
-        current_node_types = node_types.get_node_type_by_name(tree.nodes[current_node].title)
-        children = tree.nodes[current_node].children
-        current_node_type_is_sequence = False
+        if not classifier:
+            classifier = NodeTypes.default_classifier()
         errors = []
+        walk(current_node, lambda node_id: Verification.composite_children(tree, node_id, classifier),
+             pre=lambda node_id: Verification.check_composite_or_decorator_node(tree, node_id, errors, classifier))
+        return errors
+
+    @staticmethod
+    def check_composite_or_decorator_node(tree: Tree, node_id: str, errors: List[str],
+                                          classifier: NodeTypeClassifier):
+        """
+        Checks the number of children of a single node if it is a composite or decorator
+        :param tree: the tree the node is in
+        :param node_id: the id of the node
+        :param errors: the list to add the errors to
+        :param classifier: the node types to verify with
+        """
+        children = tree.nodes[node_id].children
 
-        for current_node_type in current_node_types:
-            current_type = current_node_type[0]
-            # Composites only have one entry in their list, so we're allowed to do this
-            current_type_name = current_node_type[1][0]
+        # a node type that is in the node types multiple times is checked for each of them
+        for current_type in classifier.categories_of(tree.nodes[node_id].title):
             # Decorators should have only one child
             if current_type == "decorators":
                 if len(children) != 1:
                     error = "Error in structure of tree {}, node {} is a decorator which should have 1 child," \
-                            " but it has {} children".format(tree.name, current_node, len(children))
+                            " but it has {} children".format(tree.name, node_id, len(children))
                     Verification.logger.error(error)
                     errors.append(error)
 
@@ -1366,24 +3544,21 @@ class Verification:
             if current_type == "composites":
                 if len(children) < 1:
                     error = "Error in structure of tree {}, node {} is a compositor and should have more " \
-                            "than 1 child, but it has 0".format(tree.name, current_node)
+                            "than 1 child, but it has 0".format(tree.name, node_id)
                     Verification.logger.error(error)
                     errors.append(error)
-                if "Sequence" in current_type_name:
-                    current_node_type_is_sequence = True
 
-        # Walk the children of the current node
-        for child in tree.nodes[current_node].children:
-            # If the current node is a sequence, we must only walk nodes that are not conditions
-            if current_node_type_is_sequence:
-                child_node_type = node_types.get_node_type_by_name(tree.nodes[child].title)
-                # We are allowed to do child_node_type[0][0]
-                if len(child_node_type) > 0 and child_node_type[0][0] == "conditions":
-                    # If the child of a sequence is a condition, then we don't walk it
-                    pass
-                else:
-                    # Else walk normally recursively
-                    errors.extend(Verification.check_composites_and_decorators(tree, child))
-            else:
-                errors.extend(Verification.check_composites_and_decorators(tree, child))
-        return errors
+    @staticmethod
+    def composite_children(tree: Tree, node_id: str, classifier: NodeTypeClassifier) -> List[str]:
+        """
+        The children of a node that are checked for their number of children
+        :param tree: the tree the node is in
+        :param node_id: the id of the node
+        :param classifier: the node types to verify with
+        :return: the ids of the children, without the conditions of a sequence
+        """
+        if not classifier.is_sequence(tree.nodes[node_id].title):
+            return tree.nodes[node_id].children
+        # If the current node is a sequence, we must only walk nodes that are not conditions
+        return [child for child in tree.nodes[node_id].children
+                if not classifier.is_condition(tree.nodes[child].title)]
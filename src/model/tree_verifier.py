@@ -0,0 +1,576 @@
+import logging
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+from model.compact_tree import CompactTree
+from model.exceptions import VerificationCancelledException
+from model.reference_graph import ReferenceGraph, StructureSummary
+from model.traversal import walk
+from model.tree import Collection, NodeTypeClassifier, NodeTypes, Tree, Verification
+from model.verification_cache import DependencyRecorder
+
+
+class VerificationRule:
+    """
+    A check of the TreeVerifier that looks at every node while the tree is walked once.
+    The rule gets a state for every node it visits, which it can change for the children,
+    for example the role the children should inherit. A rule is made for a single verification.
+    The result of a visit should only depend on the key of the state, the node, the titles of its children,
+    the node types and the collection, so the IncrementalVerifier can keep it while those stay the same.
+    """
+    # state for a node the rule does not visit, the nodes below it are not visited either
+    PRUNE = object()
+
+    def __init__(self, verifier: 'TreeVerifier'):
+        """
+        Constructor of a rule
+        :param verifier: the verifier the rule is part of, with the collection, category and classifier
+        """
+        self.verifier = verifier
+        self.errors: List[str] = []
+
+    def start(self, tree: Tree) -> Any:
+        """
+        Called before the tree is walked
+        :param tree: the tree to verify
+        :return: the state for the root, PRUNE to not visit any node
+        """
+        return None
+
+    def visit(self, tree: Tree, node_id: str, state: Any) -> Any:
+        """
+        Checks a node, nodes are visited depth first with the children in order
+        :param tree: the tree to verify
+        :param node_id: the id of the node
+        :param state: the state of the node
+        :return: the state passed to child_state for the children, PRUNE to skip all children
+        """
+        return state
+
+    def state_key(self, state: Any) -> Any:
+        """
+        Comparable version of a state, a node visited with the same key gives the same result
+        :param state: the state of a node
+        :return: the key
+        """
+        return state
+
+    def child_state(self, tree: Tree, node_id: str, child_id: str, state: Any) -> Any:
+        """
+        The state of a child of a visited node
+        :param tree: the tree to verify
+        :param node_id: the id of the visited node
+        :param child_id: the id of the child
+        :param state: the state returned by visit for the node
+        :return: the state of the child, PRUNE to skip it
+        """
+        return state
+
+    def finish(self, tree: Tree) -> List[str]:
+        """
+        Called after the tree is walked
+        :param tree: the tree to verify
+        :return: the errors found by the rule
+        """
+        return self.errors
+
+
+class UnconnectedNodesRule(VerificationRule):
+    """
+    Finds the nodes that cannot be reached from the root, like Verification.has_unconnected_nodes.
+    Uses the nodes the verifier reached while walking the tree, so it does not visit any node itself.
+    """
+
+    def start(self, tree: Tree) -> Any:
+        return VerificationRule.PRUNE
+
+    def finish(self, tree: Tree) -> List[str]:
+        for parent_id, child_id in self.verifier.dangling:
+            Verification.logger.error('Child {} from node {} in tree {} does not exist.'
+                                      .format(child_id, parent_id, tree.name))
+        reachable = self.verifier.reachable
+        if len(reachable) == len(tree.nodes):
+            return self.errors
+        for node_id, node in tree.nodes.items():
+            if node_id not in reachable:
+                error = "The node {} is unconnected in tree {}".format(node, tree.name)
+                Verification.logger.error(error)
+                self.errors.append(error)
+        return self.errors
+
+
+class CategoryStructureRule(VerificationRule):
+    """
+    Checks the Strategy -> Tactic -> Role structure, like Verification.check_category_structure.
+    The trees that leaf nodes refer to are walked right away, so the errors keep their order.
+    """
+
+    def start(self, tree: Tree) -> Any:
+        category = self.verifier.category
+        if not category:
+            return VerificationRule.PRUNE
+        self.errors.extend(Verification.check_category_root(self.verifier.collection, category, tree))
+        if self.errors:
+            return VerificationRule.PRUNE
+        return [tree, tree.root, Verification.category_passed_nodes(category), True, (tree.name,)]
+
+    def state_key(self, state: Any) -> Any:
+        tree, node_id, passed_nodes, first_step, followed = state[:5]
+        return id(tree), node_id, tuple(passed_nodes), first_step, followed
+
+    def visit(self, tree: Tree, node_id: str, state: Any) -> Any:
+        # the check changes the step, the state of the node is kept as it is so it can be compared later
+        step = state[:5]
+        step[2] = step[2].copy()
+        key = self.summary_key(tree, node_id, step)
+        if key is None:
+            return self.check(self.verifier.collection, tree, step, self.errors, [])
+        # the leaf refers to another tree, which is checked once for every state it is entered in
+        graph, name = self.reference_graph(), key[0]
+        summary = graph.summary(name, key[1:])
+        if summary is None:
+            recorder = DependencyRecorder(self.verifier.collection)
+            errors, followed_trees = [], []
+            self.check(recorder, tree, step, errors, followed_trees)
+            graph.store_summary(name, key[1:], StructureSummary(errors, list(recorder.dependencies), followed_trees))
+            self.errors.extend(errors)
+            return VerificationRule.PRUNE
+        # ask the collection the same questions, so the answers are recorded like when the tree is walked
+        collection = self.verifier.collection
+        for method, argument in summary.queries:
+            if method == 'is_root_in_category':
+                collection.is_root_in_category(*argument)
+            else:
+                getattr(collection, method)(argument)
+        for followed_tree in summary.followed_trees:
+            self.verifier.tree_followed(followed_tree)
+        for error in summary.errors:
+            Verification.logger.error(error)
+        self.errors.extend(summary.errors)
+        return VerificationRule.PRUNE
+
+    def reference_graph(self) -> Union[ReferenceGraph, None]:
+        """
+        The reference graph with the summaries of the trees leaf nodes refer to, None to always walk them
+        """
+        return getattr(self.verifier.collection, 'reference_graph', None)
+
+    def summary_key(self, tree: Tree, node_id: str, step: list) -> Union[Tuple, None]:
+        """
+        The name of the tree a leaf node refers to and the state the tree is entered in, the structure check of
+        the tree only depends on the node types, the node types passed, if the leaf is a sequence and which of the
+        trees it can reach were already followed into
+        :param tree: the tree the node is in
+        :param node_id: the id of the node
+        :param step: the step of the node
+        :return: the name and the key of the summary, None if the node is not followed into a tree with a summary
+        """
+        name = Verification.referred_tree_name(tree, node_id, step[3])
+        if name is None:
+            return None
+        graph = self.reference_graph()
+        if graph is None or name in step[4] or graph.collection.find_tree_by_name(name) is None:
+            return None
+        classifier = self.verifier.classifier
+        return (name, classifier.version, classifier.is_sequence(tree.nodes[node_id].title), tuple(step[2]),
+                frozenset(step[4]).intersection(graph.reachable(name)))
+
+    def check(self, collection, tree: Tree, step: list, errors: List[str], followed_trees: List[Tree]) -> Any:
+        """
+        Checks the structure at a node, a tree the node refers to is walked right away
+        :param collection: the collection to ask
+        :param tree: the tree the node is in
+        :param step: the step of the node
+        :param errors: the list to add the errors to
+        :param followed_trees: the list to add the trees that are walked to
+        :return: the steps of the children by id, PRUNE if there are none in this tree
+        """
+        classifier = self.verifier.classifier
+        Verification.check_category_structure_node(collection, step, errors, classifier)
+        steps = step[5]
+        if not steps:
+            return VerificationRule.PRUNE
+        if steps[0][0] is not tree:
+            # the leaf was followed into another tree, which is not part of the walk of this tree
+            def check(followed_step: list):
+                self.verifier.tree_followed(followed_step[0])
+                followed_trees.append(followed_step[0])
+                Verification.check_category_structure_node(collection, followed_step, errors, classifier)
+
+            for followed_step in steps:
+                walk(followed_step, lambda child_step: child_step[5], pre=check)
+            return VerificationRule.PRUNE
+        return {child_step[1]: child_step for child_step in steps}
+
+    def child_state(self, tree: Tree, node_id: str, child_id: str, state: Any) -> Any:
+        return state.get(child_id, VerificationRule.PRUNE)
+
+
+class CompositesAndDecoratorsRule(VerificationRule):
+    """
+    Checks the number of children of composites and decorators, like Verification.check_composites_and_decorators
+    """
+
+    def visit(self, tree: Tree, node_id: str, state: Any) -> Any:
+        classifier = self.verifier.classifier
+        Verification.check_composite_or_decorator_node(tree, node_id, self.errors, classifier)
+        # If the current node is a sequence, we must only walk nodes that are not conditions
+        return classifier.is_sequence(tree.nodes[node_id].title)
+
+    def child_state(self, tree: Tree, node_id: str, child_id: str, state: Any) -> Any:
+        if state and self.verifier.classifier.is_condition(tree.nodes[child_id].title):
+            return VerificationRule.PRUNE
+        return None
+
+
+class RoleInheritanceRule(VerificationRule):
+    """
+    Checks that the ROLE properties are inherited by the children, like Verification.check_role_inheritance
+    """
+
+    def visit(self, tree: Tree, node_id: str, state: Any) -> Any:
+        step = [node_id, state]
+        Verification.check_role_inheritance_node(tree, step, self.errors)
+        return step[1]
+
+
+class TreeVerifier:
+    """
+    Verifies a tree with a single walk, every visited node goes through the checks of all rules.
+    Gives the same errors in the same order as running the checks of Verification one after another.
+    More checks can be added as a VerificationRule without walking the tree again.
+    """
+    logger = logging.getLogger('tree_verifier')
+    # the rules of Verification.verify_non_mathematical_properties, in the order of their errors
+    default_rules = [UnconnectedNodesRule, CategoryStructureRule, CompositesAndDecoratorsRule, RoleInheritanceRule]
+    # number of nodes walked between asking if the verification is cancelled
+    CANCEL_INTERVAL = 256
+
+    def __init__(self, collection: Collection, category: str=None, classifier: NodeTypeClassifier=None,
+                 rules: List[type]=None, cancelled: Callable[[], bool]=None):
+        """
+        Constructor of the TreeVerifier
+        :param collection: the collection the trees are in
+        :param category: the category of the trees, the category structure is not checked if None
+        :param classifier: the node types to verify with, defaults to the cached node types from the settings
+        :param rules: the VerificationRule classes to check with, default_rules if None
+        :param cancelled: optional function that returns True when the result is no longer needed, the
+                          verification then stops with a VerificationCancelledException
+        """
+        self.collection = collection
+        self.category = category
+        self._classifier = classifier
+        self.rules = list(TreeVerifier.default_rules if rules is None else rules)
+        self.cancelled = cancelled
+        # the ids of the nodes reached from the root and the (parent id, child id) pairs of children that
+        # do not exist, found while walking the tree
+        self.reachable = set()
+        self.dangling: List[Tuple[str, str]] = []
+
+    @property
+    def classifier(self) -> NodeTypeClassifier:
+        """
+        The node types to verify with, the cached node types from the settings are only read when a rule needs them
+        """
+        if not self._classifier:
+            self._classifier = NodeTypes.default_classifier()
+        return self._classifier
+
+    def add_rule(self, rule: type):
+        """
+        Adds a rule, its errors come after the errors of the rules that are already there
+        :param rule: the VerificationRule class
+        """
+        self.rules.append(rule)
+
+    def verify(self, tree: Tree, only_check_mathematical_properties: bool=False) -> List[str]:
+        """
+        Verifies a tree, the mathematical properties are checked first and returned if any errors were found
+        :param tree: the tree to verify
+        :param only_check_mathematical_properties: if only the mathematical properties are checked
+        :return: a list with errors, empty if no errors were found
+        """
+        errors = Verification.check_root_validity(tree)
+        if errors:
+            return errors
+
+        rules = [] if only_check_mathematical_properties else [rule(self) for rule in self.rules]
+        prune = VerificationRule.PRUNE
+        nodes = tree.nodes
+        visited = self.reachable = set()
+        self.dangling = []
+        # each entry is the id of a node and the state of every rule for it
+        stack = [(tree.root, [rule.start(tree) for rule in rules])]
+        while stack:
+            node_id, states = stack.pop()
+            if node_id in visited:
+                # the walk found the cycle, the separate check reports it at the node it finds first
+                return Verification.contains_cycles(tree, {})
+            visited.add(node_id)
+            if self.cancelled and len(visited) % TreeVerifier.CANCEL_INTERVAL == 0 and self.cancelled():
+                raise VerificationCancelledException('The verification of tree {} was cancelled'.format(tree.name))
+            children = []
+            for child_id in nodes[node_id].children:
+                if child_id in nodes:
+                    children.append(child_id)
+                else:
+                    self.dangling.append((node_id, child_id))
+            states = [state if state is prune else rule.visit(tree, node_id, state)
+                      for rule, state in zip(rules, states)]
+            # push in reverse, so the first child is visited first
+            for child_id in reversed(children):
+                stack.append((child_id, [state if state is prune else rule.child_state(tree, node_id, child_id, state)
+                                         for rule, state in zip(rules, states)]))
+
+        for rule in rules:
+            errors.extend(rule.finish(tree))
+        return errors
+
+    @staticmethod
+    def verify_compact(compact: CompactTree) -> List[str]:
+        """
+        Verifies the mathematical properties of a CompactTree with a walk over its arrays, gives the same errors as
+        verify with only the mathematical properties gives for the tree
+        :param compact: the tree to verify
+        :return: a list with errors, empty if no errors were found
+        """
+        errors = Verification.check_root(compact.name, compact.root, compact.root_slot() != CompactTree.NO_NODE)
+        if errors:
+            return errors
+        # the error is reported at the node the separate cycle check finds first, like verify does
+        slot = compact.first_revisit()
+        if slot != CompactTree.NO_NODE:
+            return Verification.cycle_found(compact.name, compact.ids[slot])
+        return errors
+
+    def tree_followed(self, tree: Tree):
+        """
+        Called by the rules for every node of another tree they check, the result depends on that tree
+        :param tree: the other tree
+        """
+
+
+class IncrementalVerifier(TreeVerifier):
+    """
+    Verifies a single tree again after it was edited, gives the same errors as the TreeVerifier.
+    The tree tells the verifier which nodes changed. The results of the rules are kept for every node and for
+    the subtree below it, a subtree without changed nodes whose root gets the same state from its parent is
+    not walked again. Changed nodes and their parents are checked again, and the nodes below them as long as
+    their state changes, like the ROLE they inherit. The nodes above them are only walked to combine the
+    results. Everything is checked again when the node types, the indexes of the collection, the name or root
+    of the tree or one of the trees the structure check followed into changed.
+    """
+    logger = logging.getLogger('incremental_verifier')
+
+    def __init__(self, collection: Collection, tree: Tree, category: str=None, classifier: NodeTypeClassifier=None,
+                 rules: List[type]=None, cancelled: Callable[[], bool]=None):
+        """
+        Constructor of the IncrementalVerifier
+        :param collection: the collection the tree is in
+        :param tree: the tree to verify
+        :param category: the category of the tree, the category structure is not checked if None
+        :param classifier: the node types to verify with, defaults to the cached node types from the settings,
+                           which are looked up again for every verification
+        :param rules: the VerificationRule classes to check with, default_rules if None
+        :param cancelled: optional function that returns True when the result is no longer needed, the
+                          verification then stops with a VerificationCancelledException and the kept
+                          results are forgotten
+        """
+        super(IncrementalVerifier, self).__init__(collection, category, classifier, rules, cancelled)
+        self.tree = tree
+        self.fixed_classifier = classifier
+        # node id -> [state keys, states for the children, errors of the node, errors of the subtree or None
+        # if there are none, id of the parent], the errors are lists per rule
+        self.records: Dict[str, list] = {}
+        # ids of the nodes that changed since the last verification, and if nodes were added, removed or moved
+        self.dirty_nodes = set()
+        self.structure_changed = True
+        # what the kept results depend on besides the nodes of the tree
+        self.verified_with: Tuple = ()
+        # object id of a tree the structure check followed into -> the tree and its fingerprint
+        self.followed_trees: Dict[int, Tuple[Tree, int]] = {}
+        # number of nodes checked by the rules and number of nodes walked during the last verification
+        self.checked_nodes = 0
+        self.walked_nodes = 0
+        tree.watch(self)
+
+    def tree_dirty(self, tree: Tree, node_id: str, structure: bool):
+        """
+        Called by the tree when a node changed
+        :param tree: the tree
+        :param node_id: the id of the node, None if the name, root or all nodes changed
+        :param structure: if the node was added, removed or its children changed
+        """
+        if node_id is None:
+            self.reset()
+            return
+        self.dirty_nodes.add(node_id)
+        self.structure_changed = self.structure_changed or structure
+
+    def reset(self):
+        """
+        Forgets the kept results, the next verification checks every node
+        """
+        self.records = {}
+        self.followed_trees = {}
+        self.dirty_nodes = set()
+        self.structure_changed = True
+
+    def outdated(self) -> bool:
+        """
+        Checks if the kept results depend on something outside the tree that changed
+        :return: True if the results can no longer be used
+        """
+        if self.verified_with != (self.classifier, self.collection.index_version, self.tree.name, self.tree.root):
+            return True
+        return any(tree.fingerprint != fingerprint for tree, fingerprint in self.followed_trees.values())
+
+    def verify(self, tree: Tree=None, only_check_mathematical_properties: bool=False) -> List[str]:
+        """
+        Verifies the tree, only the changed region is checked by the rules
+        :param tree: the tree to verify, has to be the tree of the verifier
+        :param only_check_mathematical_properties: if only the mathematical properties are checked,
+                                                   the kept results are not used then
+        :return: a list with errors, empty if no errors were found
+        """
+        tree = self.tree if tree is None else tree
+        if tree is not self.tree:
+            raise ValueError('The incremental verifier of tree {} can not verify tree {}'
+                             .format(self.tree.name, tree.name))
+        self.checked_nodes = self.walked_nodes = 0
+        if only_check_mathematical_properties:
+            return super(IncrementalVerifier, self).verify(tree, True)
+        errors = Verification.check_root_validity(tree)
+        if errors:
+            return errors
+        self._classifier = self.fixed_classifier if self.fixed_classifier else NodeTypes.default_classifier()
+        if self.outdated():
+            self.reset()
+        self.verified_with = (self.classifier, self.collection.index_version, tree.name, tree.root)
+
+        if self.structure_changed:
+            reachable, self.dangling = Verification.reachable_node_ids(tree, tree.root)
+            if self.contains_revisits(tree):
+                # the region is checked once the cycle is gone
+                return Verification.contains_cycles(tree, {})
+            self.reachable = reachable
+            # results of nodes that were cut off may be outdated when they are connected again
+            self.records = {node_id: record for node_id, record in self.records.items() if node_id in reachable}
+
+        rules = [rule(self) for rule in self.rules]
+        self.walk_region(tree, rules)
+        self.dirty_nodes = set()
+        self.structure_changed = False
+        for rule in rules:
+            errors.extend(rule.finish(tree))
+        return errors
+
+    @staticmethod
+    def contains_revisits(tree: Tree) -> bool:
+        """
+        Checks if a node can be reached from the root in multiple ways, which the verification reports as a cycle
+        :param tree: the tree
+        :return: True if a node is reached again
+        """
+        nodes = tree.nodes
+        visited = set()
+        to_visit = [tree.root]
+        while to_visit:
+            node_id = to_visit.pop()
+            if node_id in visited:
+                return True
+            visited.add(node_id)
+            to_visit.extend(child_id for child_id in nodes[node_id].children if child_id in nodes)
+        return False
+
+    def touched_nodes(self) -> Tuple[set, set]:
+        """
+        The nodes that are checked again and the nodes that are walked to reach them
+        :return: the ids of the changed nodes and their parents, and the ids of those nodes and all nodes above them
+        """
+        records = self.records
+        checked = set(self.dirty_nodes)
+        for node_id in self.dirty_nodes:
+            record = records.get(node_id)
+            if record is not None and record[4] is not None:
+                checked.add(record[4])
+        walked = set()
+        for node_id in checked:
+            while node_id is not None and node_id not in walked:
+                walked.add(node_id)
+                record = records.get(node_id)
+                node_id = record[4] if record is not None else None
+        return checked, walked
+
+    def walk_region(self, tree: Tree, rules: List[VerificationRule]):
+        """
+        Walks the tree from the root into the changed region, the kept results are used for the other subtrees
+        :param tree: the tree
+        :param rules: the rules of this verification
+        """
+        prune = VerificationRule.PRUNE
+        nodes = tree.nodes
+        records = self.records
+        checked, walked = self.touched_nodes()
+
+        # each step is [id of the node, the state of every rule for it, id of the parent, the ids of the children
+        # that are walked, or None if the kept results of the subtree are used]
+        def pre(step: list):
+            node_id, states, parent_id = step[:3]
+            self.walked_nodes += 1
+            if self.cancelled and self.walked_nodes % TreeVerifier.CANCEL_INTERVAL == 0 and self.cancelled():
+                # the results of the walked nodes are partly updated, they can not be used anymore
+                self.reset()
+                raise VerificationCancelledException('The verification of tree {} was cancelled'.format(tree.name))
+            keys = tuple(state if state is prune else rule.state_key(state) for rule, state in zip(rules, states))
+            record = records.get(node_id)
+            same_state = record is not None and record[0] == keys
+            if same_state and node_id not in walked:
+                record[4] = parent_id
+                if record[3] is not None:
+                    for rule, errors in zip(rules, record[3]):
+                        rule.errors.extend(errors)
+                step.append(None)
+                return
+            step.append([child_id for child_id in nodes[node_id].children if child_id in nodes])
+            if same_state and node_id not in checked:
+                # only walked to reach the changed nodes, the node itself did not change
+                record[4] = parent_id
+                for rule, errors in zip(rules, record[2]):
+                    rule.errors.extend(errors)
+                return
+            self.checked_nodes += 1
+            child_states = []
+            node_errors = []
+            for rule, state in zip(rules, states):
+                if state is prune:
+                    child_states.append(prune)
+                    node_errors.append([])
+                    continue
+                count = len(rule.errors)
+                child_states.append(rule.visit(tree, node_id, state))
+                node_errors.append(rule.errors[count:])
+            records[node_id] = [keys, child_states, node_errors, None, parent_id]
+
+        def children(step: list) -> List[list]:
+            node_id = step[0]
+            child_states = records[node_id][1]
+            return [[child_id, [state if state is prune else rule.child_state(tree, node_id, child_id, state)
+                                for rule, state in zip(rules, child_states)], node_id] for child_id in step[3]]
+
+        def post(step: list):
+            if step[3] is None:
+                return
+            record = records[step[0]]
+            totals = [list(errors) for errors in record[2]]
+            for child_id in step[3]:
+                child_errors = records[child_id][3]
+                if child_errors is not None:
+                    for total, errors in zip(totals, child_errors):
+                        total.extend(errors)
+            record[3] = totals if any(totals) else None
+
+        walk([tree.root, [rule.start(tree) for rule in rules], None], children, pre=pre, post=post,
+             prune=lambda step: step[3] is None)
+
+    def tree_followed(self, tree: Tree):
+        self.followed_trees[id(tree)] = (tree, tree.fingerprint)
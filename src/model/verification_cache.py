@@ -0,0 +1,184 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple, Union
+
+
+class DependencyRecorder:
+    """
+    Stands in for the collection during a verification and records the questions asked to it,
+    so a cached result can be checked against another state of the collection later
+    """
+
+    def __init__(self, collection: 'Collection'):
+        """
+        Constructor of the DependencyRecorder
+        :param collection: the collection to answer the questions
+        """
+        self.collection = collection
+        # (name of the method, argument) -> the answer, the fingerprint of the tree for get_tree_by_name
+        self.dependencies: Dict[Tuple[str, Any], Any] = {}
+
+    @property
+    def reference_graph(self) -> Union['ReferenceGraph', None]:
+        """
+        The reference graph of the collection, the answers of its summaries are recorded when they are used
+        """
+        return getattr(self.collection, 'reference_graph', None)
+
+    def get_tree_by_name(self, name: str) -> Union['Tree', None]:
+        tree = self.collection.get_tree_by_name(name)
+        self.dependencies[('get_tree_by_name', name)] = tree.fingerprint if tree is not None else None
+        return tree
+
+    def get_category_from_node(self, node: str) -> str:
+        category = self.collection.get_category_from_node(node)
+        self.dependencies[('get_category_from_node', node)] = category
+        return category
+
+    def is_root_in_category(self, node: str, category: str) -> bool:
+        result = self.collection.is_root_in_category(node, category)
+        self.dependencies[('is_root_in_category', (node, category))] = result
+        return result
+
+    @staticmethod
+    def still_valid(collection: 'Collection', dependencies: Dict[Tuple[str, Any], Any]) -> bool:
+        """
+        Checks if a collection gives the same answers as the ones that were recorded
+        :param collection: the collection
+        :param dependencies: the recorded answers
+        :return: True if all answers are the same
+        """
+        for (method, argument), answer in dependencies.items():
+            if method == 'get_tree_by_name':
+                tree = collection.get_tree_by_name(argument)
+                if (tree.fingerprint if tree is not None else None) != answer:
+                    return False
+            elif method == 'get_category_from_node':
+                if collection.get_category_from_node(argument) != answer:
+                    return False
+            elif collection.is_root_in_category(*argument) != answer:
+                return False
+        return True
+
+
+class LogRecorder(logging.Handler):
+    """
+    Records the messages logged by the current thread while it is used as a context manager,
+    so they can be logged again when a cached result is used instead of verifying the tree
+    """
+
+    def __init__(self):
+        """
+        Constructor of the LogRecorder
+        """
+        super().__init__()
+        self.thread = threading.get_ident()
+        # (name of the logger, level, message) of every logged record in order
+        self.records: List[Tuple[str, int, str]] = []
+
+    def __enter__(self) -> 'LogRecorder':
+        logging.getLogger().addHandler(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        logging.getLogger().removeHandler(self)
+
+    def emit(self, record: logging.LogRecord):
+        if record.thread == self.thread:
+            self.records.append((record.name, record.levelno, record.getMessage()))
+
+    @staticmethod
+    def replay(records: Tuple[Tuple[str, int, str], ...]):
+        """
+        Logs recorded messages again
+        :param records: the name of the logger, the level and the message of the records
+        """
+        for name, level, message in records:
+            logging.getLogger(name).log(level, message)
+
+
+class VerificationCache:
+    """
+    Keeps the errors of verified trees by the fingerprint of the tree, the category, what was checked and the
+    version of the node types. A result that depends on the collection is reused when the collection gives
+    the same answers, like the same fingerprints for the trees that were followed into.
+    The messages logged during a verification are logged again when its result is used.
+    The least recently used results are dropped first.
+    """
+    logger = logging.getLogger('verification_cache')
+    MAX_SIZE = 4096
+
+    def __init__(self, max_size: int=MAX_SIZE):
+        """
+        Constructor of the VerificationCache
+        :param max_size: the number of results that are kept
+        """
+        self.max_size = max_size
+        # key -> (errors, recorded answers of the collection, the collection and state it was last valid for,
+        #         the logged messages)
+        self.results: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def collection_state(collection: 'Collection') -> Tuple:
+        """
+        The state of a collection, a collection in the same state gives the same answers
+        :param collection: the collection
+        :return: a reference to the collection, the version of its indexes and its fingerprint
+        """
+        return id(collection), collection.index_version, collection.fingerprint
+
+    def lookup(self, collection: 'Collection', key: Tuple) -> Union[List[str], None]:
+        """
+        Looks up the errors of a verification, the messages logged during the verification are logged again
+        :param collection: the collection the tree is verified in
+        :param key: the key of the verification
+        :return: a copy of the errors, None if the result is not known
+        """
+        with self.lock:
+            entry = self.results.get(key)
+        if entry is not None:
+            errors, dependencies, state, records = entry
+            if dependencies and state != VerificationCache.collection_state(collection):
+                if not DependencyRecorder.still_valid(collection, dependencies):
+                    entry = None
+                else:
+                    entry = (errors, dependencies, VerificationCache.collection_state(collection), records)
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.results[key] = entry
+            self.results.move_to_end(key)
+            self.hits += 1
+        LogRecorder.replay(entry[3])
+        return list(entry[0])
+
+    def store(self, collection: 'Collection', key: Tuple, errors: List[str], dependencies: Dict[Tuple[str, Any], Any],
+              records: List[Tuple[str, int, str]]=()):
+        """
+        Stores the errors of a verification
+        :param collection: the collection the tree was verified in
+        :param key: the key of the verification
+        :param errors: the errors
+        :param dependencies: the answers of the collection the errors depend on
+        :param records: the messages logged during the verification, as recorded by a LogRecorder
+        """
+        state = VerificationCache.collection_state(collection) if dependencies else None
+        with self.lock:
+            self.results[key] = (tuple(errors), dependencies, state, tuple(records))
+            self.results.move_to_end(key)
+            while len(self.results) > self.max_size:
+                self.results.popitem(last=False)
+
+    def clear(self):
+        """
+        Drops all results
+        """
+        with self.lock:
+            self.results.clear()
+            self.hits = 0
+            self.misses = 0
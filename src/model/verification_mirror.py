@@ -0,0 +1,206 @@
+import logging
+import weakref
+from pathlib import Path
+from typing import Callable, Dict, List, Set, Tuple, Union
+
+from model.tree import Collection, Node, NodeTypes, Tree, TreeHeader, Verification
+from model.tree_verifier import IncrementalVerifier
+
+
+class MirrorUpdate:
+    """
+    The changes to a collection and the tree in the editor since the previous update, with copies of the trees
+    and nodes that changed. The thread that created the update does not use the copies anymore, so they can be
+    handed to another thread
+    """
+    __slots__ = ('reset', 'path', 'max_loaded_nodes', 'categories', 'edited_entries', 'category', 'tree', 'nodes')
+
+    def __init__(self, reset: bool, path: Path, max_loaded_nodes: int,
+                 categories: List[Tuple[str, List[Tuple[str, Union[Tree, TreeHeader, None]]]]],
+                 edited_entries: Set[Tuple[str, str]], category: str, tree: Union[Tree, None],
+                 nodes: Union[Dict[str, Union[Node, None]], None]):
+        """
+        Constructor of the MirrorUpdate
+        :param reset: if the update is of another collection than the previous update, everything is sent again
+        :param path: the path of the collection
+        :param max_loaded_nodes: the number of nodes a lazily loaded collection keeps in memory, None if it is
+                                 not lazily loaded
+        :param categories: the categories with the filenames of their entries in collection order, with a copy
+                           of the tree or the header at the entries that changed and None at the other entries
+        :param edited_entries: the (category, filename) entries that hold the tree in the editor
+        :param category: the category of the tree in the editor
+        :param tree: a copy of the tree in the editor, None if only the changed nodes are sent
+        :param nodes: copies of the changed nodes of the tree in the editor by id, None for removed nodes
+        """
+        self.reset = reset
+        self.path = path
+        self.max_loaded_nodes = max_loaded_nodes
+        self.categories = categories
+        self.edited_entries = edited_entries
+        self.category = category
+        self.tree = tree
+        self.nodes = nodes
+
+
+class MirrorUpdater:
+    """
+    Creates the updates for a VerificationMirror on the thread that edits the collection. The tree in the editor
+    tells the updater which nodes changed, the other trees are sent again when their fingerprint changed
+    """
+    logger = logging.getLogger('mirror_updater')
+
+    def __init__(self):
+        """
+        Constructor of the MirrorUpdater
+        """
+        # weak references to the collection and tree of the previous update
+        self.collection_reference = None
+        self.tree_reference = None
+        # (category, filename) -> the fingerprint of the tree that was sent, None at the entries of the edited tree
+        self.sent: Dict[Tuple[str, str], Union[int, None]] = {}
+        # ids of the nodes of the edited tree that changed since the previous update, and if the whole tree is sent
+        self.dirty_nodes = set()
+        self.tree_outdated = True
+
+    def tree_dirty(self, tree: Tree, node_id: str, structure: bool):
+        """
+        Called by the tree in the editor when a node changed
+        :param tree: the tree
+        :param node_id: the id of the node, None if the name, root or all nodes changed
+        :param structure: if the node was added, removed or its children changed
+        """
+        if node_id is None:
+            self.tree_outdated = True
+        else:
+            self.dirty_nodes.add(node_id)
+
+    def update(self, collection: Collection, tree: Tree, category: str) -> MirrorUpdate:
+        """
+        Creates the update with the changes since the previous update
+        :param collection: the collection
+        :param tree: the tree in the editor
+        :param category: the category of the tree in the editor
+        :return: the update
+        """
+        reset = self.collection_reference is None or self.collection_reference() is not collection
+        if reset:
+            self.collection_reference = weakref.ref(collection)
+            self.sent = {}
+            self.tree_outdated = True
+        edited = self.tree_reference() if self.tree_reference is not None else None
+        if edited is not tree:
+            if edited is not None:
+                edited.unwatch(self)
+            tree.watch(self)
+            self.tree_reference = weakref.ref(tree)
+            self.tree_outdated = True
+
+        categories = []
+        edited_entries = set()
+        sent = {}
+        for entry_category, trees in collection.collection.items():
+            entries = []
+            # the values are looked up directly, a lazily loaded collection would read the trees first
+            for filename, entry in dict.items(trees):
+                location = (entry_category, filename)
+                if entry is tree:
+                    edited_entries.add(location)
+                    sent[location] = None
+                    entries.append((filename, None))
+                    continue
+                # a tree and a header with the same fingerprint have the same content
+                sent[location] = entry.fingerprint
+                if self.sent.get(location) != entry.fingerprint:
+                    entries.append((filename, entry if type(entry) is TreeHeader else entry.clone()))
+                else:
+                    entries.append((filename, None))
+            categories.append((entry_category, entries))
+        self.sent = sent
+
+        if self.tree_outdated:
+            copy, nodes = tree.clone(), None
+        else:
+            copy = None
+            nodes = {}
+            for node_id in self.dirty_nodes:
+                node = dict.get(tree.nodes, node_id)
+                nodes[node_id] = node.clone() if node is not None else None
+        self.dirty_nodes = set()
+        self.tree_outdated = False
+        return MirrorUpdate(reset, collection.path, collection.max_loaded_nodes, categories, edited_entries,
+                            category, copy, nodes)
+
+
+class VerificationMirror:
+    """
+    A copy of a collection and the tree in the editor that is verified on another thread than the one that edits
+    them. Only the verifying thread uses the copy, it is kept up to date with the updates of a MirrorUpdater.
+    The copy of the tree in the editor is changed node by node, so its IncrementalVerifier only checks the
+    changed region again, and results of the verification cache are used when the tree is known already
+    """
+    logger = logging.getLogger('verification_mirror')
+
+    def __init__(self):
+        """
+        Constructor of the VerificationMirror
+        """
+        self.collection = Collection()
+        self.tree: Tree = None
+        self.category: str = None
+        self.verifier: IncrementalVerifier = None
+
+    def apply(self, update: MirrorUpdate):
+        """
+        Applies the changes of an update, every update has to be applied in the order they were created
+        :param update: the update
+        """
+        if update.reset:
+            self.collection = Collection(None, update.path, update.max_loaded_nodes)
+        self.collection.path = update.path
+        if update.tree is not None:
+            self.tree = update.tree
+        else:
+            for node_id, node in update.nodes.items():
+                if node is None:
+                    self.tree.nodes.pop(node_id, None)
+                else:
+                    self.tree.nodes[node_id] = node
+        self.category = update.category
+
+        current = self.collection.collection
+        layout = [(category, [filename for filename, _ in entries]) for category, entries in update.categories]
+        if layout == [(category, list(trees.keys())) for category, trees in current.items()]:
+            # the same entries in the same order, only the changed entries are replaced
+            for category, entries in update.categories:
+                trees = current[category]
+                for filename, entry in entries:
+                    if (category, filename) in update.edited_entries:
+                        entry = self.tree
+                    if entry is not None and dict.get(trees, filename) is not entry:
+                        trees[filename] = entry
+        else:
+            collection = {}
+            for category, entries in update.categories:
+                trees = dict.get(current, category, {})
+                collection[category] = {filename: self.tree if (category, filename) in update.edited_entries
+                                        else entry if entry is not None else dict.get(trees, filename)
+                                        for filename, entry in entries}
+            self.collection.collection = collection
+
+        if self.verifier is None or self.verifier.tree is not self.tree or self.verifier.collection is not \
+                self.collection or self.verifier.category != self.category:
+            self.verifier = IncrementalVerifier(self.collection, self.tree, self.category)
+
+    def verify(self, cancelled: Callable[[], bool]=None) -> List[str]:
+        """
+        Verifies the copy of the tree in the editor
+        :param cancelled: optional function that returns True when the result is no longer needed, the
+                          verification then stops with a VerificationCancelledException
+        :return: a list with errors, empty if no errors were found
+        """
+        key = Verification.cache_key(self.tree, self.category, False, NodeTypes.default_classifier())
+        errors = Verification.cache.lookup(self.collection, key)
+        if errors is not None:
+            return errors
+        self.verifier.cancelled = cancelled
+        return self.verifier.verify()
@@ -1,3 +1,8 @@
+import json
+import os
+
+import pytest
+
 from controller.utils import *
 from model.config import Settings
 
@@ -12,6 +17,44 @@ def test_write_json(tmpdir):
     assert read_json(tmpdir / "test.json") == json_file
 
 
+def test_write_file_atomic(tmpdir):
+    write_file_atomic(tmpdir / "test.json", json.dumps(json_file).encode())
+    assert read_json(tmpdir / "test.json") == json_file
+    write_file_atomic(tmpdir / "test.json", b'{}')
+    assert {} == read_json(tmpdir / "test.json")
+    # no temporary files are left behind
+    assert ["test.json"] == os.listdir(str(tmpdir))
+
+
+def test_write_file_atomic_mode(tmpdir):
+    # new files get the permissions of the umask, existing files keep theirs
+    umask = os.umask(0o022)
+    try:
+        write_file_atomic(tmpdir / "test.json", b'{}')
+    finally:
+        os.umask(umask)
+    assert 0o644 == os.stat(str(tmpdir / "test.json")).st_mode & 0o777
+    os.chmod(str(tmpdir / "test.json"), 0o640)
+    write_file_atomic(tmpdir / "test.json", b'[]')
+    assert 0o640 == os.stat(str(tmpdir / "test.json")).st_mode & 0o777
+
+
+def test_write_file_atomic_failed(tmpdir, monkeypatch):
+    write_file_atomic(tmpdir / "test.json", b'{}')
+    descriptors = len(os.listdir('/proc/self/fd')) if os.path.isdir('/proc/self/fd') else None
+
+    def chmod(path, mode):
+        raise PermissionError(path)
+    monkeypatch.setattr(os, 'chmod', chmod)
+    with pytest.raises(PermissionError):
+        write_file_atomic(tmpdir / "test.json", b'[]')
+    # the file is unchanged, the temporary file is removed and closed
+    assert {} == read_json(tmpdir / "test.json")
+    assert ["test.json"] == os.listdir(str(tmpdir))
+    if descriptors is not None:
+        assert descriptors == len(os.listdir('/proc/self/fd'))
+
+
 def test_read_csv():
     file = read_csv(Settings.default_node_types_folder() / 'conditions.csv')
     assert csv_file == file
@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from model.collection_cache import CollectionCache
+from model.collection_loader import CollectionLoader
+from model.config import Settings
+from model.tree import Collection, TreeHeader, Verification
+
+
+class TestCollectionCache(object):
+    path = Path('json/collection')
+    complete_path = Path('json/jsons')
+
+    @pytest.fixture
+    def cache_folder(self, tmpdir):
+        folder = Settings.collection_cache_folder()
+        Settings.alter_collection_cache_folder(Path(str(tmpdir / 'cache')))
+        yield Path(str(tmpdir / 'cache'))
+        Settings.alter_collection_cache_folder(folder)
+
+    @pytest.fixture
+    def collection_path(self, tmpdir):
+        path = Path(str(tmpdir / 'jsons'))
+        shutil.copytree(str(self.complete_path), str(path))
+        return path
+
+    @staticmethod
+    def load(caplog, path: Path, only_math: bool=True, lazy: bool=False):
+        caplog.clear()
+        with caplog.at_level(logging.INFO):
+            trees = CollectionLoader(1).load(path, only_math, lazy=lazy)
+        return trees, [(record.levelname, record.getMessage()) for record in caplog.records
+                       if record.name == 'root']
+
+    @staticmethod
+    def read_files(monkeypatch):
+        # the files that are read instead of restored from the cache
+        read = []
+        original = CollectionLoader.results
+
+        def results(loader, json_files, *args):
+            read.extend(json_files)
+            return original(loader, json_files, *args)
+        monkeypatch.setattr(CollectionLoader, 'results', results)
+        return read
+
+    def test_disabled(self, tmpdir):
+        # the test settings do not cache the collections
+        assert Settings.collection_cache_folder() is None
+        assert CollectionCache.for_collection(self.path) is None
+
+    def test_alter_collection_cache_folder(self, cache_folder):
+        assert cache_folder == Settings.collection_cache_folder()
+        # the default folder is in the home directory of the user
+        Settings.alter_collection_cache_folder(Path('~/.cache/editor'))
+        assert Path.home() / '.cache' / 'editor' == Settings.collection_cache_folder()
+
+    def test_restored(self, caplog, cache_folder, monkeypatch):
+        for path in (self.path, self.complete_path):
+            for only_math in (True, False):
+                read = self.read_files(monkeypatch)
+                uncached, uncached_messages = self.load(caplog, path, only_math)
+                cached, cached_messages = self.load(caplog, path, only_math)
+                # the second time every file is restored from the cache, with the same messages
+                assert uncached == cached
+                assert [list(trees) for trees in uncached.values()] == [list(trees) for trees in cached.values()]
+                assert uncached_messages == cached_messages
+                assert len(read) == len(set(read))
+                monkeypatch.undo()
+        assert 2 == len(os.listdir(str(cache_folder)))
+
+    def test_restored_headers(self, caplog, cache_folder):
+        trees, _ = self.load(caplog, self.complete_path)
+        headers, _ = self.load(caplog, self.complete_path, lazy=True)
+        read_headers = CollectionLoader(1, use_cache=False).load(self.complete_path, lazy=True)
+        # the headers are cached with the trees
+        for category, category_trees in read_headers.items():
+            for filename, header in category_trees.items():
+                cached = headers[category][filename]
+                assert isinstance(cached, TreeHeader)
+                for attribute in TreeHeader.__slots__:
+                    assert getattr(header, attribute) == getattr(cached, attribute)
+                assert trees[category][filename].fingerprint == cached.fingerprint
+
+    def test_verified_again(self, caplog, cache_folder, monkeypatch):
+        trees, _ = self.load(caplog, self.complete_path, False)
+        assert 0 < sum(len(files) for files in trees.values())
+        # only the mathematical properties are cached, the other properties depend on the collection and the
+        # node types, they are verified again
+        read = self.read_files(monkeypatch)
+        verify_tree = Verification.verify_tree
+
+        def verify(collection, tree, category=None, only_check_mathematical_properties=False, classifier=None):
+            if not only_check_mathematical_properties:
+                return ['error']
+            return verify_tree(collection, tree, category, only_check_mathematical_properties, classifier)
+        monkeypatch.setattr(Verification, 'verify_tree', verify)
+        trees, messages = self.load(caplog, self.complete_path, False)
+        assert [] == read
+        assert 0 == sum(len(files) for files in trees.values())
+        assert any(message.startswith('Unable to verify tree') for _, message in messages)
+
+    def test_changed_file(self, caplog, cache_folder, collection_path, monkeypatch):
+        self.load(caplog, collection_path)
+        file_path = os.path.join(str(collection_path), 'roles', 'Assister.json')
+        with open(file_path, 'r') as file:
+            content = json.load(file)
+        content['name'] = content['data']['trees'][0]['title'] = 'ChangedRole'
+        with open(file_path, 'w') as file:
+            json.dump(content, file)
+        read = self.read_files(monkeypatch)
+        trees, _ = self.load(caplog, collection_path)
+        # only the changed file is read again
+        assert [file_path] == read
+        assert 'ChangedRole' == trees['roles']['Assister.json'].name
+        monkeypatch.undo()
+        assert trees == CollectionLoader(1, use_cache=False).load(collection_path)
+
+    def test_removed_file(self, caplog, cache_folder, collection_path):
+        self.load(caplog, collection_path)
+        os.remove(os.path.join(str(collection_path), 'roles', 'Assister.json'))
+        self.load(caplog, collection_path)
+        cache = CollectionCache.for_collection(collection_path)
+        # the entries of removed files are dropped
+        assert ('roles', 'Assister.json') not in cache.entries
+        assert ('roles', 'AttackerRole.json') in cache.entries
+
+    @pytest.mark.parametrize('content', ['{"version": 1, "path"', '[]', '{"version": 0, "files": {}}',
+                                         '{"version": 1, "path": "other", "files": {}}'])
+    def test_corrupt_cache(self, caplog, cache_folder, collection_path, content):
+        trees, _ = self.load(caplog, collection_path)
+        cache = CollectionCache.for_collection(collection_path)
+        with open(cache.file, 'w') as file:
+            file.write(content)
+        # a cache that cannot be used is ignored and written again
+        assert trees == self.load(caplog, collection_path)[0]
+        assert len(CollectionCache.for_collection(collection_path).entries) > 0
+
+    def test_corrupt_entry(self, caplog, cache_folder, collection_path, monkeypatch):
+        trees, _ = self.load(caplog, collection_path)
+        cache = CollectionCache.for_collection(collection_path)
+        with open(cache.file, 'r') as file:
+            content = json.load(file)
+        content['files']['roles/Assister.json']['tree'] = '["TestRole"]'
+        with open(cache.file, 'w') as file:
+            json.dump(content, file)
+        read = self.read_files(monkeypatch)
+        # an entry that cannot be used is read from the file again
+        assert trees == self.load(caplog, collection_path)[0]
+        assert [os.path.join(str(collection_path), 'roles', 'Assister.json')] == read
+
+    def test_collection(self, cache_folder, collection_path):
+        # opening the collection again, like the reload does, uses the cache
+        collection = Collection.from_path(collection_path)
+        assert os.path.exists(CollectionCache(collection_path, cache_folder).file)
+        assert collection == Collection.from_path(collection_path)
+        assert collection.fingerprint == Collection.from_path(collection_path, lazy=True).fingerprint
+
+    def test_changes(self, caplog, cache_folder, collection_path):
+        loader = CollectionLoader(1)
+        loader.load(collection_path)
+        entries = len(CollectionCache.for_collection(collection_path).entries)
+        file_path = os.path.join(str(collection_path), 'roles', 'Assister.json')
+        stat = os.stat(file_path)
+        os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        changes = loader.changes(collection_path, loader.stamps)
+        assert [('roles', 'Assister.json')] == list(changes.trees.keys())
+        # the entries of the files that did not change are kept
+        cache = CollectionCache.for_collection(collection_path)
+        assert entries == len(cache.entries)
+        assert list(CollectionCache.stamp(file_path)) == cache.entries[('roles', 'Assister.json')]['stamp']
+
+    def test_unchanged_poll(self, cache_folder, collection_path, monkeypatch):
+        loader = CollectionLoader(1)
+        loader.load(collection_path)
+        reads = []
+        original = CollectionCache.read
+
+        def read(cache):
+            reads.append(cache.file)
+            original(cache)
+        monkeypatch.setattr(CollectionCache, 'read', read)
+        # polls that find no changed files do not read the cache file
+        for _ in range(3):
+            assert not loader.changes(collection_path, loader.stamps)
+        assert [] == reads
@@ -0,0 +1,102 @@
+import logging
+import multiprocessing
+import os
+from pathlib import Path
+
+import model.collection_loader
+from controller.utils import read_json
+from model.collection_loader import CollectionLoader, load_packed_tree, unpack_loaded_tree, LOADED
+from model.tree import Collection, Verification
+
+
+class TestCollectionLoader(object):
+    path = Path('json/collection')
+    complete_path = Path('json/jsons')
+
+    @staticmethod
+    def messages(caplog, path: Path, loader: CollectionLoader):
+        caplog.clear()
+        with caplog.at_level(logging.INFO):
+            trees = loader.load(path)
+        return trees, [(record.levelname, record.getMessage()) for record in caplog.records
+                       if record.name == 'root']
+
+    def test_list_files(self):
+        categories, files = CollectionLoader.list_files(self.path)
+        # hidden directories are skipped, hidden files and files that are not json are listed
+        assert sorted(categories) == ['roles', 'strategies', 'tactics']
+        assert ('roles', '.hiddenTree.json', os.path.join(str(self.path), 'roles', '.hiddenTree.json')) in files
+        assert ('roles', 'TreeWithoutJsonFileExtension',
+                os.path.join(str(self.path), 'roles', 'TreeWithoutJsonFileExtension')) in files
+
+    def test_packed_tree(self):
+        collection = Collection.from_path(self.complete_path)
+        for category, filename, path in CollectionLoader.list_files(self.complete_path)[1]:
+            if not filename.endswith('.json'):
+                continue
+            status, packed = load_packed_tree(path)
+            assert LOADED == status
+            tree = unpack_loaded_tree(packed)
+            assert collection.collection[category][filename] == tree
+            # the digests are sent along
+            assert all(node._digest is not None for node in tree.nodes.values())
+
+    def test_load_parallel(self, caplog):
+        for path in (self.path, self.complete_path):
+            serial, serial_messages = self.messages(caplog, path, CollectionLoader(1))
+            parallel, parallel_messages = self.messages(caplog, path, CollectionLoader(2, 0))
+            assert serial == parallel
+            # the files are in the same order and logged in the same order
+            assert [list(trees) for trees in serial.values()] == [list(trees) for trees in parallel.values()]
+            assert serial_messages == parallel_messages
+
+    def test_load_parallel_full_verification(self, monkeypatch):
+        # the processes verify the mathematical properties, the trees are verified against the collection here
+        parent = os.getpid()
+        verified = []
+        verify_tree = Verification.verify_tree
+
+        def verify(collection, tree, category=None, only_check_mathematical_properties=False, classifier=None):
+            if os.getpid() == parent:
+                verified.append((collection, only_check_mathematical_properties))
+            return verify_tree(collection, tree, category, only_check_mathematical_properties, classifier)
+        monkeypatch.setattr(Verification, 'verify_tree', verify)
+        for path in (self.path, self.complete_path):
+            collection = Collection()
+            serial = CollectionLoader(1).load(path, False, Collection())
+            verified.clear()
+            parallel = CollectionLoader(2, 0, multiprocessing.get_context('fork')).load(path, False, collection)
+            assert serial == parallel
+            assert sum(len(trees) for trees in parallel.values()) <= len(verified)
+            assert all(other is collection and not only_mathematical for other, only_mathematical in verified)
+
+    def test_load_parallel_failed_file(self, caplog, monkeypatch):
+        # a file that a process cannot read is read again in this process, with the files after it
+        parent = os.getpid()
+        failing = os.path.join(str(self.complete_path), 'roles', 'Assister.json')
+
+        def read(path):
+            if os.getpid() != parent and str(path) == failing:
+                raise OSError("could not read {}".format(path))
+            return read_json(path)
+        monkeypatch.setattr(model.collection_loader, 'read_json', read)
+        serial = CollectionLoader(1).load(self.complete_path)
+        parallel = CollectionLoader(2, 0, multiprocessing.get_context('fork')).load(self.complete_path)
+        assert serial == parallel
+        assert [list(trees) for trees in serial.values()] == [list(trees) for trees in parallel.values()]
+
+    def test_load_messages(self, caplog):
+        trees, messages = self.messages(caplog, self.path, CollectionLoader(2, 0))
+        assert 'InvalidRole.json' not in trees['roles']
+        assert ('INFO', "File at {} is a hidden file, this file will be skipped."
+                .format(os.path.join(str(self.path), 'roles', '.hiddenTree.json'))) in messages
+        assert ('INFO', "File at {} is not a .json file, this file will be skipped."
+                .format(os.path.join(str(self.path), 'roles', 'TreeWithoutJsonFileExtension'))) in messages
+        assert ('ERROR', "The tree at {} is not a valid tree, this tree will not be loaded"
+                .format(os.path.join(str(self.path), 'roles', 'InvalidRole.json'))) in messages
+
+    def test_from_path(self):
+        collection = Collection.from_path(self.complete_path)
+        trees = CollectionLoader(2, 0).load(self.complete_path)
+        assert Collection(trees, self.complete_path) == collection
+
@@ -0,0 +1,91 @@
+import pickle
+from pathlib import Path
+
+from model.collection_verifier import CollectionVerifier, pack_tree, unpack_tree
+from model.tree import Collection, Node, NodeTypes, Tree, Verification
+from model.tree_verifier import TreeVerifier
+
+
+class PoolVerifier(CollectionVerifier):
+    """
+    Verifies every collection on a pool of processes
+    """
+
+    def use_pool(self, pending, only_check_mathematical_properties):
+        return True
+
+
+class TestCollectionVerifier(object):
+    complete_path = Path('json/jsons')
+
+    @staticmethod
+    def separate(collection: Collection, only_check_mathematical_properties: bool):
+        return {(category, filename): TreeVerifier(collection, category).verify(tree,
+                                                                                only_check_mathematical_properties)
+                for category, trees in collection.collection.items() for filename, tree in trees.items()}
+
+    def test_pack_tree(self):
+        collection = Collection.from_path(self.complete_path)
+        for trees in collection.collection.values():
+            for tree in trees.values():
+                assert tree == unpack_tree(pack_tree(tree))
+        # invalid trees are kept as they are
+        tree = Tree('invalid', '1', {'1': Node('Sequence', '1', {'ROLE': 'a'}, ['2', '2']), '3': Node('Kick', '4')})
+        assert tree == unpack_tree(pack_tree(tree))
+
+    def test_classifier_pickle(self):
+        classifier = NodeTypes.default_classifier()
+        copy = pickle.loads(pickle.dumps(classifier))
+        assert classifier.version == copy.version
+        assert classifier.types == copy.types
+
+    def test_verify_serial(self):
+        Verification.cache.clear()
+        collection = Collection.from_path(self.complete_path)
+        for math in (True, False):
+            results = CollectionVerifier(1).verify(collection, math)
+            assert self.separate(collection, math) == results
+            # the results are in the order of the collection
+            assert [(category, filename) for category, trees in collection.collection.items()
+                    for filename in trees] == list(results.keys())
+
+    def test_verify_parallel(self):
+        collection = Collection.from_path(self.complete_path)
+        for math in (True, False):
+            Verification.cache.clear()
+            results = PoolVerifier(2).verify(collection, math)
+            assert self.separate(collection, math) == results
+            assert list(self.separate(collection, math).keys()) == list(results.keys())
+            # the results of the workers are cached, also the ones that depend on other trees
+            hits = Verification.cache.hits
+            assert results == PoolVerifier(2).verify(collection, math)
+            assert hits + len(results) == Verification.cache.hits
+
+    def test_verify_without_categories(self):
+        Verification.cache.clear()
+        collection = Collection.from_path(self.complete_path)
+        results = PoolVerifier(2).verify(collection, False, category_checks=False)
+        for category, trees in collection.collection.items():
+            for filename, tree in trees.items():
+                assert TreeVerifier(collection).verify(tree) == results[(category, filename)]
+
+    def test_use_pool(self):
+        collection = Collection.from_path(self.complete_path)
+        pending = [(category, filename, tree, None) for category, trees in collection.collection.items()
+                   for filename, tree in trees.items()]
+        assert CollectionVerifier(4, 0).use_pool(pending, False)
+        # the mathematical properties are checked faster than the trees are copied to another process
+        assert not CollectionVerifier(4, 0).use_pool(pending, True)
+        assert not CollectionVerifier(2, 0).use_pool(pending, False)
+        assert not CollectionVerifier(4).use_pool(pending, False)
+        assert not CollectionVerifier(4, 0).use_pool(pending[:1], False)
+
+    def test_verify_collection(self):
+        Verification.cache.clear()
+        collection = Collection.from_path(self.complete_path)
+        tree = collection.get_tree_by_name('AttackStrategy')
+        # a cycle back to the root
+        tree.nodes[tree.nodes[tree.root].children[0]].add_child(tree.root)
+        errors = collection.verify_collection(only_check_mathematical_properties=True, max_workers=2)
+        assert TreeVerifier(collection).verify(tree, True) == errors
+        assert 0 < len(errors)
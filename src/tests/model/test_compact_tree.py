@@ -0,0 +1,151 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from controller.utils import read_json
+from model.compact_tree import CompactTree
+from model.config import Settings
+from model.exceptions import InvalidTreeJsonFormatException
+from model.tree import Collection, Tree, Node, Verification
+from model.tree_verifier import TreeVerifier
+
+
+def collection_jsons():
+    """
+    Reads all valid trees in the test jsons collection
+    """
+    result = []
+    for root, _, files in os.walk(str(Settings.default_json_folder())):
+        for file in sorted(files):
+            if file.endswith('.json') and not file.startswith('.'):
+                json = read_json(Path(root) / file)
+                try:
+                    Tree.from_json(json)
+                except InvalidTreeJsonFormatException:
+                    continue
+                result.append(json)
+    return result
+
+
+class TestCompactTree(object):
+    enter_formation_tactic = read_json(Path('json/trees/valid/EnterFormationTactic.json'))
+    unconnected_tree = read_json(Path('json/verification/SimpleTreeWithUnconnectedNodes.json'))
+
+    def test_round_trip(self):
+        for json in collection_jsons():
+            tree = Tree.from_json(json)
+            compact = CompactTree.from_tree(tree)
+            assert len(tree.nodes) == len(compact)
+            assert json == compact.create_json()
+            assert tree == compact.to_tree()
+            assert tree.create_json() == CompactTree.from_json(json).create_json()
+
+    def test_from_json(self):
+        for json in collection_jsons():
+            assert CompactTree.from_tree(Tree.from_json(json)) == CompactTree.from_json(json)
+        # the json is checked like Tree.from_json does
+        for file in os.listdir('json/trees/invalid'):
+            with pytest.raises(InvalidTreeJsonFormatException):
+                CompactTree.from_json(read_json(Path('json/trees/invalid') / file))
+
+    def test_pack(self):
+        for json in collection_jsons():
+            tree = Tree.from_json(json)
+            packed = CompactTree.from_json(json).pack()
+            unpacked = CompactTree.unpack(packed).to_tree()
+            assert tree == unpacked
+            # the digests are sent along and are the same as the digests of the nodes
+            assert all(unpacked.nodes[key]._digest == node.digest for key, node in tree.nodes.items())
+        assert packed == CompactTree.from_tree(tree).pack()
+
+    def test_node_id_other_than_key(self):
+        json = {'name': 'tree', 'data': {'trees': [{'title': 'tree', 'root': '1', 'nodes': {
+            '1': {'id': '1', 'title': 'Sequence', 'children': ['2']}, '2': {'id': 'other', 'title': 'Role'}}}]}}
+        tree = Tree.from_json(json)
+        compact = CompactTree.from_json(json)
+        assert 'other' == compact.node_id(compact.slot('2'))
+        assert json == compact.create_json()
+        assert tree == CompactTree.unpack(compact.pack()).to_tree()
+        assert 'other' == CompactTree.unpack(compact.pack()).to_tree().nodes['2'].id
+
+    def test_verify_compact(self):
+        for file in sorted(os.listdir('json/verification')):
+            tree = Tree.from_json(read_json(Path('json/verification') / file))
+            Verification.cache.clear()
+            # the same errors as verifying the mathematical properties of the tree
+            expected = TreeVerifier(Collection()).verify(tree, True)
+            assert expected == TreeVerifier.verify_compact(CompactTree.from_tree(tree))
+        cyclic = Tree.from_json(read_json(Path('json/verification/SimpleCyclicTree.json')))
+        assert 1 == len(TreeVerifier.verify_compact(CompactTree.from_tree(cyclic)))
+        shared = Tree('tree', '1', {'1': Node('Sequence', '1', children=['2', '3']),
+                                    '2': Node('Sequence', '2', children=['3']), '3': Node('Role', '3')})
+        assert Verification.verify_tree(Collection(), shared, None, True) == \
+            TreeVerifier.verify_compact(CompactTree.from_tree(shared))
+        for root in ('', 'missing'):
+            tree = Tree('tree', root, {'1': Node('Sequence', '1')})
+            assert Verification.check_root_validity(tree) == TreeVerifier.verify_compact(CompactTree.from_tree(tree))
+
+    def test_round_trip_dangling_children(self):
+        tree = Tree('tree', '1', {'1': Node('Sequence', '1', children=['2', 'missing', '2']),
+                                  '2': Node('Sequence', '2')})
+        compact = CompactTree.from_tree(tree)
+        assert ['2', 'missing', '2'] == compact.children_ids(compact.slot('1'))
+        assert tree == compact.to_tree()
+        assert CompactTree.NO_NODE == compact.slot('missing')
+
+    def test_structure_arrays(self):
+        tree = Tree.from_json(self.enter_formation_tactic)
+        compact = CompactTree.from_tree(tree)
+        for node_id, node in tree.nodes.items():
+            slot = compact.slot(node_id)
+            assert node.title == compact.title(slot)
+            parent = tree.find_parent_node_if_exists(node)
+            if parent:
+                assert compact.slot(parent.id) == compact.parent[slot]
+            else:
+                assert CompactTree.NO_NODE == compact.parent[slot]
+            # the first child / next sibling links follow the children list
+            linked = []
+            child = compact.first_child[slot]
+            while child != CompactTree.NO_NODE:
+                linked.append(compact.ids[child])
+                child = compact.next_sibling[child]
+            assert node.children == linked
+
+    def test_reachable(self):
+        tree = Tree.from_json(self.unconnected_tree)
+        compact = CompactTree.from_tree(tree)
+        visited = Verification.walk_tree(tree, tree.nodes.get(tree.root))
+        expected = [node.id for node in tree.nodes.values() if node not in visited]
+        assert expected == compact.unreachable_ids()
+        assert len(visited) == sum(compact.reachable())
+
+    def test_depths_and_subtree_sizes(self):
+        tree = Tree.from_json(self.enter_formation_tactic)
+        compact = CompactTree.from_tree(tree)
+        depths = compact.depths()
+        sizes = compact.subtree_sizes()
+        assert 0 == depths[compact.root_slot()]
+        assert len(tree.nodes) == sizes[compact.root_slot()]
+        for node_id, node in tree.nodes.items():
+            slot = compact.slot(node_id)
+            assert sizes[slot] == 1 + sum(sizes[compact.slot(child)] for child in node.children)
+            for child in node.children:
+                assert depths[slot] + 1 == depths[compact.slot(child)]
+
+    def test_inherited_roles(self):
+        tree = Tree.from_json(self.enter_formation_tactic)
+        compact = CompactTree.from_tree(tree)
+        roles = compact.inherited_roles()
+        assert roles[compact.root_slot()] is None
+        for node in tree.find_role_subtree_nodes_if_exist('EnterFormationRole'):
+            role = node.properties()['ROLE']
+            for below in [node] + [tree.nodes.get(c) for c in node.children]:
+                assert role == roles[compact.slot(below.id)]
+
+    def test_empty_root(self):
+        compact = CompactTree.from_tree(Tree('tree', '', {'1': Node('Sequence', '1')}))
+        assert 0 == sum(compact.reachable())
+        assert ['1'] == compact.unreachable_ids()
+        assert CompactTree.NO_NODE == compact.depths()[0]
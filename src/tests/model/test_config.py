@@ -1,9 +1,11 @@
+import os
+import threading
 from pathlib import Path
 
 import pytest
 
 from controller.utils import read_json, write_json
-from model.config import Settings
+from model.config import Settings, SettingsStore
 from model.exceptions import SettingNotFoundException
 
 
@@ -73,6 +75,27 @@ class TestSettings(object):
         Settings.alter_default_id_size(def_int)
         assert def_int == Settings.default_id_size()
 
+    def test_alter_lazy_collection_loading(self):
+        assert not Settings.lazy_collection_loading()
+        Settings.alter_lazy_collection_loading(True)
+        assert Settings.lazy_collection_loading()
+        Settings.alter_lazy_collection_loading(False)
+        assert not Settings.lazy_collection_loading()
+
+    def test_alter_max_loaded_nodes(self):
+        def_nodes = Settings.max_loaded_nodes()
+        Settings.alter_max_loaded_nodes(100)
+        assert 100 == Settings.max_loaded_nodes()
+        Settings.alter_max_loaded_nodes(def_nodes)
+        assert def_nodes == Settings.max_loaded_nodes()
+
+    def test_alter_collection_watch_interval(self):
+        assert 0 == Settings.collection_watch_interval()
+        Settings.alter_collection_watch_interval(2000)
+        assert 2000 == Settings.collection_watch_interval()
+        Settings.alter_collection_watch_interval(0)
+        assert 0 == Settings.collection_watch_interval()
+
     def test_default_logfile_name(self):
         assert "log" == Settings.default_logfile_name()
 
@@ -96,3 +119,42 @@ class TestSettings(object):
         assert val is not Settings.auto_update_roles()
         # revert to original value
         Settings.alter_auto_update_roles(val)
+
+    def test_cache_reloads_changed_file(self, tmpdir):
+        tmp_path = tmpdir / 'settings.json'
+        write_json(tmp_path, {"default_id_size": 16})
+        assert 16 == Settings.query_setting("default_id_size", "test", tmp_path)
+        write_json(tmp_path, {"default_id_size": 8, "other": True})
+        assert 8 == Settings.query_setting("default_id_size", "test", tmp_path)
+
+    def test_cache_returns_copies(self):
+        categories = Settings.default_collection_categories()
+        categories.append("changed")
+        assert "changed" not in Settings.default_collection_categories()
+
+    def test_alteration_written_behind(self, tmpdir):
+        tmp_path = tmpdir / 'settings.json'
+        write_json(tmp_path, {"default_id_size": 16, "auto_update_roles": True})
+        Settings.alter_setting("default_id_size", 10, "test", tmp_path)
+        Settings.alter_setting("auto_update_roles", False, "test", tmp_path)
+        assert 10 == Settings.query_setting("default_id_size", "test", tmp_path)
+        assert False is Settings.query_setting("auto_update_roles", "test", tmp_path)
+        Settings.flush()
+        assert {"default_id_size": 10, "auto_update_roles": False} == read_json(tmp_path)
+        # the file written by the cache itself is not read again
+        assert 10 == Settings.query_setting("default_id_size", "test", tmp_path)
+
+    def test_concurrent_flushes(self, tmpdir):
+        # stores of different editors writing the same file at the same time do not share a temporary file
+        tmp_path = tmpdir / 'settings.json'
+        write_json(tmp_path, {"default_id_size": 16})
+        stores = [SettingsStore() for _ in range(4)]
+        for size, store in enumerate(stores):
+            store.write(tmp_path, "default_id_size", size)
+        threads = [threading.Thread(target=store.flush) for store in stores]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert read_json(tmp_path)["default_id_size"] in range(4)
+        assert ['settings.json'] == os.listdir(str(tmpdir))
@@ -0,0 +1,75 @@
+import string
+
+import pytest
+
+from model.exceptions import IdSpaceExhaustedException
+from model.id_allocator import IdAllocator, random_ids
+
+
+class TestIdAllocator(object):
+    def test_random_ids(self):
+        ids = random_ids(100, 16)
+        assert 100 == len(ids)
+        assert all(len(node_id) == 16 for node_id in ids)
+        assert all(c.islower() or c.isdigit() for node_id in ids for c in node_id)
+        assert 100 == len(set(ids))
+
+    def test_random_ids_custom_chars(self):
+        ids = random_ids(10, 8, string.ascii_uppercase)
+        assert all(c.isupper() for node_id in ids for c in node_id)
+
+    def test_allocate_unique(self):
+        allocator = IdAllocator(2, 'ab')
+        ids = allocator.allocate(4)
+        assert ['aa', 'ab', 'ba', 'bb'] == sorted(ids)
+        assert all(node_id in allocator for node_id in ids)
+
+    def test_allocate_skips_used(self):
+        allocator = IdAllocator(1, 'abc')
+        allocator.register(['a', 'b'])
+        assert ['c'] == allocator.allocate(1)
+
+    def test_register_and_release(self):
+        allocator = IdAllocator(16)
+        allocator.register(['a', 'b'])
+        allocator.register(['a'])
+        assert 2 == len(allocator)
+        allocator.release(['a', 'b'])
+        assert 'a' in allocator
+        assert 'b' not in allocator
+        allocator.release(['a'])
+        assert 0 == len(allocator)
+
+    def test_reserved_until_registered(self):
+        allocator = IdAllocator(16)
+        node_id = allocator.allocate_one()
+        assert node_id in allocator
+        assert 0 == len(allocator)
+        allocator.register([node_id])
+        allocator.release([node_id])
+        assert node_id not in allocator
+
+    def test_released_reservation(self):
+        allocator = IdAllocator(16)
+        node_ids = allocator.allocate(3)
+        # ids that are not used after all are handed back
+        allocator.release(node_ids)
+        assert not any(node_id in allocator for node_id in node_ids)
+        assert 0 == len(allocator.reserved)
+
+    def test_allocate_exhausted(self, monkeypatch):
+        allocator = IdAllocator(1, 'ab')
+        allocator.register(['a'])
+        assert ['b'] == allocator.allocate(1)
+        with pytest.raises(IdSpaceExhaustedException):
+            allocator.allocate(1)
+        allocator.release(['b'])
+        assert ['b'] == allocator.allocate(1)
+        # a space that is almost full is reported as well, instead of generating ids forever
+        allocator = IdAllocator(2, 'ab')
+        allocator.register(['aa', 'ab', 'ba'])
+        monkeypatch.setattr(IdAllocator, 'MAX_COLLISIONS', 5)
+        monkeypatch.setattr('model.id_allocator.random_ids', lambda count, size, chars: ['aa'] * count)
+        with pytest.raises(IdSpaceExhaustedException):
+            allocator.allocate(1)
+        assert 0 == len(allocator.reserved)
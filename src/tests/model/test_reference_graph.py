@@ -0,0 +1,109 @@
+from typing import List
+
+from model.tree import Collection, Node, Tree, Verification
+from model.tree_verifier import CategoryStructureRule, CompositesAndDecoratorsRule, IncrementalVerifier, \
+    RoleInheritanceRule, TreeVerifier, UnconnectedNodesRule
+
+
+class UnsummarizedCategoryStructureRule(CategoryStructureRule):
+    """
+    Walks every tree a leaf node refers to, like the structure check without the reference graph
+    """
+
+    def reference_graph(self):
+        return None
+
+
+class TestReferenceGraph(object):
+    unsummarized_rules = [UnconnectedNodesRule, UnsummarizedCategoryStructureRule, CompositesAndDecoratorsRule,
+                          RoleInheritanceRule]
+
+    @staticmethod
+    def reference_tree(name: str, root_title: str, references: List[str]) -> Tree:
+        root = Node(root_title, name + '_root', {}, [name + '_' + reference for reference in references])
+        nodes = {root.id: root}
+        for reference in references:
+            nodes[name + '_' + reference] = Node(reference, name + '_' + reference, {'name': reference})
+        if not references:
+            root.children = [name + '_kick']
+            nodes[name + '_kick'] = Node('Kick', name + '_kick')
+        return Tree(name, root.id, nodes)
+
+    def build_collection(self) -> Collection:
+        return Collection({
+            'strategies': {'S1.json': self.reference_tree('S1', 'Sequence', ['T']),
+                           'S2.json': self.reference_tree('S2', 'Sequence', ['T', 'U'])},
+            'tactics': {'T.json': self.reference_tree('T', 'Tactic', ['R']),
+                        'U.json': self.reference_tree('U', 'Tactic', ['Q']),
+                        'X.json': self.reference_tree('X', 'Tactic', ['Y']),
+                        'Y.json': self.reference_tree('Y', 'Tactic', ['X'])},
+            'roles': {'R.json': self.reference_tree('R', 'Role', []),
+                      'Q.json': self.reference_tree('Q', 'Role', [])}})
+
+    def separate(self, collection: Collection, category: str, tree: Tree) -> List[str]:
+        return TreeVerifier(collection, category, rules=self.unsummarized_rules).verify(tree)
+
+    def test_references(self):
+        graph = self.build_collection().reference_graph
+        assert frozenset(['T', 'U']) == graph.refers_to('S2')
+        assert frozenset() == graph.refers_to('R')
+        assert frozenset() == graph.refers_to('missing')
+        assert [['X', 'Y']] == graph.cycles()
+        assert frozenset(['S1', 'T', 'R']) == graph.reachable('S1')
+        assert frozenset(['X', 'Y']) == graph.reachable('Y')
+        assert {'R', 'T', 'S1', 'S2'} == graph.dependents(['R'])
+        assert {'Q', 'U', 'S2'} == graph.dependents(['Q'])
+
+    def test_summaries(self):
+        collection = self.build_collection()
+        graph = collection.reference_graph
+        for tree in collection.collection['strategies'].values():
+            assert self.separate(collection, 'strategies', tree) == TreeVerifier(collection, 'strategies').verify(tree)
+        # the tactic is checked once for both strategies, the role is part of the summary of the tactic
+        assert 1 == len(graph.summaries['T'])
+        assert 'R' not in graph.summaries
+        for category, trees in collection.collection.items():
+            for tree in trees.values():
+                assert self.separate(collection, category, tree) == TreeVerifier(collection, category).verify(tree)
+        # the cycle is followed until a tree is entered again
+        assert 1 == len(graph.summaries['X'])
+        assert 1 == len(graph.summaries['Y'])
+
+    def test_role_changed(self):
+        collection = self.build_collection()
+        graph = collection.reference_graph
+        strategy = collection.collection['strategies']['S1.json']
+        assert [] == Verification.verify_tree(collection, strategy, 'strategies')
+        TreeVerifier(collection, 'strategies').verify(collection.collection['strategies']['S2.json'])
+        assert {'T', 'U'} == set(graph.summaries.keys())
+        # only the summaries of the trees that depend on the role are dropped
+        role = collection.collection['roles']['R.json']
+        role.nodes[role.root].title = 'Tactic'
+        assert graph.summary('U', next(iter(graph.summaries['U']))) is not None
+        assert {'U'} == set(graph.summaries.keys())
+        errors = Verification.verify_tree(collection, strategy, 'strategies')
+        assert self.separate(collection, 'strategies', strategy) == errors
+        assert 0 < len(errors)
+
+    def test_summary_recorded(self):
+        collection = self.build_collection()
+        first = collection.collection['strategies']['S1.json']
+        second = collection.collection['strategies']['S2.json']
+        Verification.cache.clear()
+        assert [] == Verification.verify_tree(collection, first, 'strategies')
+        # the second strategy uses the summary of the tactic, its cached result still depends on the role
+        assert [] == Verification.verify_tree(collection, second, 'strategies')
+        role = collection.collection['roles']['R.json']
+        role.nodes[role.root].title = 'Tactic'
+        assert self.separate(collection, 'strategies', second) == \
+            Verification.verify_tree(collection, second, 'strategies')
+        assert 0 < len(Verification.verify_tree(collection, second, 'strategies'))
+
+    def test_incremental_followed(self):
+        collection = self.build_collection()
+        first = collection.collection['strategies']['S1.json']
+        TreeVerifier(collection, 'strategies').verify(first)
+        verifier = IncrementalVerifier(collection, collection.collection['strategies']['S2.json'], 'strategies')
+        verifier.verify()
+        followed = {tree.name for tree, _ in verifier.followed_trees.values()}
+        assert {'T', 'R', 'U', 'Q'} == followed
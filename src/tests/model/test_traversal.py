@@ -0,0 +1,55 @@
+from model.traversal import walk, strongly_connected_components
+
+
+class TestTraversal(object):
+    tree = {'a': ['b', 'e'], 'b': ['c', 'd'], 'c': [], 'd': [], 'e': ['f'], 'f': []}
+
+    def test_pre_order(self):
+        order = []
+        walk('a', self.tree.get, pre=order.append)
+        assert ['a', 'b', 'c', 'd', 'e', 'f'] == order
+
+    def test_post_order(self):
+        order = []
+        walk('a', self.tree.get, post=order.append)
+        assert ['c', 'd', 'b', 'f', 'e', 'a'] == order
+
+    def test_prune(self):
+        pre_order = []
+        post_order = []
+        walk('a', self.tree.get, pre=pre_order.append, post=post_order.append, prune=lambda item: item == 'b')
+        assert ['a', 'b', 'e', 'f'] == pre_order
+        assert ['b', 'f', 'e', 'a'] == post_order
+
+    def test_state_items(self):
+        depths = {}
+
+        def visit(item):
+            depths[item[0]] = item[1]
+
+        walk(('a', 0), lambda item: [(child, item[1] + 1) for child in self.tree[item[0]]], pre=visit)
+        assert {'a': 0, 'b': 1, 'c': 2, 'd': 2, 'e': 1, 'f': 2} == depths
+
+    def test_deep_chain(self):
+        depth = 100000
+        order = []
+        walk(0, lambda item: [item + 1] if item < depth else [], post=order.append)
+        assert list(range(depth, -1, -1)) == order
+
+    def test_components(self):
+        graph = {'a': ['b'], 'b': ['c', 'e'], 'c': ['a', 'd'], 'd': [], 'e': ['f'], 'f': ['e', 'g']}
+        components = strongly_connected_components(sorted(graph), lambda vertex: graph.get(vertex, []))
+        assert [['a', 'b', 'c'], ['d'], ['e', 'f'], ['g']] == sorted(sorted(component) for component in components)
+        # a component comes after the components reachable from it
+        order = {vertex: position for position, component in enumerate(components) for vertex in component}
+        assert order['d'] < order['a'] and order['e'] < order['a'] and order['g'] < order['e']
+
+    def test_components_self_loop(self):
+        graph = {'a': ['a', 'b'], 'b': []}
+        assert [['b'], ['a']] == strongly_connected_components(['a'], graph.get)
+
+    def test_components_deep_chain(self):
+        depth = 100000
+        components = strongly_connected_components([0], lambda vertex: [(vertex + 1) % depth])
+        assert 1 == len(components)
+        assert depth == len(components[0])
@@ -1,14 +1,23 @@
+import json
+import os
+import shutil
 import string
+import sys
 from copy import deepcopy
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List
 
 import pytest
 
-from controller.utils import read_json
+import model.tree
+from controller.utils import read_json, write_json
+from model.collection_loader import CollectionLoader
 from model.config import Settings
-from model.exceptions import InvalidTreeJsonFormatException, InvalidNodeTypeException
-from model.tree import Node, Tree, Collection, NodeTypes, Verification, DisconnectedNode
+from model.exceptions import InvalidTreeJsonFormatException, InvalidNodeTypeException, \
+    VerificationCancelledException
+from model.tree import Node, Tree, Collection, NodeTypes, Verification, DisconnectedNode, TreeHeader
+from model.tree_verifier import TreeVerifier, VerificationRule, IncrementalVerifier
+from model.verification_cache import VerificationCache
 
 
 class TestNode(object):
@@ -97,6 +106,21 @@ class TestNode(object):
         assert self.node_children_no_attributes_json == self.node_children_no_attributes.create_json()
         assert self.node_no_attributes_children_json == self.node_no_attributes_children.create_json()
 
+    def test_create_json_copy(self):
+        node = Node('Sequence', 'copied', {'properties': {'a': [1]}, 'b': {'c': 2}}, ['child'])
+        digest = node.digest
+        json_node = node.create_json()
+        # the json is a plain copy, changing it does not change the node
+        assert [type(json_node), type(json_node['properties']), type(json_node['properties']['a']),
+                type(json_node['b']), type(json_node['children'])] == [dict, dict, list, dict, list]
+        json_node['properties']['a'].append(2)
+        json_node['properties']['d'] = 3
+        json_node['b']['c'] = 4
+        json_node['children'].append('other')
+        assert {'properties': {'a': [1]}, 'b': {'c': 2}} == node.attributes
+        assert ['child'] == node.children
+        assert digest == node.digest
+
     def test_add_property(self):
         node = Node.from_json(self.node_attributes_children_json)
         node.add_property("b", False)
@@ -138,6 +162,93 @@ class TestNode(object):
         assert str(node) == str(node.create_json())
         assert repr(node) == str(node)
 
+    def test_slots_and_interning(self):
+        node = Node.from_json(read_json(Path('json/nodes/valid/NodeAttributesChildren.json')))
+        other = Node.from_json(read_json(Path('json/nodes/valid/NodeAttributesChildren.json')))
+        assert not hasattr(node, '__dict__')
+        assert node.title is other.title
+        assert node.id is other.id
+        node.add_property(''.join(['RO', 'LE']), 'a')
+        other.add_property('ROLE', 'a')
+        assert list(node.properties().keys())[0] is list(other.properties().keys())[0]
+        assert node.create_json() == other.create_json()
+        assert node == other
+
+    def test_digest(self):
+        node = Node.from_json(read_json(Path('json/nodes/valid/NodeAttributesChildren.json')))
+        other = deepcopy(node)
+        assert node.digest == other.digest
+        node.attributes['properties'] = {'ROLE': 'Keeper'}
+        assert node != other
+        other.add_property('ROLE', 'Keeper')
+        assert node == other
+        node.properties()['ROLE'] = 'Defender'
+        assert node != other
+        node.properties()['ROLE'] = 'Keeper'
+        other.children.append('child')
+        assert node != other
+        other.children.pop()
+        assert node == other
+        node.title = 'other'
+        assert node != other
+
+    def test_digest_nested_values(self):
+        node = Node('node', attributes={'list': [1, {'a': [2]}], 'dict': {'b': {'c': 3}}})
+        other = node.clone()
+        digest = node.digest
+        # values changed in place in nested lists and dictionaries change the digest
+        node.attributes['list'][1]['a'].append(4)
+        assert digest != node.digest and node != other
+        node.attributes['list'][1]['a'].pop()
+        assert digest == node.digest and node == other
+        node.attributes['dict']['b']['c'] = 4
+        assert digest != node.digest
+        node.attributes['dict']['b']['c'] = 3
+        node.add_property('list', ['x'])
+        other.add_property('list', ['x'])
+        node.properties()['list'][0] = 'y'
+        assert node != other
+        # values are copied when they are set, changing the original does not change the node
+        value = {'d': [5]}
+        node.add_attribute('value', value)
+        digest = node.digest
+        value['d'].append(6)
+        assert digest == node.digest
+        assert {'d': [5]} == node.attributes['value']
+
+    def test_equal_values(self):
+        # the values are compared like python compares them, numbers that are equal have the same digest
+        assert Node('node', '1', {'a': 1}) == Node('node', '1', {'a': 1.0})
+        assert Node('node', '1', {'a': True}) == Node('node', '1', {'a': 1})
+        assert Node('node', '1', {'a': [1.0, {'b': False}]}).digest == Node('node', '1', {'a': [1, {'b': 0}]}).digest
+        assert Node('node', '1', {'a': 1.5}) != Node('node', '1', {'a': 1})
+        # a list and a tuple have the same digest but are not equal
+        assert Node('node', '1', {'a': [1]}) != Node('node', '1', {'a': (1,)})
+        tree = Tree('tree', '1', {'1': Node('node', '1', {'a': 1})})
+        other = Tree('tree', '1', {'1': Node('node', '1', {'a': 1.0})})
+        assert tree == other
+        assert Collection({'roles': {'Tree.json': tree}}) == Collection({'roles': {'Tree.json': other}})
+        tree.nodes['1'].attributes['a'] = [1]
+        other.nodes['1'].attributes['a'] = (1,)
+        assert tree.fingerprint == other.fingerprint
+        assert tree != other
+        assert Collection({'roles': {'Tree.json': tree}}) != Collection({'roles': {'Tree.json': other}})
+
+    def test_clone(self):
+        node = Node.from_json(read_json(Path('json/nodes/valid/NodeAttributesChildren.json')))
+        node.add_property('ROLE', 'Keeper')
+        node.add_attribute('list', [1, [2]])
+        clone = node.clone()
+        assert node == clone
+        assert clone.tree is None
+        clone.properties()['ROLE'] = 'Defender'
+        clone.attributes['list'][1].append(3)
+        clone.children.append('child')
+        assert 'Keeper' == node.properties()['ROLE']
+        assert [1, [2]] == node.attributes['list']
+        assert 'child' not in node.children
+        assert node != clone
+
 
 class TestTree(object):
     # valid trees
@@ -260,6 +371,77 @@ class TestTree(object):
         tree.update_subtree(subtree, tree.root, 'abcd')
         assert 4 == len(tree.nodes)
 
+    def test_add_subtree_into_itself(self):
+        tree = Tree.from_json(self.tree_demo_twente_strategy)
+        tree.add_subtree(tree, tree.root)
+        assert 8 == len(tree.nodes)
+        assert 2 == len(tree.nodes.get(tree.root).children)
+
+    def test_clone_subtree(self):
+        tree = Tree.from_json(self.tree_simple_tree)
+        subtree = Tree.from_json(self.tree_demo_twente_strategy)
+        repeater_id = subtree.nodes.get(subtree.root).children[0]
+        id_map = tree.clone_subtree(subtree, subtree.root, {subtree.root: 'new_root'})
+        assert set(subtree.nodes.keys()) == set(id_map.keys())
+        assert 'new_root' == id_map[subtree.root]
+        assert 1 + len(subtree.nodes) == len(tree.nodes)
+        for old_id, new_id in id_map.items():
+            old_node = subtree.nodes.get(old_id)
+            new_node = tree.nodes.get(new_id)
+            assert old_node.title == new_node.title
+            assert old_node.attributes == new_node.attributes
+            assert [id_map[child_id] for child_id in old_node.children] == new_node.children
+            assert new_node.tree is tree
+        assert id_map[subtree.root] == tree.find_parent_node_if_exists(tree.nodes.get(id_map[repeater_id])).id
+
+    def test_clone_subtree_missing_child(self):
+        tree = Tree.from_json(self.tree_simple_tree)
+        subtree = Tree.from_json(self.tree_demo_twente_strategy)
+        subtree.nodes.get(subtree.root).add_child('missing')
+        id_map = tree.clone_subtree(subtree, subtree.root)
+        assert 'missing' not in id_map
+        assert 1 == len(tree.nodes.get(id_map[subtree.root]).children)
+
+    def test_clone_subtree_shared_child(self):
+        # a node below two nodes is copied below each of them, like add_subtree always did
+        subtree = Tree('shared', 'a', {'a': Node('A', 'a', children=['b', 'c']), 'b': Node('B', 'b', children=['d']),
+                                       'c': Node('C', 'c', children=['d']), 'd': Node('D', 'd')})
+        tree = Tree.from_json(self.tree_simple_tree)
+        tree.add_subtree(subtree, tree.root)
+        assert 1 + 5 == len(tree.nodes)
+        copy_a = tree.nodes[tree.nodes[tree.root].children[-1]]
+        copy_b, copy_c = (tree.nodes[child_id] for child_id in copy_a.children)
+        assert copy_b.children[0] != copy_c.children[0]
+        assert 'D' == tree.nodes[copy_b.children[0]].title == tree.nodes[copy_c.children[0]].title
+        # the ids of the map are used for the first copies
+        id_map = Tree('copy', '', {}).clone_subtree(subtree, 'a', {'a': 'a2', 'd': 'd2'})
+        assert {'a': 'a2', 'b': id_map['b'], 'c': id_map['c'], 'd': 'd2'} == id_map
+
+    def test_clone_subtree_cycle(self):
+        subtree = Tree('cycle', 'a', {'a': Node('A', 'a', children=['b']), 'b': Node('B', 'b', children=['a'])})
+        copy = Tree('copy', '', {})
+        id_map = copy.clone_subtree(subtree, 'a')
+        # the child that would repeat a node above it is left out
+        assert 2 == len(copy.nodes)
+        assert [] == copy.nodes[id_map['b']].children
+        # the new ids are interned like ids set on a node
+        assert all(node.id is sys.intern(node.id) for node in copy.nodes.values())
+
+    def test_clone(self):
+        tree = Tree.from_json(self.tree_dance_strategy)
+        clone = tree.clone()
+        assert tree == clone
+        assert all(node.tree is clone for node in clone.nodes.values())
+        assert all(clone.nodes[node_id] is not node for node_id, node in tree.nodes.items())
+        node = clone.nodes.get(clone.root)
+        node.add_attribute('a', 'b')
+        assert tree != clone
+        assert 'a' not in tree.nodes.get(tree.root).attributes
+        node.remove_attribute('a')
+        assert tree == clone
+        child_id = node.children[0]
+        assert node.id == clone.find_parent_node_if_exists(clone.nodes.get(child_id)).id
+
     def test_add_subtree_invalid(self):
         tree = Tree.from_json(self.tree_simple_tree)
         tree.add_subtree(tree, "abc")
@@ -356,6 +538,48 @@ class TestTree(object):
         assert not tree.find_parent_node_if_exists(tree.nodes.get(tree.root))
         assert tree.nodes.get(tree.root) == tree.find_parent_node_if_exists(tree.nodes.get('abcdefgh314'))
 
+    def test_find_parent_node_after_changes(self):
+        tree = Tree.from_json(self.tree_demo_twente_strategy)
+        root = tree.nodes.get(tree.root)
+        node = Node('Sequence', 'new')
+        tree.add_node(node)
+        assert not tree.find_parent_node_if_exists(node)
+        root.add_child(node.id)
+        assert root == tree.find_parent_node_if_exists(node)
+        # changing the children in place also updates the index
+        root.children.remove(node.id)
+        assert not tree.find_parent_node_if_exists(node)
+        tree.nodes.get('abcdefgh314').children = ['new']
+        assert tree.nodes.get('abcdefgh314') == tree.find_parent_node_if_exists(node)
+        # removing the parent removes the relation
+        tree.remove_node_by_id('abcdefgh314')
+        assert not tree.find_parent_node_if_exists(node)
+        # a copy has its own index
+        copy = deepcopy(tree)
+        copy.nodes.get(copy.root).add_child('new')
+        assert copy.nodes.get(copy.root) == copy.find_parent_node_if_exists(copy.nodes.get('new'))
+        assert not tree.find_parent_node_if_exists(node)
+
+    def test_find_parent_node_multiple_parents(self):
+        tree = Tree('tree', '1', {'1': Node('Sequence', '1', children=['3']),
+                                  '2': Node('Sequence', '2', children=['3']),
+                                  '3': Node('Sequence', '3')})
+        assert tree.nodes.get('1') == tree.find_parent_node_if_exists(tree.nodes.get('3'))
+        tree.nodes.get('1').remove_child('3')
+        assert tree.nodes.get('2') == tree.find_parent_node_if_exists(tree.nodes.get('3'))
+
+    def test_find_child_position(self):
+        tree = Tree.from_json(self.tree_enter_formation_tactic)
+        root = tree.nodes.get(tree.root)
+        assert tree.find_child_position(root) is None
+        for position, child_id in enumerate(root.children):
+            assert position == tree.find_child_position(tree.nodes.get(child_id))
+        first = root.children[0]
+        root.remove_child(first)
+        for position, child_id in enumerate(root.children):
+            assert position == tree.find_child_position(tree.nodes.get(child_id))
+        assert tree.find_child_position(tree.nodes.get(first)) is None
+
     def test_find_role_subtree_node_above_node(self):
         tree = Tree.from_json(self.tree_demo_twente_strategy)
         assert not tree.find_role_subtree_node_above_node(tree.nodes.get('abcdefgh314'))
@@ -380,6 +604,66 @@ class TestTree(object):
         assert tree.nodes.get('3j1eplzumct1ky2l') not in nodes
 
 
+    def test_fingerprint(self):
+        tree = Tree.from_json(self.tree_dance_strategy)
+        other = Tree.from_json(self.tree_dance_strategy)
+        assert tree.fingerprint == other.fingerprint
+        node = tree.nodes.get(tree.root)
+        node.add_attribute('a', 'b')
+        assert tree != other
+        node.remove_attribute('a')
+        assert tree == other
+        tree.add_node(Node('a', 'new'))
+        assert tree != other
+        tree.remove_node_by_id('new')
+        assert tree == other
+        tree.name = 'other'
+        assert tree != other
+        tree.name = other.name
+        tree.nodes = dict(tree.nodes)
+        assert tree == deepcopy(other)
+
+    def test_snapshot(self):
+        tree = Tree.from_json(self.tree_dance_strategy)
+        expected = deepcopy(tree)
+        snapshot = tree.snapshot()
+        assert snapshot == tree
+        root = tree.nodes.get(tree.root)
+        assert snapshot.nodes.get(tree.root) is root
+        root.add_attribute('a', 'b')
+        root.children.append('c')
+        tree.add_node(Node('c', 'c'))
+        assert snapshot == expected
+        assert snapshot != tree
+        assert snapshot.nodes.get(tree.root) is not root
+        for node_id, node in snapshot.nodes.items():
+            if node_id != tree.root:
+                assert tree.nodes.get(node_id) is node
+        assert snapshot.find_parent_node_if_exists(Node('c', 'c')) is None
+        assert tree.find_parent_node_if_exists(Node('c', 'c')) is root
+        snapshot.make_writable()
+        snapshot.nodes.get(snapshot.root).add_attribute('d', 'e')
+        assert 'd' in snapshot.nodes.get(snapshot.root).attributes
+        assert snapshot != expected
+
+    def test_deep_chain(self):
+        tree = Tree.from_json(TestVerification.deep_chain_json(50000))
+        tree.propagate_role('node0', 'Keeper')
+        assert 'Keeper' == tree.nodes.get('node50000').properties()['ROLE']
+        tree.remove_propagation('node0')
+        assert not tree.nodes.get('node50000').properties()
+        tree.nodes.get('node50000').attributes = {'role': 'Keeper'}
+        tree.nodes.get('node50000').title = 'Role'
+        assert [tree.nodes.get('node50000')] == tree.find_role_subtree_nodes_below_node(tree.nodes.get('node0'))
+        copy = Tree('Copy', 'copy', {'copy': Node('Role', 'copy')})
+        copy.add_subtree(tree, 'copy', 'node49000')
+        assert 1002 == len(copy.nodes)
+        tree.remove_subtree('node1')
+        assert 2 == len(tree.nodes)
+        assert tree.remove_node_and_children_by_id('node0')
+        assert 0 == len(tree.nodes)
+
+
 class TestCollection(object):
     path = Path("json/collection/")
     complete_path = Path('json/jsons/')
@@ -420,6 +704,79 @@ class TestCollection(object):
         assert 'TreeWithoutJsonFileExtension' not in collection.collection.get('roles')
         assert Collection(self.collection) == collection
 
+    def test_fingerprint(self):
+        collection = Collection.from_path(self.path)
+        copy = deepcopy(collection)
+        assert collection == copy
+        tree = collection.collection['roles']['Assister.json']
+        tree.nodes.get(tree.root).add_attribute('role', 'Keeper')
+        assert collection != copy
+        tree.nodes.get(tree.root).remove_attribute('role')
+        assert collection == copy
+        collection.collection['roles'].pop('Assister.json')
+        assert collection != copy
+        collection.add_tree('roles', 'Assister.json', tree)
+        assert collection == copy
+        collection.collection['other'] = {}
+        assert collection != copy
+        collection.collection.pop('other')
+        assert collection == copy
+
+    def test_clone(self):
+        collection = Collection.from_path(self.path)
+        tree = collection.collection['roles']['Assister.json']
+        collection.add_tree('other', 'Assister.json', tree)
+        clone = collection.clone()
+        assert collection == clone
+        clone_tree = clone.collection['roles']['Assister.json']
+        assert clone_tree is not tree
+        assert clone_tree is clone.collection['other']['Assister.json']
+        clone_tree.nodes.get(clone_tree.root).add_attribute('role', 'Keeper')
+        assert collection != clone
+
+    def test_snapshot(self):
+        collection = Collection.from_path(self.path)
+        expected = deepcopy(collection)
+        load_collection = collection.snapshot()
+        assert load_collection.collection['roles']['Assister.json'] is collection.collection['roles']['Assister.json']
+        tree = collection.collection['roles']['Assister.json']
+        node = tree.nodes.get(tree.root)
+        node.add_attribute('role', 'Keeper')
+        assert load_collection == expected
+        assert load_collection != collection
+        load_tree = load_collection.collection['roles']['Assister.json']
+        assert load_tree is not tree
+        assert load_tree.nodes.get(tree.root) is not node
+        assert all(load_tree.nodes.get(node_id) is other for node_id, other in tree.nodes.items()
+                   if node_id != tree.root)
+        assert load_collection.collection['strategies'] == collection.collection['strategies']
+        # saving a single tree
+        load_collection.collection['roles']['Assister.json'] = tree
+        assert load_collection == collection
+        node.remove_attribute('role')
+        assert load_collection != collection
+        assert load_collection.collection['roles']['Assister.json'] != tree
+        # discarding the changes
+        collection = load_collection.writable_copy()
+        tree = collection.collection['roles']['Assister.json']
+        assert collection == load_collection
+        assert 'role' in tree.nodes.get(tree.root).attributes
+        tree.nodes.get(tree.root).remove_attribute('role')
+        assert collection != load_collection
+        assert 'role' in load_collection.collection['roles']['Assister.json'].nodes.get(tree.root).attributes
+
+    def test_fingerprint_shared_tree(self):
+        collection = Collection.from_path(self.path)
+        other = Collection.from_path(self.path)
+        tree = other.collection['roles']['Assister.json']
+        collection.collection['roles']['Assister.json'] = tree
+        assert collection == other
+        tree.nodes.get(tree.root).add_attribute('role', 'Keeper')
+        assert collection == other
+        collection.remove_tree('roles', 'Assister.json')
+        tree.nodes.get(tree.root).remove_attribute('role')
+        assert collection != other
+
     def test_write_collection(self, tmpdir):
         collection = Collection.from_path(self.path)
         collection.write_collection(tmpdir)
@@ -564,6 +921,42 @@ class TestCollection(object):
         result = collection.get_category_from_node("invalid_category")
         assert not result
 
+    def test_indexes_follow_changes(self):
+        collection = Collection.from_path(self.path)
+        tree = collection.get_tree_by_name('Assister')
+        tree.name = 'Renamed'
+        assert collection.get_tree_by_name('Assister') is None
+        assert collection.get_tree_by_name('Renamed') is tree
+        assert ('sx6fvrxlaoudhmmq9', 'Renamed') in collection.get_root_nodes_by_category('roles')
+        old_root = tree.root
+        tree.root = 'new_root'
+        assert collection.get_category_from_node(old_root) is None
+        assert 'roles' == collection.get_category_from_node(tree.root)
+        assert collection.is_root_in_category(tree.root, 'roles')
+        assert not collection.is_root_in_category(tree.root, 'tactics')
+        collection.add_tree('other', 'Copy.json', tree)
+        collection.remove_tree_by_name('roles', 'Renamed')
+        assert collection.get_tree_by_name('Renamed') is tree
+        assert 'other' == collection.get_category_from_node(tree.root)
+        assert [] == collection.get_root_nodes_by_category('roles')
+        collection.collection.pop('other')
+        assert collection.get_tree_by_name('Renamed') is None
+        assert collection.get_category_from_node(tree.root) is None
+        # the last category is removed with its trees
+        last = list(collection.collection.keys())[-1]
+        names = [tree.name for tree in collection.collection[last].values()]
+        assert last == collection.collection.popitem()[0]
+        assert last not in collection.collection
+        assert all(collection.get_tree_by_name(name) is None for name in names)
+
+    def test_get_tree_by_name_first(self):
+        collection = Collection.from_path(self.path)
+        copy = deepcopy(collection.get_tree_by_name('Assister'))
+        collection.add_tree('tactics', 'Assister.json', copy)
+        assert collection.get_tree_by_name('Assister') is collection.collection['roles']['Assister.json']
+        collection.remove_tree('roles', 'Assister.json')
+        assert collection.get_tree_by_name('Assister') is copy
+
     def test_verify_trees(self):
         collection = Collection.from_path(Settings.default_json_folder(), only_verify_mathematical_properties=False)
         for category in collection.collection:
@@ -580,6 +973,86 @@ class TestCollection(object):
         read = Tree.from_json(read_json(path))
         assert tree == read
 
+    def test_serialized(self, tmpdir):
+        tree = self.attack_strategy
+        write_json(Path(tmpdir) / 'tree.json', tree.create_json())
+        assert (Path(tmpdir) / 'tree.json').read_bytes() == tree.serialized()
+        # kept until the tree changes, also by copies of the tree
+        assert tree.serialized() is tree.serialized()
+        assert tree.serialized() is tree.snapshot().serialized()
+        serialized = tree.serialized()
+        tree.nodes[tree.root].title = 'Changed'
+        assert serialized != tree.serialized()
+        # also after a nested value changed in place
+        tree.nodes[tree.root].add_attribute('nested', {'values': []})
+        serialized = tree.serialized()
+        tree.nodes[tree.root].attributes['nested']['values'].append('value')
+        assert serialized != tree.serialized()
+        assert tree == Tree.from_json(json.loads(tree.serialized()))
+
+    @staticmethod
+    def written_files(monkeypatch) -> List[str]:
+        written = []
+        write = model.tree.write_file_atomic
+
+        def write_file_atomic(path, content):
+            written.append(os.path.relpath(str(path), str(path.parent.parent)))
+            write(path, content)
+        monkeypatch.setattr(model.tree, 'write_file_atomic', write_file_atomic)
+        return written
+
+    def test_write_collection_changed_only(self, tmpdir, monkeypatch):
+        Collection.from_path(self.complete_path).write_collection(Path(tmpdir))
+        collection = Collection.from_path(Path(tmpdir))
+        written = self.written_files(monkeypatch)
+        assert [] == collection.write_collection()
+        assert [] == written
+        tree = collection.get_tree_by_name('Keeper')
+        tree.nodes[tree.root].title = 'Changed'
+        collection.add_tree('roles', 'Added.json', Tree('Added', '1', {'1': Node('Role', '1')}))
+        (Path(tmpdir) / 'roles' / 'Assister.json').write_text('{}')
+        # the changed and added trees are written, and the tree of the file that changed on disk
+        assert [] == collection.write_collection()
+        assert {'roles/Keeper.json', 'roles/Added.json', 'roles/Assister.json'} == set(written)
+        assert collection == Collection.from_path(Path(tmpdir))
+        del written[:]
+        assert [] == collection.write_collection()
+        assert [] == written
+        # no temporary files are left behind
+        assert all(not file.startswith('.') for file in os.listdir(str(Path(tmpdir) / 'roles')))
+        # written to another folder, all trees are written
+        collection.write_collection(Path(tmpdir) / 'copy')
+        assert len(written) == sum(len(trees) for trees in collection.collection.values())
+
+    def test_write_collection_errors(self, tmpdir, monkeypatch):
+        collection = Collection.from_path(self.complete_path)
+        collection.path = Path(tmpdir)
+        collection.add_tree('roles', 'Cycle.json', Tree('Cycle', '1', {'1': Node('Role', '1', children=['1'])}))
+        written = self.written_files(monkeypatch)
+        errors = collection.write_collection()
+        assert ['Tree Cycle could not be written as there were errors during verification'] == errors[-1:]
+        assert 'roles/Cycle.json' not in written
+        assert len(written) == sum(len(trees) for trees in collection.collection.values()) - 1
+        monkeypatch.setattr(model.tree, 'write_file_atomic', lambda path, content: 1 / 0)
+        tree = collection.get_tree_by_name('Keeper')
+        tree.nodes[tree.root].title = 'Changed'
+        # the old content of the file is kept when a tree cannot be written
+        assert ['An exception occurred when writing tree Keeper.'] == \
+            collection.write_tree(tree, Path(tmpdir) / 'roles' / 'Keeper.json')
+        assert 'An exception occurred when writing tree Keeper.' in collection.write_collection()
+        assert 'Changed' != Collection.from_path(Path(tmpdir)).get_tree_by_name('Keeper').nodes[tree.root].title
+
+    def test_write_lazy_collection(self, tmpdir, monkeypatch):
+        Collection.from_path(self.complete_path).write_collection(Path(tmpdir))
+        collection = Collection.from_path(Path(tmpdir), lazy=True)
+        written = self.written_files(monkeypatch)
+        tree = collection.get_tree_by_name('Keeper')
+        tree.nodes[tree.root].title = 'Changed'
+        collection.write_collection()
+        # the trees that were not read are not read to write them
+        assert ['roles/Keeper.json'] == written
+        assert 1 == len(collection.loaded)
+
     def test_json_path(self):
         collection = Collection.from_path(self.path)
         assert collection.jsons_path() == self.path
@@ -605,6 +1078,92 @@ class TestCollection(object):
             assert old_child_node.id != child_node.id
             assert len(old_child_node.children) == len(child_node.children)
 
+    def test_id_allocator(self):
+        collection = Collection.from_path(self.complete_path)
+        allocator = collection.id_allocator
+        tree = collection.get_tree_by_name('EnterFormationTactic')
+        assert all(node_id in allocator for node_id in tree.nodes)
+        node = Node('Role', allocator.allocate_one())
+        tree.add_node(node)
+        assert node.id in allocator
+        tree.remove_node(node)
+        assert node.id not in allocator
+        category = collection.get_category_from_node(tree.root)
+        filename = tree.name + '.json'
+        collection.remove_tree(category, filename)
+        assert tree.root not in allocator
+        collection.add_tree(category, filename, tree)
+        assert tree.root in allocator
+
+    def test_find_role_usages(self):
+        collection = Collection.from_path(self.complete_path)
+        usages = collection.find_role_usages('EnterFormationRole')
+        expected = [(tree, node.id) for trees in collection.collection.values() for tree in trees.values()
+                    for node in tree.find_role_subtree_nodes_if_exist('EnterFormationRole')]
+        assert len(usages) > 0
+        assert sorted(usages, key=lambda usage: usage[1]) == sorted(expected, key=lambda usage: usage[1])
+        tree, node_id = usages[0]
+        tree.nodes.get(node_id).attributes['role'] = 'OtherRole'
+        assert (tree, node_id) not in collection.find_role_usages('EnterFormationRole')
+        assert [(tree, node_id)] == collection.find_role_usages('OtherRole')
+        tree.remove_node_by_id(node_id)
+        assert [] == collection.find_role_usages('OtherRole')
+        node = Node('Role', attributes={'role': 'NewRole'})
+        tree.add_node(node)
+        assert [(tree, node.id)] == collection.find_role_usages('NewRole')
+        tree.nodes = dict(tree.nodes)
+        assert [(tree, node.id)] == collection.find_role_usages('NewRole')
+        for category, trees in collection.collection.items():
+            for filename in list(trees.keys()):
+                if trees[filename] is tree:
+                    collection.remove_tree(category, filename)
+        assert [] == collection.find_role_usages('NewRole')
+
+    def test_update_subtrees_in_collection_unique_ids(self):
+        collection = Collection.from_path(self.complete_path)
+        allocator = collection.id_allocator
+        before = set(allocator.counts)
+        collection.update_subtrees_in_collection(collection.get_tree_by_name('EnterFormationRole'))
+        ids = [node_id for trees in collection.collection.values() for tree in trees.values() for node_id in tree.nodes]
+        assert set(ids) == set(allocator.counts)
+        # the copies of the subtree all got new ids that are used once
+        new_ids = [node_id for node_id in ids if node_id not in before]
+        assert len(new_ids) > 0
+        assert len(new_ids) == len(set(new_ids))
+
+    def test_plan_role_update(self):
+        collection = Collection.from_path(self.complete_path)
+        role_tree = collection.get_tree_by_name('EnterFormationRole')
+        role_tree.nodes.get(role_tree.root).title = 'TestChange'
+        fingerprint = collection.fingerprint
+        plan = collection.plan_role_update(role_tree)
+        # planning does not change anything
+        assert fingerprint == collection.fingerprint
+        usages = collection.find_role_usages('EnterFormationRole')
+        assert sorted(node_id for _, node_id in usages) == sorted(plan.updated_node_ids())
+        assert [] == plan.prevented
+        changes = plan.apply()
+        assert changes is plan
+        for loop_tree, node_id in usages:
+            assert node_id in plan.updated_node_ids(loop_tree)
+            child = loop_tree.nodes.get(loop_tree.nodes.get(node_id).children[0])
+            assert 'TestChange' == child.title
+        # applying twice does nothing
+        fingerprint = collection.fingerprint
+        plan.apply()
+        assert fingerprint == collection.fingerprint
+
+    def test_plan_role_update_prevented(self):
+        collection = Collection.from_path(self.complete_path)
+        tree = collection.get_tree_by_name('EnterFormationTactic')
+        role_node = tree.find_role_subtree_nodes_if_exist('EnterFormationRole')[0]
+        nested = Node('Role', attributes={'role': 'EnterFormationRole'})
+        tree.add_node(nested)
+        tree.nodes.get(role_node.children[0]).add_child(nested.id)
+        plan = collection.plan_role_update(tree, role_node)
+        assert [] == plan.updates
+        assert len(plan.prevented) > 0
+
     def test_update_subtrees_in_collection_from_subtree(self):
         collection = Collection.from_path(self.complete_path)
         tree = collection.get_tree_by_name('EnterFormationTactic')
@@ -646,6 +1205,279 @@ class TestCollection(object):
         assert collection == collection_copy
 
 
+class TestLazyCollection(object):
+    complete_path = Path('json/jsons/')
+
+    @staticmethod
+    def headers(collection: Collection) -> int:
+        return sum(type(tree) is TreeHeader for trees in collection.collection.values() for tree in dict.values(trees))
+
+    def test_headers(self):
+        collection = Collection.from_path(self.complete_path, lazy=True)
+        eager = Collection.from_path(self.complete_path, lazy=False)
+        assert collection.lazy and not eager.lazy
+        # nothing is read to list, compare and index the trees
+        assert eager.categories_and_filenames() == collection.categories_and_filenames()
+        assert eager == collection
+        assert eager.get_root_nodes_by_category('roles') == collection.get_root_nodes_by_category('roles')
+        assert eager.reference_graph.cycles() == collection.reference_graph.cycles()
+        assert 0 == len(collection.loaded)
+        for category, trees in eager.collection.items():
+            for filename, tree in trees.items():
+                header = dict.__getitem__(collection.collection[category], filename)
+                assert (tree.name, tree.root, len(tree.nodes)) == (header.name, header.root, header.nodes)
+                assert tree.fingerprint == header.fingerprint
+                assert set(tree.role_nodes.keys()) == header.roles
+
+    def test_read_on_lookup(self):
+        collection = Collection.from_path(self.complete_path, lazy=True)
+        eager = Collection.from_path(self.complete_path, lazy=False)
+        headers = self.headers(collection)
+        tree = collection.get_tree_by_name('AttackStrategy')
+        assert eager.get_tree_by_name('AttackStrategy') == tree
+        assert headers - 1 == self.headers(collection)
+        assert tree is collection.collection['strategies']['AttackStrategy.json']
+        assert tree is collection.find_tree_by_name('AttackStrategy')
+        # changes are followed like for any tree
+        tree.nodes[tree.root].title = 'Changed'
+        assert eager != collection
+        tree.nodes[tree.root].title = eager.get_tree_by_name('AttackStrategy').nodes[tree.root].title
+        assert eager == collection
+        # iterating reads all trees
+        assert [tree for trees in eager.collection.values() for tree in trees.values()] == \
+            [tree for trees in collection.collection.values() for tree in trees.values()]
+        assert 0 == self.headers(collection)
+
+    def test_eviction(self):
+        collection = Collection.from_path(self.complete_path, lazy=True)
+        collection.max_loaded_nodes = 100
+        changed = collection.get_tree_by_name('AttackStrategy')
+        changed.nodes[changed.root].title = 'Changed'
+        for trees in collection.collection.values():
+            for tree in trees.values():
+                # the unchanged trees fit in the budget besides the changed one and the one last read
+                assert collection.loaded_nodes <= 100 + len(changed.nodes) + len(tree.nodes)
+        # trees with changes are kept
+        assert changed is dict.__getitem__(collection.collection['strategies'], 'AttackStrategy.json')
+        assert 0 < self.headers(collection)
+        # a dropped tree that is still used is used again, otherwise it is read again
+        held = collection.get_tree_by_name('KeeperStrategy')
+        collection.max_loaded_nodes = 0
+        collection.evict()
+        assert type(dict.__getitem__(collection.collection['strategies'], 'KeeperStrategy.json')) is TreeHeader
+        assert held is collection.get_tree_by_name('KeeperStrategy')
+        assert Collection.from_path(self.complete_path).get_tree_by_name('Keeper') == \
+            collection.get_tree_by_name('Keeper')
+
+    def test_evicted_tree_changed(self):
+        collection = Collection.from_path(self.complete_path, lazy=True)
+        saved = collection.snapshot()
+        held = collection.get_tree_by_name('KeeperStrategy')
+        collection.max_loaded_nodes = 0
+        collection.get_tree_by_name('AttackStrategy')
+        assert type(dict.__getitem__(collection.collection['strategies'], 'KeeperStrategy.json')) is TreeHeader
+        # a change through someone else holding a dropped tree is followed, the tree is stored at its entry again
+        held.nodes[held.root].title = 'Changed'
+        assert held is dict.__getitem__(collection.collection['strategies'], 'KeeperStrategy.json')
+        assert saved != collection
+        assert collection.unsaved_entry(saved, 'strategies', 'KeeperStrategy.json')
+        assert not collection.saved_entry('strategies', 'KeeperStrategy.json',
+                                          self.complete_path / 'strategies' / 'KeeperStrategy.json')
+        # the read only collection reads the tree from its file
+        assert 'Changed' != saved.get_tree_by_name('KeeperStrategy').nodes[held.root].title
+
+    def test_evicted_tree_removed(self):
+        collection = Collection.from_path(self.complete_path, lazy=True)
+        held = collection.get_tree_by_name('KeeperStrategy')
+        collection.max_loaded_nodes = 0
+        collection.get_tree_by_name('AttackStrategy')
+        assert any(observer() is collection for observer in held.observers)
+        # a dropped tree is no longer followed once its entry is removed
+        del collection.collection['strategies']['KeeperStrategy.json']
+        assert not any(observer() is collection for observer in held.observers)
+        held.nodes[held.root].title = 'Changed'
+        assert 'KeeperStrategy.json' not in collection.collection['strategies']
+
+    def test_removed_when_invalid(self, tmpdir):
+        collection = Collection.from_path(self.complete_path, lazy=False)
+        collection.write_collection(Path(tmpdir))
+        lazy = Collection.from_path(Path(tmpdir), lazy=True)
+        (Path(tmpdir) / 'roles' / 'Keeper.json').write_text('{"name": "Keeper"}')
+        assert lazy.get_tree_by_name('Keeper') is None
+        assert 'Keeper.json' not in lazy.collection['roles']
+        assert 'Keeper' not in lazy.names
+
+    def test_copies(self):
+        collection = Collection.from_path(self.complete_path, lazy=True)
+        tree = collection.get_tree_by_name('AttackStrategy')
+        snapshot = collection.snapshot()
+        writable = snapshot.writable_copy()
+        clone = collection.clone()
+        for copy in (snapshot, writable, clone, deepcopy(collection)):
+            assert copy.lazy
+            assert collection == copy
+            assert collection.same_entry(copy, 'strategies', 'AttackStrategy.json')
+        assert ('strategies', 'AttackStrategy.json') in writable.loaded
+        tree.nodes[tree.root].title = 'Changed'
+        assert not collection.same_entry(snapshot, 'strategies', 'AttackStrategy.json')
+        assert collection.same_entry(snapshot, 'roles', 'Keeper.json')
+        assert 'Changed' != snapshot.get_tree_by_name('AttackStrategy').nodes[tree.root].title
+
+    def test_role_usages(self):
+        collection = Collection.from_path(self.complete_path, lazy=True)
+        eager = Collection.from_path(self.complete_path, lazy=False)
+        assert [(tree.name, node_id) for tree, node_id in eager.find_role_usages('Keeper')] == \
+            [(tree.name, node_id) for tree, node_id in collection.find_role_usages('Keeper')]
+
+    def test_saved(self, tmpdir):
+        Collection.from_path(self.complete_path, lazy=False).write_collection(Path(tmpdir))
+        collection = Collection.from_path(Path(tmpdir), lazy=True)
+        tree = collection.get_tree_by_name('Keeper')
+        tree.nodes[tree.root].title = 'Changed'
+        collection.write_tree(tree, Path(tmpdir) / 'roles' / 'Keeper.json')
+        # the tree has the content of its file again, so it can be dropped
+        assert tree.fingerprint == collection.loaded[('roles', 'Keeper.json')].fingerprint
+        assert tree == Collection.from_path(Path(tmpdir), lazy=True).get_tree_by_name('Keeper')
+
+
+class TestCollectionChanges(object):
+    complete_path = Path('json/jsons/')
+
+    @pytest.fixture
+    def path(self, tmpdir):
+        Collection.from_path(self.complete_path).write_collection(Path(tmpdir))
+        return Path(tmpdir)
+
+    @staticmethod
+    def change_file(path: Path, name: str=None, title: str='Changed'):
+        content = json.loads(path.read_text())
+        tree = content['data']['trees'][0]
+        tree['nodes'][tree['root']]['title'] = title
+        if name:
+            content['name'] = tree['title'] = name
+        path.write_text(json.dumps(content))
+        # the file counts as changed even when it is written within the resolution of the clock
+        stat = os.stat(str(path))
+        os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def test_no_changes(self, path):
+        collection = Collection.from_path(path)
+        assert len(collection.file_stamps) == sum(len(trees) for trees in collection.collection.values())
+        assert not collection.read_changes()
+        tree = collection.get_tree_by_name('Keeper')
+        tree.nodes[tree.root].title = 'Changed'
+        collection.write_tree(tree, path / 'roles' / 'Keeper.json')
+        # the files written by the collection itself did not change on disk
+        assert not collection.read_changes()
+
+    @pytest.mark.parametrize('lazy', [False, True])
+    def test_changes(self, path, lazy):
+        collection = Collection.from_path(path, lazy=lazy)
+        self.change_file(path / 'roles' / 'Keeper.json')
+        shutil.copyfile(str(path / 'roles' / 'Keeper.json'), str(path / 'roles' / 'Added.json'))
+        self.change_file(path / 'roles' / 'Added.json', 'Added')
+        os.remove(str(path / 'strategies' / 'AttackStrategy.json'))
+        (path / 'roles' / 'Assister.json').write_text('{"name": "Assister"}')
+        os.makedirs(str(path / 'new'))
+        changes = collection.read_changes()
+        assert {('roles', 'Keeper.json'), ('roles', 'Added.json')} == set(changes.trees.keys())
+        assert {('strategies', 'AttackStrategy.json'), ('roles', 'Assister.json')} == set(changes.removed)
+        assert all(type(tree) is (TreeHeader if lazy else Tree) for tree in changes.trees.values())
+        # nothing changed in the collection yet, the files count as read
+        assert 'Added.json' not in collection.collection['roles']
+        assert not collection.read_changes()
+        unchanged = dict.__getitem__(collection.collection['roles'], 'Keeperv2.json')
+        assert set(changes.locations()) == set(collection.merge_changes(changes))
+        assert Collection.from_path(path) == collection
+        assert unchanged is dict.__getitem__(collection.collection['roles'], 'Keeperv2.json')
+        assert 'Changed' == collection.get_tree_by_name('Keeper').nodes[collection.get_tree_by_name('Keeper').root]\
+            .title
+        assert 'Added' in collection.names and 'AttackStrategy' not in collection.names
+        assert {} == collection.collection['new']
+
+    def test_changes_read_later(self, path):
+        collection = Collection.from_path(path)
+        self.change_file(path / 'roles' / 'Keeper.json')
+        self.change_file(path / 'roles' / 'Assister.json')
+        # like the files are compared on another thread, while the collection writes a tree
+        changes = CollectionLoader(use_cache=False).changes(path, dict(collection.file_stamps))
+        tree = collection.get_tree_by_name('Assister')
+        tree.nodes[tree.root].title = 'Written'
+        collection.write_tree(tree, path / 'roles' / 'Assister.json')
+        stamp = collection.file_stamps[('roles', 'Assister.json')]
+        collection.changes_read(changes)
+        # the written tree keeps its stamp and is left out of the changes
+        assert [('roles', 'Keeper.json')] == changes.locations()
+        assert stamp == collection.file_stamps[('roles', 'Assister.json')]
+        collection.merge_changes(changes)
+        assert 'Written' == collection.get_tree_by_name('Assister').nodes[tree.root].title
+        assert Collection.from_path(path) == collection
+        assert not collection.read_changes()
+
+    @pytest.mark.parametrize('lazy', [False, True])
+    def test_saved_by_copy(self, path, lazy):
+        collection = Collection.from_path(path, lazy=lazy)
+        tree = collection.get_tree_by_name('Keeper')
+        tree.nodes[tree.root].title = 'Changed'
+        # like a copy of the collection is written on another thread
+        copy = collection.clone()
+        stamps = dict(copy.file_stamps)
+        assert [] == copy.write_collection()
+        saved = copy.files_saved(stamps)
+        assert [('roles', 'Keeper.json')] == list(saved)
+        assert not collection.saved_entry('roles', 'Keeper.json', path / 'roles' / 'Keeper.json')
+        # another collection does not take over the files
+        collection.merge_saved(path / 'other', saved)
+        assert not collection.saved_entry('roles', 'Keeper.json', path / 'roles' / 'Keeper.json')
+        collection.merge_saved(path, saved)
+        assert collection.saved_entry('roles', 'Keeper.json', path / 'roles' / 'Keeper.json')
+        assert not collection.read_changes()
+        if lazy:
+            assert tree.fingerprint == collection.loaded[('roles', 'Keeper.json')].fingerprint
+
+    def test_unsaved_changes(self, path):
+        collection = Collection.from_path(path)
+        saved = collection.snapshot()
+        edited = collection.get_tree_by_name('Keeper')
+        edited.nodes[edited.root].title = 'Edited'
+        collection.collection['roles'].pop('Keeperv2.json')
+        self.change_file(path / 'roles' / 'Keeper.json')
+        self.change_file(path / 'roles' / 'Keeperv2.json')
+        self.change_file(path / 'roles' / 'Assister.json')
+        self.change_file(path / 'roles' / 'AttackerRole.json')
+        changes = collection.read_changes()
+        merged = collection.merge_changes(changes, saved, [('roles', 'AttackerRole.json')])
+        saved.merge_changes(changes)
+        # the trees with unsaved changes and the kept trees stay, the saved collection has the trees on disk
+        assert [('roles', 'Assister.json')] == merged
+        assert edited is collection.get_tree_by_name('Keeper')
+        assert 'Edited' == edited.nodes[edited.root].title
+        assert 'Keeperv2.json' not in collection.collection['roles']
+        assert not collection.same_entry(saved, 'roles', 'AttackerRole.json')
+        assert collection.same_entry(saved, 'roles', 'Assister.json')
+        assert Collection.from_path(path) == saved
+        # the tree shared with the saved collection is copied there before it changes
+        tree = collection.get_tree_by_name('Assister')
+        tree.nodes[tree.root].title = 'Edited'
+        assert Collection.from_path(path) == saved
+
+    def test_reload(self, path):
+        collection = Collection.from_path(path)
+        saved = collection.snapshot()
+        tree = collection.get_tree_by_name('Keeperv2')
+        tree.nodes[tree.root].title = 'Edited'
+        self.change_file(path / 'roles' / 'Keeper.json')
+        # like the editor reloads the collection
+        saved.merge_changes(saved.read_changes())
+        reloaded = saved.writable_copy()
+        # the changes in memory are left out and the trees of unchanged files are shared
+        assert Collection.from_path(path) == reloaded
+        assert not reloaded.is_snapshot
+        assert dict.__getitem__(saved.collection['roles'], 'Assister.json') is \
+            dict.__getitem__(reloaded.collection['roles'], 'Assister.json')
+        assert not reloaded.read_changes()
+
+
 class TestVerification(object):
 
     path = Path("json/collection/")
@@ -708,6 +1540,18 @@ class TestVerification(object):
         tree = self.simple_unconnected_tree
         assert 1 is len(Verification.has_unconnected_nodes(tree))
 
+    def test_find_unconnected_nodes(self):
+        tree = Tree('tree', 'a', {'a': Node('a', 'a', children=['b', 'missing']), 'b': Node('b', 'b', children=['a']),
+                                  'c': Node('c', 'c', children=['d', 'gone']), 'd': Node('d', 'd')})
+        unconnected, dangling = Verification.find_unconnected_nodes(tree)
+        assert ['c', 'd'] == unconnected
+        assert [('a', 'missing')] == dangling
+        assert 2 == len(Verification.has_unconnected_nodes(tree))
+        tree.nodes.get('b').add_child('c')
+        unconnected, dangling = Verification.find_unconnected_nodes(tree)
+        assert [] == unconnected
+        assert [('a', 'missing'), ('c', 'gone')] == sorted(dangling)
+
     def test_invalid_role_inheritance_tree_1(self):
         collection = Collection(self.collection)
         tree = self.simple_invalid_role_inheritance_tree_1
@@ -770,8 +1614,340 @@ class TestVerification(object):
         tree.nodes.get(tree.root).add_child(tree.root)
         assert 3 == len(Verification.walk_tree(tree, tree.nodes.get(tree.root)))
 
+    @staticmethod
+    def deep_chain_json(depth: int) -> Dict:
+        """
+        Creates the json of a role tree that is a chain of sequences, deeper than the recursion limit
+        """
+        nodes = {'node0': {'id': 'node0', 'title': 'Role', 'children': ['node1']}}
+        for index in range(1, depth):
+            nodes['node{}'.format(index)] = {'id': 'node{}'.format(index), 'title': 'Sequence',
+                                             'children': ['node{}'.format(index + 1)]}
+        nodes['node{}'.format(depth)] = {'id': 'node{}'.format(depth), 'title': 'Kick'}
+        tree = {'title': 'DeepChain', 'root': 'node0', 'nodes': nodes}
+        return {'name': 'DeepChain', 'data': {'trees': [tree]}}
+
+    def test_deep_chain(self):
+        tree = Tree.from_json(self.deep_chain_json(50000))
+        collection = Collection({'roles': {'DeepChain.json': tree}})
+        assert [] == collection.verify_tree(tree, 'roles')
+        assert 50001 == len(Verification.walk_tree(tree, tree.nodes.get(tree.root)))
+        tree.nodes.get('node49999').add_property('ROLE', 'Keeper')
+        tree.nodes.get('node50000').add_property('ROLE', 'Defender')
+        assert 1 == len(Verification.check_role_inheritance(tree, tree.root))
+
+
+    @staticmethod
+    def separate_checks(collection: Collection, tree: Tree, category: str=None) -> List[str]:
+        """
+        Verifies a tree by running the checks of Verification one after another
+        """
+        errors = Verification.verify_mathematical_properties(tree)
+        if errors:
+            return errors
+        return Verification.verify_non_mathematical_properties(collection, category, tree)
+
+    @staticmethod
+    def break_tree(tree: Tree) -> Tree:
+        """
+        Copies a tree and breaks it in a few places: a branch is disconnected, a decorator loses its child and
+        the ROLE property of the last node does not match its parent
+        """
+        tree = tree.clone()
+        root = tree.nodes[tree.root]
+        if root.children and tree.nodes[root.children[0]].children:
+            root.children[0:1] = tree.nodes[root.children[0]].children[:1]
+        for node in tree.nodes.values():
+            if node.title == 'Inverter':
+                node.children = []
+                break
+        last = list(tree.nodes.values())[-1]
+        last.add_property('ROLE', 'NotTheRole')
+        return tree
+
+    def test_fused_verifier_jsons(self):
+        collection = Collection.from_path(TestCollection.complete_path)
+        categories = [None] + list(collection.collection.keys())
+        verifier = {category: TreeVerifier(collection, category) for category in categories}
+        compared = 0
+        for trees in collection.collection.values():
+            for tree in trees.values():
+                for category in categories:
+                    for checked in (tree, self.break_tree(tree)):
+                        expected = self.separate_checks(collection, checked, category)
+                        assert expected == verifier[category].verify(checked)
+                        assert expected == Verification.verify_tree(collection, checked, category)
+                        compared += bool(expected)
+        # the broken trees and the wrong categories give errors
+        assert compared > 0
+
+    def test_fused_verifier_invalid_trees(self):
+        collection = Collection(self.collection)
+        trees = [self.simple_cyclic_tree, self.simple_unconnected_tree, self.simple_invalid_composites_tree,
+                 self.simple_invalid_decorator_tree, self.simple_invalid_role_inheritance_tree_1,
+                 self.simple_invalid_role_inheritance_tree_2, self.simple_invalid_root_node_tree1,
+                 self.simple_invalid_root_node_tree2, self.ssr_tree, self.ttr_tree, self.rr_tree, self.complex_tree,
+                 self.offensive_strategy_tree, self.keeper_strategy_tree]
+        for tree in trees:
+            for category in (None, 'roles', 'tactics', 'strategies'):
+                expected = self.separate_checks(collection, tree, category)
+                assert expected == TreeVerifier(collection, category).verify(tree)
+                maths = Verification.verify_mathematical_properties(tree)
+                assert maths == TreeVerifier(collection, category).verify(tree, True)
+
+    def test_fused_verifier_cycle(self):
+        tree = Tree('tree', 'a', {'a': Node('Sequence', 'a', children=['b', 'c']), 'b': Node('Kick', 'b'),
+                                  'c': Node('Sequence', 'c', children=['a', 'b'])})
+        errors = TreeVerifier(Collection({})).verify(tree)
+        assert Verification.contains_cycles(tree, {}) == errors
+        assert 1 == len(errors)
+
+    def test_fused_verifier_rule(self):
+        class TitleRule(VerificationRule):
+            visited = []
+
+            def visit(self, tree, node_id, state):
+                TitleRule.visited.append(node_id)
+                if tree.nodes[node_id].title == 'Kick':
+                    self.errors.append('kick {}'.format(node_id))
+                return state
+
+        tree = Tree('tree', 'a', {'a': Node('Sequence', 'a', children=['b', 'c']), 'b': Node('Kick', 'b'),
+                                  'c': Node('Inverter', 'c', children=['d']), 'd': Node('Kick', 'd'),
+                                  'e': Node('Kick', 'e')})
+        verifier = TreeVerifier(Collection({}))
+        verifier.add_rule(TitleRule)
+        errors = verifier.verify(tree)
+        assert ['a', 'b', 'c', 'd'] == TitleRule.visited
+        # the errors of the added rule come after the errors of the default rules
+        assert 3 == len(errors)
+        assert errors[0].startswith('The node')
+        assert ['kick b', 'kick d'] == errors[1:]
+
+
+    @staticmethod
+    def edit_tree(tree: Tree, step: int):
+        """
+        Makes one of a few kinds of edits to a tree, like the editor does, yields between the parts of an edit
+        """
+        node_ids = sorted(tree.nodes.keys())
+        node = tree.nodes[node_ids[step * 7 % len(node_ids)]]
+        kind = step % 7
+        if kind == 0:
+            node.add_property('ROLE', 'Edited{}'.format(step))
+        elif kind == 1 and node.children:
+            node.remove_child(node.children[-1])
+        elif kind == 2:
+            node.title = 'Inverter' if node.title != 'Inverter' else 'Sequence'
+        elif kind == 3:
+            child = Node('Condition{}'.format(step), 'added{}'.format(step))
+            tree.add_node(child)
+            node.add_child(child.id)
+        elif kind == 4 and node.properties():
+            node.update_properties({})
+        elif kind == 5 and node.children:
+            # reconnect the last child to another node
+            child_id = node.children.pop()
+            tree.nodes[node_ids[(step * 3 + 1) % len(node_ids)]].add_child(child_id)
+        elif kind == 6 and node.children:
+            # cut off a child, change it and connect it again
+            child_id = node.children.pop()
+            tree.nodes[child_id].add_property('ROLE', 'Detached')
+            yield
+            node.add_child(child_id)
+
+    def test_incremental_verifier_jsons(self):
+        collection = Collection.from_path(TestCollection.complete_path).clone()
+        for category, trees in collection.collection.items():
+            for tree in trees.values():
+                verifier = IncrementalVerifier(collection, tree, category)
+                assert TreeVerifier(collection, category).verify(tree) == verifier.verify()
+                assert len(tree.nodes) <= verifier.checked_nodes + 1
+                assert TreeVerifier(collection, category).verify(tree) == verifier.verify()
+                assert 0 == verifier.checked_nodes
+                for step in range(14):
+                    for _ in self.edit_tree(tree, step):
+                        assert TreeVerifier(collection, category).verify(tree) == verifier.verify()
+                    assert TreeVerifier(collection, category).verify(tree) == verifier.verify()
+
+    def test_incremental_verifier_region(self):
+        collection = Collection.from_path(TestCollection.complete_path).clone()
+        tree = collection.get_tree_by_name('SimpleDefendTactic')
+        verifier = IncrementalVerifier(collection, tree, 'tactics')
+        assert [] == verifier.verify()
+        leaf = next(node for node in tree.nodes.values() if not node.children)
+        leaf.add_attribute('extra', 'value')
+        assert [] == verifier.verify()
+        # the parent is checked again as well, the states of its children depend on their titles
+        assert 2 == verifier.checked_nodes
+        assert verifier.walked_nodes < len(tree.nodes)
+        # a different ROLE is checked again for the node and its descendants
+        role_node = next(node for node in tree.nodes.values() if node.id != tree.root and node.children)
+        role_node.add_property('ROLE', 'Changed')
+        errors = verifier.verify()
+        assert TreeVerifier(collection, 'tactics').verify(tree) == errors
+        assert 0 < len(errors)
+        # the node, its parent and the nodes below it that inherit the ROLE
+        assert 2 + len(tree.descendant_ids(role_node.id)) >= verifier.checked_nodes > 2
+        assert verifier.checked_nodes < len(tree.nodes)
+
+    def test_incremental_verifier_dependencies(self):
+        collection = Collection.from_path(TestCollection.complete_path).clone()
+        tree = collection.get_tree_by_name('AttackStrategy')
+        verifier = IncrementalVerifier(collection, tree, 'strategies')
+        assert [] == verifier.verify()
+        # the tactic the strategy refers to gets a second Role node on a path
+        tactic = collection.get_tree_by_name('Attactic')
+        root = tactic.nodes[tactic.root]
+        role = Node('Role', 'extra_role')
+        role.add_child(root.children[0])
+        tactic.add_node(role)
+        root.children[0] = role.id
+        expected = TreeVerifier(collection, 'strategies').verify(tree)
+        assert 0 < len(expected)
+        assert expected == verifier.verify()
+        assert len(tree.nodes) <= verifier.checked_nodes + 1
+        # a cycle is found and the results are kept for the nodes that were checked
+        tree.nodes[tree.root].add_child(tree.root)
+        assert Verification.contains_cycles(tree, {}) == verifier.verify()
+        tree.nodes[tree.root].remove_child(tree.root)
+        assert expected == verifier.verify()
+        with pytest.raises(ValueError):
+            verifier.verify(tactic)
+
+
+    def test_fused_verifier_cancelled(self):
+        tree = Tree.from_json(self.deep_chain_json(1000))
+        collection = Collection({'roles': {'DeepChain.json': tree}})
+        revisions = [1]
+        verifier = TreeVerifier(collection, 'roles', cancelled=lambda: revisions[-1] != 1)
+        assert [] == verifier.verify(tree)
+        revisions.append(2)
+        with pytest.raises(VerificationCancelledException):
+            verifier.verify(tree)
+
+    def test_incremental_verifier_cancelled(self):
+        tree = Tree.from_json(self.deep_chain_json(1000))
+        collection = Collection({'roles': {'DeepChain.json': tree}})
+        revisions = [1]
+        verifier = IncrementalVerifier(collection, tree, 'roles', cancelled=lambda: revisions[-1] != 1)
+        assert [] == verifier.verify()
+        tree.nodes[tree.root].add_property('ROLE', 'Changed')
+        revisions.append(2)
+        with pytest.raises(VerificationCancelledException):
+            verifier.verify()
+        # the partly updated results are forgotten, the next verification checks every node
+        revisions.append(1)
+        assert TreeVerifier(collection, 'roles').verify(tree) == verifier.verify()
+        assert len(tree.nodes) <= verifier.checked_nodes + 1
+
+    def test_verification_cache_unchanged_collection(self, monkeypatch, tmpdir):
+        Verification.cache.clear()
+        collection = Collection.from_path(TestCollection.complete_path)
+        trees = [(category, tree) for category, files in collection.collection.items() for tree in files.values()]
+        first = [collection.verify_tree(tree, category, True) for category, tree in trees]
+        second = [collection.verify_tree(tree, category, False) for category, tree in trees]
+        verified = []
+        verify = TreeVerifier.verify
+        monkeypatch.setattr(TreeVerifier, 'verify', lambda *args: verified.append(args) or verify(*args))
+        hits = Verification.cache.hits
+        # a close check and a save of the unchanged collection
+        assert first == [collection.verify_tree(tree, category, True) for category, tree in trees]
+        assert second == [collection.verify_tree(tree, category, False) for category, tree in trees]
+        for category, tree in trees:
+            collection.write_tree(tree, Path(tmpdir) / 'cached.json')
+        assert [] == verified
+        assert hits + 3 * len(trees) == Verification.cache.hits
+        # a changed tree is verified again
+        tree = trees[0][1]
+        tree.nodes[tree.root].add_child('missing')
+        assert first[0] == collection.verify_tree(tree, trees[0][0], True)
+        assert 1 == len(verified)
+
+    def test_verification_cache_dependencies(self):
+        Verification.cache.clear()
+        collection = Collection.from_path(TestCollection.complete_path).clone()
+        strategy = collection.get_tree_by_name('AttackStrategy')
+        assert [] == collection.verify_tree(strategy, 'strategies')
+        # the tactic the strategy refers to changes, the strategy is verified again
+        tactic = collection.get_tree_by_name('Attactic')
+        root = tactic.nodes[tactic.root]
+        role = Node('Role', 'extra_role')
+        role.add_child(root.children[0])
+        tactic.add_node(role)
+        root.children[0] = role.id
+        misses = Verification.cache.misses
+        errors = collection.verify_tree(strategy, 'strategies')
+        assert TreeVerifier(collection, 'strategies').verify(strategy) == errors
+        assert 0 < len(errors)
+        assert misses + 1 == Verification.cache.misses
+        # another collection with the same trees gives the same answers
+        assert errors == collection.clone().verify_tree(strategy.clone(), 'strategies')
+        assert misses + 1 == Verification.cache.misses
+        # the tactic is no longer in the collection
+        collection.remove_tree_by_name('tactics', 'Attactic')
+        errors = collection.verify_tree(strategy, 'strategies')
+        assert TreeVerifier(collection, 'strategies').verify(strategy) == errors
+        assert misses + 2 == Verification.cache.misses
+
+    def test_verification_cache_logging(self, caplog):
+        Verification.cache.clear()
+        collection = Collection.from_path(TestCollection.complete_path).clone()
+        tree = collection.get_tree_by_name('Attactic')
+        tree.nodes[tree.root].add_child('missing')
+        tree.add_node(Node('Sequence', 'unconnected'))
+        caplog.clear()
+        errors = collection.verify_tree(tree, 'tactics')
+        logged = [(record.name, record.levelno, record.getMessage()) for record in caplog.records]
+        assert 0 < len(errors)
+        assert 'Child missing from node {} in tree Attactic does not exist.'.format(tree.root) in \
+            [message for _, _, message in logged]
+        # a cached result logs the same messages as the verification
+        caplog.clear()
+        hits = Verification.cache.hits
+        assert errors == collection.verify_tree(tree, 'tactics')
+        assert hits + 1 == Verification.cache.hits
+        assert logged == [(record.name, record.levelno, record.getMessage()) for record in caplog.records]
+
+    def test_verification_cache_size(self):
+        cache = VerificationCache(2)
+        collection = Collection({})
+        cache.store(collection, ('a',), ['error'], {})
+        cache.store(collection, ('b',), [], {})
+        assert ['error'] == cache.lookup(collection, ('a',))
+        cache.store(collection, ('c',), [], {})
+        assert cache.lookup(collection, ('b',)) is None
+        assert [] == cache.lookup(collection, ('c',))
+        # the returned errors are a copy
+        cache.lookup(collection, ('a',)).append('other')
+        assert ['error'] == cache.lookup(collection, ('a',))
+
 
 class TestNodeTypes:
+    def test_classifier(self):
+        node_types = NodeTypes.from_csv()
+        classifier = node_types.classifier()
+        for name in ('Sequence', 'Repeater', 'Role', 'unknown'):
+            assert list(node_types.get_node_type_by_name(name)) == \
+                [(category, list(node_type)) for category, node_type in classifier.get_node_type_by_name(name)]
+        assert classifier.is_composite('Sequence')
+        assert classifier.is_sequence('Sequence')
+        assert not classifier.is_sequence('Selector')
+        assert classifier.is_decorator('Repeater')
+        assert not classifier.is_condition('unknown')
+        with pytest.raises(AttributeError):
+            classifier.types = {}
+
+    def test_default_classifier_cache(self, tmpdir):
+        node_types = NodeTypes.from_csv()
+        node_types.write(tmpdir)
+        classifier = NodeTypes.default_classifier(tmpdir)
+        assert classifier is NodeTypes.default_classifier(tmpdir)
+        node_types.add_node_type('composites', 'NewSequence')
+        node_types.write(tmpdir)
+        assert classifier is not NodeTypes.default_classifier(tmpdir)
+        assert NodeTypes.default_classifier(tmpdir).is_sequence('NewSequence')
+
     def test_from_csv(self):
         node_types = NodeTypes.from_csv(Settings.default_node_types_folder())
         assert '.hiddenfile.csv' not in node_types.node_types.keys()
@@ -822,6 +1998,15 @@ class TestNodeTypes:
         assert "a" in node_from_node_type.attributes.get("properties").keys()
         assert "b" in node_from_node_type.attributes.get("properties").keys()
 
+    def test_create_node_from_type_allocated_id(self):
+        collection = Collection.from_path(Path('json/jsons'))
+        node = NodeTypes.create_node_from_node_type(["Sequence", "a"], collection.id_allocator)
+        # the id is not used by any tree of the collection and not handed out again
+        assert node.id not in {node_id for trees in collection.collection.values() for tree in trees.values()
+                               for node_id in tree.nodes.keys()}
+        assert node.id in collection.id_allocator
+        assert node.id != collection.id_allocator.allocate_one()
+
     def test_add_node_type(self, tmpdir):
         node_types = NodeTypes.from_csv()
         # check if a new category gets created if it does not exist
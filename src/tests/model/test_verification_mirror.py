@@ -0,0 +1,167 @@
+from pathlib import Path
+
+from model.tree import Collection, Node, Tree, TreeHeader, Verification
+from model.tree_verifier import TreeVerifier
+from model.verification_mirror import MirrorUpdater, VerificationMirror
+
+
+class TestVerificationMirror(object):
+    path = Path('json/jsons')
+
+    @staticmethod
+    def mirror(collection: Collection, tree: Tree, category: str):
+        updater = MirrorUpdater()
+        mirror = VerificationMirror()
+        mirror.apply(updater.update(collection, tree, category))
+        return updater, mirror
+
+    @staticmethod
+    def assert_mirrored(mirror: VerificationMirror, collection: Collection, tree: Tree, category: str):
+        assert tree == mirror.tree
+        assert tree.fingerprint == mirror.tree.fingerprint
+        assert collection.fingerprint == mirror.collection.fingerprint
+        Verification.cache.clear()
+        assert TreeVerifier(collection, category).verify(tree) == mirror.verify()
+
+    def test_copy(self):
+        collection = Collection.from_path(self.path).clone()
+        tree = collection.get_tree_by_name('AttackStrategy')
+        _, mirror = self.mirror(collection, tree, 'strategies')
+        self.assert_mirrored(mirror, collection, tree, 'strategies')
+        # the copy does not share any trees or nodes with the collection
+        assert mirror.tree is not tree
+        assert mirror.collection.get_tree_by_name('AttackStrategy') is mirror.tree
+        assert not any(mirror.tree.nodes[node_id] is node for node_id, node in tree.nodes.items())
+        tactic = collection.get_tree_by_name('Attactic')
+        assert mirror.collection.get_tree_by_name('Attactic') is not tactic
+        fingerprint = mirror.tree.fingerprint
+        tree.nodes[tree.root].title = 'Changed'
+        assert fingerprint == mirror.tree.fingerprint
+
+    def test_edited_nodes(self):
+        collection = Collection.from_path(self.path).clone()
+        tree = collection.get_tree_by_name('SimpleDefendTactic')
+        updater, mirror = self.mirror(collection, tree, 'tactics')
+        verifier = mirror.verifier
+        leaf = next(node for node in tree.nodes.values() if not node.children)
+        leaf.add_attribute('extra', 'value')
+        update = updater.update(collection, tree, 'tactics')
+        # only the changed node is sent
+        assert update.tree is None
+        assert [leaf.id] == list(update.nodes)
+        assert all(entry is None for _, entries in update.categories for _, entry in entries)
+        mirror.apply(update)
+        assert verifier is mirror.verifier
+        self.assert_mirrored(mirror, collection, tree, 'tactics')
+        # added and removed nodes and changed children
+        parent = tree.nodes[tree.root]
+        node = Node('Role', 'mirrored_role')
+        node.add_child(parent.children[0])
+        tree.add_node(node)
+        parent.children[0] = node.id
+        mirror.apply(updater.update(collection, tree, 'tactics'))
+        self.assert_mirrored(mirror, collection, tree, 'tactics')
+        parent.children[0] = node.children[0]
+        del tree.nodes[node.id]
+        update = updater.update(collection, tree, 'tactics')
+        assert update.nodes[node.id] is None
+        mirror.apply(update)
+        assert node.id not in mirror.tree.nodes
+        self.assert_mirrored(mirror, collection, tree, 'tactics')
+
+    def test_incremental_verification(self):
+        collection = Collection.from_path(self.path).clone()
+        tree = collection.get_tree_by_name('SimpleDefendTactic')
+        updater, mirror = self.mirror(collection, tree, 'tactics')
+        Verification.cache.clear()
+        mirror.verify()
+        leaf = next(node for node in tree.nodes.values() if not node.children)
+        leaf.add_attribute('extra', 'value')
+        mirror.apply(updater.update(collection, tree, 'tactics'))
+        Verification.cache.clear()
+        assert [] == mirror.verify()
+        # only the changed node and its parent are checked again
+        assert 2 == mirror.verifier.checked_nodes
+
+    def test_cached_result(self):
+        collection = Collection.from_path(self.path).clone()
+        tree = collection.get_tree_by_name('AttackStrategy')
+        Verification.cache.clear()
+        errors = Verification.verify_tree(collection, tree, 'strategies')
+        _, mirror = self.mirror(collection, tree, 'strategies')
+        hits = Verification.cache.hits
+        assert errors == mirror.verify()
+        assert hits + 1 == Verification.cache.hits
+        assert 0 == mirror.verifier.walked_nodes
+
+    def test_other_trees(self):
+        collection = Collection.from_path(self.path).clone()
+        tree = collection.get_tree_by_name('AttackStrategy')
+        updater, mirror = self.mirror(collection, tree, 'strategies')
+        # a tactic the strategy refers to changes, only that tree is sent again
+        tactic = collection.get_tree_by_name('Attactic')
+        root = tactic.nodes[tactic.root]
+        role = Node('Role', 'extra_role')
+        role.add_child(root.children[0])
+        tactic.add_node(role)
+        root.children[0] = role.id
+        update = updater.update(collection, tree, 'strategies')
+        sent = [entry for _, entries in update.categories for _, entry in entries if entry is not None]
+        assert 1 == len(sent)
+        assert tactic == sent[0] and tactic is not sent[0]
+        assert {} == update.nodes
+        mirror.apply(update)
+        self.assert_mirrored(mirror, collection, tree, 'strategies')
+        # entries that are added and removed
+        collection.collection['roles']['Added.json'] = Tree('Added', 'added', {'added': Node('Role', 'added')})
+        collection.collection['tactics'].pop('Attactic.json')
+        mirror.apply(updater.update(collection, tree, 'strategies'))
+        assert [(category, list(trees)) for category, trees in collection.collection.items()] == \
+            [(category, list(trees)) for category, trees in mirror.collection.collection.items()]
+        self.assert_mirrored(mirror, collection, tree, 'strategies')
+
+    def test_other_tree_edited(self):
+        collection = Collection.from_path(self.path).clone()
+        strategy = collection.get_tree_by_name('AttackStrategy')
+        updater, mirror = self.mirror(collection, strategy, 'strategies')
+        # the edited strategy is sent as a tree of the collection again, the tactic is sent whole
+        tactic = collection.get_tree_by_name('Attactic')
+        strategy.nodes[strategy.root].title = 'Changed'
+        update = updater.update(collection, tactic, 'tactics')
+        assert update.tree is not None
+        mirror.apply(update)
+        assert mirror.collection.get_tree_by_name('Attactic') is mirror.tree
+        assert strategy == mirror.collection.get_tree_by_name('AttackStrategy')
+        self.assert_mirrored(mirror, collection, tactic, 'tactics')
+        # a renamed tree is sent whole
+        tactic.name = 'Renamed'
+        update = updater.update(collection, tactic, 'tactics')
+        assert update.tree is not None
+        mirror.apply(update)
+        self.assert_mirrored(mirror, collection, tactic, 'tactics')
+
+    def test_other_collection(self):
+        collection = Collection.from_path(self.path).clone()
+        tree = collection.get_tree_by_name('AttackStrategy')
+        updater, mirror = self.mirror(collection, tree, 'strategies')
+        other = collection.clone()
+        tree = other.get_tree_by_name('AttackStrategy')
+        update = updater.update(other, tree, 'strategies')
+        assert update.reset
+        assert all(entry is not None for category, entries in update.categories for filename, entry in entries
+                   if (category, filename) not in update.edited_entries)
+        mirror.apply(update)
+        self.assert_mirrored(mirror, other, tree, 'strategies')
+
+    def test_lazy_collection(self):
+        collection = Collection.from_path(self.path, lazy=True)
+        tree = collection.get_tree_by_name('AttackStrategy')
+        updater, mirror = self.mirror(collection, tree, 'strategies')
+        assert mirror.collection.lazy
+        # the trees that are not read yet are sent as their header, the copy reads them itself
+        headers = [(category, filename) for category, trees in collection.collection.items()
+                   for filename, entry in dict.items(trees) if type(entry) is TreeHeader]
+        assert 0 < len(headers)
+        assert all(type(dict.get(mirror.collection.collection[category], filename)) is TreeHeader
+                   for category, filename in headers)
+        self.assert_mirrored(mirror, collection, tree, 'strategies')
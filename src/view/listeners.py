@@ -1,4 +1,3 @@
-from copy import deepcopy
 from pathlib import Path
 from typing import List
 
@@ -7,7 +6,10 @@ from PyQt5.QtGui import QColor
 
 from controller.heatmap_demo import HeatmapDemoThread
 from controller.workers import MainWorker
+from model.collection_loader import CollectionChanges
+from model.config import Settings
 from model.tree import Tree, Collection, NodeTypes
+from model.verification_mirror import MirrorUpdate, MirrorUpdater
 
 import view.windows
 
@@ -22,24 +24,35 @@ class MainListener(QObject):
     # the other without and will use the default path
     open_collection_signal = pyqtSignal()
     open_collection_custom_path_signal = pyqtSignal(Path)
+    # checks the files of the collection for changes made outside of the editor
+    # with the path of the files, a copy of their stamps, the verification mode and if the collection is lazy
+    poll_collection_signal = pyqtSignal(Path, object, bool, bool)
 
     # signals for writing a collection
     # one with path the other without
     # without path will write to the path in Settings or collection
+    # the worker gets a copy of the collection
     write_collection_signal = pyqtSignal(Collection)
     write_collection_custom_path_signal = pyqtSignal(Collection, Path)
 
     # writes a tree
     # one with category and filename to write to the current collection
     # the other path a custom path to write to
-    write_tree_signal = pyqtSignal(str, str, Tree)
-    write_tree_custom_path_signal = pyqtSignal(Path, Tree)
+    # both with the path of the json files of the collection and a copy of the tree
+    write_tree_signal = pyqtSignal(Path, str, str, Tree)
+    write_tree_custom_path_signal = pyqtSignal(Path, Path, Tree)
 
     # reads the node types json files
     open_node_types_signal = pyqtSignal()
 
     create_heatmap_signal = pyqtSignal(str, str)
 
+    # verifies the tree in the editor
+    # with the revision of the tree and the changes to the tree and collection since the previous verification
+    verify_tree_signal = pyqtSignal(int, MirrorUpdate)
+    # milliseconds to wait after an edit before verifying, so fast edits are verified once
+    VERIFY_DELAY = 150
+
     def __init__(self, gui):
         super().__init__()
         self.gui: view.windows.MainWindow = gui
@@ -55,6 +68,18 @@ class MainListener(QObject):
         self.open_collection_custom_path_signal.connect(self.worker.open_collection)
         self.worker.open_collection_finished_signal.connect(self.open_collection_finished)
 
+        # signals for watching the files of the collection, the timer only runs when an interval is set
+        # a reload uses the same check, after the checks that are running
+        self.poll_collection_signal.connect(self.worker.poll_collection)
+        self.worker.poll_collection_finished_signal.connect(self.poll_collection_finished)
+        self.polling = False
+        self.reload_requested = False
+        self.reload_polled = False
+        self.watch_timer = QTimer()
+        self.watch_timer.timeout.connect(self.poll_collection)
+        if Settings.collection_watch_interval() > 0:
+            self.watch_timer.start(Settings.collection_watch_interval())
+
         # signals for writing the collection
         self.write_collection_signal.connect(self.worker.write_collection)
         self.write_collection_custom_path_signal.connect(self.worker.write_collection)
@@ -76,6 +101,49 @@ class MainListener(QObject):
         self.create_heatmap_signal.connect(self.worker.create_heatmap)
         self.heatmap_timer = QTimer()
 
+        # signals for verifying the tree in the editor, the timer restarts on every edit
+        self.verify_tree_signal.connect(self.worker.verify_tree)
+        self.worker.verify_tree_finished_signal.connect(self.verify_tree_finished)
+        self.verification_revision = 0
+        self.mirror_updater = MirrorUpdater()
+        self.verify_timer = QTimer()
+        self.verify_timer.setSingleShot(True)
+        self.verify_timer.setInterval(MainListener.VERIFY_DELAY)
+        self.verify_timer.timeout.connect(self.start_verification)
+
+    def verify_tree(self):
+        """
+        Schedules a verification of the tree in the editor after an edit, a verification of
+        an earlier revision that is still running is cancelled
+        """
+        self.verification_revision += 1
+        self.worker.verification_revision = self.verification_revision
+        self.verify_timer.start()
+
+    # noinspection PyArgumentList
+    @pyqtSlot()
+    def start_verification(self):
+        """
+        Sends the changes to the tree and collection in the editor to the worker when no edits were
+        made during the delay, the worker verifies its own copy of them
+        """
+        if not self.gui.tree or not self.gui.collection:
+            return
+        self.verify_tree_signal.emit(self.verification_revision,
+                                     self.mirror_updater.update(self.gui.collection, self.gui.tree, self.gui.category))
+
+    # noinspection PyArgumentList
+    @pyqtSlot(int, list)
+    def verify_tree_finished(self, revision: int, errors: List[str]):
+        """
+        Method that handles the result of verifying the tree in the editor
+        updates the checkmark if the result is for the latest revision of the tree
+        :param revision: the revision of the tree that was verified
+        :param errors: a list with errors
+        """
+        if revision == self.verification_revision:
+            self.gui.toolbar_widget.show_verification_result(errors)
+
     # noinspection PyArgumentList
     @pyqtSlot(Collection)
     def open_collection_finished(self, collection: Collection):
@@ -85,59 +153,132 @@ class MainListener(QObject):
         Redraws the menu bar
         :param collection: the collection object
         """
-        self.gui.load_collection = collection
-        self.gui.collection = deepcopy(collection)
+        self.gui.load_collection = collection.snapshot()
+        self.gui.collection = collection
+        self.gui.update_window_title_and_menu_bar()
+
+    def reload_collection(self):
+        """
+        Reloads the saved collection, only the files that changed on disk are read again,
+        the changes in memory are left out
+        """
+        self.reload_requested = True
+        if not self.polling:
+            self.start_poll()
+
+    # noinspection PyArgumentList
+    @pyqtSlot()
+    def poll_collection(self):
+        """
+        Asks the worker to check the files of the collection for changes, unless it is still checking them
+        """
+        if not self.polling and self.gui.collection and self.gui.load_collection:
+            self.start_poll()
+
+    def start_poll(self):
+        """
+        Sends the files of the saved collection to the worker to check them for changes,
+        the worker does not get the collection itself
+        """
+        self.polling = True
+        self.reload_polled = self.reload_requested
+        self.reload_requested = False
+        collection = self.gui.load_collection
+        self.poll_collection_signal.emit(collection.jsons_path(), dict(collection.file_stamps),
+                                         collection.only_verify_mathematical_properties, collection.lazy)
+
+    # noinspection PyArgumentList
+    @pyqtSlot(object)
+    def poll_collection_finished(self, changes: CollectionChanges):
+        """
+        Method that handles the changes to the files of the collection made outside of the editor
+        The saved collection gets the trees on disk, the trees without unsaved changes as well,
+        the tree in the editor is not replaced. A reload replaces all trees by the saved ones afterwards
+        :param changes: the changes
+        """
+        self.polling = False
+        if not self.gui.collection or not self.gui.load_collection:
+            self.reload_polled = False
+            return
+        # the files count as read, the files written in the meantime are left out of the changes
+        self.gui.load_collection.changes_read(changes)
+        if changes and not self.reload_polled:
+            keep = [(self.gui.category, self.gui.filename)] if self.gui.tree else []
+            # compared with the saved collection before it changes
+            self.gui.collection.merge_changes(changes, self.gui.load_collection, keep)
+        if changes:
+            self.gui.load_collection.merge_changes(changes)
+        if self.reload_polled:
+            self.reload_polled = False
+            self.gui.collection = self.gui.load_collection.writable_copy()
+        elif self.reload_requested:
+            # the reload was requested while files were checked, they are checked again
+            self.start_poll()
         self.gui.update_window_title_and_menu_bar()
 
     # noinspection PyArgumentList
-    @pyqtSlot(list)
-    def write_collection_finished(self, errors: List[str]):
+    @pyqtSlot(Path, object, list)
+    def write_collection_finished(self, path: Path, saved: dict, errors: List[str]):
         """
         Method that handles the result of writing a collection from the controller
         if it succeeded, update the collection again
         if it failed show an error message
+        :param path: the path of the json files of the written collection
+        :param saved: the files that were written, see Collection.files_saved
         :param errors: a list with errors
         """
+        if self.gui.collection:
+            self.gui.collection.merge_saved(path, saved)
         if not len(errors) == 0:
             # show errors
             view.windows.Dialogs.error_box("ERROR", 'There were errors while writing the collection!')
         else:
-            self.gui.load_tree = deepcopy(self.gui.tree)
-            self.gui.load_collection = deepcopy(self.gui.collection)
+            self.gui.load_collection = self.gui.collection.snapshot()
             self.gui.update_window_title_and_menu_bar()
 
     # noinspection PyArgumentList
-    @pyqtSlot(str, str, Tree, list)
-    def write_tree_finished(self, category: str, filename: str, tree: Tree, errors: List[str]):
+    @pyqtSlot(Path, str, str, Tree, object, list)
+    def write_tree_finished(self, collection_path: Path, category: str, filename: str, tree: Tree, saved: dict,
+                            errors: List[str]):
         """
         Method that handles the result of writing a tree from the controller
         if it succeeded, update the collection again
         if it failed show an error message
+        :param collection_path: the path of the json files of the collection
         :param category: the category writing to
         :param filename: the filename writing
-        :param tree: tree we were trying to write
+        :param tree: the copy of the tree we were trying to write
+        :param saved: the files that were written, see Collection.files_saved
         :param errors: a list with errors
         """
+        if self.gui.collection:
+            self.gui.collection.merge_saved(collection_path, saved)
         if not len(errors) == 0:
-            # show the failed tree on the screen
-            self.gui.show_tree(category, filename, tree)
+            # show the failed tree on the screen, as it is in the collection now
+            trees = self.gui.collection.collection.get(category, {})
+            self.gui.show_tree(category, filename, trees.get(filename, tree))
             view.windows.Dialogs.error_box("ERROR", 'There were errors while writing the tree', errors)
         else:
-            self.gui.load_tree = deepcopy(self.gui.tree)
-            self.gui.load_collection.collection[category][filename] = self.gui.load_tree
+            # the saved collection gets the tree as it was written
+            self.gui.load_collection.collection[category][filename] = tree
             self.gui.update_window_title_and_menu_bar()
 
     # noinspection PyArgumentList
-    @pyqtSlot(Path, Tree, list)
-    def write_tree_custom_path_finished(self, path: Path, tree: Tree, errors: List[str]):
+    @pyqtSlot(Path, Path, Tree, object, list)
+    def write_tree_custom_path_finished(self, collection_path: Path, path: Path, tree: Tree, saved: dict,
+                                        errors: List[str]):
         """
         Method that handles the result of writing a tree from the controller
         if it succeeded, update the collection again
         if it failed show an error message
+        :param collection_path: the path of the json files of the collection
         :param path: the path written to
-        :param tree: the tree we were trying to write
+        :param tree: the copy of the tree we were trying to write
+        :param saved: the files that were written, see Collection.files_saved
         :param errors: a list with errors
         """
+        if self.gui.collection:
+            self.gui.collection.merge_saved(collection_path, saved)
         if not len(errors) == 0:
             view.windows.Dialogs.error_box("ERROR", 'There were errors while writing tree {} to '.format(tree.name)
                                            + str(path) + '!', errors)
@@ -70,7 +70,8 @@ class TreeScene(QGraphicsScene):
         self.node_init_pos = (x, y)
         # remove old content
         self.clear()
-        tree = deepcopy(tree)
+        # share the nodes with the shown tree, only the root is copied when disconnected nodes are added to it
+        tree = tree.snapshot()
         # check if there is a root, otherwise do not display the tree
         if not tree.root:
             return
@@ -80,6 +81,8 @@ class TreeScene(QGraphicsScene):
                                     for node in tree.nodes if node != tree.root and node not in all_children]
         # sort nodes based on number of children
         disconnected_model_nodes = sorted(disconnected_model_nodes, key=lambda n: len(n.children), reverse=True)
+        if len(disconnected_model_nodes) > 0:
+            tree.nodes[tree.root] = deepcopy(tree.nodes[tree.root])
         for i, d_node in enumerate(disconnected_model_nodes):
             d_view_node = DisconnectedNode(d_node)
             tree.nodes[d_view_node.id] = d_view_node
@@ -536,7 +539,7 @@ class TreeScene(QGraphicsScene):
         if mime_data.hasText() and self.gui.tree:
             drag_drop_event.accept()
             node_type = json.loads(mime_data.text())
-            node = NodeTypes.create_node_from_node_type(node_type)
+            node = NodeTypes.create_node_from_node_type(node_type, self.gui.collection.id_allocator)
             # setting this attribute starts node addition sequence in the scene
             self.gui.tree.add_node(node)
             node = ViewNode(*self.node_init_pos, scene=self, model_node=node, title=node.title,
@@ -13,8 +13,9 @@ import view.scenes
 import view.elements
 from controller.utils import singularize, capitalize
 from model.tree import NodeTypes, Node
+from model.tree_verifier import IncrementalVerifier
 
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Tuple
 
 
 class NodeTreeWidget(QTreeWidget):
@@ -145,9 +146,8 @@ class NodeTypesWidget(QWidget):
             self.app.wait_for_click_filter.reset_event_filter()
         title = view.windows.Dialogs.text_input_dialog("Create Node", "Title of the node:")
         if title or '':
-            node = Node(title)
+            node = Node(title, self.gui.collection.id_allocator.allocate_one())
             self.add_node_to_view(node)
-            # todo correctly display subtree
 
     def node_from_selected_type(self):
         """
@@ -156,7 +156,7 @@ class NodeTypesWidget(QWidget):
         if not self.selected:
             return
         node_type = self.selected.data(1, Qt.UserRole)
-        node = NodeTypes.create_node_from_node_type(node_type)
+        node = NodeTypes.create_node_from_node_type(node_type, self.gui.collection.id_allocator)
         self.add_node_to_view(node)
 
     def add_subtree_button_clicked(self):
@@ -169,13 +169,14 @@ class NodeTypesWidget(QWidget):
             return
         tree = self.gui.collection.collection.get(category).get(filename)
         category_singular = singularize(capitalize(category))
-        node = Node(category_singular, attributes={"name": tree.name})
+        node = Node(category_singular, self.gui.collection.id_allocator.allocate_one(), {"name": tree.name})
         # special case for rules, which are defined differently as subtrees as other trees
         if category_singular == 'Role':
             node.attributes['properties'] = {'ROLE': tree.name}
             node.attributes['role'] = tree.name
             self.add_node_to_view(node)
-            self.gui.tree.add_subtree(self.gui.collection.collection.get('roles').get(filename), node.id)
+            self.gui.tree.add_subtree(self.gui.collection.collection.get('roles').get(filename), node.id,
+                                      id_allocator=self.gui.collection.id_allocator)
         else:
             self.add_node_to_view(node)
 
@@ -451,6 +452,8 @@ class ToolbarWidget(QWidget):
         self.check_or_cross.setStyleSheet("QPushButton { border: none; margin: 0px; padding: 0px; }")
         self.check_or_cross.setIcon(self.check_icon)
         self.layout.addWidget(self.check_or_cross)
+        # keeps the results of the last verification, so after an edit only the changed nodes are checked
+        self.verifier = None
 
         # verification button
         self.verify_button = QPushButton("Verify")
@@ -492,13 +495,33 @@ class ToolbarWidget(QWidget):
     def verify_tree(self, message: bool=False):
         """
         Slot that checks a tree when the verify button has been clicked
-        :param message: If a dialog should be shown, or only update the checkmark
+        :param message: If a dialog should be shown, or only update the checkmark. Without a dialog the
+                        tree is verified on the worker thread after the edits stopped
         """
+        if not message:
+            self.gui.main_listener.verify_tree()
+            return
         collection = self.gui.collection
         tree = self.gui.tree
         category = self.gui.category
-        errors = collection.verify_tree(tree, category)
+        if not self.verifier or self.verifier.tree is not tree or self.verifier.collection is not collection \
+                or self.verifier.category != category:
+            self.verifier = IncrementalVerifier(collection, tree, category)
+        errors = self.verifier.verify()
+        self.show_verification_result(errors)
+
+        if len(errors) == 0:
+            view.windows.Dialogs.message_box("Success", "The Tree has been verified successfully. "
+                                             "No errors have been found.")
+        else:
+            view.windows.Dialogs.error_box("Error", "There were errors while verifying the tree, "
+                                                    "click more details for more info.", errors)
 
+    def show_verification_result(self, errors: List[str]):
+        """
+        Updates the checkmark and its tooltip with the result of a verification
+        :param errors: the errors of the verification
+        """
         # update check or cross icon
         if len(errors) == 0:
             self.check_or_cross.setIcon(self.check_icon)
@@ -509,14 +532,6 @@ class ToolbarWidget(QWidget):
             errors_tooltip.extend(errors)
             self.check_or_cross.setToolTip('\n'.join(errors_tooltip))
 
-        if message:
-            if len(errors) == 0:
-                view.windows.Dialogs.message_box("Success", "The Tree has been verified successfully. "
-                                                 "No errors have been found.")
-            else:
-                view.windows.Dialogs.error_box("Error", "There were errors while verifying the tree, "
-                                                        "click more details for more info.", errors)
-
 
 class TreeViewPropertyDisplay(QWidget):
     """
@@ -1,5 +1,4 @@
 import re
-from copy import deepcopy
 from functools import partial
 from pathlib import Path
 from typing import Union, List, Tuple
@@ -69,7 +68,6 @@ class MainWindow(QMainWindow):
         # collection and NodeTypes that has been loaded, used for checking for unsaved changes
         self.load_collection: Collection = None
         self.load_node_types: NodeTypes = None
-        self.load_tree = None
         self.collection = None
         # details about the tree currently shown
         # at start no tree is shown
@@ -95,6 +93,17 @@ class MainWindow(QMainWindow):
         # which initializes the menu bar
         self.menubar.open_collection()
 
+    @property
+    def load_tree(self) -> Union[Tree, None]:
+        """
+        The saved version of the tree that is shown, looked up in the loaded collection because
+        the loaded collection gets a snapshot of the tree when the tree changes
+        :return: the saved tree, None if the tree is new or no tree is shown
+        """
+        if not self.load_collection or not self.category or not self.filename:
+            return None
+        return self.load_collection.collection.get(self.category, {}).get(self.filename)
+
     def enable_tree_actions(self, enable: bool=True):
         """
         these items are enabled if a tree is shown
@@ -124,8 +133,6 @@ class MainWindow(QMainWindow):
         """
         if self.app.wait_for_click_filter:
             self.app.wait_for_click_filter.reset_event_filter()
-        # reset the changes in the loaded tree
-        self.load_tree = None
         # close the currently displayed collection
         self.tree = None
         self.category = None
@@ -145,10 +152,6 @@ class MainWindow(QMainWindow):
         """
         self.close_tree()
         self.category = category
-        if category in self.load_collection.collection and filename in self.load_collection.collection.get(category):
-            self.load_tree = self.load_collection.collection[category][filename]
-        else:
-            self.load_tree = None
         self.tree = tree
         self.collection.collection[category][filename] = tree
         self.filename = filename
@@ -169,18 +172,14 @@ class MainWindow(QMainWindow):
             return DialogEnum.No, []
         elif self.load_collection != self.collection:
             # only check for errors in the mathematical properties
-            errors = []
-            for category, trees in self.collection.collection.items():
-                for filename, tree in trees.items():
-                    errors.extend(self.collection.verify_tree(tree, category,
-                                                              only_check_mathematical_properties=True))
+            errors = self.collection.verify_collection(only_check_mathematical_properties=True)
             if len(errors) == 0:
                 message = 'There are some unsaved changes in the collection, do you want to save them?'
                 save = Dialogs.yes_no_cancel_message_box('Unsaved changes', message)
                 # act depending on the user's choice
                 if save is DialogEnum.Yes:
                     if write:
-                        self.main_listener.write_collection_signal.emit(self.load_collection)
+                        self.main_listener.write_collection_signal.emit(self.load_collection.clone())
                 elif save is DialogEnum.No:
                     if self.collection and self.filename in self.collection.collection.get(self.category):
                         self.collection.collection[self.category].pop(self.filename)
@@ -202,14 +201,16 @@ class MainWindow(QMainWindow):
         """
         self.toolbar_widget.verify_tree()
         # if node is given check if a subtree changed
-        changed_nodes = []
+        changes = None
         if node and Settings.auto_update_roles():
             view_node = self.tree_view_widget.graphics_scene.nodes[node.id]
             node = self.tree.find_role_subtree_node_above_node(node)
             if node:
-                changed_nodes = self.collection.update_subtrees_in_collection(self.tree, node)
+                changes = self.collection.update_subtrees_in_collection(self.tree, node)
             elif 'roles' == self.category:
-                changed_nodes = self.collection.update_subtrees_in_collection(self.tree)
+                changes = self.collection.update_subtrees_in_collection(self.tree)
+            # only the updated Role nodes of the visible tree have to be drawn again
+            changed_nodes = changes.updated_node_ids(self.tree) if changes else []
             self.tree_view_widget.graphics_scene.update_children(changed_nodes)
             view_node.initiate_view(True)
         # rebuild menu bar
@@ -226,8 +227,8 @@ class MainWindow(QMainWindow):
             self.menubar.discard_collection_changes_act.setEnabled(False)
         else:
             self.menubar.discard_collection_changes_act.setEnabled(True)
-        if self.collection and self.filename and self.filename in self.load_collection.collection[self.category] and \
-                self.tree == self.load_collection.collection[self.category][self.filename]:
+        if self.collection and self.filename and \
+                self.load_collection.same_entry(self.collection, self.category, self.filename):
             self.setWindowTitle(self.category + '/' + self.filename)
             self.menubar.discard_tree_changes_act.setEnabled(False)
         elif self.tree:
@@ -247,9 +248,9 @@ class MainWindow(QMainWindow):
                                                                 'the changes of all trees in the collection?'
                                              .format(self.filename))
         if discard:
-            self.collection = deepcopy(self.load_collection)
-            if self.load_tree and self.filename in self.load_collection.collection.get(self.category):
-                self.show_tree(self.category, self.filename, deepcopy(self.load_tree))
+            self.collection = self.load_collection.writable_copy()
+            if self.load_tree:
+                self.show_tree(self.category, self.filename, self.collection.collection[self.category][self.filename])
             else:
                 self.close_tree()
 
@@ -260,10 +261,11 @@ class MainWindow(QMainWindow):
         discard = Dialogs.yes_no_message_box('Discard changes', 'Are you sure you want to discard '
                                                                 'the changes of {}?'.format(self.filename))
         if discard:
-            if self.load_tree and self.filename in self.load_collection.collection[self.category]:
+            if self.load_tree:
                 # not a new file, discard and reload
-                self.collection.collection[self.category][self.filename] = self.load_tree
-                self.show_tree(self.category, self.filename, deepcopy(self.load_tree))
+                tree = self.load_tree
+                tree.make_writable()
+                self.show_tree(self.category, self.filename, tree)
             else:
                 # new file, discard and
                 self.collection.collection.get(self.category).pop(self.filename, None)
@@ -282,6 +284,8 @@ class MainWindow(QMainWindow):
             if self.heatmap_demo:
                 self.heatmap_demo_thread.stop()
                 self.heatmap_demo_thread.join()
+            # settings are written in the background, write the last changes before the application stops
+            Settings.flush()
             return event.accept()
         elif save is DialogEnum.Yes:
             if self.heatmap_demo:
@@ -290,6 +294,7 @@ class MainWindow(QMainWindow):
             if len(errors) == 0:
                 # written here to prevent exceptions from thread when closing window
                 self.collection.write_collection()
+                Settings.flush()
                 return event.accept()
         return event.ignore()
 
@@ -418,9 +423,9 @@ class MenuBar:
                 category_menu.addAction(add_tree_act)
                 # adds an action for each file in the category
                 for filename in filenames:
-                    changed = False if filename in self.main_window.load_collection.collection[category] and \
-                        self.main_window.load_collection.collection[category][filename] == \
-                        self.main_window.collection.collection[category][filename] else True
+                    # compared by fingerprint, trees of a lazily loaded collection are not read for the menu
+                    changed = not self.main_window.load_collection.same_entry(self.main_window.collection, category,
+                                                                              filename)
                     if changed:
                         category_file_act = QAction('*' + filename, self.main_window)
                     else:
@@ -450,12 +455,15 @@ class MenuBar:
 
     def reload_collection(self):
         """
-        Asks to save current changes and reloads the collection
+        Asks to save current changes and reloads the collection, only the files that changed are read again
         """
         save, errors = self.main_window.check_unsaved_changes(write=True)
         if save is not DialogEnum.Cancel:
             self.main_window.close_tree()
-            self.main_window.main_listener.open_collection_signal.emit()
+            if self.main_window.load_collection:
+                self.main_window.main_listener.reload_collection()
+            else:
+                self.main_window.main_listener.open_collection_signal.emit()
 
     def open_tree(self, category: str, filename: str):
         """
@@ -481,7 +489,7 @@ class MenuBar:
         """
         emits a signal to write the collection to the default path
         """
-        self.main_window.main_listener.write_collection_signal.emit(self.main_window.collection)
+        self.main_window.main_listener.write_collection_signal.emit(self.main_window.collection.clone())
 
     def save_collection_as(self):
         """
@@ -492,15 +500,16 @@ class MenuBar:
         path = Dialogs.open_folder_dialog('Save collection folder', json_path)
         # do a call to the controller to write the collection
         if path:
-            self.main_window.main_listener.write_collection_custom_path_signal.emit(self.main_window.collection,
-                                                                                    path)
+            self.main_window.main_listener.write_collection_custom_path_signal.emit(
+                self.main_window.collection.clone(), path)
 
     def save_tree(self):
         """
         Save the tree currently displayed to the collection
         """
-        self.main_window.main_listener.write_tree_signal.emit(self.main_window.category, self.main_window.filename,
-                                                              self.main_window.tree)
+        self.main_window.main_listener.write_tree_signal.emit(self.main_window.collection.jsons_path(),
+                                                              self.main_window.category, self.main_window.filename,
+                                                              self.main_window.tree.clone())
 
     def save_tree_as(self):
         """
@@ -512,7 +521,8 @@ class MenuBar:
         path = Dialogs.save_file_dialog('Save tree as', json_path / self.main_window.filename, )
         # do a call to the controller to write the collection
         if path:
-            self.main_window.main_listener.write_tree_custom_path_signal.emit(path, self.main_window.tree)
+            self.main_window.main_listener.write_tree_custom_path_signal.emit(self.main_window.collection.jsons_path(),
+                                                                              path, self.main_window.tree.clone())
 
     def create_tree(self, category: str):
         """